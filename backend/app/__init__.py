@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, abort, send_from_directory, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
@@ -171,6 +171,33 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@yourcompany.com')
     
+    # Numbers each worker reserves per id sequence (ORD/CUST/INV...); 1 keeps ids in creation order
+    app.config['ID_SEQUENCE_BLOCK_SIZE'] = int(os.getenv('ID_SEQUENCE_BLOCK_SIZE', 1))
+    
+    # Payroll payouts: concurrent provider calls per job, and requests/second per provider (0 = unlimited)
+    app.config['DISBURSEMENT_WORKERS'] = int(os.getenv('DISBURSEMENT_WORKERS', 8))
+    app.config['DISBURSEMENT_RATE_LIMITS'] = {
+        'mtn_momo': float(os.getenv('MOMO_DISBURSEMENT_RATE_LIMIT', 10)),
+    }
+    
+    # Audit/event rows are bulk-inserted by a background writer (see app/utils/audit_writer.py)
+    app.config['AUDIT_WRITER_ASYNC'] = os.getenv('AUDIT_WRITER_ASYNC', 'true').lower() == 'true'
+    app.config['AUDIT_QUEUE_SIZE'] = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+    app.config['AUDIT_BATCH_SIZE'] = int(os.getenv('AUDIT_BATCH_SIZE', 200))
+    app.config['AUDIT_FLUSH_INTERVAL'] = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1.0))
+    app.config['AUDIT_SLOW_FLUSH_SECONDS'] = float(os.getenv('AUDIT_SLOW_FLUSH_SECONDS', 2.0))
+    app.config['AUDIT_DEGRADED_SECONDS'] = float(os.getenv('AUDIT_DEGRADED_SECONDS', 30.0))
+    app.config['AUDIT_SPOOL_FILE'] = os.getenv('AUDIT_SPOOL_FILE', 'logs/audit_spool.jsonl')
+    
+    # Seconds between upserts of each worker's per-business API usage counters
+    app.config['API_USAGE_FLUSH_INTERVAL'] = int(os.getenv('API_USAGE_FLUSH_INTERVAL', 10))
+    
+    # Counters for the rate_limit decorators: auto (Redis if REDIS_URL is reachable, else a SQLite
+    # file shared by the workers on this host), redis, sqlite or memory (per worker)
+    app.config['RATE_LIMIT_BACKEND'] = os.getenv('RATE_LIMIT_BACKEND', 'auto')
+    app.config['RATE_LIMIT_SQLITE_PATH'] = os.getenv('RATE_LIMIT_SQLITE_PATH', 'logs/rate_limits.sqlite')
+    app.config['RATE_LIMIT_MAX_KEYS'] = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+    
     # Initialize rate limiter if available
     if limiter:
         limiter.init_app(app)
@@ -181,6 +208,9 @@ def create_app():
     jwt.init_app(app)
     mail.init_app(app)
     
+    from app.utils.audit_writer import audit_writer
+    audit_writer.init_app(app)
+    
     # Initialize API hardening system (temporarily disabled)
     # from app.utils.api_hardening import APIHardening
     # api_hardening = APIHardening(app)
@@ -218,7 +248,7 @@ def create_app():
     from app.models.leave_request import LeaveRequest, LeaveType, LeaveStatus
     from app.models.payroll import Payroll, PayrollStatus
     from app.models.returns import Return, ReturnItem
-    from app.models.communication import Notification, Message, Announcement
+    from app.models.communication import Notification, Message, Announcement, AlertDedupeKey
     from app.models.settings import CompanyProfile, UserPermission, SystemSetting
     from app.models.audit_log import AuditLog
     from app.models.task import Task
@@ -228,6 +258,16 @@ def create_app():
     from app.models.subscription import Subscription, Plan
     from app.models.supplier_bill import SupplierBill
     from app.models.api_integrations import APIClient, APIAccessToken, WebhookSubscription, WebhookDelivery, Currency, ExchangeRate, CustomField, CustomFieldValue, DocumentTemplate
+    from app.models.outbox import OutboxEvent
+    from app.models.import_job import ImportJob
+    from app.models.sales_rollup import DailySalesRollup, SalesRollupState
+    from app.models.id_sequence import IdSequence
+    from app.models.disbursement_job import DisbursementJob
+    from app.models.stock_level import StockLevel
+    from app.models.search_document import SearchDocument, SearchIndexState
+    from app.models.api_usage import APIUsage
+    from app.models.tenant_export import TenantExport
+    from app.models.tenant_context_version import TenantContextVersion
     
     # Register blueprints
     from app.routes.auth import auth_bp
@@ -264,6 +304,8 @@ def create_app():
     from app.routes.events import events_bp
     from app.routes.chatbot import chatbot_bp
     from app.routes.customer_portal import customer_portal_bp
+    from app.routes.import_jobs import import_jobs_bp
+    from app.routes.search import search_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
@@ -299,6 +341,44 @@ def create_app():
     app.register_blueprint(events_bp, url_prefix='/api/events')
     app.register_blueprint(chatbot_bp, url_prefix='/api/chatbot')
     app.register_blueprint(customer_portal_bp, url_prefix='/api/customer')
+    app.register_blueprint(import_jobs_bp, url_prefix='/api/import-jobs')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+
+    # CLI commands (background jobs and maintenance)
+    from app.commands import register_commands
+    register_commands(app)
+
+    # Daily sales rollups follow order, return, expense and payroll writes
+    from app.utils.rollups import register_rollup_listeners
+    register_rollup_listeners()
+
+    # Cached tenant contexts are dropped when users, branch access or businesses change
+    from app.utils.tenant_context import register_tenant_context_listeners
+    register_tenant_context_listeners()
+
+    # Cached SystemSetting scopes are dropped when settings change
+    from app.utils.settings_service import register_settings_listeners
+    register_settings_listeners()
+    
+    # Stock levels per branch/warehouse follow inventory transactions
+    from app.utils.stock_ledger import register_stock_ledger_listeners
+    register_stock_ledger_listeners()
+    
+    # Cached storefront businesses and category lists are dropped when they change
+    from app.utils.catalogue import register_catalogue_listeners
+    register_catalogue_listeners()
+    
+    # Search documents follow product, customer, supplier and employee writes
+    from app.utils.search_index import register_search_index_listeners
+    register_search_index_listeners()
+    
+    # Barcode scan indexes are dropped when a business's products change
+    from app.utils.barcodes import register_barcode_listeners
+    register_barcode_listeners()
+    
+    # Hourly API call counters per business for the superadmin analytics
+    from app.utils.api_usage import register_api_usage
+    register_api_usage(app)
     
     # Configure static file serving for uploaded files (images, documents)
     # Prefer environment variable for persistence across deployments
@@ -309,6 +389,8 @@ def create_app():
         upload_folder = os.path.join(base_dir, 'static', 'uploads')
     app.config['UPLOAD_FOLDER'] = upload_folder
     os.makedirs(upload_folder, exist_ok=True)
+    # Tenant export archives; only downloadable through the superadmin API, never via /uploads
+    app.config['TENANT_EXPORT_FOLDER'] = os.getenv('TENANT_EXPORT_FOLDER') or os.path.join(upload_folder, 'exports')
     
     # Health check endpoint for Docker
     @app.route('/health')
@@ -331,6 +413,8 @@ def create_app():
     # Serve uploaded files
     @app.route('/uploads/<path:filename>')
     def serve_uploads(filename):
+        if filename.replace('\\', '/').lstrip('/').split('/', 1)[0] == 'exports':
+            abort(404)
         return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
     # Serve frontend static files
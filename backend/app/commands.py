@@ -0,0 +1,199 @@
+"""
+Flask CLI Commands
+==================
+Maintenance and background jobs run with the `flask` CLI, e.g.
+
+    flask --app run scan-alerts --loop --interval 300
+    flask --app run outbox-worker
+    flask --app run outbox-prune --days 7
+    flask --app run rebuild-rollups
+    flask --app run rebuild-stock-levels
+    flask --app run rebuild-search-index
+    flask --app run replay-audit-spool
+    flask --app run tenant-export --business-id 42
+    flask --app run tenant-restore --archive business_42_export.tar
+"""
+
+import time
+import click
+
+
+def register_commands(app):
+    """Attach the project's CLI commands to the Flask app."""
+
+    @app.cli.command('scan-alerts')
+    @click.option('--business-id', type=int, default=None, help='Scan a single business.')
+    @click.option('--batch-size', type=int, default=100, show_default=True, help='Businesses loaded per batch.')
+    @click.option('--loop', is_flag=True, help='Keep scanning every --interval seconds.')
+    @click.option('--interval', type=int, default=300, show_default=True, help='Seconds between scans with --loop.')
+    def scan_alerts(business_id, batch_size, loop, interval):
+        """Raise low stock, pending leave and overdue invoice notifications."""
+        from app.utils.alert_scanner import AlertScanner
+
+        while True:
+            scanner = AlertScanner()
+            if business_id:
+                alerts = scanner.scan_business(business_id)
+                click.echo(f"Business {business_id}: {alerts} new alert(s)")
+            else:
+                stats = scanner.scan_all(batch_size=batch_size)
+                click.echo(
+                    f"Scanned {stats['businesses']} business(es): "
+                    f"{stats['alerts']} new alert(s), {stats['errors']} error(s)"
+                )
+            if not loop:
+                break
+            time.sleep(interval)
+
+    @app.cli.command('outbox-worker')
+    @click.option('--batch-size', type=int, default=100, show_default=True, help='Events claimed per batch.')
+    @click.option('--interval', type=float, default=5, show_default=True, help='Seconds between polls when idle.')
+    @click.option('--max-attempts', type=int, default=8, show_default=True, help='Attempts before an event is parked as dead.')
+    @click.option('--once', is_flag=True, help='Drain the outbox and exit.')
+    @click.option('--retention-days', type=int, default=7, show_default=True,
+                  help='Days done events are kept before the worker deletes them.')
+    def outbox_worker(batch_size, interval, max_attempts, once, retention_days):
+        """Deliver queued notifications, emails and webhooks."""
+        from app.utils.outbox import OutboxWorker
+
+        click.echo("Outbox worker started")
+        OutboxWorker(batch_size=batch_size, max_attempts=max_attempts,
+                     retention_days=retention_days).run(interval=interval, once=once)
+
+    @app.cli.command('outbox-prune')
+    @click.option('--days', type=int, default=7, show_default=True, help='Keep done events this many days.')
+    def outbox_prune(days):
+        """
+        Delete delivered outbox events older than --days (dead ones are kept).
+        The outbox worker does this hourly; schedule it daily (e.g. cron
+        `0 3 * * *`) where no worker runs.
+        """
+        from app.utils.outbox import OutboxWorker
+
+        deleted = OutboxWorker(retention_days=days).prune()
+        click.echo(f"Deleted {deleted} done outbox event(s)")
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--business-id', type=int, default=None, help='Rebuild a single business.')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Only recompute days from this date (default: full history).')
+    @click.option('--days', type=int, default=None, help='Only recompute the last N days.')
+    def rebuild_rollups(business_id, since, days):
+        """Backfill or repair the daily sales rollups."""
+        from datetime import datetime, timedelta
+        from app import db
+        from app.models.business import Business
+        from app.utils.rollups import rebuild
+
+        start = since.date() if since else None
+        if days:
+            start = datetime.utcnow().date() - timedelta(days=days - 1)
+
+        if business_id:
+            business_ids = [business_id]
+        else:
+            business_ids = [bid for (bid,) in db.session.query(Business.id).order_by(Business.id).all()]
+
+        for bid in business_ids:
+            rows = rebuild(bid, since=start)
+            click.echo(f"Business {bid}: {rows} rollup row(s)")
+
+    @app.cli.command('rebuild-stock-levels')
+    @click.option('--business-id', type=int, default=None, help='Rebuild a single business.')
+    @click.option('--no-opening-balances', is_flag=True,
+                  help='Only report products whose stock the transaction log does not explain.')
+    def rebuild_stock_levels(business_id, no_opening_balances):
+        """Recompute branch/warehouse stock levels from the inventory transaction log."""
+        from app import db
+        from app.models.business import Business
+        from app.utils.stock_ledger import rebuild_stock_levels as rebuild
+
+        if business_id:
+            business_ids = [business_id]
+        else:
+            business_ids = [bid for (bid,) in db.session.query(Business.id).order_by(Business.id).all()]
+
+        for bid in business_ids:
+            stats = rebuild(bid, opening_balances=not no_opening_balances)
+            click.echo(
+                f"Business {bid}: {stats['levels']} level(s), "
+                f"{stats['opening_balances']} opening balance(s), {stats['out_of_step']} product(s) out of step"
+            )
+
+    @app.cli.command('rebuild-search-index')
+    @click.option('--business-id', type=int, default=None, help='Rebuild a single business.')
+    def rebuild_search_index(business_id):
+        """Rewrite the product, customer, supplier and employee search documents."""
+        from app import db
+        from app.models.business import Business
+        from app.utils.search_index import rebuild_search_index as rebuild
+
+        if business_id:
+            business_ids = [business_id]
+        else:
+            business_ids = [bid for (bid,) in db.session.query(Business.id).order_by(Business.id).all()]
+
+        for bid in business_ids:
+            click.echo(f"Business {bid}: {rebuild(bid)} document(s)")
+
+    @app.cli.command('replay-audit-spool')
+    def replay_audit_spool():
+        """Insert audit/event rows spooled to file while the database was unavailable."""
+        from app.utils.audit_writer import audit_writer
+
+        click.echo(f"{audit_writer.replay_spool()} row(s) written from {audit_writer.spool_file}")
+
+    @app.cli.command('tenant-export')
+    @click.option('--business-id', type=int, default=None, help='Export this business.')
+    @click.option('--resume', type=int, default=None, help='Resume the export or restore job with this id.')
+    def tenant_export(business_id, resume):
+        """Export every table a business owns to an archive (or resume an interrupted job)."""
+        from app import db
+        from app.models.tenant_export import TenantExport
+        from app.utils.tenant_export import create_export_job, run_tenant_job
+
+        if resume:
+            if not db.session.get(TenantExport, resume):
+                raise click.ClickException(f"Job {resume} not found")
+            job_id = resume
+        elif business_id:
+            job_id = create_export_job(business_id, None).id
+        else:
+            raise click.UsageError('Pass --business-id or --resume')
+
+        job = run_tenant_job(job_id)
+        if job.status != 'done':
+            raise click.ClickException(f"Job {job.id} failed: {job.error_message} (resume with --resume {job.id})")
+        click.echo(f"Job {job.id}: {job.processed_rows} row(s) from {len(job.tables or [])} table(s)"
+                   + (f" -> {job.archive_path}" if job.kind == 'export' else f", {job.rejected_rows} rejected"))
+
+    @app.cli.command('tenant-restore')
+    @click.option('--archive', type=click.Path(exists=True, dir_okay=False), default=None,
+                  help='Archive file to restore.')
+    @click.option('--export-id', type=int, default=None, help='Restore the archive of this export job.')
+    @click.option('--resume', type=int, default=None, help='Resume the restore job with this id.')
+    def tenant_restore(archive, export_id, resume):
+        """Restore a business from an export archive; existing rows are left untouched."""
+        from app import db
+        from app.models.tenant_export import TenantExport
+        from app.utils.tenant_export import TenantArchiveError, create_restore_job, run_tenant_job
+
+        try:
+            if resume:
+                if not db.session.get(TenantExport, resume):
+                    raise click.ClickException(f"Job {resume} not found")
+                job_id = resume
+            elif export_id:
+                job_id = create_restore_job(None, export=db.session.get(TenantExport, export_id)).id
+            elif archive:
+                job_id = create_restore_job(None, path=archive).id
+            else:
+                raise click.UsageError('Pass --archive, --export-id or --resume')
+        except TenantArchiveError as e:
+            raise click.ClickException(str(e))
+
+        job = run_tenant_job(job_id)
+        if job.status != 'done':
+            raise click.ClickException(f"Job {job.id} failed: {job.error_message} (resume with --resume {job.id})")
+        click.echo(f"Business {job.business_id}: {job.processed_rows} row(s) restored, "
+                   f"{job.rejected_rows} rejected")
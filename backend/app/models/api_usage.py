@@ -0,0 +1,33 @@
+from app import db
+
+
+class APIUsage(db.Model):
+    """
+    API calls per business, endpoint and hour, counted in-process by
+    `app.utils.api_usage` and added to this table with upserts every few
+    seconds. Superadmin analytics aggregate these rows instead of scanning
+    request-level logs.
+    """
+    __tablename__ = 'api_usage_hourly'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)  # UTC, truncated to the hour
+    endpoint = db.Column(db.String(120), primary_key=True)  # Flask endpoint, e.g. 'orders.create_order'
+    request_count = db.Column(db.BigInteger, default=0, nullable=False)
+    error_count = db.Column(db.BigInteger, default=0, nullable=False)
+    total_duration_ms = db.Column(db.BigInteger, default=0, nullable=False)
+
+    __table_args__ = (
+        # Platform-wide window queries ("hour >= start" across all businesses)
+        db.Index('idx_api_usage_hourly_hour', 'hour'),
+    )
+
+    def to_dict(self):
+        return {
+            'business_id': self.business_id,
+            'hour': self.hour.isoformat() if self.hour else None,
+            'endpoint': self.endpoint,
+            'request_count': self.request_count,
+            'error_count': self.error_count,
+            'avg_duration_ms': self.total_duration_ms / self.request_count if self.request_count else 0
+        }
@@ -2,6 +2,7 @@ from app import db
 from datetime import datetime
 from enum import Enum
 from flask import request
+from app.utils.audit_writer import audit_writer
 from app.utils.event_monitor import event_monitor, EventCategory, EventType, EventSeverity
 
 class AuditAction(Enum):
@@ -45,6 +46,11 @@ class AuditLog(db.Model):
     business = db.relationship('Business', back_populates='audit_logs')
     branch = db.relationship('Branch', backref='audit_logs')
 
+    __table_args__ = (
+        db.Index('idx_audit_logs_business_created', 'business_id', 'created_at'),
+        db.Index('idx_audit_logs_entity', 'entity_type', 'entity_id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -66,8 +72,14 @@ class AuditLog(db.Model):
 # Enhanced audit log function that also creates event monitoring entries
 def create_audit_log(user_id, business_id, action, entity_type, entity_id, branch_id=None, 
                    old_values=None, new_values=None, ip_address=None, user_agent=None, 
-                   metadata=None, severity=None, description=None):
-    """Create audit log entry and corresponding event monitoring entry"""
+                   metadata=None, severity=None, description=None, commit=True):
+    """Create audit log entry and corresponding event monitoring entry.
+
+    Both rows are buffered by app.utils.audit_writer and bulk-inserted in the
+    background on a separate connection, so the caller's session is neither
+    flushed nor committed here. With commit=False they are only queued once
+    the caller's transaction commits (and dropped if it rolls back).
+    Returns the audit row's values."""
     
     # Get request context if not provided
     if not ip_address and request:
@@ -76,20 +88,21 @@ def create_audit_log(user_id, business_id, action, entity_type, entity_id, branc
         user_agent = request.headers.get('User-Agent', '')
     
     # Create audit log entry
-    audit_log = AuditLog(
-        user_id=user_id,
-        business_id=business_id,
-        branch_id=branch_id,
-        action=action,
-        entity_type=entity_type,
-        entity_id=entity_id,
-        old_values=old_values,
-        new_values=new_values,
-        ip_address=ip_address,
-        user_agent=user_agent,
-        additional_metadata=metadata or {}
-    )
-    db.session.add(audit_log)
+    audit_log = {
+        'user_id': user_id,
+        'business_id': business_id,
+        'branch_id': branch_id,
+        'action': action,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'old_values': old_values,
+        'new_values': new_values,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'additional_metadata': metadata or {},
+        'created_at': datetime.utcnow()
+    }
+    audit_writer.enqueue(AuditLog.__table__, audit_log, after_commit=not commit)
     
     # Create corresponding event monitoring entry
     try:
@@ -104,7 +117,7 @@ def create_audit_log(user_id, business_id, action, entity_type, entity_id, branc
             AuditAction.REJECT: EventType.DATA_MODIFIED,
             AuditAction.PERMISSION_CHANGE: EventType.PERMISSION_GRANTED,
             AuditAction.SETTINGS_UPDATE: EventType.CONFIGURATION_CHANGED,
-            AuditAction.FILE_UPLOAD: EventType.DATA_IMPORTED,
+            AuditAction.FILE_UPLOAD: EventType.DATA_IMPORT,
             AuditAction.FILE_DOWNLOAD: EventType.DATA_EXPORT,
             AuditAction.EXPORT: EventType.DATA_EXPORT,
             AuditAction.IMPORT: EventType.DATA_IMPORT,
@@ -162,7 +175,6 @@ def create_audit_log(user_id, business_id, action, entity_type, entity_id, branc
             description=description,
             details={
                 'audit_action': action.value,
-                'audit_log_id': audit_log.id,
                 'metadata': metadata or {}
             },
             entity_type=entity_type,
@@ -171,14 +183,14 @@ def create_audit_log(user_id, business_id, action, entity_type, entity_id, branc
             new_values=new_values,
             user_id=str(user_id) if user_id else None,
             business_id=str(business_id) if business_id else None,
-            tags=['audit', action.value, entity_type]
+            tags=['audit', action.value, entity_type],
+            commit=commit
         )
         
     except Exception as e:
         # Don't let event monitoring errors break audit logging
         print(f"Failed to create event monitoring entry: {str(e)}")
     
-    db.session.commit()
     return audit_log
 
 # Decorator for automatic audit logging
@@ -76,10 +76,8 @@ class Business(db.Model):
         currency_value = self.currency
         if not currency_value:
             try:
-                from app.models.settings import SystemSetting
-                global_setting = SystemSetting.query.filter_by(business_id=None, setting_key='default_currency').first()
-                if global_setting and global_setting.setting_value:
-                    currency_value = global_setting.setting_value
+                from app.utils.settings_service import get_setting
+                currency_value = get_setting(None, 'default_currency') or currency_value
             except Exception:
                 # If SystemSetting model isn't available or query fails, fall back to 'USD'
                 currency_value = currency_value or 'USD'
@@ -22,6 +22,10 @@ class Notification(db.Model):
     business = relationship('Business', back_populates='notifications')
     branch = relationship('Branch', backref='notifications')
 
+    __table_args__ = (
+        db.Index('idx_notifications_user_read_created', 'business_id', 'user_id', 'is_read', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -124,4 +128,31 @@ class Announcement(db.Model):
                 'first_name': self.author.first_name,
                 'last_name': self.author.last_name
             } if self.author else None
-        }
\ No newline at end of file
+        }
+
+class AlertDedupeKey(db.Model):
+    """
+    Records when a system alert (low stock, overdue invoice, ...) was last
+    raised for an entity, so the alert scanner can skip repeats with an
+    indexed key lookup instead of matching on notification text.
+    """
+    __tablename__ = 'alert_dedupe_keys'
+
+    id = Column(Integer, primary_key=True)
+    business_id = Column(Integer, ForeignKey('businesses.id', ondelete='CASCADE'), nullable=False)
+    dedupe_key = Column(String(200), nullable=False)  # e.g. 'low_stock:42:out'
+    last_alerted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('business_id', 'dedupe_key', name='_business_alert_dedupe_key_uc'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'business_id': self.business_id,
+            'dedupe_key': self.dedupe_key,
+            'last_alerted_at': self.last_alerted_at.isoformat() if self.last_alerted_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
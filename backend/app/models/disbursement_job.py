@@ -0,0 +1,63 @@
+from app import db
+from datetime import datetime
+
+
+class DisbursementJob(db.Model):
+    """
+    A batch payroll payout to mobile wallets and its progress. Payouts are
+    sent in the background; clients poll
+    `GET /api/hr/payroll/disbursement-jobs/<id>` until the status is 'done'
+    or 'failed'.
+    """
+    __tablename__ = 'disbursement_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+
+    provider = db.Column(db.String(50), default='mtn_momo', nullable=False)
+    payroll_ids = db.Column(db.JSON)  # Requested payrolls; empty means all approved
+
+    # queued, running, done, failed
+    status = db.Column(db.String(20), default='queued', nullable=False)
+
+    # Progress
+    total_count = db.Column(db.Integer, default=0, nullable=False)
+    processed_count = db.Column(db.Integer, default=0, nullable=False)
+    succeeded_count = db.Column(db.Integer, default=0, nullable=False)
+    failed_count = db.Column(db.Integer, default=0, nullable=False)
+    total_amount = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    disbursed_amount = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+
+    # [{'payroll_id': n, 'success': bool, 'reference'|'error': ...}], capped
+    results = db.Column(db.JSON)
+    error_message = db.Column(db.Text)  # Fatal error that stopped the job
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_disbursement_jobs_business_created', 'business_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'business_id': self.business_id,
+            'user_id': self.user_id,
+            'provider': self.provider,
+            'status': self.status,
+            'total_count': self.total_count,
+            'processed_count': self.processed_count,
+            'succeeded_count': self.succeeded_count,
+            'failed_count': self.failed_count,
+            'progress': round(self.processed_count * 100.0 / self.total_count, 1) if self.total_count else 0.0,
+            'total_amount': float(self.total_amount or 0),
+            'disbursed_amount': float(self.disbursed_amount or 0),
+            'results': self.results or [],
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -48,7 +48,11 @@ class Expense(db.Model):
     approver = db.relationship('User', foreign_keys=[approved_by], backref='approved_expenses')
     
     # Unique constraint per business
-    __table_args__ = (db.UniqueConstraint('business_id', 'expense_id', name='_business_expense_id_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('business_id', 'expense_id', name='_business_expense_id_uc'),
+        db.Index('idx_expenses_business_status_date', 'business_id', 'status', 'expense_date'),
+        db.Index('idx_expenses_business_branch_date', 'business_id', 'branch_id', 'expense_date'),
+    )
     
     def to_dict(self):
         return {
@@ -0,0 +1,17 @@
+from app import db
+from datetime import datetime
+
+
+class IdSequence(db.Model):
+    """
+    Last number handed out for a business's human-readable ids with one
+    prefix (ORD, CUST, INV, ITX, WH-, PO). Advanced atomically by
+    `app.utils.sequences`; numbers are never reused, so a rolled-back
+    request leaves a gap.
+    """
+    __tablename__ = 'id_sequences'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), primary_key=True)
+    prefix = db.Column(db.String(10), primary_key=True)
+    last_value = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -0,0 +1,61 @@
+from app import db
+from datetime import datetime
+
+
+class ImportJob(db.Model):
+    """
+    A bulk CSV import (products, customers, employees) and its progress.
+    Large files are imported in the background; clients poll
+    `GET /api/import-jobs/<id>` until the status is 'done' or 'failed'.
+    """
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+
+    kind = db.Column(db.String(30), nullable=False)  # products, customers, employees
+    filename = db.Column(db.String(255))
+
+    # queued, validating, importing, done, failed
+    status = db.Column(db.String(20), default='queued', nullable=False)
+
+    # Progress
+    total_rows = db.Column(db.Integer, default=0, nullable=False)
+    processed_rows = db.Column(db.Integer, default=0, nullable=False)
+    created_count = db.Column(db.Integer, default=0, nullable=False)
+    error_count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Row errors ([{'row': n, 'error': '...'}], capped) and created record keys
+    errors = db.Column(db.JSON)
+    created = db.Column(db.JSON)
+    error_message = db.Column(db.Text)  # Fatal error that stopped the job
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_import_jobs_business_created', 'business_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'business_id': self.business_id,
+            'user_id': self.user_id,
+            'kind': self.kind,
+            'filename': self.filename,
+            'status': self.status,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'created_count': self.created_count,
+            'error_count': self.error_count,
+            'progress': round(self.processed_rows * 100.0 / self.total_rows, 1) if self.total_rows else 0.0,
+            'errors': self.errors or [],
+            'created': self.created or [],
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
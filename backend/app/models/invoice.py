@@ -44,7 +44,13 @@ class Invoice(db.Model):
     returns = db.relationship('Return', back_populates='invoice', cascade='all, delete-orphan')
 
     # Unique constraint for business-specific invoice IDs
-    __table_args__ = (db.UniqueConstraint('business_id', 'invoice_id', name='_business_invoice_id_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('business_id', 'invoice_id', name='_business_invoice_id_uc'),
+        db.Index('idx_invoices_business_status_due', 'business_id', 'status', 'due_date'),
+        db.Index('idx_invoices_business_created', 'business_id', 'created_at'),
+        db.Index('idx_invoices_business_issue_date', 'business_id', 'issue_date'),
+        db.Index('idx_invoices_order_id', 'order_id'),
+    )
 
     def to_dict(self):
         # Convert all monetary values to float for JSON serialization
@@ -33,6 +33,7 @@ class Order(db.Model):
     shipping_cost = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
     total_amount = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
     notes = db.Column(db.Text)
+    idempotency_key = db.Column(db.String(64), nullable=True)  # Client key of synced offline POS sales
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -47,7 +48,18 @@ class Order(db.Model):
     returns = db.relationship('Return', back_populates='order', cascade='all, delete-orphan')
     
     # Unique constraint per business
-    __table_args__ = (db.UniqueConstraint('business_id', 'order_id', name='_business_order_id_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('business_id', 'order_id', name='_business_order_id_uc'),
+        # Tenant-scoped report and dashboard lookups (db_migrations/0040)
+        db.Index('idx_orders_business_status_created', 'business_id', 'status', 'created_at'),
+        db.Index('idx_orders_business_created', 'business_id', 'created_at'),
+        db.Index('idx_orders_business_branch_created', 'business_id', 'branch_id', 'created_at'),
+        db.Index('idx_orders_business_order_date', 'business_id', 'order_date'),
+        # Replayed offline sales are recognised by their key (db_migrations/0044)
+        db.Index('uq_orders_business_idempotency_key', 'business_id', 'idempotency_key', unique=True,
+                 postgresql_where=db.text('idempotency_key IS NOT NULL'),
+                 sqlite_where=db.text('idempotency_key IS NOT NULL')),
+    )
     
     def get_payment_status(self):
         """Determine payment status based on invoice amount_due and amount_paid"""
@@ -142,6 +154,11 @@ class OrderItem(db.Model):
     # Relationships
     order = db.relationship('Order', back_populates='order_items')
     product = db.relationship('Product', back_populates='order_items', lazy='joined')
+
+    __table_args__ = (
+        db.Index('idx_order_items_order_id', 'order_id'),
+        db.Index('idx_order_items_product_id', 'product_id'),
+    )
     
     def to_dict(self):
         return {
@@ -0,0 +1,47 @@
+from app import db
+from datetime import datetime
+
+
+class OutboxEvent(db.Model):
+    """
+    Side effect (notification, email, webhook) recorded in the same
+    transaction as the change that caused it and delivered later by the
+    outbox worker (`flask outbox-worker`).
+    """
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), nullable=False)
+
+    event_type = db.Column(db.String(50), nullable=False)  # e.g. 'low_stock.check', 'webhook'
+    payload = db.Column(db.JSON, nullable=False)
+
+    # pending, processing, done, dead
+    status = db.Column(db.String(20), default='pending', nullable=False)
+
+    # Retry tracking
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_outbox_events_status_available', 'status', 'available_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'business_id': self.business_id,
+            'event_type': self.event_type,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
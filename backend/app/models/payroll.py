@@ -48,6 +48,11 @@ class Payroll(db.Model):
     approver = db.relationship('User', foreign_keys=[approved_by], backref='approved_payrolls')
     business = db.relationship('Business', back_populates='payrolls')
     branch = db.relationship('Branch', backref='payrolls')
+
+    __table_args__ = (
+        db.Index('idx_payrolls_business_status_period', 'business_id', 'status', 'pay_period_end'),
+        db.Index('idx_payrolls_business_employee_period', 'business_id', 'employee_id', 'pay_period_start'),
+    )
     
     def to_dict(self):
         return {
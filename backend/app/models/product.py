@@ -44,6 +44,17 @@ class Product(db.Model):
         db.UniqueConstraint('business_id', 'product_id', name='_business_product_id_uc'),
         db.UniqueConstraint('business_id', 'sku', name='_business_sku_uc'),
         db.UniqueConstraint('business_id', 'barcode', name='_business_barcode_uc'),
+        # Low stock lookups: "stock <= limit" uses the first index, "stock <= reorder_level"
+        # the partial one, and PostgreSQL BitmapOrs them for the combined filter
+        db.Index('idx_products_business_stock', 'business_id', 'stock_quantity'),
+        db.Index('idx_products_below_reorder', 'business_id',
+                 postgresql_where=db.text('stock_quantity <= reorder_level'),
+                 sqlite_where=db.text('stock_quantity <= reorder_level')),
+        db.Index('idx_products_business_category', 'business_id', 'category_id'),
+        # Storefront catalogue: keyset pages by name / price and the ETag version (count, max updated_at)
+        db.Index('idx_products_business_name', 'business_id', 'name', 'id'),
+        db.Index('idx_products_business_price', 'business_id', 'unit_price', 'id'),
+        db.Index('idx_products_business_updated', 'business_id', 'updated_at'),
     )
     
     def to_dict(self):
@@ -37,7 +37,12 @@ class Return(db.Model):
     return_items = db.relationship('ReturnItem', back_populates='return_obj', cascade='all, delete-orphan')
 
     # Unique constraint per business
-    __table_args__ = (db.UniqueConstraint('business_id', 'return_id', name='_business_return_id_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('business_id', 'return_id', name='_business_return_id_uc'),
+        db.Index('idx_returns_business_status_created', 'business_id', 'status', 'created_at'),
+        db.Index('idx_returns_business_return_date', 'business_id', 'return_date'),
+        db.Index('idx_returns_order_id', 'order_id'),
+    )
 
     def to_dict(self):
         try:
@@ -106,6 +111,10 @@ class ReturnItem(db.Model):
     return_obj = db.relationship('Return', back_populates='return_items')
     product = db.relationship('Product', back_populates='return_items')
 
+    __table_args__ = (
+        db.Index('idx_return_items_return_id', 'return_id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
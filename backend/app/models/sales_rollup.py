@@ -0,0 +1,70 @@
+from app import db
+from datetime import datetime
+
+
+class DailySalesRollup(db.Model):
+    """
+    Pre-aggregated sales and finance figures for one business, branch and
+    UTC day. Maintained by `app.utils.rollups` whenever orders, returns,
+    expenses or payroll change, and rebuilt with `flask rebuild-rollups`.
+
+    Each figure is bucketed by the date the live reports use for it:
+    orders and order items by Order.created_at, returns by return_date
+    (returns_confirmed_amount by Return.created_at), expenses by
+    expense_date and payroll by payment_date.
+    """
+    __tablename__ = 'daily_sales_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), nullable=False)
+    branch_id = db.Column(db.Integer, default=0, nullable=False)  # 0 = no branch
+    day = db.Column(db.Date, nullable=False)
+
+    # Orders (all statuses)
+    order_count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Delivered/completed orders
+    sales_count = db.Column(db.Integer, default=0, nullable=False)
+    sales_amount = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+
+    # Returned orders (still counted as sales; the Return record is deducted)
+    returned_order_count = db.Column(db.Integer, default=0, nullable=False)
+    returned_order_amount = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+
+    # Delivered/completed/returned orders
+    net_revenue = db.Column(db.Numeric(14, 2), default=0, nullable=False)  # total - shipping - tax
+    tax_amount = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    discount_amount = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    gross_sales = db.Column(db.Numeric(14, 2), default=0, nullable=False)  # sum(quantity * unit_price)
+    line_discounts = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    cogs = db.Column(db.Numeric(14, 2), default=0, nullable=False)  # at cost_price when refreshed
+
+    # Returns
+    returns_value = db.Column(db.Numeric(14, 2), default=0, nullable=False)  # pending/approved/processed
+    pending_returns = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    returns_cogs = db.Column(db.Numeric(14, 2), default=0, nullable=False)  # approved/processed
+    returns_confirmed_amount = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+
+    # Approved/paid expenses and payroll
+    expenses = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    payroll_gross = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    payroll_tax = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    payroll_other = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('business_id', 'day', 'branch_id', name='_business_day_branch_rollup_uc'),
+    )
+
+
+class SalesRollupState(db.Model):
+    """
+    Marks a business whose rollups cover its whole history, so reports may
+    read them. Set by a full `flask rebuild-rollups` and for businesses
+    created after rollups were introduced.
+    """
+    __tablename__ = 'sales_rollup_states'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), primary_key=True)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,75 @@
+from app import db
+from datetime import datetime
+from sqlalchemy import DDL, event
+
+
+class SearchDocument(db.Model):
+    """
+    One searchable record (product, customer, supplier or employee) for
+    `app.utils.search_index`, rewritten in the same transaction as the
+    record itself. `search_text` holds the record's normalised tokens.
+
+    PostgreSQL searches it through a GIN index on
+    to_tsvector('simple', search_text); SQLite through the FTS5 table
+    search_documents_fts, an external-content index kept in step by
+    triggers. Both are created with the table (and by
+    db_migrations/0048 on existing PostgreSQL databases).
+    """
+    __tablename__ = 'search_documents'
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), nullable=False)
+    entity_type = db.Column(db.String(20), nullable=False)  # product, customer, supplier, employee
+    entity_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    subtitle = db.Column(db.String(255))
+    search_text = db.Column(db.Text, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_id', name='_search_document_entity_uc'),
+        db.Index('idx_search_documents_business_type', 'business_id', 'entity_type'),
+    )
+
+    def to_dict(self):
+        return {
+            'type': self.entity_type,
+            'id': self.entity_id,
+            'title': self.title,
+            'subtitle': self.subtitle,
+            'is_active': self.is_active
+        }
+
+
+
+class SearchIndexState(db.Model):
+    """
+    Marks a business whose search documents cover all its records. Set by
+    `rebuild_search_index` and for businesses created after the index was
+    introduced; a business without one is rebuilt on its first search.
+    """
+    __tablename__ = 'search_index_states'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), primary_key=True)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+event.listen(SearchDocument.__table__, 'after_create', DDL(
+    "CREATE INDEX IF NOT EXISTS idx_search_documents_tsv "
+    "ON search_documents USING gin (to_tsvector('simple', search_text))"
+).execute_if(dialect='postgresql'))
+
+for _statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5("
+    "search_text, content='search_documents', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, search_text) "
+    "VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, search_text) "
+    "VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO search_documents_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+):
+    event.listen(SearchDocument.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
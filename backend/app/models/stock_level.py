@@ -0,0 +1,41 @@
+from app import db
+from datetime import datetime
+
+# branch_id / warehouse_id value for stock not held at a specific branch or warehouse
+UNASSIGNED = 0
+
+
+class StockLevel(db.Model):
+    """
+    Quantity of a product on hand at one branch and warehouse, kept equal
+    to the sum of its `InventoryTransaction` rows by `app.utils.stock_ledger`
+    (atomic increments in the same transaction as the movement). Branch and
+    warehouse are 0 rather than NULL when unassigned so that the key is
+    usable as an upsert target; they therefore carry no foreign keys.
+    """
+    __tablename__ = 'stock_levels'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id', ondelete='CASCADE'), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    branch_id = db.Column(db.Integer, primary_key=True, default=UNASSIGNED)
+    warehouse_id = db.Column(db.Integer, primary_key=True, default=UNASSIGNED)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    product = db.relationship('Product')
+
+    __table_args__ = (
+        # Branch-scoped availability and low stock ("quantity <= limit") lookups
+        db.Index('idx_stock_levels_business_branch_quantity', 'business_id', 'branch_id', 'quantity'),
+        db.Index('idx_stock_levels_business_warehouse', 'business_id', 'warehouse_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'business_id': self.business_id,
+            'product_id': self.product_id,
+            'branch_id': self.branch_id or None,
+            'warehouse_id': self.warehouse_id or None,
+            'quantity': self.quantity,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,18 @@
+from app import db
+
+
+class TenantContextVersion(db.Model):
+    """
+    Change counter of a user or a business, bumped by `app.utils.tenant_context`
+    in the same transaction as any write that changes a cached tenant
+    context. Every worker compares it on each cache hit, so a deactivated
+    user or business loses access on its next request everywhere.
+
+    No foreign keys: a version must outlive the row it counts for, so a
+    deleted user's cached context is still rejected.
+    """
+    __tablename__ = 'tenant_context_versions'
+
+    kind = db.Column(db.String(10), primary_key=True)  # user, business
+    scope_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, default=0, nullable=False)
@@ -0,0 +1,74 @@
+from app import db
+from datetime import datetime
+
+
+class TenantExport(db.Model):
+    """
+    A full-tenant export or restore run by `app.utils.tenant_export` in
+    the background. Exports write one archive per job (gzip NDJSON per
+    table in a tar) under the exports folder. A job checkpoints after every
+    chunk, so an interrupted one resumes where it stopped.
+
+    business_id carries no foreign key: archives outlive the business (a
+    restore job exists before its business row does).
+    """
+    __tablename__ = 'tenant_exports'
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+
+    kind = db.Column(db.String(10), nullable=False, default='export')  # export, restore
+    # Archive a restore reads from: an earlier export job or an uploaded file
+    source_export_id = db.Column(db.Integer, db.ForeignKey('tenant_exports.id', ondelete='SET NULL'))
+
+    # queued, running, done, failed
+    status = db.Column(db.String(20), default='queued', nullable=False)
+    archive_path = db.Column(db.String(500))
+    file_size = db.Column(db.BigInteger)
+
+    # Progress: planned tables and row counts, rows done, and where to resume
+    tables = db.Column(db.JSON)
+    table_counts = db.Column(db.JSON)
+    total_rows = db.Column(db.BigInteger, default=0, nullable=False)
+    processed_rows = db.Column(db.BigInteger, default=0, nullable=False)
+    rejected_rows = db.Column(db.BigInteger, default=0, nullable=False)
+    checkpoint = db.Column(db.JSON)
+    errors = db.Column(db.JSON)  # [{'table': ..., 'error': ...}], capped
+    error_message = db.Column(db.Text)  # Fatal error that stopped the job
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Bumped with every checkpoint; a running job that stops updating has died
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_tenant_exports_business_created', 'business_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'business_id': self.business_id,
+            'user_id': self.user_id,
+            'kind': self.kind,
+            'source_export_id': self.source_export_id,
+            'status': self.status,
+            'tables': self.tables or [],
+            'table_counts': self.table_counts or {},
+            'current_table': (self.checkpoint or {}).get('table'),
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'rejected_rows': self.rejected_rows,
+            'progress': round(min(self.processed_rows * 100.0 / self.total_rows, 100.0), 1) if self.total_rows else 0.0,
+            'file_size': self.file_size,
+            'download_url': f'/api/superadmin/exports/{self.id}/download'
+            if self.kind == 'export' and self.status == 'done' else None,
+            'errors': self.errors or [],
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
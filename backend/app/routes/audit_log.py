@@ -5,6 +5,7 @@ from app.models.audit_log import AuditLog, AuditAction, create_audit_log
 from app.models.user import User, UserRole
 from app.models.business import Business
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.serialization import with_load_plan, serialize, requested_fields
 from datetime import datetime
 from sqlalchemy import desc
 
@@ -65,12 +66,12 @@ def get_audit_logs():
         query = query.order_by(desc(AuditLog.created_at))
         
         # Paginate results
-        audit_logs = query.paginate(
+        audit_logs = with_load_plan(query, 'audit_log').paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'audit_logs': [log.to_dict() for log in audit_logs.items],
+            'audit_logs': serialize(audit_logs.items, requested_fields()),
             'total': audit_logs.total,
             'pages': audit_logs.pages,
             'current_page': page,
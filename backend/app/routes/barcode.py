@@ -3,12 +3,11 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.product import Product
 from app.utils.middleware import get_business_id
+from app.utils.barcodes import lookup, reserve_barcodes
 import qrcode
 import io
 import base64
 from PIL import Image, ImageDraw, ImageFont
-import random
-import string
 from datetime import datetime
 
 barcode_bp = Blueprint('barcode', __name__)
@@ -32,19 +31,8 @@ def get_currency_symbol(currency_code):
     return currency_symbols.get(currency_code.upper(), '$')  # Default to $ if currency not found
 
 def generate_unique_barcode(business_id):
-    """Generate a unique barcode for a business"""
-    while True:
-        # Generate a 12-digit barcode (like EAN-12)
-        barcode = ''.join(random.choices(string.digits, k=12))
-        
-        # Check if barcode already exists for this business
-        existing = Product.query.filter_by(
-            business_id=business_id,
-            barcode=barcode
-        ).first()
-        
-        if not existing:
-            return barcode
+    """Generate a unique EAN-13 barcode for a business"""
+    return reserve_barcodes(business_id, 1)[0]
 
 @barcode_bp.route('/generate', methods=['POST'])
 @jwt_required()
@@ -289,15 +277,18 @@ def bulk_generate_barcodes():
                 Product.id.in_(product_ids)
             ).all()
         
+        # One uniqueness check for all the codes needed
+        missing = [product for product in products if not product.barcode]
+        codes = reserve_barcodes(business_id, len(missing))
+        
         generated = []
-        for product in products:
-            if not product.barcode:
-                product.barcode = generate_unique_barcode(business_id)
-                generated.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'barcode': product.barcode
-                })
+        for product, code in zip(missing, codes):
+            product.barcode = code
+            generated.append({
+                'id': product.id,
+                'name': product.name,
+                'barcode': product.barcode
+            })
         
         db.session.commit()
         
@@ -320,37 +311,19 @@ def lookup_barcode(barcode):
     try:
         business_id = get_business_id()
         
-        # Search for product by barcode in the current business
-        product = Product.query.filter_by(
-            business_id=business_id, 
-            barcode=barcode, 
-            is_active=True
-        ).first()
+        # Answered from the business's in-memory barcode/SKU index (SKU is the fallback)
+        product, matched_by = lookup(business_id, barcode)
         
         if product:
+            response = {'found': True, 'product': product}
+            if matched_by == 'sku':
+                response['matched_by'] = 'sku'
+            return jsonify(response), 200
+        else:
             return jsonify({
-                'found': True,
-                'product': product.to_dict()
+                'found': False,
+                'message': f'No product found with barcode: {barcode}'
             }), 200
-        else:
-            # Try to find by SKU as fallback
-            product_by_sku = Product.query.filter_by(
-                business_id=business_id,
-                sku=barcode,
-                is_active=True
-            ).first()
-            
-            if product_by_sku:
-                return jsonify({
-                    'found': True,
-                    'product': product_by_sku.to_dict(),
-                    'matched_by': 'sku'
-                }), 200
-            else:
-                return jsonify({
-                    'found': False,
-                    'message': f'No product found with barcode: {barcode}'
-                }), 200
                 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -4,7 +4,8 @@ from app import db
 from app.models.user import User
 from app.utils.decorators import staff_required
 from app.utils.middleware import get_business_id, get_active_branch_id
-from datetime import datetime
+from app.utils.notifications import get_unread_count, invalidate_unread_count
+from datetime import datetime, timedelta
 from sqlalchemy import func
 
 communication_bp = Blueprint('communication', __name__)
@@ -21,7 +22,6 @@ def get_notifications():
         branch_id = request.args.get('branch_id', type=int) or get_active_branch_id()
         user_id = get_jwt_identity()
         unread_only = request.args.get('unread', 'false').lower() == 'true'
-        today = datetime.utcnow().date()
         # Optional date filters
         start_date_str = request.args.get('start_date')
         end_date_str = request.args.get('end_date')
@@ -51,113 +51,8 @@ def get_notifications():
                 start_dt = None
                 end_dt = None
         
-        # Proactively check for things that need notification
-        from app.models.product import Product
-        from app.models.leave_request import LeaveRequest, LeaveStatus
-        from app.utils.notifications import notify_managers
-        from datetime import date, timedelta
-        
-        # 1. Check Low Stock
-        low_stock_query = Product.query.filter(
-            Product.business_id == business_id,
-            Product.stock_quantity <= Product.reorder_level,
-            Product.is_active == True
-        )
-        # Product model does not support branch-specific filtering
-        
-        low_stock_products = low_stock_query.all()
-        
-        for product in low_stock_products:
-            title = "Low Stock Alert"
-            msg = f"Product '{product.name}' is low on stock ({product.stock_quantity})."
-            if product.stock_quantity == 0:
-                title = "Out of Stock Alert"
-                msg = f"Product '{product.name}' is out of stock!"
-            
-            # Check if notification already exists for this business/branch today
-            existing_query = Notification.query.filter(
-                Notification.business_id == business_id,
-                Notification.title == title,
-                Notification.message.contains(product.name),
-                Notification.created_at >= datetime.utcnow() - timedelta(days=1)
-            )
-            if branch_id:
-                existing_query = existing_query.filter(Notification.branch_id == branch_id)
-            
-            existing = existing_query.first()
-            
-            if not existing:
-                # Note: notify_managers might need to be updated to accept branch_id
-                # For now, we'll just create the notification manually if needed, 
-                # but let's assume notify_managers handles it or we'll update it later.
-                notify_managers(business_id, title, msg, 'warning' if product.stock_quantity > 0 else 'danger')
-
-        # 2. Expired product alerts disabled (Product has no expiry_date column)
-
-        # 3. Check Pending Leave Requests (for managers/admins)
-        user = User.query.get(user_id)
-        from app.models.user import UserRole
-        if user.role in [UserRole.admin, UserRole.manager, UserRole.superadmin]:
-            pending_leaves_query = LeaveRequest.query.filter(
-                LeaveRequest.business_id == business_id,
-                LeaveRequest.status == LeaveStatus.PENDING
-            )
-            # Leave requests are linked to employees, which are linked to branches
-            # So we might need to join or filter by employee's branch
-            
-            pending_leaves = pending_leaves_query.all()
-            
-            for leave in pending_leaves:
-                # Filter by branch if requested
-                if branch_id and leave.employee.branch_id != branch_id:
-                    continue
-                    
-                title = "Pending Leave Request"
-                msg = f"New leave request from {leave.employee.user.first_name} {leave.employee.user.last_name}."
-                
-                existing_query = Notification.query.filter(
-                    Notification.business_id == business_id,
-                    Notification.title == title,
-                    Notification.message.contains(leave.employee.user.last_name),
-                    Notification.created_at >= datetime.utcnow() - timedelta(days=1)
-                )
-                if branch_id:
-                    existing_query = existing_query.filter(Notification.branch_id == branch_id)
-                    
-                existing = existing_query.first()
-                
-                if not existing:
-                    notify_managers(business_id, title, msg, 'info')
-
-        # 4. Check Overdue Invoices
-        from app.models.invoice import Invoice, InvoiceStatus
-        overdue_invoices_query = Invoice.query.filter(
-            Invoice.business_id == business_id,
-            Invoice.due_date < today,
-            Invoice.status != InvoiceStatus.PAID
-        )
-        if branch_id:
-            overdue_invoices_query = overdue_invoices_query.filter(Invoice.branch_id == branch_id)
-            
-        overdue_invoices = overdue_invoices_query.all()
-        
-        for inv in overdue_invoices:
-            title = "Overdue Invoice"
-            msg = f"Invoice {inv.invoice_id} for {inv.customer.first_name} {inv.customer.last_name} is overdue!"
-            
-            existing_query = Notification.query.filter(
-                Notification.business_id == business_id,
-                Notification.title == title,
-                Notification.message.contains(inv.invoice_id),
-                Notification.created_at >= datetime.utcnow() - timedelta(days=1)
-            )
-            if branch_id:
-                existing_query = existing_query.filter(Notification.branch_id == branch_id)
-                
-            existing = existing_query.first()
-            
-            if not existing:
-                notify_managers(business_id, title, msg, 'danger')
+        # Low stock, pending leave and overdue invoice alerts are raised out of
+        # band by the alert scanner (`flask scan-alerts`), so this is a plain read.
 
         # Now fetch all notifications
         query = Notification.query.filter_by(business_id=business_id, user_id=user_id)
@@ -174,18 +69,22 @@ def get_notifications():
             query = query.filter(Notification.created_at < end_dt)
         notifications = query.order_by(Notification.created_at.desc()).limit(50).all()
         
-        unread_count_query = Notification.query.filter_by(business_id=business_id, user_id=user_id, is_read=False)
-        if start_dt:
-            unread_count_query = unread_count_query.filter(Notification.created_at >= start_dt)
-        if end_dt:
-            unread_count_query = unread_count_query.filter(Notification.created_at < end_dt)
-        if branch_id:
-            unread_count_query = unread_count_query.filter_by(branch_id=branch_id)
+        if start_dt or end_dt:
+            unread_count_query = Notification.query.filter_by(business_id=business_id, user_id=user_id, is_read=False)
+            if start_dt:
+                unread_count_query = unread_count_query.filter(Notification.created_at >= start_dt)
+            if end_dt:
+                unread_count_query = unread_count_query.filter(Notification.created_at < end_dt)
+            if branch_id:
+                unread_count_query = unread_count_query.filter_by(branch_id=branch_id)
+            total_unread = unread_count_query.count()
+        else:
+            total_unread = get_unread_count(business_id, user_id, branch_id)
             
         return jsonify({
             'notifications': [notification.to_dict() for notification in notifications],
             'pagination': {
-                'total_unread': unread_count_query.count()
+                'total_unread': total_unread
             }
         }), 200
         
@@ -212,6 +111,7 @@ def mark_notification_read(notification_id):
             
         notification.is_read = True
         db.session.commit()
+        invalidate_unread_count(business_id, user_id)
         
         return jsonify({'message': 'Notification marked as read'}), 200
         
@@ -238,6 +138,7 @@ def mark_all_notifications_read():
         query.update({Notification.is_read: True}, synchronize_session=False)
         
         db.session.commit()
+        invalidate_unread_count(business_id, user_id)
         
         return jsonify({'message': 'All notifications marked as read'}), 200
         
@@ -263,6 +164,7 @@ def delete_notification(notification_id):
             
         db.session.delete(notification)
         db.session.commit()
+        invalidate_unread_count(business_id, user_id)
         
         return jsonify({'message': 'Notification deleted'}), 200
         
@@ -288,6 +190,7 @@ def clear_all_notifications():
         query.delete(synchronize_session=False)
         
         db.session.commit()
+        invalidate_unread_count(business_id, user_id)
         
         return jsonify({'message': 'All notifications cleared'}), 200
         
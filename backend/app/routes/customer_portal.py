@@ -1,10 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from app import db, bcrypt
 from app.models.customer import Customer
 from app.models.business import Business
-from app.models.product import Product
-from app.models.category import Category
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from app.utils.sequences import next_id
+from app.utils.catalogue import (
+    DEFAULT_PAGE_SIZE, SORTS, catalogue_etag, catalogue_version, decode_cursor,
+    get_business, get_product, list_categories, list_products, resolve_business_id
+)
 from datetime import datetime, timedelta
 import re
 
@@ -14,10 +17,10 @@ customer_portal_bp = Blueprint('customer_portal', __name__)
 @customer_portal_bp.route('/business/<slug>', methods=['GET'])
 def get_business_by_slug(slug):
     try:
-        business = Business.query.filter_by(slug=slug, is_active=True).first()
-        if not business:
+        business = get_business(slug)
+        if not business or not business.get('is_active'):
             return jsonify({'error': 'Business not found'}), 404
-        return jsonify({'business': business.to_dict()}), 200
+        return jsonify({'business': business}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -67,7 +70,7 @@ def register():
             city=data.get('city'),
             zip_code=data.get('postal_code'),
             business_id=business_id,
-            customer_id=f'CUST{datetime.now().strftime("%y%m%d%H%M%S")}',
+            customer_id=next_id(business_id, 'CUST'),
             is_active=True
         )
         customer.set_password(data['password'])
@@ -154,66 +157,80 @@ def get_profile():
     return jsonify({'customer': customer.to_dict()}), 200
 
 # Products & Categories for Shop
+def _catalogue_response(payload_factory, business_id, params):
+    """
+    Serve a catalogue payload with ETag / Last-Modified validators,
+    answering 304 without building the payload when the client is current.
+    """
+    version = catalogue_version(business_id)
+    etag = catalogue_etag(business_id, version, params)
+    last_modified = version[1].replace(microsecond=0) if version[1] else None
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and last_modified <= request.if_modified_since.replace(tzinfo=None))
+    response = make_response('', 304) if not_modified else make_response(jsonify(payload_factory()), 200)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
 @customer_portal_bp.route('/products', methods=['GET'])
 def get_products():
     try:
-        business_slug = request.args.get('business_slug')
-        business_id = request.args.get('business_id', type=int)
-        
-        if business_slug:
-            business = Business.query.filter_by(slug=business_slug).first()
-            if business:
-                business_id = business.id
-        
+        business_id = resolve_business_id(request.args.get('business_slug'),
+                                          request.args.get('business_id', type=int))
         if not business_id:
-            business = Business.query.filter_by(is_active=True).first()
-            if business:
-                business_id = business.id
-        
-        query = Product.query
-        if business_id:
-            query = query.filter_by(business_id=business_id)
-            
-        category_id = request.args.get('category')
-        if category_id:
-            query = query.filter_by(category_id=category_id)
-            
-        search = request.args.get('search')
-        if search:
-            query = query.filter(Product.name.ilike(f'%{search}%'))
-            
-        products = query.filter_by(is_active=True).all()
-        
-        return jsonify({
-            'products': [p.to_dict() for p in products]
-        }), 200
+            return jsonify({'error': 'Business not found'}), 404
+
+        filters = {
+            'category_id': request.args.get('category', type=int),
+            'search': request.args.get('search'),
+            'min_price': request.args.get('min_price', type=float),
+            'max_price': request.args.get('max_price', type=float),
+            'in_stock': request.args.get('in_stock', 'false').lower() == 'true',
+            'sort': request.args.get('sort', 'name'),
+            'cursor': request.args.get('cursor'),
+            'per_page': request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int),
+        }
+        if filters['sort'] not in SORTS:
+            return jsonify({'error': f"Invalid sort: {filters['sort']}. Must be one of: {', '.join(SORTS)}"}), 400
+        if filters['cursor']:
+            decode_cursor(filters['cursor'], filters['sort'])
+
+        return _catalogue_response(lambda: list_products(business_id, **filters), business_id, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@customer_portal_bp.route('/products/<int:product_id>', methods=['GET'])
+def get_product_details(product_id):
+    try:
+        business_id = resolve_business_id(request.args.get('business_slug'),
+                                          request.args.get('business_id', type=int))
+        product = get_product(business_id, product_id) if business_id else None
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        return jsonify({'product': product}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @customer_portal_bp.route('/categories', methods=['GET'])
 def get_categories():
     try:
-        business_slug = request.args.get('business_slug')
-        business_id = request.args.get('business_id', type=int)
-        
-        if business_slug:
-            business = Business.query.filter_by(slug=business_slug).first()
-            if business:
-                business_id = business.id
-                
+        business_id = resolve_business_id(request.args.get('business_slug'),
+                                          request.args.get('business_id', type=int))
         if not business_id:
-            business = Business.query.filter_by(is_active=True).first()
-            if business:
-                business_id = business.id
-                
-        query = Category.query
-        if business_id:
-            query = query.filter_by(business_id=business_id)
-            
-        categories = query.all()
-        return jsonify({
-            'categories': [c.to_dict() for c in categories]
-        }), 200
+            return jsonify({'categories': []}), 200
+
+        response = make_response(jsonify({'categories': list_categories(business_id)}), 200)
+        response.add_etag()
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import db
-from app.models.user import User, UserRole
+from app.models.user import UserRole
 from app.models.customer import Customer
 from app.models.product import Product
 from app.models.category import Category
@@ -11,14 +11,90 @@ from app.models.invoice import Invoice, InvoiceStatus
 from app.models.payroll import Payroll, PayrollStatus
 from app.models.supplier_bill import SupplierBill
 from app.models.task import Task
-from app.models.returns import Return, ReturnStatus, ReturnItem
+from app.models.returns import Return, ReturnStatus
 from app.utils.decorators import staff_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.tenant_context import get_tenant_context
+from app.utils.serialization import with_load_plan, serialize
+from app.utils.dashboard_metrics import DashboardMetricsAggregator
+from app.utils.time_series import TimeSeries
+from app.utils.rollups import rollup_query, rollups_available
+from app.models.sales_rollup import DailySalesRollup
 from datetime import datetime, timedelta
 from sqlalchemy import func, text
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+
+def _rollup_buckets(series, business_id, branch_id, **aggregates):
+    """Per-bucket sums of daily rollup columns; series buckets are whole days."""
+    query = series.query(
+        DailySalesRollup.day,
+        *[func.sum(column).label(name) for name, column in aggregates.items()],
+        is_date=True
+    ).filter(DailySalesRollup.business_id == business_id)
+    if branch_id:
+        query = query.filter(DailySalesRollup.branch_id == branch_id)
+    return series.fetch(query)
+
+
+def _order_buckets(series, business_id, branch_id, statuses, use_rollups=False):
+    """Order revenue and count per bucket of series, in one grouped query."""
+    if use_rollups:
+        revenue, orders = DailySalesRollup.sales_amount, DailySalesRollup.sales_count
+        if OrderStatus.RETURNED in statuses:
+            revenue = revenue + DailySalesRollup.returned_order_amount
+            orders = orders + DailySalesRollup.returned_order_count
+        return _rollup_buckets(series, business_id, branch_id, revenue=revenue, orders=orders)
+
+    query = series.query(
+        Order.created_at,
+        func.sum(Order.total_amount).label('revenue'),
+        func.count(Order.id).label('orders')
+    ).filter(
+        Order.business_id == business_id,
+        Order.status.in_(statuses)
+    )
+    if branch_id:
+        query = query.filter(Order.branch_id == branch_id)
+    return series.fetch(query)
+
+
+def _return_buckets(series, business_id, branch_id, use_rollups=False):
+    """Approved/processed return amounts per bucket of series."""
+    if use_rollups:
+        return _rollup_buckets(series, business_id, branch_id, amount=DailySalesRollup.returns_confirmed_amount)
+
+    query = series.query(
+        Return.created_at,
+        func.sum(Return.total_amount).label('amount')
+    ).filter(
+        Return.business_id == business_id,
+        Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED])
+    )
+    if branch_id:
+        query = query.filter(Return.branch_id == branch_id)
+    return series.fetch(query)
+
+
+def _expense_buckets(series, business_id, branch_id, use_rollups=False):
+    """Approved/paid expense amounts per bucket of series."""
+    if use_rollups:
+        return _rollup_buckets(series, business_id, branch_id, amount=DailySalesRollup.expenses)
+
+    query = series.query(
+        Expense.expense_date,
+        func.sum(Expense.amount).label('amount'),
+        is_date=True
+    ).filter(
+        Expense.business_id == business_id,
+        Expense.status.in_([ExpenseStatus.APPROVED, ExpenseStatus.PAID])
+    )
+    if branch_id:
+        query = query.filter(Expense.branch_id == branch_id)
+    return series.fetch(query)
+
+
 @dashboard_bp.route('/stats', methods=['GET'])
 @jwt_required()
 def get_dashboard_stats():
@@ -39,9 +115,8 @@ def get_dashboard_stats():
                 branch_id = get_active_branch_id()
         else:
             # Fallback to active branch only for restricted roles
-            user_id = get_jwt_identity()
-            user = db.session.get(User, user_id)
-            if user and user.role in [UserRole.staff]:
+            context = get_tenant_context()
+            if context and context.role in [UserRole.staff]:
                 branch_id = get_active_branch_id()
         
         current_end = None
@@ -58,8 +133,9 @@ def get_dashboard_stats():
             except ValueError:
                 return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
         else:
-            # Define date ranges based on period
-            now = datetime.utcnow()
+            # Define date ranges based on period, starting at midnight so the
+            # totals can be read from the daily rollups
+            now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
             if period == 'daily':
                 # Current: last 30 days, Previous: 30-60 days ago
                 current_start = now - timedelta(days=30)
@@ -76,186 +152,25 @@ def get_dashboard_stats():
                 previous_end = current_start
                 previous_start = now - timedelta(days=365*10)
 
-        # Define successful statuses - only DELIVERED and COMPLETED count as actual revenue
-        # Define successful statuses - must include RETURNED so we don't accidentally
-        # double-deduct by dropping the gross order AND subtracting the Return record.
-        successful_statuses = [
-            OrderStatus.DELIVERED, OrderStatus.COMPLETED, OrderStatus.RETURNED
-        ]
-
-        def get_metrics(start_date, end_date=None):
-            # Revenue - Exclude Shipping and Tax to perfectly match Net Sales logic
-            rev_q = db.session.query(func.sum(Order.total_amount - Order.shipping_cost - Order.tax_amount)).filter(
-                Order.business_id == business_id,
-                Order.status.in_(successful_statuses),
-                Order.created_at >= start_date
-            )
-            if end_date: rev_q = rev_q.filter(Order.created_at < end_date)
-            if branch_id: rev_q = rev_q.filter(Order.branch_id == branch_id)
-            gross_rev = float(rev_q.scalar() or 0)
-
-            # Returns - Match Income Statement (Pending + Approved + Processed)
-            # Use return_date instead of created_at to match
-            ret_q = db.session.query(func.sum(Return.total_amount)).filter(
-                Return.business_id == business_id,
-                Return.status.in_([ReturnStatus.PENDING, ReturnStatus.APPROVED, ReturnStatus.PROCESSED]),
-                Return.return_date >= start_date.date()
-            )
-            if end_date: ret_q = ret_q.filter(Return.return_date < end_date.date())
-            if branch_id: ret_q = ret_q.filter(Return.branch_id == branch_id)
-            returns_val = float(ret_q.scalar() or 0)
-
-            # Net Revenue
-            rev = gross_rev - returns_val
-
-            # Gross COGS
-            cogs_q = db.session.query(func.coalesce(func.sum(OrderItem.quantity * Product.cost_price), 0)).join(
-                Order, OrderItem.order_id == Order.id
-            ).join(
-                Product, OrderItem.product_id == Product.id
-            ).filter(
-                Order.business_id == business_id,
-                Order.status.in_(successful_statuses),
-                Order.created_at >= start_date
-            )
-            if end_date: cogs_q = cogs_q.filter(Order.created_at < end_date)
-            if branch_id: cogs_q = cogs_q.filter(Order.branch_id == branch_id)
-            gross_cogs = float(cogs_q.scalar() or 0)
-            
-            # Returns COGS (matching Income Statement rules)
-            ret_cogs_q = db.session.query(func.sum(ReturnItem.quantity * Product.cost_price)).join(
-                Return, ReturnItem.return_id == Return.id
-            ).join(
-                Product, ReturnItem.product_id == Product.id
-            ).filter(
-                Return.business_id == business_id,
-                Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED]),
-                Return.return_date >= start_date.date()
-            )
-            if end_date: ret_cogs_q = ret_cogs_q.filter(Return.return_date < end_date.date())
-            if branch_id: ret_cogs_q = ret_cogs_q.filter(Return.branch_id == branch_id)
-            returns_cogs = float(ret_cogs_q.scalar() or 0)
-            
-            # True COGS
-            cogs = gross_cogs - returns_cogs
-
-            # Expenses - APPROVED and PAID
-            from app.models.expense import Expense, ExpenseStatus
-            exp_q = db.session.query(func.sum(Expense.amount)).filter(
-                Expense.business_id == business_id,
-                Expense.status.in_([ExpenseStatus.APPROVED, ExpenseStatus.PAID]),
-                Expense.expense_date >= start_date.date()
-            )
-            if end_date: exp_q = exp_q.filter(Expense.expense_date < end_date.date())
-            if hasattr(Expense, 'branch_id') and branch_id:
-                exp_q = exp_q.filter(Expense.branch_id == branch_id)
-            exp = float(exp_q.scalar() or 0)
-            
-            # Payroll - Use payment_date to strictly match Income Statement
-            payroll_q = db.session.query(func.sum(Payroll.gross_pay)).filter(
-                Payroll.business_id == business_id,
-                Payroll.status.in_([PayrollStatus.APPROVED, PayrollStatus.PAID]),
-                Payroll.payment_date >= start_date.date()
-            )
-            if end_date: payroll_q = payroll_q.filter(Payroll.payment_date < end_date.date())
-            if branch_id: payroll_q = payroll_q.filter(Payroll.branch_id == branch_id)
-            pay = float(payroll_q.scalar() or 0)
-            
-            # Tax - collected from customers acts as liability, already stripped from 'rev'
-            tax = 0.0
-
-            # Final profit tightly coupling Income Statement
-            profit = rev - cogs - exp - pay
-            
-            return {
-                'revenue': rev, 
-                'cogs': cogs, 
-                'expenses': exp, 
-                'payroll': pay,
-                'tax': tax,
-                'profit': profit
-            }
-
-        current_metrics = get_metrics(current_start, current_end)
-        previous_metrics = get_metrics(previous_start, previous_end)
+        # Both periods are aggregated together, one statement per source table
+        aggregator = DashboardMetricsAggregator(business_id, branch_id)
+        metrics = aggregator.get_period_metrics(
+            (current_start, current_end), (previous_start, previous_end)
+        )
+        current_metrics = metrics['current']
+        previous_metrics = metrics['previous']
 
         def calc_change(curr, prev):
             if prev == 0: return 100 if curr > 0 else 0
             return round(((curr - prev) / prev) * 100, 1)
 
         # Basic stats (totals)
-        total_customers = db.session.query(func.count(Customer.id)).filter(
-            Customer.business_id == business_id,
-            Customer.created_at >= current_start,
-            Customer.created_at < current_end
-        )
-        if branch_id: total_customers = total_customers.filter(Customer.branch_id == branch_id)
-        total_customers = total_customers.scalar()
-        
-        total_products = db.session.query(func.count(Product.id)).filter(
-            Product.business_id == business_id, 
-            Product.is_active == True
-        )
-        if hasattr(Product, 'branch_id') and branch_id: total_products = total_products.filter(Product.branch_id == branch_id)
-        total_products = total_products.scalar()
-        
-        total_orders = db.session.query(func.count(Order.id)).filter(
-            Order.business_id == business_id,
-            Order.created_at >= current_start,
-            Order.created_at < current_end
-        )
-        if branch_id: total_orders = total_orders.filter(Order.branch_id == branch_id)
-        total_orders = total_orders.scalar()
-        
-        # Inventory Value
-        total_inventory_value = db.session.query(func.sum(Product.stock_quantity * Product.cost_price)).filter(
-            Product.business_id == business_id, Product.is_active == True
-        ).scalar() or 0
-
-        # Outstanding Invoices
-        from app.models.invoice import Invoice, InvoiceStatus
-        outstanding_invoices = db.session.query(func.sum(Invoice.amount_due)).filter(
-            Invoice.business_id == business_id,
-            Invoice.status != InvoiceStatus.PAID,
-            Invoice.status != InvoiceStatus.CANCELLED
-        ).scalar() or 0
-
-        # Revenue by category (Net of Returns)
-        rbc_query = db.session.query(
-            Category.name,
-            func.sum(OrderItem.line_total).label('revenue')
-        ).join(Product, Product.category_id == Category.id)\
-         .join(OrderItem, OrderItem.product_id == Product.id)\
-         .join(Order, Order.id == OrderItem.order_id)\
-         .filter(
-            Order.business_id == business_id,
-            Order.status.in_(successful_statuses),
-            Order.created_at >= current_start,
-            Order.created_at < current_end
-        )
-        if branch_id: rbc_query = rbc_query.filter(Order.branch_id == branch_id)
-        revenue_by_category_raw = rbc_query.group_by(Category.name).all()
-        
-        revenue_distribution = {}
-        for name, gross_amount in revenue_by_category_raw:
-            # Calculate returns for this category
-            cat_ret_q = db.session.query(func.sum(ReturnItem.line_total)).join(
-                Return, ReturnItem.return_id == Return.id
-            ).join(
-                Product, ReturnItem.product_id == Product.id
-            ).join(
-                Category, Product.category_id == Category.id
-            ).filter(
-                Return.business_id == business_id,
-                Category.name == name,
-                Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED]),
-                Return.created_at >= current_start,
-                Return.created_at < current_end
-            )
-            if branch_id: cat_ret_q = cat_ret_q.filter(Return.branch_id == branch_id)
-            cat_returns = float(cat_ret_q.scalar() or 0)
-            
-            revenue_distribution[name] = max(0, float(gross_amount or 0) - cat_returns)
+        total_customers = metrics['total_customers']
+        total_products = metrics['total_products']
+        total_orders = metrics['total_orders']
+        total_inventory_value = metrics['total_inventory_value']
+        outstanding_invoices = metrics['outstanding_invoices']
+        revenue_distribution = metrics['revenue_distribution']
 
         # Calculate margin change with division by zero protection
         current_margin = round(((current_metrics['revenue'] - current_metrics['cogs']) / current_metrics['revenue'] * 100), 1) if current_metrics['revenue'] > 0 else 0
@@ -264,15 +179,7 @@ def get_dashboard_stats():
 
         # Calculate inventory progress (relative to a dynamic scale based on total products and average price)
         # Use a dynamic target based on business size: target = max_products * avg_unit_price * 10
-        avg_unit_price = db.session.query(func.avg(Product.unit_price)).filter(
-            Product.business_id == business_id, 
-            Product.is_active == True
-        ).scalar() or 0
-        max_products = db.session.query(func.count(Product.id)).filter(
-            Product.business_id == business_id, 
-            Product.is_active == True
-        ).scalar() or 0
-        inventory_target = float(avg_unit_price) * max(max_products, 1) * 10  # Assume 10x stock turnover as target
+        inventory_target = metrics['avg_unit_price'] * max(total_products, 1) * 10  # Assume 10x stock turnover as target
         inventory_progress = min(100, round((float(total_inventory_value) / inventory_target) * 100, 1)) if inventory_target > 0 else 0
         
         # Calculate invoice progress (relative to total revenue)
@@ -328,9 +235,8 @@ def get_recent_activity():
             except ValueError:
                 branch_id = get_active_branch_id()
         else:
-            user_id = get_jwt_identity()
-            user = db.session.get(User, user_id)
-            if user and user.role in [UserRole.staff]:
+            context = get_tenant_context()
+            if context and context.role in [UserRole.staff]:
                 branch_id = get_active_branch_id()
         
         # Recent orders
@@ -394,217 +300,81 @@ def get_sales_chart_data():
             except ValueError:
                 branch_id = get_active_branch_id()
         else:
-            user_id = get_jwt_identity()
-            user = db.session.get(User, user_id)
-            if user and user.role in [UserRole.staff]:
+            context = get_tenant_context()
+            if context and context.role in [UserRole.staff]:
                 branch_id = get_active_branch_id()
         start_date_str = request.args.get('start_date')
         end_date_str = request.args.get('end_date')
         
-        sales_data = []
-        previous_sales_data = []
         # Define successful statuses - only DELIVERED and COMPLETED count as actual revenue
         # PENDING, CONFIRMED, PROCESSING, SHIPPED may never be completed or paid
         successful_statuses = [
             OrderStatus.DELIVERED, OrderStatus.COMPLETED
         ]
-        
+
+        # Each branch picks the bucket range and whether returns are netted
+        # (and clamped at zero) for the current and the comparison series.
         if start_date_str and end_date_str:
             # Use provided date range
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
                 end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                
-                # Generate data for each day in the range
-                current_date = start_date
-                while current_date <= end_date:
-                    day_query = db.session.query(
-                        func.sum(Order.total_amount).label('revenue'),
-                        func.count(Order.id).label('orders')
-                    ).filter(
-                        Order.business_id == business_id,
-                        func.date(Order.created_at) == current_date,
-                        Order.status.in_(successful_statuses)
-                    )
-                    if branch_id:
-                        day_query = day_query.filter(Order.branch_id == branch_id)
-                    result = day_query.first()
-                    
-                    # Daily returns
-                    day_ret_query = db.session.query(func.sum(Return.total_amount)).filter(
-                        Return.business_id == business_id,
-                        func.date(Return.created_at) == current_date,
-                        Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED])
-                    )
-                    if branch_id: day_ret_query = day_ret_query.filter(Return.branch_id == branch_id)
-                    day_ret = float(day_ret_query.scalar() or 0)
-
-                    sales_data.append({
-                        'label': current_date.strftime('%b %d'),
-                        'revenue': float(result.revenue or 0) - day_ret,
-                        'orders': int(result.orders or 0)
-                    })
-                    current_date += timedelta(days=1)
-                
-                # For previous period comparison, shift back by the same duration
-                duration = (end_date - start_date).days + 1
-                prev_start = start_date - timedelta(days=duration)
-                prev_end = end_date - timedelta(days=duration)
-                
-                current_date = prev_start
-                while current_date <= prev_end:
-                    day_query = db.session.query(
-                        func.sum(Order.total_amount).label('revenue')
-                    ).filter(
-                        Order.business_id == business_id,
-                        func.date(Order.created_at) == current_date,
-                        Order.status.in_(successful_statuses)
-                    )
-                    if branch_id:
-                        day_query = day_query.filter(Order.branch_id == branch_id)
-                    result = day_query.first()
-                    previous_sales_data.append(float(result.revenue or 0))
-                    current_date += timedelta(days=1)
-                    
             except ValueError:
                 return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+            series = TimeSeries('day', start_date, end_date)
+            # For previous period comparison, shift back by the same duration
+            previous_series = series.shifted(-len(series.buckets))
+            current_net, current_clamp = True, False
+            previous_net, previous_clamp = False, False
         elif period == 'daily':
-            # Current 30 days (fallback when no specific dates provided)
-            for i in range(29, -1, -1):
-                d = datetime.utcnow().date() - timedelta(days=i)
-                day_query = db.session.query(
-                    func.sum(Order.total_amount).label('revenue'),
-                    func.count(Order.id).label('orders')
-                ).filter(
-                    Order.business_id == business_id,
-                    func.date(Order.created_at) == d,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    day_query = day_query.filter(Order.branch_id == branch_id)
-                result = day_query.first()
-
-                # Daily returns for trend
-                ret_trend_q = db.session.query(func.sum(Return.total_amount)).filter(
-                    Return.business_id == business_id,
-                    func.date(Return.created_at) == d,
-                    Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED])
-                )
-                if branch_id: ret_trend_q = ret_trend_q.filter(Return.branch_id == branch_id)
-                ret_trend = float(ret_trend_q.scalar() or 0)
-
-                sales_data.append({
-                    'label': d.strftime('%b %d'),
-                    'revenue': float(result.revenue or 0) - ret_trend,
-                    'orders': int(result.orders or 0)
-                })
-            
-            # Previous 30 days (for comparison)
-            for i in range(59, 29, -1):
-                date = datetime.utcnow().date() - timedelta(days=i)
-                day_query = db.session.query(
-                    func.sum(Order.total_amount).label('revenue')
-                ).filter(
-                    Order.business_id == business_id,
-                    func.date(Order.created_at) == date,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    day_query = day_query.filter(Order.branch_id == branch_id)
-                result = day_query.first()
-                
-                # Previous period returns
-                prev_ret_q = db.session.query(func.sum(Return.total_amount)).filter(
-                    Return.business_id == business_id,
-                    func.date(Return.created_at) == date,
-                    Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED])
-                )
-                if branch_id: prev_ret_q = prev_ret_q.filter(Return.branch_id == branch_id)
-                prev_ret = float(prev_ret_q.scalar() or 0)
-                
-                previous_sales_data.append(max(0, float(result.revenue or 0) - prev_ret))
-
+            # Current 30 days vs previous 30 days
+            series = TimeSeries.last_n('day', 30)
+            previous_series = series.shifted(-30)
+            current_net, current_clamp = True, False
+            previous_net, previous_clamp = True, True
         elif period == 'monthly':
-            # Last 12 months
-            for i in range(11, -1, -1):
-                current_date = datetime.utcnow()
-                month = (current_date.month - i - 1) % 12 + 1
-                year = current_date.year + (current_date.month - i - 1) // 12
-                
-                month_query = db.session.query(
-                    func.sum(Order.total_amount).label('revenue'),
-                    func.count(Order.id).label('orders')
-                ).filter(
-                    Order.business_id == business_id,
-                    func.extract('month', Order.created_at) == month,
-                    func.extract('year', Order.created_at) == year,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    month_query = month_query.filter(Order.branch_id == branch_id)
-                result = month_query.first()
-                
-                # Monthly returns for trend
-                ret_month_q = db.session.query(func.sum(Return.total_amount)).filter(
-                    Return.business_id == business_id,
-                    func.extract('month', Return.created_at) == month,
-                    func.extract('year', Return.created_at) == year,
-                    Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED])
-                )
-                if branch_id: ret_month_q = ret_month_q.filter(Return.branch_id == branch_id)
-                ret_month = float(ret_month_q.scalar() or 0)
-
-                month_name = datetime(year, month, 1).strftime('%b %Y')
-                sales_data.append({
-                    'label': month_name,
-                    'revenue': max(0, float(result.revenue or 0) - ret_month),
-                    'orders': int(result.orders or 0)
-                })
-
-                # Previous year same month
-                prev_year = year - 1
-                prev_query = db.session.query(func.sum(Order.total_amount)).filter(
-                    Order.business_id == business_id,
-                    func.extract('month', Order.created_at) == month,
-                    func.extract('year', Order.created_at) == prev_year,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    prev_query = prev_query.filter(Order.branch_id == branch_id)
-                previous_sales_data.append(float(prev_query.scalar() or 0))
+            # Last 12 months vs the same months of the previous year
+            series = TimeSeries.last_n('month', 12)
+            previous_series = series.shifted(-12)
+            current_net, current_clamp = True, True
+            previous_net, previous_clamp = False, False
         else:
-            # Last 5 years
-            for i in range(4, -1, -1):
-                year = datetime.utcnow().year - i
-                
-                year_query = db.session.query(
-                    func.sum(Order.total_amount).label('revenue'),
-                    func.count(Order.id).label('orders')
-                ).filter(
-                    Order.business_id == business_id,
-                    func.extract('year', Order.created_at) == year,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    year_query = year_query.filter(Order.branch_id == branch_id)
-                result = year_query.first()
-                
-                sales_data.append({
-                    'label': str(year),
-                    'revenue': float(result.revenue or 0),
-                    'orders': int(result.orders or 0)
-                })
+            # Last 5 years vs the 5 years before
+            series = TimeSeries.last_n('year', 5)
+            previous_series = series.shifted(-5)
+            current_net, current_clamp = False, False
+            previous_net, previous_clamp = False, False
+
+        # The comparison range directly precedes the current one, so a single
+        # grouped query per table covers both.
+        combined = TimeSeries(series.granularity, previous_series.first, series.last)
+        use_rollups = rollups_available(business_id)
+        order_rows = _order_buckets(combined, business_id, branch_id, successful_statuses, use_rollups)
+        return_rows = {}
+        if current_net or previous_net:
+            return_rows = _return_buckets(combined, business_id, branch_id, use_rollups)
+
+        def revenue_at(bucket, net, clamp):
+            row = order_rows.get(bucket)
+            revenue = float(row.revenue or 0) if row else 0.0
+            if net:
+                ret_row = return_rows.get(bucket)
+                revenue -= float(ret_row.amount or 0) if ret_row else 0.0
+                if clamp:
+                    revenue = max(0, revenue)
+            return revenue
 
-                # Previous 5 years comparison (just 0 for now or same year - 5)
-                prev_year = year - 5
-                prev_query = db.session.query(func.sum(Order.total_amount)).filter(
-                    Order.business_id == business_id,
-                    func.extract('year', Order.created_at) == prev_year,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    prev_query = prev_query.filter(Order.branch_id == branch_id)
-                previous_sales_data.append(float(prev_query.scalar() or 0))
+        sales_data = []
+        for bucket, label in zip(series.buckets, series.labels()):
+            row = order_rows.get(bucket)
+            sales_data.append({
+                'label': label,
+                'revenue': revenue_at(bucket, current_net, current_clamp),
+                'orders': int(row.orders or 0) if row else 0
+            })
+        previous_sales_data = [
+            revenue_at(bucket, previous_net, previous_clamp) for bucket in previous_series.buckets
+        ]
 
         return jsonify({
             'sales_data': sales_data,
@@ -628,185 +398,78 @@ def get_revenue_expense_chart():
             except ValueError:
                 branch_id = get_active_branch_id()
         else:
-            user_id = get_jwt_identity()
-            user = db.session.get(User, user_id)
-            if user and user.role in [UserRole.staff]:
+            context = get_tenant_context()
+            if context and context.role in [UserRole.staff]:
                 branch_id = get_active_branch_id()
         start_date_str = request.args.get('start_date')
         end_date_str = request.args.get('end_date')
         
-        labels = []
-        revenue_data = []
-        expense_data = []
-        
-        # Define successful statuses - only DELIVERED and COMPLETED count as actual revenue
         # Define successful statuses - must include RETURNED so we don't accidentally
         # double-deduct by dropping the gross order AND subtracting the Return record.
         successful_statuses = [
             OrderStatus.DELIVERED, OrderStatus.COMPLETED, OrderStatus.RETURNED
         ]
         
-        from app.models.expense import Expense, ExpenseStatus
-        from app.models.payment import Payment, PaymentStatus
-        
         if start_date_str and end_date_str:
             # Use provided date range
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
                 end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                
-                # Generate data for each day in the range
-                current_date = start_date
-                while current_date <= end_date:
-                    labels.append(current_date.strftime('%b %d'))
-                    
-                    # Revenue
-                    rev_query = db.session.query(func.sum(Order.total_amount)).filter(
-                        Order.business_id == business_id,
-                        func.date(Order.created_at) == current_date,
-                        Order.status.in_(successful_statuses)
-                    )
-                    if branch_id:
-                        rev_query = rev_query.filter(Order.branch_id == branch_id)
-                    revenue_data.append(float(rev_query.scalar() or 0))
-                    
-                    # Expenses - include both APPROVED and PAID expenses
-                    exp_query = db.session.query(func.sum(Expense.amount)).filter(
-                        Expense.business_id == business_id,
-                        Expense.expense_date == current_date,
-                        Expense.status.in_([ExpenseStatus.APPROVED, ExpenseStatus.PAID])
-                    )
-                    if hasattr(Expense, 'branch_id') and branch_id:
-                        exp_query = exp_query.filter(Expense.branch_id == branch_id)
-                    expense_data.append(float(exp_query.scalar() or 0))
-                    
-                    current_date += timedelta(days=1)
-                    
             except ValueError:
                 return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+            series = TimeSeries('day', start_date, end_date)
         elif period == 'daily':
-            # Last 30 days
-            days_to_fetch = 30
-            for i in range(days_to_fetch - 1, -1, -1):
-                date = datetime.utcnow().date() - timedelta(days=i)
-                labels.append(date.strftime('%b %d'))
-                
-                # Revenue
-                rev_query = db.session.query(func.sum(Order.total_amount)).filter(
-                    Order.business_id == business_id,
-                    func.date(Order.created_at) == date,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    rev_query = rev_query.filter(Order.branch_id == branch_id)
-                revenue_data.append(float(rev_query.scalar() or 0))
-                
-                # Expenses - include both APPROVED and PAID expenses
-                exp_query = db.session.query(func.sum(Expense.amount)).filter(
-                    Expense.business_id == business_id,
-                    Expense.expense_date == date,
-                    Expense.status.in_([ExpenseStatus.APPROVED, ExpenseStatus.PAID])
-                )
-                if hasattr(Expense, 'branch_id') and branch_id:
-                    exp_query = exp_query.filter(Expense.branch_id == branch_id)
-                expense_data.append(float(exp_query.scalar() or 0))
-                
+            series = TimeSeries.last_n('day', 30)
         elif period == 'monthly':
-            # Last 12 months
-            for i in range(11, -1, -1):
-                current_date = datetime.utcnow()
-                month = (current_date.month - i - 1) % 12 + 1
-                year = current_date.year + (current_date.month - i - 1) // 12
-                
-                month_name = datetime(year, month, 1).strftime('%b %Y')
-                labels.append(month_name)
-                
-                # Revenue
-                rev_query = db.session.query(func.sum(Order.total_amount)).filter(
-                    Order.business_id == business_id,
-                    func.extract('month', Order.created_at) == month,
-                    func.extract('year', Order.created_at) == year,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    rev_query = rev_query.filter(Order.branch_id == branch_id)
-                revenue_data.append(float(rev_query.scalar() or 0))
-                
-                # Expenses - include both APPROVED and PAID expenses
-                exp_query = db.session.query(func.sum(Expense.amount)).filter(
-                    Expense.business_id == business_id,
-                    func.extract('month', Expense.expense_date) == month,
-                    func.extract('year', Expense.expense_date) == year,
-                    Expense.status.in_([ExpenseStatus.APPROVED, ExpenseStatus.PAID])
-                )
-                if hasattr(Expense, 'branch_id') and branch_id:
-                    exp_query = exp_query.filter(Expense.branch_id == branch_id)
-                expense_data.append(float(exp_query.scalar() or 0))
+            series = TimeSeries.last_n('month', 12)
         else:
-            # Last 5 years
-            for i in range(4, -1, -1):
-                year = datetime.utcnow().year - i
-                labels.append(str(year))
-                
-                # Revenue
-                rev_query = db.session.query(func.sum(Order.total_amount)).filter(
-                    Order.business_id == business_id,
-                    func.extract('year', Order.created_at) == year,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    rev_query = rev_query.filter(Order.branch_id == branch_id)
-                revenue_data.append(float(rev_query.scalar() or 0))
-                
-                # Expenses - include both APPROVED and PAID expenses
-                exp_query = db.session.query(func.sum(Expense.amount)).filter(
-                    Expense.business_id == business_id,
-                    func.extract('year', Expense.expense_date) == year,
-                    Expense.status.in_([ExpenseStatus.APPROVED, ExpenseStatus.PAID])
-                )
-                if hasattr(Expense, 'branch_id') and branch_id:
-                    exp_query = exp_query.filter(Expense.branch_id == branch_id)
-                expense_data.append(float(exp_query.scalar() or 0))
+            series = TimeSeries.last_n('year', 5)
+
+        # One grouped query per source table for the whole range
+        use_rollups = rollups_available(business_id)
+        order_rows = _order_buckets(series, business_id, branch_id, successful_statuses, use_rollups)
+        expense_rows = _expense_buckets(series, business_id, branch_id, use_rollups)
+
+        labels = series.labels()
+        revenue_data = series.fill(order_rows, lambda row: float(row.revenue or 0))
+        # Expenses - include both APPROVED and PAID expenses
+        expense_data = series.fill(expense_rows, lambda row: float(row.amount or 0))
         
-        # Calculate COGS for the period
-        cogs_total = 0
-        if start_date_str and end_date_str:
-            # Custom date range COGS calculation
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            
-            cogs_query = db.session.query(func.sum(OrderItem.quantity * Product.cost_price)).join(
-                Order, OrderItem.order_id == Order.id
-            ).join(
-                Product, OrderItem.product_id == Product.id
-            ).filter(
-                Order.business_id == business_id,
-                Order.status.in_(successful_statuses),
-                func.date(Order.created_at) >= start_date,
-                func.date(Order.created_at) <= end_date
-            )
-            if branch_id:
-                cogs_query = cogs_query.filter(Order.branch_id == branch_id)
-            cogs_total = float(cogs_query.scalar() or 0)
-        else:
-            # Use the same period logic as revenue/expense data
+        # Summary totals use the same period logic as revenue/expense data
+        if not (start_date_str and end_date_str):
+            end_date = datetime.utcnow().date()
             if period == 'daily':
                 # Last 30 days
-                start_date = datetime.utcnow().date() - timedelta(days=30)
-                end_date = datetime.utcnow().date()
+                start_date = end_date - timedelta(days=30)
             elif period == 'weekly':
                 # Last 12 weeks
-                start_date = datetime.utcnow().date() - timedelta(weeks=12)
-                end_date = datetime.utcnow().date()
+                start_date = end_date - timedelta(weeks=12)
             elif period == 'monthly':
                 # Last 12 months
-                start_date = datetime.utcnow().date() - timedelta(days=365)
-                end_date = datetime.utcnow().date()
+                start_date = end_date - timedelta(days=365)
             else: # yearly
                 # Last 5 years
-                start_date = datetime.utcnow().date() - timedelta(days=365*5)
-                end_date = datetime.utcnow().date()
-            
+                start_date = end_date - timedelta(days=365*5)
+
+        # Whole days from start_date to end_date inclusive, as a plain range on
+        # created_at so the index can be used
+        range_start = datetime.combine(start_date, datetime.min.time())
+        range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+        # COGS and tax for the period
+        if use_rollups:
+            cogs_total, tax_total = rollup_query(
+                business_id, branch_id,
+                func.coalesce(func.sum(DailySalesRollup.cogs), 0),
+                func.coalesce(func.sum(DailySalesRollup.tax_amount), 0)
+            ).filter(
+                DailySalesRollup.day >= start_date,
+                DailySalesRollup.day <= end_date
+            ).one()
+            cogs_total = float(cogs_total)
+            tax_total = float(tax_total)
+        else:
+            # Calculate COGS for the period
             cogs_query = db.session.query(func.sum(OrderItem.quantity * Product.cost_price)).join(
                 Order, OrderItem.order_id == Order.id
             ).join(
@@ -814,13 +477,24 @@ def get_revenue_expense_chart():
             ).filter(
                 Order.business_id == business_id,
                 Order.status.in_(successful_statuses),
-                func.date(Order.created_at) >= start_date,
-                func.date(Order.created_at) <= end_date
+                Order.created_at >= range_start,
+                Order.created_at < range_end
             )
             if branch_id:
                 cogs_query = cogs_query.filter(Order.branch_id == branch_id)
             cogs_total = float(cogs_query.scalar() or 0)
         
+            # Calculate tax for the period
+            tax_query = db.session.query(func.coalesce(func.sum(Order.tax_amount), 0)).filter(
+                Order.business_id == business_id,
+                Order.status.in_(successful_statuses),
+                Order.created_at >= range_start,
+                Order.created_at < range_end
+            )
+            if branch_id:
+                tax_query = tax_query.filter(Order.branch_id == branch_id)
+            tax_total = float(tax_query.scalar() or 0)
+        
         # Calculate payroll for the period
         payroll_query = db.session.query(func.coalesce(func.sum(Payroll.gross_pay), 0)).filter(
             Payroll.business_id == business_id,
@@ -832,17 +506,6 @@ def get_revenue_expense_chart():
             payroll_query = payroll_query.filter(Payroll.branch_id == branch_id)
         payroll_total = float(payroll_query.scalar() or 0)
         
-        # Calculate tax for the period
-        tax_query = db.session.query(func.coalesce(func.sum(Order.tax_amount), 0)).filter(
-            Order.business_id == business_id,
-            Order.status.in_(successful_statuses),
-            func.date(Order.created_at) >= start_date,
-            func.date(Order.created_at) <= end_date
-        )
-        if branch_id:
-            tax_query = tax_query.filter(Order.branch_id == branch_id)
-        tax_total = float(tax_query.scalar() or 0)
-        
         total_rev = sum(revenue_data)
         total_exp = sum(expense_data)
         
@@ -1137,8 +800,8 @@ def apply_filters():
         if search_query:
             orders_query = orders_query.filter(Order.order_number.ilike(f'%{search_query}%'))
         
-        orders = orders_query.order_by(Order.created_at.desc()).limit(100).all()
-        result['orders'] = [o.to_dict() for o in orders]
+        orders = with_load_plan(orders_query, 'order').order_by(Order.created_at.desc()).limit(100).all()
+        result['orders'] = serialize(orders)
         result['summary']['total_orders'] = orders_query.count()
         result['summary']['total_revenue'] = float(orders_query.filter(
             Order.status.in_(successful_statuses)
@@ -1174,8 +837,8 @@ def apply_filters():
         if search_query:
             invoices_query = invoices_query.filter(Invoice.invoice_number.ilike(f'%{search_query}%'))
         
-        invoices = invoices_query.order_by(Invoice.created_at.desc()).limit(100).all()
-        result['invoices'] = [i.to_dict() for i in invoices]
+        invoices = with_load_plan(invoices_query, 'invoice').order_by(Invoice.created_at.desc()).limit(100).all()
+        result['invoices'] = serialize(invoices)
         result['summary']['total_invoices'] = invoices_query.count()
         result['summary']['outstanding_invoices'] = float(invoices_query.filter(
             Invoice.status != InvoiceStatus.PAID,
@@ -8,11 +8,14 @@ from app.models.attendance import Attendance
 from app.models.leave_request import LeaveRequest, LeaveStatus, LeaveType
 from app.models.payroll import Payroll, PayrollStatus
 from app.models.task import Task
+from app.models.disbursement_job import DisbursementJob
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
 from app.utils import momo
+from app.utils.bulk_import import submit_import, background_requested
+from app.utils.disbursements import submit_disbursement
+from app.utils.search_index import search_filter
 from datetime import datetime, date
-import csv
 
 hr_bp = Blueprint('hr', __name__)
 
@@ -55,20 +58,8 @@ def get_employees():
         if branch_id:
             query = query.filter_by(branch_id=branch_id)
         
-        # Use outerjoin to handle cases where user might not exist
-        query = query.outerjoin(User)
-        
         if search:
-            search_filter = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    Employee.employee_id.ilike(search_filter),
-                    User.first_name.ilike(search_filter),
-                    User.last_name.ilike(search_filter),
-                    Employee.department.ilike(search_filter),
-                    Employee.position.ilike(search_filter)
-                )
-            )
+            query = query.filter(search_filter(Employee.id, business_id, 'employee', search))
         
         if department:
             query = query.filter(Employee.department == department)
@@ -294,6 +285,9 @@ def bulk_upload_employees():
 
     Note: This bulk upload does NOT create user accounts; it links employees
     to existing users by email.
+
+    Large files are imported in the background: the response is 202 with an
+    import job to poll at /api/import-jobs/<id>.
     """
     try:
         business_id = get_business_id()
@@ -309,113 +303,9 @@ def bulk_upload_employees():
         if not file.filename.lower().endswith('.csv'):
             return jsonify({'error': 'Only CSV files are supported. Please upload a .csv file'}), 400
 
-        content = file.read().decode('utf-8-sig')
-        reader = csv.DictReader(content.splitlines())
-
-        # Helper to fetch a value from a row using flexible header matching
-        def get_val(r, *candidates):
-            if not r:
-                return None
-            for cand in candidates:
-                for rk in list(r.keys()):
-                    if rk is None:
-                        continue
-                    if rk.strip().lower() == cand.strip().lower():
-                        return r.get(rk)
-            return None
-
-        created = []
-        errors = []
-        row_num = 1
-
-        for row in reader:
-            row_num += 1
-            try:
-                employee_id = (get_val(row, 'employee_id', 'Employee ID', 'employee id') or '').strip()
-                user_email = (get_val(row, 'user_email', 'User Email', 'email', 'user email') or '').strip()
-
-                if not employee_id:
-                    errors.append({'row': row_num, 'error': 'Missing required field: employee_id'})
-                    continue
-
-                # Ensure employee_id unique per business
-                existing_emp = Employee.query.filter_by(business_id=business_id, employee_id=employee_id).first()
-                if existing_emp:
-                    errors.append({'row': row_num, 'error': f'Employee ID {employee_id} already exists for this business'})
-                    continue
-
-                # Find user by email within the same business (optional)
-                user = User.query.filter_by(email=user_email, business_id=business_id).first() if user_email else None
-                if user_email and not user:
-                    errors.append({'row': row_num, 'error': f'User with email {user_email} not found for this business'})
-                    continue
-
-                # Ensure user does not already have an employee record
-                if user and user.employee:
-                    errors.append({'row': row_num, 'error': f'User {user_email} already has an employee record'})
-                    continue
-
-                department = (get_val(row, 'department', 'Department') or '').strip()
-                position = (get_val(row, 'position', 'Position') or '').strip()
-                hire_date_raw = (get_val(row, 'hire_date', 'Hire Date', 'hire date') or '').strip()
-
-                if not department or not position or not hire_date_raw:
-                    errors.append({'row': row_num, 'error': 'Missing required fields: department, position, hire_date'})
-                    continue
-
-                # Parse hire_date
-                try:
-                    hire_date = datetime.strptime(hire_date_raw, '%Y-%m-%d').date()
-                except ValueError:
-                    errors.append({'row': row_num, 'error': f'Invalid hire_date (expected YYYY-MM-DD): {hire_date_raw}'})
-                    continue
-
-                # Salary
-                try:
-                    salary_raw = get_val(row, 'salary', 'Salary') or ''
-                    salary = float(salary_raw) if salary_raw != '' else None
-                except (ValueError, TypeError):
-                    errors.append({'row': row_num, 'error': f'Invalid salary: {row.get("salary")}'})
-                    continue
-
-                address = (get_val(row, 'address', 'Address') or '').strip()
-                emergency_contact_name = (get_val(row, 'emergency_contact_name', 'Emergency Contact Name', 'emergency contact name') or '').strip()
-                emergency_contact_phone = (get_val(row, 'emergency_contact_phone', 'Emergency Contact Phone', 'emergency contact phone') or '').strip()
-                bank_account = (get_val(row, 'bank_account', 'Bank Account', 'bank account') or '').strip()
-
-                is_active_raw = (get_val(row, 'is_active', 'Is Active', 'is active') or '').strip().lower()
-                is_active = True if is_active_raw == '' else is_active_raw in ['true', '1', 'yes', 'on']
-
-                employee = Employee(
-                    business_id=business_id,
-                    branch_id=branch_id,
-                    user_id=user.id if user else None,
-                    employee_id=employee_id,
-                    department=department,
-                    position=position,
-                    hire_date=hire_date,
-                    salary=salary,
-                    address=address,
-                    emergency_contact_name=emergency_contact_name,
-                    emergency_contact_phone=emergency_contact_phone,
-                    bank_account=bank_account,
-                    is_active=is_active
-                )
-
-                db.session.add(employee)
-                db.session.commit()
-                created.append(employee.to_dict())
-
-            except Exception as row_err:
-                db.session.rollback()
-                errors.append({'row': row_num, 'error': str(row_err)})
-                continue
-
-        return jsonify({
-            'created': created,
-            'errors': errors,
-            'created_count': len(created)
-        }), 200
+        body, status = submit_import(business_id, get_jwt_identity(), 'employees', file,
+                                     branch_id=branch_id, background=background_requested())
+        return jsonify(body), status
 
     except Exception as e:
         db.session.rollback()
@@ -933,62 +823,61 @@ def disburse_payroll(payroll_id):
 @hr_bp.route('/payroll/batch-disburse', methods=['POST'])
 @jwt_required()
 def batch_disburse_payroll():
+    """
+    Pay out approved payrolls (all of them, or the given payroll_ids).
+    Small batches return the results (200); larger ones run as a
+    disbursement job to poll (202). ?background=true|false forces the mode.
+    """
     try:
         business_id = get_business_id()
         data = request.get_json() or {}
         payroll_ids = data.get('payroll_ids')  # optional list
 
-        query = Payroll.query.filter_by(business_id=business_id)
-        if payroll_ids:
-            query = query.filter(Payroll.id.in_(payroll_ids))
-        else:
-            # default: all approved payrolls
-            query = query.filter(Payroll.status == PayrollStatus.APPROVED)
+        if payroll_ids is not None and (not isinstance(payroll_ids, list)
+                                        or not all(isinstance(i, int) for i in payroll_ids)):
+            return jsonify({'error': 'payroll_ids must be a list of ids'}), 400
 
-        payrolls = query.all()
-        results = []
+        body, status = submit_disbursement(business_id, get_jwt_identity(), payroll_ids,
+                                           background=background_requested())
+        return jsonify(body), status
 
-        for payroll in payrolls:
-            try:
-                employee = payroll.employee
-                if not employee or not employee.user or not employee.user.phone:
-                    results.append({'payroll_id': payroll.id, 'success': False, 'error': 'Missing phone'})
-                    continue
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
-                phone = employee.user.phone
-                amount = float(payroll.net_pay)
-                currency = payroll.disbursement_currency or 'EUR'
-
-                res = momo.disburse_to_wallet(amount=amount, phone_number=phone, currency=currency, payee_note=f'Payroll {payroll.id}')
-
-                if res.get('success'):
-                    payroll.disbursement_provider = 'mtn_momo'
-                    payroll.disbursement_reference = res.get('reference_id')
-                    payroll.disbursement_status = res.get('status', 'pending')
-                    payroll.disbursement_amount = amount
-                    payroll.disbursement_currency = currency
-                    payroll.disbursed_at = datetime.utcnow()
-                    payroll.disbursement_metadata = res
-                    payroll.status = PayrollStatus.PAID
-                    payroll.payment_date = datetime.utcnow().date()
-                    db.session.add(payroll)
-                    db.session.commit()
-                    results.append({'payroll_id': payroll.id, 'success': True, 'reference': res.get('reference_id')})
-                else:
-                    payroll.disbursement_status = res.get('status', 'failed')
-                    payroll.disbursement_metadata = res
-                    db.session.add(payroll)
-                    db.session.commit()
-                    results.append({'payroll_id': payroll.id, 'success': False, 'error': res})
+@hr_bp.route('/payroll/disbursement-jobs', methods=['GET'])
+@jwt_required()
+def get_disbursement_jobs():
+    """Recent payroll disbursement jobs for the business, newest first."""
+    try:
+        business_id = get_business_id()
+        limit = min(request.args.get('limit', 20, type=int), 100)
 
-            except Exception as e:
-                db.session.rollback()
-                results.append({'payroll_id': payroll.id, 'success': False, 'error': str(e)})
+        jobs = DisbursementJob.query.filter_by(business_id=business_id).order_by(
+            DisbursementJob.created_at.desc(), DisbursementJob.id.desc()
+        ).limit(limit).all()
 
-        return jsonify({'results': results}), 200
+        # Per-payroll results are only returned by the single job endpoint
+        return jsonify({'jobs': [{
+            key: value for key, value in job.to_dict().items() if key != 'results'
+        } for job in jobs]}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@hr_bp.route('/payroll/disbursement-jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_disbursement_job(job_id):
+    """Status and progress of one disbursement job; poll until status is done or failed."""
+    try:
+        business_id = get_business_id()
+        job = DisbursementJob.query.filter_by(id=job_id, business_id=business_id).first()
+        if not job:
+            return jsonify({'error': 'Disbursement job not found'}), 404
+
+        return jsonify({'job': job.to_dict()}), 200
 
     except Exception as e:
-        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @hr_bp.route('/payroll/<int:payroll_id>', methods=['DELETE'])
@@ -1228,15 +1117,7 @@ def get_attendance_records():
             employees_query = employees_query.filter_by(branch_id=branch_id)
         
         if search:
-            employees_query = employees_query.outerjoin(User).filter(
-                db.or_(
-                    Employee.employee_id.ilike(f'%{search}%'),
-                    User.first_name.ilike(f'%{search}%'),
-                    User.last_name.ilike(f'%{search}%'),
-                    Employee.department.ilike(f'%{search}%'),
-                    Employee.position.ilike(f'%{search}%')
-                )
-            )
+            employees_query = employees_query.filter(search_filter(Employee.id, business_id, 'employee', search))
         
         employees = employees_query.filter_by(is_active=True).all()
         
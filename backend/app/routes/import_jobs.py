@@ -0,0 +1,46 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from app.models.import_job import ImportJob
+from app.utils.decorators import manager_required
+from app.utils.middleware import get_business_id
+
+import_jobs_bp = Blueprint('import_jobs', __name__)
+
+@import_jobs_bp.route('/', methods=['GET'])
+@jwt_required()
+@manager_required
+def get_import_jobs():
+    """Recent bulk import jobs for the business, newest first."""
+    try:
+        business_id = get_business_id()
+        kind = request.args.get('kind')
+        limit = min(request.args.get('limit', 20, type=int), 100)
+
+        query = ImportJob.query.filter_by(business_id=business_id)
+        if kind:
+            query = query.filter_by(kind=kind)
+        jobs = query.order_by(ImportJob.created_at.desc(), ImportJob.id.desc()).limit(limit).all()
+
+        # Row-level details are only returned by the single job endpoint
+        return jsonify({'jobs': [{
+            key: value for key, value in job.to_dict().items() if key not in ('errors', 'created')
+        } for job in jobs]}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@import_jobs_bp.route('/<int:job_id>', methods=['GET'])
+@jwt_required()
+@manager_required
+def get_import_job(job_id):
+    """Status and progress of one import job; poll until status is done or failed."""
+    try:
+        business_id = get_business_id()
+        job = ImportJob.query.filter_by(id=job_id, business_id=business_id).first()
+        if not job:
+            return jsonify({'error': 'Import job not found'}), 404
+
+        return jsonify({'job': job.to_dict()}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -5,13 +5,19 @@ from app.models.user import User
 from app.models.product import Product
 from app.models.category import Category
 from app.models.supplier import Supplier
-from app.models.inventory_transaction import InventoryTransaction
+from app.models.inventory_transaction import InventoryTransaction, TransactionType
+from app.models.warehouse import Warehouse
+from app.models.stock_level import StockLevel
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
 from datetime import datetime
 import os
 from werkzeug.utils import secure_filename
-from app.utils.notifications import check_low_stock_and_notify, check_expiry_and_notify
+from app.utils.notifications import check_low_stock_and_notify, check_expiry_and_notify, get_low_stock_limit
+from app.utils.serialization import with_load_plan, serialize, requested_fields
+from app.utils.bulk_import import submit_import, background_requested
+from app.utils.stock_ledger import record_movements, branch_stock, available_stock
+from app.utils.search_index import search_filter
 
 inventory_bp = Blueprint('inventory', __name__)
 
@@ -34,14 +40,7 @@ def get_products():
         query = Product.query.filter_by(business_id=business_id)
         
         if search:
-            query = query.filter(
-                db.or_(
-                    Product.product_id.contains(search.upper()),
-                    Product.name.contains(search),
-                    Product.sku.contains(search),
-                    Product.barcode.contains(search)
-                )
-            )
+            query = query.filter(search_filter(Product.id, business_id, 'product', search))
         
         if category_id:
             query = query.filter(Product.category_id == category_id)
@@ -53,15 +52,8 @@ def get_products():
             query = query.filter(Product.is_active == (is_active.lower() == 'true'))
         
         if low_stock:
-            # Get configurable low stock limit from system settings
-            from app.models.settings import SystemSetting
-            low_stock_setting = SystemSetting.query.filter_by(
-                business_id=business_id, 
-                setting_key='low_stock_limit'
-            ).first()
-            
-            # Default to 20 if not set
-            low_stock_limit = int(low_stock_setting.setting_value) if low_stock_setting else 20
+            # Get configurable low stock limit from system settings (default 20)
+            low_stock_limit = get_low_stock_limit(business_id)
             
             # Filter products with stock quantity <= low stock limit
             query = query.filter(
@@ -71,12 +63,12 @@ def get_products():
                 )
             )
         
-        products = query.order_by(Product.created_at.desc()).paginate(
+        products = with_load_plan(query, 'product').order_by(Product.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'products': [product.to_dict() for product in products.items],
+            'products': serialize(products.items, requested_fields()),
             'total': products.total,
             'pages': products.pages,
             'current_page': page
@@ -167,6 +159,10 @@ def create_product():
             brand=data.get('brand')
         )
         db.session.add(product)
+        db.session.flush()
+        record_movements(business_id, get_jwt_identity(), TransactionType.ADJUSTMENT_IN,
+                         {product.id: int(product.stock_quantity or 0)}, branch_id=branch_id,
+                         reference_id=product.product_id, notes='Opening stock')
         db.session.commit()
 
         # Check for low stock and expiry and notify
@@ -262,6 +258,13 @@ def update_product(product_id):
         if 'unit_of_measure' in data:
             product.unit_of_measure = data['unit_of_measure']
         if 'stock_quantity' in data:
+            # Setting the level directly is recorded as an adjustment by the difference
+            change = int(data['stock_quantity']) - int(product.stock_quantity or 0)
+            record_movements(business_id, get_jwt_identity(),
+                             TransactionType.ADJUSTMENT_IN if change > 0 else TransactionType.ADJUSTMENT_OUT,
+                             {product.id: abs(change)},
+                             branch_id=request.args.get('branch_id', type=int) or get_active_branch_id(),
+                             reference_id=product.product_id, notes='Stock level edited')
             product.stock_quantity = data['stock_quantity']
         if 'reorder_level' in data:
             product.reorder_level = data['reorder_level']
@@ -517,6 +520,10 @@ def adjust_stock():
         
         adjustment_type = data['adjustment_type'].upper()
         quantity = data['quantity']
+
+        warehouse_id = data.get('warehouse_id')
+        if warehouse_id and not Warehouse.query.filter_by(id=warehouse_id, business_id=business_id).first():
+            return jsonify({'error': 'Warehouse not found for this business'}), 404
         
         if adjustment_type == 'IN':
             product.stock_quantity += quantity
@@ -529,35 +536,11 @@ def adjust_stock():
         
         product.updated_at = datetime.utcnow()
         
-        # Create an inventory transaction record
-        from app.models.inventory_transaction import InventoryTransaction, TransactionType
-        
+        # Record the movement (updates the branch/warehouse stock level on flush)
         transaction_type = TransactionType.ADJUSTMENT_IN if adjustment_type == 'IN' else TransactionType.ADJUSTMENT_OUT
-        
-        # Generate transaction ID
-        last_transaction = InventoryTransaction.query.filter_by(business_id=business_id).order_by(InventoryTransaction.id.desc()).first()
-        if last_transaction:
-            try:
-                last_id = int(last_transaction.transaction_id[3:])  # Remove 'ITX' prefix
-                transaction_id = f'ITX{last_id + 1:04d}'
-            except:
-                transaction_id = f'ITX{datetime.now().strftime("%Y%m%d%H%M%S")}'
-        else:
-            transaction_id = 'ITX0001'
-        
-        transaction = InventoryTransaction(
-            business_id=business_id,
-            branch_id=branch_id,
-            transaction_id=transaction_id,
-            product_id=product.id,
-            transaction_type=transaction_type,
-            quantity=quantity,
-            reference_id=data.get('reason', ''),
-            notes=data.get('reason', ''),
-            created_by=get_jwt_identity()
-        )
-        
-        db.session.add(transaction)
+        record_movements(business_id, get_jwt_identity(), transaction_type, {product.id: quantity},
+                         branch_id=branch_id, warehouse_id=warehouse_id or None,
+                         reference_id=data.get('reason', ''), notes=data.get('reason', ''))
         db.session.commit()
         
         # Check for low stock and expiry and notify
@@ -608,12 +591,12 @@ def get_inventory_transactions():
             end_dt = datetime.strptime(end_date, '%Y-%m-%d')
             query = query.filter(InventoryTransaction.created_at <= end_dt)
         
-        transactions = query.order_by(InventoryTransaction.created_at.desc()).paginate(
+        transactions = with_load_plan(query, 'inventory_transaction').order_by(InventoryTransaction.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'transactions': [tx.to_dict() for tx in transactions.items],
+            'transactions': serialize(transactions.items, requested_fields()),
             'total': transactions.total,
             'pages': transactions.pages,
             'current_page': page
@@ -623,11 +606,73 @@ def get_inventory_transactions():
         return jsonify({'error': str(e)}), 500
 
 
+# Stock on hand per branch / warehouse (stock ledger)
+@inventory_bp.route('/stock-levels', methods=['GET'])
+@jwt_required()
+def get_stock_levels():
+    """
+    With ?product_ids=1,2,3 answers availability at ?branch_id= /
+    ?warehouse_id= (summed over the other one when omitted) as
+    {'stock': {product_id: quantity}}, e.g. for POS checks. Otherwise lists
+    the levels there, ?low_stock=true keeping those at or below the
+    product's reorder level or the low stock limit.
+    """
+    try:
+        business_id = get_business_id()
+        branch_id = request.args.get('branch_id', type=int)
+        warehouse_id = request.args.get('warehouse_id', type=int)
+
+        product_ids = request.args.get('product_ids')
+        if product_ids:
+            try:
+                ids = [int(value) for value in product_ids.split(',') if value.strip()]
+            except ValueError:
+                return jsonify({'error': 'product_ids must be a comma-separated list of ids'}), 400
+            stock = available_stock(business_id, ids[:500], branch_id=branch_id, warehouse_id=warehouse_id)
+            return jsonify({'stock': {str(product_id): quantity for product_id, quantity in stock.items()}}), 200
+
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
+
+        query = db.session.query(StockLevel, Product.name, Product.sku, Product.reorder_level).join(
+            Product, Product.id == StockLevel.product_id
+        ).filter(StockLevel.business_id == business_id)
+        if branch_id is not None:
+            query = query.filter(StockLevel.branch_id == branch_id)
+        if warehouse_id is not None:
+            query = query.filter(StockLevel.warehouse_id == warehouse_id)
+        if request.args.get('low_stock', '').lower() == 'true':
+            query = query.filter(db.or_(
+                StockLevel.quantity <= get_low_stock_limit(business_id),
+                StockLevel.quantity <= Product.reorder_level
+            ))
+
+        levels = query.order_by(StockLevel.quantity, StockLevel.product_id).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return jsonify({
+            'stock_levels': [{
+                **level.to_dict(), 'product_name': name, 'sku': sku, 'reorder_level': reorder_level
+            } for level, name, sku, reorder_level in levels.items],
+            'total': levels.total,
+            'pages': levels.pages,
+            'current_page': page
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # Bulk upload products via CSV
 @inventory_bp.route('/products/bulk-upload', methods=['POST'])
 @admin_required
 @manager_required
 def bulk_upload_products():
+    """
+    Bulk upload products from a CSV file (see product_bulk_sample.csv).
+    Small files are imported before responding; larger ones return 202 with
+    an import job to poll at /api/import-jobs/<id>.
+    """
     try:
         business_id = get_business_id()
         branch_id = request.args.get('branch_id', type=int) or get_active_branch_id()
@@ -643,239 +688,9 @@ def bulk_upload_products():
         if not file.filename.lower().endswith('.csv'):
             return jsonify({'error': 'Only CSV files are supported. Please upload a .csv file'}), 400
 
-        content = file.read().decode('utf-8-sig')
-
-        import csv
-        reader = csv.DictReader(content.splitlines())
-
-        created = []
-        errors = []
-        row_num = 1
-        for row in reader:
-            row_num += 1
-            # Basic validation
-            name = row.get('name') or row.get('product_name')
-            if not name:
-                errors.append({'row': row_num, 'error': 'Missing product name'})
-                continue
-
-            # Category: allow category_id or category_name
-            category_id = None
-            if row.get('category_id'):
-                try:
-                    category_id = int(row.get('category_id'))
-                    cat = Category.query.filter_by(id=category_id, business_id=business_id).first()
-                    if not cat:
-                        errors.append({'row': row_num, 'error': f'Category id {category_id} not found for this business'})
-                        continue
-                except ValueError:
-                    errors.append({'row': row_num, 'error': 'Invalid category_id format'})
-                    continue
-            elif row.get('category'):
-                cat_name = row.get('category').strip()
-                cat = Category.query.filter_by(name=cat_name, business_id=business_id).first()
-                if cat:
-                    category_id = cat.id
-                else:
-                    # Auto-create category if it doesn't exist
-                    try:
-                        new_cat = Category(
-                            business_id=business_id,
-                            name=cat_name,
-                            description=f"Auto-created during bulk upload on {datetime.now().strftime('%Y-%m-%d')}"
-                        )
-                        db.session.add(new_cat)
-                        db.session.flush() # Get the ID without committing the whole transaction yet
-                        category_id = new_cat.id
-                    except Exception as e:
-                        errors.append({'row': row_num, 'error': f"Failed to create category '{cat_name}': {str(e)}"})
-                        continue
-            else:
-                # No category provided, create or use default "Uncategorized" category
-                default_cat = Category.query.filter_by(name='Uncategorized', business_id=business_id).first()
-                if default_cat:
-                    category_id = default_cat.id
-                else:
-                    try:
-                        default_cat = Category(
-                            business_id=business_id,
-                            name='Uncategorized',
-                            description='Default category for products without a specified category'
-                        )
-                        db.session.add(default_cat)
-                        db.session.flush() # Get the ID without committing the whole transaction yet
-                        category_id = default_cat.id
-                    except Exception as e:
-                        errors.append({'row': row_num, 'error': f"Failed to create default category: {str(e)}"})
-                        continue
-
-            # Unit price
-            try:
-                unit_price_val = row.get('unit_price')
-                if unit_price_val is None or unit_price_val == '':
-                    unit_price = 0.0
-                else:
-                    unit_price = float(unit_price_val)
-            except (ValueError, TypeError):
-                errors.append({'row': row_num, 'error': f'Invalid unit_price: {row.get("unit_price")}'})
-                continue
-
-            # Stock quantity
-            try:
-                stock_quantity_val = row.get('stock_quantity')
-                if stock_quantity_val is None or stock_quantity_val == '':
-                    stock_quantity = 0
-                else:
-                    stock_quantity = int(float(stock_quantity_val))
-            except (ValueError, TypeError):
-                errors.append({'row': row_num, 'error': f'Invalid stock_quantity: {row.get("stock_quantity")}'})
-                continue
-
-            # Other fields
-            product_id = row.get('product_id')
-            sku = row.get('sku')
-            barcode = row.get('barcode')
-            description = row.get('description')
-            
-            # Safely parse cost_price
-            try:
-                cost_price_val = row.get('cost_price')
-                if cost_price_val is None or cost_price_val == '':
-                    cost_price = None
-                else:
-                    cost_price = float(cost_price_val)
-            except (ValueError, TypeError):
-                errors.append({'row': row_num, 'error': f'Invalid cost_price: {row.get("cost_price")}'})
-                continue
-            
-            # Safely parse reorder_level
-            try:
-                reorder_level_val = row.get('reorder_level')
-                if reorder_level_val is None or reorder_level_val == '':
-                    reorder_level = 0
-                else:
-                    reorder_level = int(float(reorder_level_val))
-            except (ValueError, TypeError):
-                errors.append({'row': row_num, 'error': f'Invalid reorder_level: {row.get("reorder_level")}'})
-                continue
-            
-            # Parse other optional fields
-            unit_of_measure = row.get('unit_of_measure')
-            
-            # Safely parse min_stock_level
-            try:
-                min_stock_level_val = row.get('min_stock_level')
-                if min_stock_level_val is None or min_stock_level_val == '':
-                    min_stock_level = 0
-                else:
-                    min_stock_level = int(float(min_stock_level_val))
-            except (ValueError, TypeError):
-                errors.append({'row': row_num, 'error': f'Invalid min_stock_level: {row.get("min_stock_level")}'})
-                continue
-            
-            # Safely parse max_stock_level
-            try:
-                max_stock_level_val = row.get('max_stock_level')
-                if max_stock_level_val is None or max_stock_level_val == '':
-                    max_stock_level = None
-                else:
-                    max_stock_level = int(float(max_stock_level_val))
-            except (ValueError, TypeError):
-                errors.append({'row': row_num, 'error': f'Invalid max_stock_level: {row.get("max_stock_level")}'})
-                continue
-            
-            # Safely parse weight
-            try:
-                weight_val = row.get('weight')
-                if weight_val is None or weight_val == '':
-                    weight = None
-                else:
-                    weight = float(weight_val)
-            except (ValueError, TypeError):
-                errors.append({'row': row_num, 'error': f'Invalid weight: {row.get("weight")}'})
-                continue
-            
-            dimensions = row.get('dimensions')
-            color = row.get('color')
-            size = row.get('size')
-            brand = row.get('brand')
-            # Ignore expiry_date in bulk upload
-            is_active = row.get('is_active', 'true').lower() in ['true', '1', 'yes', 'on'] if row.get('is_active') else True
-
-            # Uniqueness checks
-            if product_id:
-                existing = Product.query.filter_by(business_id=business_id, product_id=product_id).first()
-                if existing:
-                    errors.append({'row': row_num, 'error': f'Product ID {product_id} already exists for this business'})
-                    continue
-
-            if sku:
-                existing = Product.query.filter_by(business_id=business_id, sku=sku).first()
-                if existing:
-                    errors.append({'row': row_num, 'error': f'SKU {sku} already exists for this business'})
-                    continue
-
-            if barcode:
-                existing = Product.query.filter_by(business_id=business_id, barcode=barcode).first()
-                if existing:
-                    errors.append({'row': row_num, 'error': f'Barcode {barcode} already exists for this business'})
-                    continue
-
-            # Generate product_id if missing
-            if not product_id:
-                last_product = Product.query.filter_by(business_id=business_id).order_by(Product.id.desc()).first()
-                if last_product:
-                    try:
-                        last_id = int(last_product.product_id[4:])  # Remove 'PROD' prefix
-                        product_id = f'PROD{last_id + 1:04d}'
-                    except Exception:
-                        product_id = f'PROD{datetime.now().strftime("%Y%m%d%H%M%S")}'
-                else:
-                    product_id = 'PROD0001'
-
-            # Create product
-            product = Product(
-                business_id=business_id,
-                product_id=product_id,
-                name=name,
-                description=description or '',
-                sku=sku,
-                barcode=barcode,
-                category_id=category_id,
-                unit_price=unit_price,
-                cost_price=cost_price,
-                unit_of_measure=unit_of_measure,
-                stock_quantity=stock_quantity,
-                reorder_level=reorder_level,
-                min_stock_level=min_stock_level,
-                max_stock_level=max_stock_level,
-                weight=weight,
-                dimensions=dimensions,
-                color=color,
-                size=size,
-                brand=brand,
-                is_active=is_active
-            )
-
-            try:
-                db.session.add(product)
-                db.session.commit()
-                
-                # Check for low stock and expiry and notify after each product is created
-                try:
-                    check_low_stock_and_notify(product)
-                    check_expiry_and_notify(product)
-                except Exception as notify_error:
-                    # Log notification errors but don't fail the entire upload
-                    print(f"Notification error for product {product.name}: {str(notify_error)}")
-                
-                created.append(product.to_dict())
-            except Exception as e:
-                db.session.rollback()
-                errors.append({'row': row_num, 'error': str(e)})
-                continue
-
-        return jsonify({'created': created, 'errors': errors, 'created_count': len(created)}), 200
+        body, status = submit_import(business_id, get_jwt_identity(), 'products', file,
+                                     branch_id=branch_id, background=background_requested())
+        return jsonify(body), status
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -883,63 +698,41 @@ def bulk_upload_products():
 @inventory_bp.route('/summary', methods=['GET'])
 @admin_required
 def get_inventory_summary():
-    """Get inventory summary including low stock products"""
+    """
+    Get inventory summary including low stock products. With ?branch_id=
+    (or ?warehouse_id=) the stock figures are that location's levels from
+    the stock ledger instead of the business-wide product stock.
+    """
     try:
         business_id = get_business_id()
-        branch_id = request.args.get('branch_id', type=int) or get_active_branch_id()
+        branch_id = request.args.get('branch_id', type=int)
+        warehouse_id = request.args.get('warehouse_id', type=int)
         
-        # Get configurable low stock limit from system settings
-        from app.models.settings import SystemSetting
-        low_stock_setting = SystemSetting.query.filter_by(
-            business_id=business_id, 
-            setting_key='low_stock_limit'
-        ).first()
-        
-        # Default to 20 if not set
-        low_stock_limit = int(low_stock_setting.setting_value) if low_stock_setting else 20
+        # Get configurable low stock limit from system settings (default 20)
+        low_stock_limit = get_low_stock_limit(business_id)
         
         # Get total products count
         total_products = Product.query.filter_by(business_id=business_id, is_active=True).count()
         
-        # Get low stock products count
-        low_stock_query = Product.query.filter(
-            Product.business_id == business_id,
-            Product.is_active == True,
-            db.or_(
-                Product.stock_quantity <= low_stock_limit,
-                Product.stock_quantity <= Product.reorder_level
-            )
-        )
-        if branch_id:
-            low_stock_query = low_stock_query.filter(Product.branch_id == branch_id)
+        stock = Product.stock_quantity
+        base_query = Product.query.filter(Product.business_id == business_id, Product.is_active == True)
+        if branch_id or warehouse_id:
+            levels = branch_stock(business_id, branch_id=branch_id, warehouse_id=warehouse_id)
+            stock = db.func.coalesce(levels.c.quantity, 0)
+            base_query = base_query.outerjoin(levels, levels.c.product_id == Product.id)
         
-        low_stock_products = low_stock_query.all()
-        low_stock_count = len(low_stock_products)
+        # Get low stock products
+        low_stock_query = base_query.filter(db.or_(stock <= low_stock_limit, stock <= Product.reorder_level))
+        low_stock_count = low_stock_query.count()
+        low_stock_products = low_stock_query.add_columns(stock).order_by(stock, Product.id).limit(10).all()
         
         # Get out of stock products
-        out_of_stock_query = Product.query.filter_by(
-            business_id=business_id, 
-            is_active=True, 
-            stock_quantity=0
-        )
-        if branch_id:
-            out_of_stock_query = out_of_stock_query.filter(Product.branch_id == branch_id)
-        
-        out_of_stock_products = out_of_stock_query.all()
-        out_of_stock_count = len(out_of_stock_products)
+        out_of_stock_count = base_query.filter(stock <= 0).count()
         
         # Calculate total stock value
-        from sqlalchemy import func
-        total_value_query = db.session.query(
-            func.sum(Product.stock_quantity * Product.unit_price)
-        ).filter(
-            Product.business_id == business_id,
-            Product.is_active == True
-        )
-        if branch_id:
-            total_value_query = total_value_query.filter(Product.branch_id == branch_id)
-        
-        total_stock_value = total_value_query.scalar() or 0.0
+        total_stock_value = base_query.with_entities(
+            db.func.sum(stock * Product.unit_price)
+        ).scalar() or 0.0
         
         summary = {
             'total_products': total_products,
@@ -951,11 +744,11 @@ def get_inventory_summary():
                 {
                     'id': p.id,
                     'name': p.name,
-                    'stock_quantity': p.stock_quantity,
+                    'stock_quantity': int(quantity or 0),
                     'reorder_level': p.reorder_level,
                     'unit_price': float(p.unit_price) if p.unit_price else 0.0
                 }
-                for p in low_stock_products[:10]  # Show first 10 low stock items
+                for p, quantity in low_stock_products  # First 10 low stock items, lowest stock first
             ]
         }
         
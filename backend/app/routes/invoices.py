@@ -7,6 +7,8 @@ from app.models.order import Order
 from app.models.invoice import Invoice, InvoiceStatus
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.serialization import with_load_plan, serialize, requested_fields
+from app.utils.sequences import next_id
 from datetime import datetime, timedelta
 import re
 
@@ -58,12 +60,12 @@ def get_invoices():
         if date_to:
             query = query.filter(Invoice.issue_date <= date_to)
 
-        invoices = query.order_by(Invoice.created_at.desc()).paginate(
+        invoices = with_load_plan(query, 'invoice').order_by(Invoice.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
 
         return jsonify({
-            'invoices': [invoice.to_dict() for invoice in invoices.items],
+            'invoices': serialize(invoices.items, requested_fields()),
             'total': invoices.total,
             'pages': invoices.pages,
             'current_page': page
@@ -121,15 +123,7 @@ def create_invoice():
             customer = None
 
         # Generate invoice ID (e.g., INV0001)
-        last_invoice = Invoice.query.filter_by(business_id=business_id).order_by(Invoice.id.desc()).first()
-        if last_invoice:
-            try:
-                last_id = int(last_invoice.invoice_id[3:])  # Remove 'INV' prefix
-                invoice_id = f'INV{last_id + 1:04d}'
-            except:
-                invoice_id = f'INV{datetime.now().strftime("%Y%m%d%H%M%S")}'
-        else:
-            invoice_id = 'INV0001'
+        invoice_id = next_id(business_id, 'INV')
 
         # Calculate totals
         subtotal = data.get('subtotal', 0)
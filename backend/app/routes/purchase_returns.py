@@ -7,8 +7,10 @@ from app.models.purchase_order import PurchaseOrder
 from app.models.product import Product
 from app.models.purchase_return import PurchaseReturn, PurchaseReturnItem, PurchaseReturnStatus
 from app.models.audit_log import create_audit_log, AuditAction
+from app.models.inventory_transaction import TransactionType
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.stock_ledger import record_movements
 from datetime import datetime, timedelta
 import re
 
@@ -206,6 +208,7 @@ def create_purchase_return():
         )
 
         # Add items to return and handle inventory reduction
+        returned = {}
         for item in return_items:
             return_obj.return_items.append(item)
             
@@ -213,8 +216,12 @@ def create_purchase_return():
             product = Product.query.filter_by(id=item.product_id, business_id=business_id).first()
             if product:
                 product.stock_quantity -= item.quantity
+                returned[product.id] = returned.get(product.id, 0) + item.quantity
                 print(f"Reduced {item.quantity} units from product {product.name} (ID: {product.id}) for supplier return")
 
+        record_movements(business_id, int(get_jwt_identity()), TransactionType.ADJUSTMENT_OUT, returned,
+                         branch_id=branch_id, reference_id=return_id, notes='Returned to supplier')
+
         db.session.add(return_obj)
         db.session.flush() # Get return ID
 
@@ -345,11 +352,16 @@ def delete_purchase_return(return_id):
             return jsonify({'error': 'Purchase return not found'}), 404
 
         # Restore inventory before deleting
+        restored = {}
         for item in return_obj.return_items:
             product = Product.query.filter_by(id=item.product_id, business_id=business_id).first()
             if product:
                 product.stock_quantity += item.quantity
+                restored[product.id] = restored.get(product.id, 0) + item.quantity
                 print(f"Restored {item.quantity} units to product {product.name} (ID: {product.id})")
+        record_movements(business_id, int(get_jwt_identity()), TransactionType.ADJUSTMENT_IN, restored,
+                         branch_id=return_obj.branch_id, reference_id=return_obj.return_id,
+                         notes='Supplier return deleted')
 
         db.session.delete(return_obj)
         db.session.commit()
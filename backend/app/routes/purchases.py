@@ -7,6 +7,10 @@ from app.models.product import Product
 from app.models.purchase_order import PurchaseOrder, PurchaseOrderItem, PurchaseOrderStatus
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.sequences import next_id, advance_sequence
+from app.models.inventory_transaction import TransactionType
+from app.models.warehouse import Warehouse
+from app.utils.stock_ledger import record_movements
 from datetime import datetime
 
 purchases_bp = Blueprint('purchases', __name__)
@@ -99,20 +103,11 @@ def create_purchase_order():
         
         # Use provided order_id if available, otherwise generate one
         order_id = data.get('order_id')
-        if not order_id:
-            last_order = PurchaseOrder.query.filter_by(business_id=business_id).order_by(PurchaseOrder.id.desc()).first()
-            if last_order:
-                try:
-                    # Try to extract number from order_id if it follows POxxxx format
-                    if last_order.order_id.startswith('PO'):
-                        last_id = int(last_order.order_id[2:])
-                        order_id = f'PO{last_id + 1:04d}'
-                    else:
-                        order_id = f'PO{datetime.now().strftime("%Y%m%d%H%M%S")}'
-                except:
-                    order_id = f'PO{datetime.now().strftime("%Y%m%d%H%M%S")}'
-            else:
-                order_id = 'PO0001'
+        if order_id:
+            # Keep generated IDs clear of ones entered by hand
+            advance_sequence(business_id, 'PO', order_id)
+        else:
+            order_id = next_id(business_id, 'PO')
         
         # Validate and process items
         order_items = []
@@ -284,7 +279,13 @@ def receive_goods():
         purchase_order = PurchaseOrder.query.filter_by(id=data['order_id'], business_id=business_id).first()
         if not purchase_order:
             return jsonify({'error': 'Purchase order not found for this business'}), 404
+
+        warehouse_id = data.get('warehouse_id')
+        if warehouse_id and not Warehouse.query.filter_by(id=warehouse_id, business_id=business_id).first():
+            return jsonify({'error': 'Warehouse not found for this business'}), 404
         
+        received = {}
+        unit_prices = {}
         # Process each item in the receipt
         for item_data in data['items']:
             # Find the corresponding order item
@@ -305,6 +306,13 @@ def receive_goods():
             if product:
                 product.stock_quantity += item_data['received_quantity']
                 product.updated_at = datetime.utcnow()
+                received[product.id] = received.get(product.id, 0) + item_data['received_quantity']
+                unit_prices[product.id] = order_item.unit_price
+        
+        # Goods in, at the order's branch and the receiving warehouse
+        record_movements(business_id, get_jwt_identity(), TransactionType.PURCHASE, received,
+                         branch_id=purchase_order.branch_id, warehouse_id=warehouse_id or None,
+                         reference_id=purchase_order.order_id, unit_prices=unit_prices)
         
         # Update order status based on received items
         total_items = len(purchase_order.order_items)
@@ -33,6 +33,12 @@ from app.models.returns import Return, ReturnStatus, ReturnItem
 from sqlalchemy import text
 from app.utils.decorators import staff_required, manager_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.time_series import TimeSeries, day_of_week_expression
+from app.utils.stock_ledger import branch_stock
+from app.utils.exports import (
+    iter_rows, csv_chunks, xlsx_chunks, pdf_chunks, streaming_response,
+    CSV_MIMETYPE, XLSX_MIMETYPE, PDF_MIMETYPE, Workbook
+)
 from datetime import datetime, timedelta, date
 from sqlalchemy import func, desc
 
@@ -230,113 +236,73 @@ def get_sales_report():
             Customer.created_at <= end_date
         ).scalar() or 0
 
-        # Sales Trend
-        sales_trend = []
+        # Sales Trend - daily buckets up to a month, monthly beyond that. Monthly
+        # buckets run through the month of end_date, so a range ending mid-month
+        # gets a trailing partial bucket (e.g. 90 days spans 4 months, not 3)
         delta = end_date - start_date
-        if delta.days <= 31:
-            for i in range(delta.days + 1):
-                d = start_date.date() + timedelta(days=i)
-                trend_query = db.session.query(
-                    func.sum(Order.total_amount).label('revenue'),
-                    func.count(Order.id).label('orders')
-                ).filter(
-                    Order.business_id == business_id,
-                    func.date(Order.created_at) == d,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    trend_query = trend_query.filter(Order.branch_id == branch_id)
-                result = trend_query.first()
-                sales_trend.append({
-                    'period': d.strftime('%b %d'),
-                    'revenue': float(result.revenue or 0),
-                    'orders': int(result.orders or 0)
-                })
-        else:
-            curr = start_date
-            while curr <= end_date:
-                m = curr.month
-                y = curr.year
-                trend_query = db.session.query(
-                    func.sum(Order.total_amount).label('revenue'),
-                    func.count(Order.id).label('orders')
-                ).filter(
-                    Order.business_id == business_id,
-                    func.extract('month', Order.created_at) == m,
-                    func.extract('year', Order.created_at) == y,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    trend_query = trend_query.filter(Order.branch_id == branch_id)
-                result = trend_query.first()
-                sales_trend.append({
-                    'period': curr.strftime('%b %Y'),
-                    'revenue': float(result.revenue or 0),
-                    'orders': int(result.orders or 0)
-                })
-                if curr.month == 12:
-                    curr = curr.replace(year=curr.year + 1, month=1)
-                else:
-                    curr = curr.replace(month=curr.month + 1)
+        granularity = 'day' if delta.days <= 31 else 'month'
+        trend_series = TimeSeries(granularity, start_date, end_date)
 
         # Previous Period Trend
-        previous_sales_trend = []
         prev_delta = end_date - start_date
         prev_start_date = start_date - prev_delta
         prev_end_date = start_date - timedelta(seconds=1)
-
-        if prev_delta.days <= 31:
-            for i in range(prev_delta.days + 1):
-                d = prev_start_date.date() + timedelta(days=i)
-                trend_query = db.session.query(func.sum(Order.total_amount)).filter(
-                    Order.business_id == business_id,
-                    func.date(Order.created_at) == d,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    trend_query = trend_query.filter(Order.branch_id == branch_id)
-                previous_sales_trend.append(float(trend_query.scalar() or 0))
+        if granularity == 'day':
+            # Same number of days as the current trend
+            previous_series = TimeSeries(granularity, prev_start_date, prev_start_date + timedelta(days=prev_delta.days))
         else:
-            curr = prev_start_date
-            while curr <= prev_end_date:
-                m = curr.month
-                y = curr.year
-                trend_query = db.session.query(func.sum(Order.total_amount)).filter(
-                    Order.business_id == business_id,
-                    func.extract('month', Order.created_at) == m,
-                    func.extract('year', Order.created_at) == y,
-                    Order.status.in_(successful_statuses)
-                )
-                if branch_id:
-                    trend_query = trend_query.filter(Order.branch_id == branch_id)
-                previous_sales_trend.append(float(trend_query.scalar() or 0))
-                
-                if curr.month == 12:
-                    curr = curr.replace(year=curr.year + 1, month=1)
-                else:
-                    curr = curr.replace(month=curr.month + 1)
+            previous_series = TimeSeries(granularity, prev_start_date, prev_end_date)
 
-        # Sales by Day of Week
-        sales_by_day = []
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        for i, day_name in enumerate(days):
-            day_query = db.session.query(
+        def trend_rows(series):
+            query = series.query(
+                Order.created_at,
                 func.sum(Order.total_amount).label('revenue'),
                 func.count(Order.id).label('orders')
             ).filter(
                 Order.business_id == business_id,
-                Order.created_at >= start_date,
-                Order.created_at <= end_date,
-                Order.status.in_(successful_statuses),
-                func.extract('dow', Order.created_at) == (i + 1) % 7
+                Order.status.in_(successful_statuses)
             )
             if branch_id:
-                day_query = day_query.filter(Order.branch_id == branch_id)
-            result = day_query.first()
+                query = query.filter(Order.branch_id == branch_id)
+            return series.fetch(query)
+
+        rows = trend_rows(trend_series)
+        sales_trend = [
+            {
+                'period': label,
+                'revenue': float(rows[bucket].revenue or 0) if bucket in rows else 0.0,
+                'orders': int(rows[bucket].orders or 0) if bucket in rows else 0
+            }
+            for bucket, label in zip(trend_series.buckets, trend_series.labels())
+        ]
+
+        previous_rows = trend_rows(previous_series)
+        previous_sales_trend = previous_series.fill(previous_rows, lambda row: float(row.revenue or 0))
+
+        # Sales by Day of Week (0 = Sunday in both PostgreSQL and SQLite)
+        dow = day_of_week_expression(Order.created_at).label('dow')
+        day_query = db.session.query(
+            dow,
+            func.sum(Order.total_amount).label('revenue'),
+            func.count(Order.id).label('orders')
+        ).filter(
+            Order.business_id == business_id,
+            Order.created_at >= start_date,
+            Order.created_at <= end_date,
+            Order.status.in_(successful_statuses)
+        )
+        if branch_id:
+            day_query = day_query.filter(Order.branch_id == branch_id)
+        day_rows = {int(row.dow): row for row in day_query.group_by(dow).all()}
+
+        sales_by_day = []
+        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        for i, day_name in enumerate(days):
+            result = day_rows.get((i + 1) % 7)
             sales_by_day.append({
                 'day': day_name,
-                'revenue': float(result.revenue or 0),
-                'orders': int(result.orders or 0)
+                'revenue': float(result.revenue or 0) if result else 0.0,
+                'orders': int(result.orders or 0) if result else 0
             })
 
         sales_report = {
@@ -371,7 +337,9 @@ def get_sales_report():
 def get_inventory_report():
     try:
         business_id = get_business_id()
-        branch_id = request.args.get('branch_id', type=int) or get_active_branch_id()
+        # Stock figures are business-wide unless a branch or warehouse is asked for explicitly
+        branch_id = request.args.get('branch_id', type=int)
+        warehouse_id = request.args.get('warehouse_id', type=int)
         
         # Get date range parameters
         start_date = request.args.get('start_date')
@@ -381,19 +349,16 @@ def get_inventory_report():
         tp_query = db.session.query(func.count(Product.id)).filter(Product.business_id == business_id)
         total_products = tp_query.scalar()
         
-        ls_query = Product.query.filter(
-            Product.business_id == business_id,
-            Product.stock_quantity <= Product.reorder_level
-        )
-        # Product model does not support branch-specific filtering
-        low_stock_products = ls_query.all()
+        # Per-location levels come from the stock ledger; products without a level there have none
+        stock = Product.stock_quantity
+        product_query = Product.query.filter(Product.business_id == business_id)
+        if branch_id or warehouse_id:
+            levels = branch_stock(business_id, branch_id=branch_id, warehouse_id=warehouse_id)
+            stock = func.coalesce(levels.c.quantity, 0)
+            product_query = product_query.outerjoin(levels, levels.c.product_id == Product.id)
         
-        oos_query = Product.query.filter(
-            Product.business_id == business_id,
-            Product.stock_quantity == 0
-        )
-        # Product model does not support branch-specific filtering
-        out_of_stock_products = oos_query.all()
+        low_stock_products = product_query.filter(stock <= Product.reorder_level).add_columns(stock).all()
+        out_of_stock_products = product_query.filter(stock <= 0).add_columns(stock).all()
         
         # Inventory Value - use cost_price if available, fallback to unit_price
         # Use COALESCE to prefer cost_price, fall back to unit_price
@@ -402,11 +367,7 @@ def get_inventory_report():
             (Product.cost_price.isnot(None), Product.cost_price),
             else_=Product.unit_price
         )
-        iv_query = db.session.query(func.sum(Product.stock_quantity * price_column)).filter(
-            Product.business_id == business_id
-        )
-        # Product model does not support branch-specific filtering
-        inventory_value_result = iv_query.scalar()
+        inventory_value_result = product_query.with_entities(func.sum(stock * price_column)).scalar()
         inventory_value = float(inventory_value_result) if inventory_value_result is not None else 0.0
         
         # Category Distribution
@@ -414,7 +375,7 @@ def get_inventory_report():
             Category.name,
             func.count(Product.id).label('count')
         ).join(Product).filter(Product.business_id == business_id)
-        # Product model does not support branch-specific filtering
+        # Counts products, not stock, so it is the same for every branch
         category_distribution = cd_query.group_by(Category.name).all()
         
         cat_dist = []
@@ -431,8 +392,10 @@ def get_inventory_report():
             'out_of_stock_products': len(out_of_stock_products),
             'inventory_value': float(inventory_value),
             'category_distribution': cat_dist,
-            'low_stock_items': [product.to_dict() for product in low_stock_products],
-            'out_of_stock_items': [product.to_dict() for product in out_of_stock_products]
+            'low_stock_items': [{**product.to_dict(), 'stock_quantity': int(quantity or 0)}
+                                for product, quantity in low_stock_products],
+            'out_of_stock_items': [{**product.to_dict(), 'stock_quantity': int(quantity or 0)}
+                                   for product, quantity in out_of_stock_products]
         }
         
         return jsonify({'inventory_report': inventory_report}), 200
@@ -1170,116 +1133,71 @@ def export_report(report_type):
         # Export inventory/products report
         elif report_type.lower() == 'inventory' or report_type.lower() == 'products':
             # Get all products for the business (or all products for superadmin)
-            if business_id == 0:  # Superadmin sees all products
-                products_query = Product.query
-            else:
-                products_query = Product.query.filter_by(business_id=business_id)
-            products = products_query.all()
+            products_query = db.session.query(
+                Product.product_id, Product.name, Product.sku, Product.barcode,
+                Category.name.label('category_name'), Product.unit_price, Product.cost_price,
+                Product.stock_quantity, Product.reorder_level, Product.min_stock_level,
+                Product.max_stock_level, Product.unit_of_measure, Product.brand, Product.is_active
+            ).outerjoin(Category, Product.category_id == Category.id)
+            if business_id != 0:  # Superadmin sees all products
+                products_query = products_query.filter(Product.business_id == business_id)
+            products_query = products_query.order_by(Product.id)
             
-            # Prepare data for export
-            report_data = []
-            for product in products:
-                report_data.append({
-                    'Product ID': product.product_id,
-                    'Name': product.name,
-                    'SKU': product.sku or '',
-                    'Barcode': product.barcode or '',
-                    'Category': product.category_obj.name if product.category_obj else '',
-                    'Unit Price': float(product.unit_price) if product.unit_price else 0,
-                    'Cost Price': float(product.cost_price) if product.cost_price else 0,
-                    'Stock Quantity': product.stock_quantity,
-                    'Reorder Level': product.reorder_level,
-                    'Min Stock Level': product.min_stock_level,
-                    'Max Stock Level': product.max_stock_level or '',
-                    'Unit of Measure': product.unit_of_measure or '',
-                    'Brand': product.brand or '',
-                    'Is Active': 'Yes' if product.is_active else 'No'
-                })
+            headers = [
+                'Product ID', 'Name', 'SKU', 'Barcode', 'Category', 'Unit Price', 'Cost Price',
+                'Stock Quantity', 'Reorder Level', 'Min Stock Level', 'Max Stock Level',
+                'Unit of Measure', 'Brand', 'Is Active'
+            ]
+            
+            def product_rows():
+                for product in iter_rows(products_query):
+                    yield [
+                        product.product_id,
+                        product.name,
+                        product.sku or '',
+                        product.barcode or '',
+                        product.category_name or '',
+                        float(product.unit_price) if product.unit_price else 0,
+                        float(product.cost_price) if product.cost_price else 0,
+                        product.stock_quantity,
+                        product.reorder_level,
+                        product.min_stock_level,
+                        product.max_stock_level or '',
+                        product.unit_of_measure or '',
+                        product.brand or '',
+                        'Yes' if product.is_active else 'No'
+                    ]
+            
+            filename = f'inventory_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
             
             if format_type == 'csv':
-                output = io.StringIO()
-                if report_data:
-                    writer = csv.DictWriter(output, fieldnames=report_data[0].keys())
-                    writer.writeheader()
-                    writer.writerows(report_data)
-                
-                output.seek(0)
-                return Response(
-                    output.getvalue(),
-                    mimetype='text/csv',
-                    headers={'Content-Disposition': f'attachment; filename=inventory_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'}
-                )
+                return streaming_response(csv_chunks(headers, product_rows()), CSV_MIMETYPE, f'{filename}.csv')
             elif format_type == 'xlsx':
-                if pd is None:
-                    return jsonify({'error': 'Missing required dependency: pandas. Please install it using: pip install pandas openpyxl'}), 500
+                if Workbook is None:
+                    return jsonify({'error': 'Missing required dependency: openpyxl. Please install it using: pip install openpyxl'}), 500
                 
-                df = pd.DataFrame(report_data)
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl'):
-                    df.to_excel(output, sheet_name='Inventory Report', index=False)
-                
-                output.seek(0)
-                return send_file(
-                    output,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    as_attachment=True,
-                    download_name=f'inventory_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-                )
+                chunks = xlsx_chunks('Inventory Report', headers, product_rows())
+                return streaming_response(chunks, XLSX_MIMETYPE, f'{filename}.xlsx')
             elif format_type == 'pdf':
                 if canvas is None:
                     return jsonify({'error': 'Missing required dependency: reportlab. Please install it using: pip install reportlab'}), 500
                 
-                buffer = BytesIO()
-                p = canvas.Canvas(buffer, pagesize=letter)
-                width, height = letter
-                
-                # Title
-                p.setFont("Helvetica-Bold", 16)
-                p.drawString(50, height - 50, "Inventory Report")
-                
-                # Date Range
-                p.setFont("Helvetica", 12)
-                p.drawString(50, height - 70, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                
-                # Summary
-                y_position = height - 100
-                p.setFont("Helvetica-Bold", 12)
-                p.drawString(50, y_position, f"Total Products: {len(products)}")
-                y_position -= 20
-                
-                # Headers
-                p.setFont("Helvetica-Bold", 9)
-                headers = ['Product', 'SKU', 'Price', 'Stock', 'Status']
-                x_positions = [50, 200, 300, 380, 460]
-                for header, x in zip(headers, x_positions):
-                    p.drawString(x, y_position, header)
-                y_position -= 15
-                
-                # Data rows
-                p.setFont("Helvetica", 8)
-                for product in report_data[:30]:  # Limit to 30 rows for PDF
-                    p.drawString(50, y_position, str(product['Name'])[:25])
-                    p.drawString(200, y_position, str(product['SKU'])[:15])
-                    p.drawString(300, y_position, str(product['Unit Price']))
-                    p.drawString(380, y_position, str(product['Stock Quantity']))
-                    p.drawString(460, y_position, 'Active' if product['Is Active'] == 'Yes' else 'Inactive')
-                    y_position -= 12
-                    if y_position < 50:
-                        p.showPage()
-                        y_position = height - 50
-                
-                if len(products) > 30:
-                    p.drawString(50, y_position, f"... and {len(products) - 30} more products")
-                
-                p.save()
-                buffer.seek(0)
-                
-                return send_file(
-                    buffer,
-                    mimetype='application/pdf',
-                    as_attachment=True,
-                    download_name=f'inventory_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+                total_products = products_query.order_by(None).count()
+                columns = [('Product', 50, 25), ('SKU', 200, 15), ('Price', 300, 12), ('Stock', 380, 10), ('Status', 460, 10)]
+                pdf_rows = (
+                    [row[1], row[2], row[5], row[7], 'Active' if row[13] == 'Yes' else 'Inactive']
+                    for row in product_rows()
+                )
+                chunks = pdf_chunks(
+                    "Inventory Report",
+                    columns,
+                    pdf_rows,
+                    subtitle_lines=[
+                        f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                        f"Total Products: {total_products}"
+                    ]
                 )
+                return streaming_response(chunks, PDF_MIMETYPE, f'{filename}.pdf')
 
         # For other report types, return a generic success message
         # In the future, implement specific export functionality for each report type
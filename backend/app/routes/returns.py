@@ -8,8 +8,10 @@ from app.models.invoice import Invoice
 from app.models.product import Product
 from app.models.returns import Return, ReturnItem, ReturnStatus
 from app.models.audit_log import create_audit_log, AuditAction
+from app.models.inventory_transaction import TransactionType
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.stock_ledger import record_movements
 from datetime import datetime
 import re
 
@@ -209,6 +211,7 @@ def create_return():
         )
 
         # Add items to return and handle inventory restoration
+        restocked = {}
         for item in return_items:
             return_obj.return_items.append(item)
             
@@ -216,7 +219,10 @@ def create_return():
             product = Product.query.filter_by(id=item.product_id, business_id=business_id).first()
             if product:
                 product.stock_quantity += item.quantity
+                restocked[product.id] = restocked.get(product.id, 0) + item.quantity
                 print(f"Restored {item.quantity} units to product {product.name} (ID: {product.id})")
+        record_movements(business_id, int(get_jwt_identity()), TransactionType.RETURN, restocked,
+                         branch_id=branch_id, reference_id=return_id, notes=data['reason'])
 
         db.session.add(return_obj)
         db.session.flush() # Get return ID
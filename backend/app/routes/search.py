@@ -0,0 +1,46 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from app.models.user import UserRole
+from app.utils.decorators import staff_required
+from app.utils.middleware import get_business_id
+from app.utils.search_index import search, DEFAULT_LIMIT, TYPES
+from app.utils.tenant_context import get_tenant_context
+
+search_bp = Blueprint('search', __name__)
+
+# Result types staff can see; suppliers and employees need a manager or above
+STAFF_TYPES = {'products', 'customers'}
+
+@search_bp.route('/', methods=['GET'], strict_slashes=False)
+@jwt_required()
+@staff_required
+def typeahead():
+    """Ranked prefix matches across products, customers, suppliers and employees, for search-as-you-type."""
+    try:
+        business_id = get_business_id()
+        q = request.args.get('q', '').strip()
+        limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+        include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
+
+        allowed = set(TYPES) if get_tenant_context().role != UserRole.staff else STAFF_TYPES
+        types_arg = request.args.get('types')
+        if types_arg:
+            types = {name.strip() for name in types_arg.split(',') if name.strip()}
+            unknown = types - set(TYPES)
+            if unknown:
+                return jsonify({'error': f"Invalid types: {', '.join(sorted(unknown))}. "
+                                         f"Must be any of: {', '.join(TYPES)}"}), 400
+            types &= allowed
+        else:
+            types = allowed
+
+        if not types:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+
+        return jsonify({
+            'query': q,
+            'results': search(business_id, q, types=types, limit=limit, include_inactive=include_inactive)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
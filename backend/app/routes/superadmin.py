@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.user import User, UserRole, UserApprovalStatus
@@ -7,8 +7,10 @@ from app.models.branch import Branch
 from app.models.subscription import Subscription, SubscriptionStatus, Plan
 from app.models.settings import SystemSetting
 from app.models.api_integrations import APIClient, APIAccessToken
+from app.models.tenant_export import TenantExport
 from app.utils.decorators import superadmin_required
 from app.utils.email_service import EmailService
+from app.utils.settings_service import get_setting
 from app.models.audit_log import AuditLog, AuditAction
 try:
     from app.utils.audit_log import create_audit_log
@@ -16,11 +18,12 @@ except ImportError:
     def create_audit_log(*args, **kwargs):
         print("Warning: create_audit_log not found, using dummy.")
         pass
-from sqlalchemy import func, desc
+from sqlalchemy import case, func, desc
 try:
     import psutil
 except ImportError:
     psutil = None
+import os
 import platform
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
@@ -32,25 +35,30 @@ superadmin_bp = Blueprint('superadmin', __name__)
 @superadmin_required
 def get_superadmin_stats():
     try:
-        # User stats
-        total_users = User.query.count()
-        active_users = User.query.filter_by(is_active=True).count()
-        users_by_role = db.session.query(User.role, func.count(User.id)).group_by(User.role).all()
+        # User stats: one GROUP BY gives totals, active counts and roles
+        total_users = active_users = 0
         role_counts = {}
-        for role, count in users_by_role:
+        for role, is_active, count in db.session.query(
+            User.role, User.is_active, func.count(User.id)
+        ).group_by(User.role, User.is_active).all():
             # Handle both enum and string roles
-            if hasattr(role, 'value'):
-                role_counts[role.value] = count
-            else:
-                role_counts[str(role)] = count
+            key = role.value if hasattr(role, 'value') else str(role)
+            role_counts[key] = role_counts.get(key, 0) + count
+            total_users += count
+            if is_active:
+                active_users += count
 
         # Business stats
-        total_businesses = Business.query.count()
-        active_businesses = Business.query.filter_by(is_active=True).count()
+        total_businesses, active_businesses = db.session.query(
+            func.count(Business.id),
+            func.coalesce(func.sum(case((Business.is_active.is_(True), 1), else_=0)), 0)
+        ).one()
 
         # Subscription stats
-        total_subscriptions = Subscription.query.count()
-        active_subscriptions = Subscription.query.filter_by(status=SubscriptionStatus.ACTIVE).count()
+        total_subscriptions, active_subscriptions = db.session.query(
+            func.count(Subscription.id),
+            func.coalesce(func.sum(case((Subscription.status == SubscriptionStatus.ACTIVE, 1), else_=0)), 0)
+        ).one()
         total_revenue = db.session.query(func.sum(Plan.price)).join(Subscription).filter(Subscription.status == SubscriptionStatus.ACTIVE).scalar() or 0
 
         stats = {
@@ -757,73 +765,15 @@ def send_broadcast():
 @superadmin_required
 def get_api_analytics():
     try:
-        from app.models.audit_log import AuditLog
-        from datetime import datetime, timedelta
+        from app.utils.api_usage import usage_summary
         
         # Get date range from query params
         days = request.args.get('days', 7, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Get API calls by endpoint
-        api_logs = AuditLog.query.filter(
-            AuditLog.action.like('API%'),
-            AuditLog.created_at >= start_date
-        ).all()
-        
-        # Group by action
-        endpoint_counts = {}
-        for log in api_logs:
-            action = log.action
-            if action not in endpoint_counts:
-                endpoint_counts[action] = {'total': 0, 'by_business': {}}
-            endpoint_counts[action]['total'] += 1
-            
-            # Count by business
-            if log.business_id:
-                if log.business_id not in endpoint_counts[action]['by_business']:
-                    endpoint_counts[action]['by_business'][log.business_id] = 0
-                endpoint_counts[action]['by_business'][log.business_id] += 1
-        
-        # Daily API calls
-        daily_counts = {}
-        for i in range(days):
-            date = (datetime.utcnow() - timedelta(days=i)).strftime('%Y-%m-%d')
-            daily_counts[date] = 0
-        
-        for log in api_logs:
-            date = log.created_at.strftime('%Y-%m-%d')
-            if date in daily_counts:
-                daily_counts[date] += 1
-        
-        # Top businesses by API usage
-        business_api_counts = {}
-        for log in api_logs:
-            if log.business_id:
-                if log.business_id not in business_api_counts:
-                    business_api_counts[log.business_id] = 0
-                business_api_counts[log.business_id] += 1
-        
-        # Get business names
-        top_businesses = []
-        for business_id, count in sorted(business_api_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
-            business = db.session.get(Business, business_id)
-            if business:
-                top_businesses.append({
-                    'business_id': business_id,
-                    'business_name': business.name,
-                    'api_calls': count
-                })
-        
-        analytics = {
-            'total_calls': len(api_logs),
-            'days': days,
-            'endpoint_usage': endpoint_counts,
-            'daily_calls': daily_counts,
-            'top_businesses': top_businesses,
-            'avg_daily_calls': len(api_logs) / days if days > 0 else 0
-        }
+        if days < 1 or days > 366:
+            return jsonify({'error': 'days must be between 1 and 366'}), 400
         
-        return jsonify(analytics), 200
+        # Aggregated in SQL from the hourly per-business usage counters
+        return jsonify(usage_summary(days)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -939,9 +889,9 @@ def get_platform_overview():
         businesses_month = Business.query.filter(Business.created_at >= month_start).count()
         
         # Active sessions (based on recent audit logs)
-        active_users_24h = AuditLog.query.filter(
+        active_users_24h = db.session.query(func.count(func.distinct(AuditLog.user_id))).filter(
             AuditLog.created_at >= now - timedelta(hours=24)
-        ).distinct(AuditLog.user_id).count()
+        ).scalar()
         
         # Subscription breakdown
         subscription_breakdown = {}
@@ -1247,12 +1197,7 @@ def get_system_health():
             health_data['status'] = 'degraded'
         
         # Maintenance mode check
-        maintenance_setting = SystemSetting.query.filter_by(
-            business_id=None,
-            setting_key='maintenance_mode'
-        ).first()
-        
-        health_data['maintenance_mode'] = maintenance_setting.setting_value == 'True' if maintenance_setting else False
+        health_data['maintenance_mode'] = get_setting(None, 'maintenance_mode') == 'True'
         
         return jsonify(health_data), 200
     except Exception as e:
@@ -1404,40 +1349,134 @@ def get_payment_logs():
         return jsonify({'error': str(e)}), 500
 
 
-# Superadmin - Export Business Data
-@superadmin_bp.route('/business/<int:business_id>/export', methods=['GET'])
-@jwt_required()
+# ==================== TENANT EXPORT & RESTORE ====================
+
+# Superadmin - Start a full export of a business (background job)
+@superadmin_bp.route('/business/<int:business_id>/export', methods=['POST'])
+@superadmin_required
 def export_business_data(business_id):
-    """Export all data for a specific business"""
+    """Queue an archive of every table the business owns; poll /exports/<id> for progress."""
     try:
+        from app.utils.tenant_export import create_export_job, is_active, start_tenant_job
+
         business = db.session.get(Business, business_id)
         if not business:
             return jsonify({'error': 'Business not found'}), 404
-        
-        # Gather all data for the business
-        from app.models.user import User
-        from app.models.order import Order
-        from app.models.invoice import Invoice
-        from app.models.product import Product
-        
-        users = User.query.filter_by(business_id=business_id).all()
-        orders = Order.query.filter_by(business_id=business_id).all()
-        invoices = Invoice.query.filter_by(business_id=business_id).all()
-        products = Product.query.filter_by(business_id=business_id).all()
-        
-        export_data = {
-            'business': business.to_dict(),
-            'users': [u.to_dict() for u in users],
-            'orders': [o.to_dict() for o in orders],
-            'invoices': [i.to_dict() for i in invoices],
-            'products': [p.to_dict() for p in products],
-            'exported_at': datetime.utcnow().isoformat()
-        }
-        
-        return jsonify(export_data), 200
+
+        # One export per business at a time
+        running = TenantExport.query.filter_by(business_id=business_id, kind='export').filter(
+            TenantExport.status.in_(('queued', 'running'))
+        ).order_by(TenantExport.id.desc()).first()
+        if running and is_active(running):
+            return jsonify({'message': 'Export already in progress', 'job': running.to_dict()}), 202
+
+        job = create_export_job(business_id, get_jwt_identity())
+        start_tenant_job(job.id)
+        return jsonify({'message': 'Export started', 'job': job.to_dict()}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Superadmin - Latest export of a business
+@superadmin_bp.route('/business/<int:business_id>/export', methods=['GET'])
+@superadmin_required
+def get_business_export(business_id):
+    """The most recent export job for the business, with its download link once done."""
+    try:
+        job = TenantExport.query.filter_by(business_id=business_id, kind='export').order_by(
+            TenantExport.id.desc()
+        ).first()
+        if not job:
+            return jsonify({'error': 'No export found for this business'}), 404
+        return jsonify({'job': job.to_dict()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Superadmin - Export/restore job status
+@superadmin_bp.route('/exports/<int:job_id>', methods=['GET'])
+@superadmin_required
+def get_export_job(job_id):
+    """Status and progress of an export or restore job."""
+    try:
+        job = db.session.get(TenantExport, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'job': job.to_dict()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Superadmin - Resume an interrupted export/restore job
+@superadmin_bp.route('/exports/<int:job_id>/resume', methods=['POST'])
+@superadmin_required
+def resume_export_job(job_id):
+    """Continue a failed or stalled job from its last checkpoint."""
+    try:
+        from app.utils.tenant_export import is_active, start_tenant_job
+
+        job = db.session.get(TenantExport, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        if job.status == 'done':
+            return jsonify({'error': 'Job has already finished'}), 400
+        if is_active(job):
+            return jsonify({'error': 'Job is still running'}), 409
+
+        job.status = 'queued'
+        db.session.commit()
+        start_tenant_job(job.id)
+        return jsonify({'message': 'Job resumed', 'job': job.to_dict()}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Superadmin - Download a finished export
+@superadmin_bp.route('/exports/<int:job_id>/download', methods=['GET'])
+@superadmin_required
+def download_export(job_id):
+    """Stream the export archive."""
+    try:
+        job = db.session.get(TenantExport, job_id)
+        if not job or job.kind != 'export':
+            return jsonify({'error': 'Export not found'}), 404
+        if job.status != 'done' or not job.archive_path or not os.path.exists(job.archive_path):
+            return jsonify({'error': 'Export archive is not available'}), 409
+
+        return send_file(job.archive_path, mimetype='application/x-tar', as_attachment=True,
+                         download_name=f'business_{job.business_id}_export_{job.id}.tar')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Superadmin - Restore a business from an export archive
+@superadmin_bp.route('/restores', methods=['POST'])
+@superadmin_required
+def restore_business_data():
+    """
+    Restore from a finished export job (JSON {"export_id": ...}) or an
+    uploaded archive (multipart field "archive"). Rows that already exist
+    are left untouched.
+    """
+    try:
+        from app.utils.tenant_export import TenantArchiveError, create_restore_job, start_tenant_job
+
+        user_id = get_jwt_identity()
+        try:
+            if 'archive' in request.files:
+                job = create_restore_job(user_id, file=request.files['archive'])
+            else:
+                export_id = (request.get_json(silent=True) or {}).get('export_id')
+                export = db.session.get(TenantExport, export_id) if export_id else None
+                if not export:
+                    return jsonify({'error': 'export_id or an archive file is required'}), 400
+                job = create_restore_job(user_id, export=export)
+        except TenantArchiveError as e:
+            return jsonify({'error': str(e)}), 400
+
+        start_tenant_job(job.id)
+        return jsonify({'message': 'Restore started', 'job': job.to_dict()}), 202
     except Exception as e:
-        import traceback
-        print(f"Error in export_business_data: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
 
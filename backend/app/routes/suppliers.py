@@ -5,6 +5,7 @@ from app.models.user import User
 from app.models.supplier import Supplier
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.search_index import search_filter
 from datetime import datetime
 import re
 import csv
@@ -27,15 +28,7 @@ def get_suppliers():
             query = query.filter_by(branch_id=branch_id)
         
         if search:
-            query = query.filter(
-                db.or_(
-                    Supplier.supplier_id.contains(search.upper()),
-                    Supplier.company_name.contains(search),
-                    Supplier.contact_person.contains(search),
-                    Supplier.email.contains(search),
-                    Supplier.phone.contains(search)
-                )
-            )
+            query = query.filter(search_filter(Supplier.id, business_id, 'supplier', search))
         
         if is_active is not None:
             query = query.filter(Supplier.is_active == (is_active.lower() == 'true'))
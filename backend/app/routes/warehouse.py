@@ -5,6 +5,7 @@ from app.models.user import User
 from app.models.warehouse import Warehouse
 from app.utils.decorators import staff_required, manager_required, admin_required
 from app.utils.middleware import get_business_id, get_active_branch_id
+from app.utils.sequences import next_id
 from datetime import datetime
 import uuid
 
@@ -70,22 +71,14 @@ def create_warehouse():
             if not data.get(field):
                 return jsonify({'error': f'{field} is required'}), 400
         
-        # Generate warehouse ID
-        last_warehouse = Warehouse.query.filter_by(business_id=business_id).order_by(Warehouse.id.desc()).first()
-        if last_warehouse:
-            try:
-                last_id = int(last_warehouse.warehouse_id[3:])  # Remove 'WH-' prefix
-                warehouse_id = f'WH-{last_id + 1:04d}'
-            except:
-                warehouse_id = f'WH-{datetime.now().strftime("%Y%m%d%H%M%S")}'
-        else:
-            warehouse_id = 'WH-0001'
-        
         # Check if warehouse name already exists for this business
         existing_warehouse = Warehouse.query.filter_by(business_id=business_id, name=data['name']).first()
         if existing_warehouse:
             return jsonify({'error': 'Warehouse name already exists for this business'}), 409
         
+        # Generate warehouse ID (e.g., WH-0001)
+        warehouse_id = next_id(business_id, 'WH-')
+        
         # Check if manager exists (if provided)
         manager_id = None
         if data.get('manager_id'):
@@ -0,0 +1,238 @@
+"""
+Background Alert Scanner
+========================
+Raises the system alerts that used to be generated on every poll of
+`GET /communication/notifications`:
+
+- Low stock / out of stock products
+- Pending leave requests
+- Overdue invoices
+
+The scanner runs out of band (see `flask scan-alerts`), one business at a
+time. For each business it loads the candidate rows with a few set-based
+queries, checks them against `AlertDedupeKey` in one indexed lookup, and
+inserts the new notifications for all managers with a single commit.
+"""
+
+from app import db
+from app.models.business import Business
+from app.models.communication import Notification, AlertDedupeKey
+from app.models.customer import Customer
+from app.models.employee import Employee
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.leave_request import LeaveRequest, LeaveStatus
+from app.models.product import Product
+from app.models.user import User, UserRole
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+# An alert for the same entity is raised at most once per window
+DEDUPE_WINDOW = timedelta(days=1)
+
+# Dedupe keys untouched for this long are pruned
+DEDUPE_RETENTION = timedelta(days=30)
+
+_KEY_LOOKUP_CHUNK = 500
+
+
+def claim_alert_keys(business_id: int, keys: List[str], now: Optional[datetime] = None) -> Set[str]:
+    """
+    Return the subset of keys whose alert is due (never raised, or last raised
+    before the dedupe window) and stamp them as alerted at now.
+    Changes are added to the session; the caller commits.
+    """
+    now = now or datetime.utcnow()
+    keys = list(dict.fromkeys(keys))
+
+    existing = {}
+    for i in range(0, len(keys), _KEY_LOOKUP_CHUNK):
+        chunk = keys[i:i + _KEY_LOOKUP_CHUNK]
+        for row in AlertDedupeKey.query.filter(
+            AlertDedupeKey.business_id == business_id,
+            AlertDedupeKey.dedupe_key.in_(chunk)
+        ).all():
+            existing[row.dedupe_key] = row
+
+    cutoff = now - DEDUPE_WINDOW
+    due = set()
+    for key in keys:
+        record = existing.get(key)
+        if record is None:
+            db.session.add(AlertDedupeKey(
+                business_id=business_id,
+                dedupe_key=key,
+                last_alerted_at=now
+            ))
+            due.add(key)
+        elif record.last_alerted_at < cutoff:
+            record.last_alerted_at = now
+            due.add(key)
+    return due
+
+
+class AlertScanner:
+    """Scans businesses for alert conditions and notifies their managers."""
+
+    def __init__(self, now: Optional[datetime] = None):
+        self.now = now or datetime.utcnow()
+
+    # ==================== ALERT CANDIDATES ====================
+
+    def _low_stock_alerts(self, business_id: int) -> List[Dict[str, Any]]:
+        rows = db.session.query(
+            Product.id, Product.name, Product.stock_quantity
+        ).filter(
+            Product.business_id == business_id,
+            Product.stock_quantity <= Product.reorder_level,
+            Product.is_active == True
+        ).all()
+
+        alerts = []
+        for product_id, name, quantity in rows:
+            if quantity == 0:
+                alerts.append({
+                    'key': f"low_stock:{product_id}:out",
+                    'title': "Out of Stock Alert",
+                    'message': f"Product '{name}' is out of stock!",
+                    'type': 'danger'
+                })
+            else:
+                alerts.append({
+                    'key': f"low_stock:{product_id}:low",
+                    'title': "Low Stock Alert",
+                    'message': f"Product '{name}' is low on stock ({quantity}).",
+                    'type': 'warning'
+                })
+        return alerts
+
+    def _pending_leave_alerts(self, business_id: int) -> List[Dict[str, Any]]:
+        rows = db.session.query(
+            LeaveRequest.id, User.first_name, User.last_name
+        ).join(
+            Employee, LeaveRequest.employee_id == Employee.id
+        ).outerjoin(
+            User, Employee.user_id == User.id
+        ).filter(
+            LeaveRequest.business_id == business_id,
+            LeaveRequest.status == LeaveStatus.PENDING
+        ).all()
+
+        return [{
+            'key': f"leave_pending:{leave_id}",
+            'title': "Pending Leave Request",
+            'message': f"New leave request from {first_name or ''} {last_name or ''}.",
+            'type': 'info'
+        } for leave_id, first_name, last_name in rows]
+
+    def _overdue_invoice_alerts(self, business_id: int) -> List[Dict[str, Any]]:
+        rows = db.session.query(
+            Invoice.id, Invoice.invoice_id, Customer.first_name, Customer.last_name
+        ).outerjoin(
+            Customer, Invoice.customer_id == Customer.id
+        ).filter(
+            Invoice.business_id == business_id,
+            Invoice.due_date < self.now.date(),
+            Invoice.status != InvoiceStatus.PAID
+        ).all()
+
+        alerts = []
+        for invoice_pk, invoice_ref, first_name, last_name in rows:
+            if first_name or last_name:
+                message = f"Invoice {invoice_ref} for {first_name} {last_name} is overdue!"
+            else:
+                message = f"Invoice {invoice_ref} is overdue!"
+            alerts.append({
+                'key': f"invoice_overdue:{invoice_pk}",
+                'title': "Overdue Invoice",
+                'message': message,
+                'type': 'danger'
+            })
+        return alerts
+
+    # ==================== DEDUPE ====================
+
+    def _prune_dedupe_keys(self, business_id: int) -> None:
+        AlertDedupeKey.query.filter(
+            AlertDedupeKey.business_id == business_id,
+            AlertDedupeKey.last_alerted_at < self.now - DEDUPE_RETENTION
+        ).delete(synchronize_session=False)
+
+    # ==================== SCANNING ====================
+
+    def scan_business(self, business_id: int) -> int:
+        """
+        Raise any new alerts for one business.
+        Returns the number of distinct alerts raised (not notifications).
+        """
+        candidates = (
+            self._low_stock_alerts(business_id)
+            + self._pending_leave_alerts(business_id)
+            + self._overdue_invoice_alerts(business_id)
+        )
+        if not candidates:
+            self._prune_dedupe_keys(business_id)
+            db.session.commit()
+            return 0
+
+        due_keys = claim_alert_keys(business_id, [a['key'] for a in candidates], self.now)
+        due = [alert for alert in candidates if alert['key'] in due_keys]
+
+        if due:
+            recipient_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
+                User.business_id == business_id,
+                User.role.in_([UserRole.manager, UserRole.admin, UserRole.superadmin])
+            ).all()]
+            db.session.add_all([
+                Notification(
+                    business_id=business_id,
+                    user_id=user_id,
+                    title=alert['title'],
+                    message=alert['message'],
+                    type=alert['type'],
+                    created_at=self.now
+                )
+                for alert in due for user_id in recipient_ids
+            ])
+
+        self._prune_dedupe_keys(business_id)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another scanner raised the same alerts concurrently
+            db.session.rollback()
+            return 0
+
+        if due:
+            from app.utils.notifications import invalidate_unread_count
+            invalidate_unread_count(business_id)
+        return len(due)
+
+    def scan_all(self, batch_size: int = 100) -> Dict[str, int]:
+        """Scan every active business, reading business ids in batches."""
+        stats = {'businesses': 0, 'alerts': 0, 'errors': 0}
+        last_id = 0
+        while True:
+            business_ids = [business_id for (business_id,) in db.session.query(Business.id).filter(
+                Business.is_active == True,
+                Business.id > last_id
+            ).order_by(Business.id).limit(batch_size).all()]
+            if not business_ids:
+                break
+
+            for business_id in business_ids:
+                try:
+                    stats['alerts'] += self.scan_business(business_id)
+                except Exception:
+                    db.session.rollback()
+                    stats['errors'] += 1
+                    logger.exception("Alert scan failed for business %s", business_id)
+                stats['businesses'] += 1
+            last_id = business_ids[-1]
+            # Keep the identity map small across batches
+            db.session.expunge_all()
+        return stats
@@ -7,13 +7,19 @@ import json
 import statistics
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
-from collections import defaultdict, deque
+from collections import Counter, defaultdict
 from dataclasses import dataclass, asdict
 from threading import Lock
-import numpy as np
-from scipy import stats
 from flask import request, g, current_app
 from redis import Redis
+from app.utils.streaming_stats import DecayedRate, P2Quantile, RunningStats
+
+def _percentile(values: List[float], percent: int) -> float:
+    """Percentile with linear interpolation between closest ranks (numpy's default)."""
+    if len(values) < 2:
+        return float(values[0]) if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
 
 @dataclass
 class APIMetric:
@@ -31,83 +37,128 @@ class APIMetric:
     api_key: Optional[str] = None
     error_message: Optional[str] = None
 
+class EndpointStats:
+    """Fixed-memory running statistics for one endpoint and method"""
+    
+    __slots__ = ('response_time', 'request_size', 'error_rate', 'recent_error_rate',
+                 'p95_response_time', 'p99_response_time', 'status_codes')
+    
+    def __init__(self, window_size: int, recent_window: int):
+        self.response_time = RunningStats(span=window_size)
+        self.request_size = RunningStats(span=window_size)
+        self.error_rate = DecayedRate(span=window_size)
+        self.recent_error_rate = DecayedRate(span=recent_window)
+        self.p95_response_time = P2Quantile(0.95)
+        self.p99_response_time = P2Quantile(0.99)
+        self.status_codes = Counter()
+    
+    def add(self, metric: APIMetric):
+        is_error = metric.status_code >= 400
+        self.response_time.add(metric.response_time)
+        if metric.request_size > 0:
+            self.request_size.add(metric.request_size)
+        self.error_rate.add(is_error)
+        self.recent_error_rate.add(is_error)
+        self.p95_response_time.add(metric.response_time)
+        self.p99_response_time.add(metric.response_time)
+        self.status_codes[metric.status_code] += 1
+
 class AnomalyDetector:
-    """Statistical anomaly detection for API metrics"""
+    """
+    Statistical anomaly detection for API metrics.
     
-    def __init__(self, window_size: int = 100, threshold: float = 2.5):
+    Each endpoint keeps streaming statistics (app.utils.streaming_stats)
+    instead of a window of raw metrics, so recording and checking a request
+    is O(1) however busy the endpoint is. Means and deviations decay with a
+    span of `window_size` requests, the recent error rate with a span of
+    `recent_window`; p95/p99 are P-square estimates and min/max cover
+    everything seen.
+    """
+    
+    MIN_OBSERVATIONS = 10  # Need enough data for statistical analysis
+    
+    def __init__(self, window_size: int = 100, threshold: float = 2.5, recent_window: int = 10):
         self.window_size = window_size
         self.threshold = threshold
-        self.metrics_history = defaultdict(lambda: deque(maxlen=window_size))
+        self.recent_window = recent_window
+        self.endpoint_stats: Dict[str, EndpointStats] = {}
         self.lock = Lock()
     
+    def _stats(self, key: str) -> EndpointStats:
+        stats = self.endpoint_stats.get(key)
+        if stats is None:
+            stats = self.endpoint_stats[key] = EndpointStats(self.window_size, self.recent_window)
+        return stats
+    
+    def observe(self, metric: APIMetric) -> List[Dict[str, Any]]:
+        """Check a metric against its endpoint's baseline, then add it to the baseline"""
+        key = f"{metric.endpoint}:{metric.method}"
+        with self.lock:
+            stats = self._stats(key)
+            anomalies = self._check(stats, metric)
+            stats.add(metric)
+        return anomalies
+    
     def add_metric(self, metric: APIMetric):
-        """Add a metric to the history"""
+        """Add a metric to the statistics"""
         with self.lock:
-            key = f"{metric.endpoint}:{metric.method}"
-            self.metrics_history[key].append(metric)
+            self._stats(f"{metric.endpoint}:{metric.method}").add(metric)
     
     def detect_anomalies(self, metric: APIMetric) -> List[Dict[str, Any]]:
-        """Detect anomalies in a metric"""
-        anomalies = []
-        key = f"{metric.endpoint}:{metric.method}"
-        
+        """Detect anomalies in a metric against the current statistics"""
         with self.lock:
-            history = list(self.metrics_history[key])
-        
-        if len(history) < 10:  # Need enough data for statistical analysis
+            stats = self.endpoint_stats.get(f"{metric.endpoint}:{metric.method}")
+            return self._check(stats, metric) if stats else []
+    
+    def _check(self, stats: EndpointStats, metric: APIMetric) -> List[Dict[str, Any]]:
+        anomalies = []
+        response_time = stats.response_time
+        if response_time.count < self.MIN_OBSERVATIONS:
             return anomalies
         
-        # Extract response times
-        response_times = [m.response_time for m in history]
-        
         # Detect response time anomalies
-        if len(response_times) >= 10:
-            mean_rt = statistics.mean(response_times)
-            std_rt = statistics.stdev(response_times) if len(response_times) > 1 else 0
-            
-            if std_rt > 0:
-                z_score = abs(metric.response_time - mean_rt) / std_rt
-                if z_score > self.threshold:
-                    anomalies.append({
-                        'type': 'response_time_anomaly',
-                        'severity': 'high' if z_score > self.threshold * 1.5 else 'medium',
-                        'z_score': z_score,
-                        'mean_response_time': mean_rt,
-                        'std_response_time': std_rt,
-                        'current_response_time': metric.response_time,
-                        'description': f"Response time is {z_score:.2f} standard deviations from normal"
-                    })
+        std_rt = response_time.std
+        if std_rt > 0:
+            z_score = abs(metric.response_time - response_time.mean) / std_rt
+            if z_score > self.threshold:
+                anomalies.append({
+                    'type': 'response_time_anomaly',
+                    'severity': 'high' if z_score > self.threshold * 1.5 else 'medium',
+                    'z_score': z_score,
+                    'mean_response_time': response_time.mean,
+                    'std_response_time': std_rt,
+                    'current_response_time': metric.response_time,
+                    'description': f"Response time is {z_score:.2f} standard deviations from normal"
+                })
         
         # Detect error rate anomalies
-        error_metrics = [m for m in history if m.status_code >= 400]
-        error_rate = len(error_metrics) / len(history)
-        
         if metric.status_code >= 400:
-            recent_error_rate = len([m for m in history[-10:] if m.status_code >= 400]) / min(10, len(history))
+            recent = stats.recent_error_rate
+            # Count this error in, as the recent window would
+            weight = max(recent.alpha, 1.0 / (recent.count + 1))
+            recent_error_rate = recent.rate + weight * (1.0 - recent.rate)
             
             if recent_error_rate > 0.5:  # More than 50% errors in recent requests
                 anomalies.append({
                     'type': 'error_rate_anomaly',
                     'severity': 'high',
                     'error_rate': recent_error_rate,
-                    'recent_errors': len([m for m in history[-10:] if m.status_code >= 400]),
+                    'recent_errors': round(recent_error_rate * self.recent_window),
                     'description': f"High error rate detected: {recent_error_rate:.1%}"
                 })
         
         # Detect request size anomalies
-        request_sizes = [m.request_size for m in history if m.request_size > 0]
-        if len(request_sizes) >= 10 and metric.request_size > 0:
-            mean_size = statistics.mean(request_sizes)
-            std_size = statistics.stdev(request_sizes) if len(request_sizes) > 1 else 0
-            
+        request_size = stats.request_size
+        if request_size.count >= self.MIN_OBSERVATIONS and metric.request_size > 0:
+            std_size = request_size.std
             if std_size > 0:
-                z_score = abs(metric.request_size - mean_size) / std_size
+                z_score = abs(metric.request_size - request_size.mean) / std_size
                 if z_score > self.threshold:
                     anomalies.append({
                         'type': 'request_size_anomaly',
                         'severity': 'medium',
                         'z_score': z_score,
-                        'mean_request_size': mean_size,
+                        'mean_request_size': request_size.mean,
                         'current_request_size': metric.request_size,
                         'description': f"Request size is {z_score:.2f} standard deviations from normal"
                     })
@@ -116,27 +167,21 @@ class AnomalyDetector:
     
     def get_baseline_stats(self, endpoint: str, method: str) -> Dict[str, Any]:
         """Get baseline statistics for an endpoint"""
-        key = f"{endpoint}:{method}"
-        
         with self.lock:
-            history = list(self.metrics_history[key])
-        
-        if len(history) < 2:
-            return {}
-        
-        response_times = [m.response_time for m in history]
-        error_metrics = [m for m in history if m.status_code >= 400]
-        
-        return {
-            'total_requests': len(history),
-            'avg_response_time': statistics.mean(response_times),
-            'min_response_time': min(response_times),
-            'max_response_time': max(response_times),
-            'p95_response_time': np.percentile(response_times, 95),
-            'p99_response_time': np.percentile(response_times, 99),
-            'error_rate': len(error_metrics) / len(history),
-            'status_codes': dict(Counter([m.status_code for m in history]))
-        }
+            stats = self.endpoint_stats.get(f"{endpoint}:{method}")
+            if stats is None or stats.response_time.count < 2:
+                return {}
+            
+            return {
+                'total_requests': stats.response_time.count,
+                'avg_response_time': stats.response_time.mean,
+                'min_response_time': stats.response_time.min,
+                'max_response_time': stats.response_time.max,
+                'p95_response_time': stats.p95_response_time.value,
+                'p99_response_time': stats.p99_response_time.value,
+                'error_rate': stats.error_rate.rate,
+                'status_codes': dict(stats.status_codes)
+            }
 
 class APIMonitor:
     """Comprehensive API monitoring system"""
@@ -177,11 +222,8 @@ class APIMonitor:
             error_message=error_message
         )
         
-        # Add to anomaly detector
-        self.anomaly_detector.add_metric(metric)
-        
-        # Detect anomalies
-        anomalies = self.anomaly_detector.detect_anomalies(metric)
+        # Detect anomalies against the endpoint's baseline, then update it
+        anomalies = self.anomaly_detector.observe(metric)
         
         # Log anomalies
         for anomaly in anomalies:
@@ -300,8 +342,8 @@ class APIMonitor:
             'avg_response_time': statistics.mean(response_times),
             'min_response_time': min(response_times),
             'max_response_time': max(response_times),
-            'p95_response_time': np.percentile(response_times, 95),
-            'p99_response_time': np.percentile(response_times, 99),
+            'p95_response_time': _percentile(response_times, 95),
+            'p99_response_time': _percentile(response_times, 99),
             'error_rate': error_count / len(metrics),
             'error_count': error_count,
             'status_code_distribution': dict(Counter(status_codes)),
@@ -353,7 +395,7 @@ class APIMonitor:
                             'total_requests': total_requests,
                             'avg_response_time': statistics.mean(response_times),
                             'error_rate': error_count / total_requests if total_requests > 0 else 0,
-                            'p95_response_time': np.percentile(response_times, 95)
+                            'p95_response_time': _percentile(response_times, 95)
                         })
             
             # Sort by requested metric
@@ -513,9 +555,6 @@ class APIMonitoringMiddleware:
         
         return response
 
-# Helper function
-from collections import Counter
-
 # Global instance
 api_monitor = APIMonitor()
 api_monitoring_middleware = APIMonitoringMiddleware()
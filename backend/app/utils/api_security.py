@@ -13,17 +13,17 @@ from typing import Dict, Any, Optional, List, Tuple
 from functools import wraps
 from flask import request, jsonify, g, current_app
 from redis import Redis
+from .rate_limiter import MemoryBackend, RateLimiter, RedisBackend
 import ipaddress
-from collections import defaultdict
-import threading
 
 class APIRateLimiter:
     """Advanced rate limiting with multiple strategies"""
     
     def __init__(self, redis_client=None):
         self.redis = redis_client or Redis(decode_responses=True)
-        self.local_cache = defaultdict(list)
-        self.lock = threading.Lock()
+        # Sliding window limits run on the shared engine; Redis errors fall back to per-process counters
+        self.limiter = RateLimiter(RedisBackend(self.redis), MemoryBackend())
+        self.local_limiter = RateLimiter(fallback=self.limiter.fallback)
     
     def is_rate_limited(self, 
                        key: str, 
@@ -76,44 +76,17 @@ class APIRateLimiter:
             return self._local_fallback(key, limit, window, now)
     
     def _sliding_window_check(self, key: str, limit: int, window: int, now: int) -> Tuple[bool, Dict[str, Any]]:
-        """Sliding window rate limiting"""
-        pipe = self.redis.pipeline()
-        window_start = now - window
-        
-        # Remove old entries
-        pipe.zremrangebyscore(f"sliding:{key}", 0, window_start)
-        
-        # Add current request
-        pipe.zadd(f"sliding:{key}", {str(now): now})
-        
-        # Count current requests
-        pipe.zcard(f"sliding:{key}")
-        
-        # Set expiry
-        pipe.expire(f"sliding:{key}", window)
-        
-        try:
-            results = pipe.execute()
-            current = results[2]
-            
-            # Remove oldest if over limit
-            if current > limit:
-                remove_count = current - limit
-                pipe.zremrangebyrank(f"sliding:{key}", 0, remove_count - 1)
-                pipe.execute()
-            
-            remaining = max(0, limit - current)
-            oldest_request = self.redis.zrange(f"sliding:{key}", 0, 0, withscores=True)
-            reset_time = int(oldest_request[0][1]) + window if oldest_request else now + window
-            
-            return current > limit, {
-                'limit': limit,
-                'remaining': remaining,
-                'reset_time': reset_time,
-                'retry_after': reset_time - now if current > limit else 0
-            }
-        except Exception:
-            return self._local_fallback(key, limit, window, now)
+        """Sliding window counter rate limiting (O(1) per request, see app.utils.rate_limiter)"""
+        return self._result(self.limiter.hit(key, limit, window))
+    
+    @staticmethod
+    def _result(result) -> Tuple[bool, Dict[str, Any]]:
+        return not result.allowed, {
+            'limit': result.limit,
+            'remaining': result.remaining,
+            'reset_time': result.reset_at,
+            'retry_after': result.retry_after
+        }
     
     def _token_bucket_check(self, key: str, limit: int, window: int, now: int) -> Tuple[bool, Dict[str, Any]]:
         """Token bucket rate limiting"""
@@ -167,28 +140,8 @@ class APIRateLimiter:
             return self._local_fallback(key, limit, window, now)
     
     def _local_fallback(self, key: str, limit: int, window: int, now: int) -> Tuple[bool, Dict[str, Any]]:
-        """Local memory fallback when Redis fails"""
-        with self.lock:
-            timestamps = self.local_cache[key]
-            
-            # Remove old timestamps
-            timestamps[:] = [t for t in timestamps if t > now - window]
-            
-            if len(timestamps) >= limit:
-                return True, {
-                    'limit': limit,
-                    'remaining': 0,
-                    'reset_time': timestamps[0] + window,
-                    'retry_after': timestamps[0] + window - now
-                }
-            
-            timestamps.append(now)
-            return False, {
-                'limit': limit,
-                'remaining': limit - len(timestamps),
-                'reset_time': now + window,
-                'retry_after': 0
-            }
+        """Per-process sliding window counters when Redis fails"""
+        return self._result(self.local_limiter.hit(key, limit, window))
 
 class IPWhitelistBlacklist:
     """IP whitelist and blacklist management"""
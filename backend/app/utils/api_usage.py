@@ -0,0 +1,256 @@
+"""
+API Usage Counters
+==================
+Hourly API call counts per business and endpoint (`APIUsage`, table
+api_usage_hourly), kept by the request pipeline and read by the
+superadmin analytics.
+
+- `after_request` adds each /api/ call that carries a business (from the
+  JWT claims or the request's tenant context) to an in-process counter
+  keyed by (business, hour, endpoint). This is a dict update with no query.
+- Every `API_USAGE_FLUSH_INTERVAL` seconds, the next request adds the
+  counters to the table, with one upsert on a connection of its own. They
+  are also added at interpreter exit. Counts therefore lag by up to one
+  interval per worker. Counts of businesses deleted in the meantime (the
+  upsert's foreign key fails) are dropped and the rest written. If the
+  upsert fails otherwise, its counts are merged back and retried on the
+  next flush, keeping at most `MAX_PENDING_COUNTERS` keys.
+- `usage_summary()` answers the analytics from GROUP BY queries over the
+  hourly rows. The number of rows it returns does not depend on traffic.
+
+Typical use:
+
+    register_api_usage(app)
+    summary = usage_summary(days=30)
+"""
+
+from app import db
+from app.models.api_usage import APIUsage
+from app.models.business import Business
+from datetime import datetime, timedelta
+from flask import g, request
+from sqlalchemy import desc, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Dict, Optional, Tuple
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 10
+# Counters kept for retry while the table cannot be written; the oldest hours go first
+MAX_PENDING_COUNTERS = 50000
+
+# Analytics response limits
+TOP_BUSINESSES = 10
+TOP_ENDPOINTS = 50
+TOP_BUSINESSES_PER_ENDPOINT = 5
+
+_usage = APIUsage.__table__
+_counters: Dict[Tuple[int, datetime, str], list] = {}
+_counters_lock = threading.Lock()
+_state = {'app': None, 'interval': DEFAULT_FLUSH_INTERVAL, 'last_flush': time.monotonic(), 'exit_flush': False}
+
+
+# ==================== COUNTING ====================
+
+def record(business_id: int, endpoint: str, status_code: int, duration_ms: float,
+           now: Optional[datetime] = None) -> None:
+    """Count one API call in this process."""
+    hour = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    key = (business_id, hour, endpoint[:120])
+    with _counters_lock:
+        counter = _counters.get(key)
+        if counter is None:
+            counter = _counters[key] = [0, 0, 0]
+        counter[0] += 1
+        if status_code >= 400:
+            counter[1] += 1
+        counter[2] += int(duration_ms)
+
+
+def _upsert(conn, rows):
+    dialect = postgresql if conn.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(_usage).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=['business_id', 'hour', 'endpoint'],
+        set_={
+            'request_count': _usage.c.request_count + statement.excluded.request_count,
+            'error_count': _usage.c.error_count + statement.excluded.error_count,
+            'total_duration_ms': _usage.c.total_duration_ms + statement.excluded.total_duration_ms
+        }
+    )
+
+
+def flush_api_usage() -> int:
+    """Add this process's counters to api_usage_hourly; returns the number of rows upserted."""
+    global _counters
+    with _counters_lock:
+        pending, _counters = _counters, {}
+        _state['last_flush'] = time.monotonic()
+    if not pending:
+        return 0
+    rows = [{
+        'business_id': business_id, 'hour': hour, 'endpoint': endpoint,
+        'request_count': requests, 'error_count': errors, 'total_duration_ms': duration
+    } for (business_id, hour, endpoint), (requests, errors, duration) in pending.items()]
+    try:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(_upsert(conn, rows))
+        except IntegrityError:
+            # A business was deleted since its calls were counted: drop its counts
+            with db.engine.begin() as conn:
+                existing = set(conn.execute(select(Business.id).where(
+                    Business.id.in_({row['business_id'] for row in rows})
+                )).scalars())
+                dropped = len(rows)
+                rows = [row for row in rows if row['business_id'] in existing]
+                dropped -= len(rows)
+                if rows:
+                    conn.execute(_upsert(conn, rows))
+            logger.warning(f"Dropped {dropped} API usage counters of deleted businesses")
+        return len(rows)
+    except Exception as e:
+        logger.error(f"Failed to flush {len(rows)} API usage counters: {str(e)}")
+        with _counters_lock:
+            for key, (requests, errors, duration) in pending.items():
+                counter = _counters.setdefault(key, [0, 0, 0])
+                counter[0] += requests
+                counter[1] += errors
+                counter[2] += duration
+            if len(_counters) > MAX_PENDING_COUNTERS:
+                for key in sorted(_counters, key=lambda key: key[1])[:len(_counters) - MAX_PENDING_COUNTERS]:
+                    del _counters[key]
+                logger.warning(f"API usage counters capped at {MAX_PENDING_COUNTERS}; oldest hours dropped")
+        return 0
+
+
+def _request_business_id() -> Optional[int]:
+    context = g.get('tenant_context')
+    if context is not None and context[1] is not None:
+        return context[1].business_id
+    try:
+        from flask_jwt_extended import get_jwt
+        business_id = get_jwt().get('business_id')
+    except Exception:
+        return None
+    try:
+        return int(business_id) if business_id else None
+    except (TypeError, ValueError):
+        return None
+
+
+def register_api_usage(app) -> None:
+    """Count API calls per business from the request pipeline."""
+    _state['app'] = app
+    _state['interval'] = app.config.get('API_USAGE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+    @app.before_request
+    def _start_api_usage_timer():
+        g.api_usage_started = time.perf_counter()
+
+    @app.after_request
+    def _count_api_usage(response):
+        try:
+            started = g.get('api_usage_started')
+            if started is not None and request.endpoint and request.path.startswith('/api/'):
+                business_id = _request_business_id()
+                if business_id:
+                    record(business_id, request.endpoint, response.status_code,
+                           (time.perf_counter() - started) * 1000)
+            if time.monotonic() - _state['last_flush'] >= _state['interval']:
+                flush_api_usage()
+        except Exception as e:
+            # Usage counting must never fail a request
+            logger.error(f"API usage counting failed: {str(e)}")
+        return response
+
+    if not _state['exit_flush']:
+        _state['exit_flush'] = True
+        atexit.register(_flush_at_exit)
+
+
+def _flush_at_exit() -> None:
+    app = _state['app']
+    if app is not None and _counters:
+        with app.app_context():
+            flush_api_usage()
+
+
+# ==================== ANALYTICS ====================
+
+def usage_summary(days: int = 7, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    API usage over the last `days` days: totals, calls per day, the busiest
+    businesses and endpoints. Every part is a GROUP BY over
+    api_usage_hourly with a fixed limit.
+    """
+    now = now or datetime.utcnow()
+    start = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    in_window = APIUsage.hour >= start
+
+    total_calls, error_calls, total_duration = db.session.query(
+        func.coalesce(func.sum(APIUsage.request_count), 0),
+        func.coalesce(func.sum(APIUsage.error_count), 0),
+        func.coalesce(func.sum(APIUsage.total_duration_ms), 0)
+    ).filter(in_window).one()
+
+    daily_calls = {(now - timedelta(days=i)).strftime('%Y-%m-%d'): 0 for i in range(days)}
+    day = func.date(APIUsage.hour)
+    for calls_day, calls in db.session.query(day, func.sum(APIUsage.request_count)).filter(
+        in_window
+    ).group_by(day).all():
+        key = str(calls_day)[:10]
+        if key in daily_calls:
+            daily_calls[key] = int(calls)
+
+    top_businesses = [{
+        'business_id': row.business_id,
+        'business_name': row.name,
+        'api_calls': int(row.calls)
+    } for row in db.session.query(
+        APIUsage.business_id, Business.name, func.sum(APIUsage.request_count).label('calls')
+    ).join(Business, Business.id == APIUsage.business_id).filter(in_window).group_by(
+        APIUsage.business_id, Business.name
+    ).order_by(desc('calls')).limit(TOP_BUSINESSES).all()]
+
+    # Busiest endpoints, each with its busiest businesses (ranked in SQL)
+    per_business = select(
+        APIUsage.endpoint, APIUsage.business_id,
+        func.sum(APIUsage.request_count).label('calls')
+    ).where(in_window).group_by(APIUsage.endpoint, APIUsage.business_id).subquery()
+    ranked = select(
+        per_business.c.endpoint, per_business.c.business_id, per_business.c.calls,
+        func.sum(per_business.c.calls).over(partition_by=per_business.c.endpoint).label('endpoint_total'),
+        func.row_number().over(
+            partition_by=per_business.c.endpoint, order_by=per_business.c.calls.desc()
+        ).label('business_rank')
+    ).subquery()
+    endpoint_rank = func.dense_rank().over(order_by=(ranked.c.endpoint_total.desc(), ranked.c.endpoint))
+    ranked_endpoints = select(
+        ranked.c.endpoint, ranked.c.business_id, ranked.c.calls, ranked.c.endpoint_total,
+        endpoint_rank.label('endpoint_rank')
+    ).where(ranked.c.business_rank <= TOP_BUSINESSES_PER_ENDPOINT).subquery()
+
+    endpoint_usage: Dict[str, Any] = {}
+    for row in db.session.execute(select(ranked_endpoints).where(
+        ranked_endpoints.c.endpoint_rank <= TOP_ENDPOINTS
+    ).order_by(ranked_endpoints.c.endpoint_rank, ranked_endpoints.c.calls.desc())):
+        usage = endpoint_usage.setdefault(row.endpoint, {'total': int(row.endpoint_total), 'by_business': {}})
+        usage['by_business'][row.business_id] = int(row.calls)
+
+    total_calls = int(total_calls)
+    return {
+        'total_calls': total_calls,
+        'error_calls': int(error_calls),
+        'avg_response_ms': round(int(total_duration) / total_calls, 2) if total_calls else 0,
+        'days': days,
+        'endpoint_usage': endpoint_usage,
+        'daily_calls': daily_calls,
+        'top_businesses': top_businesses,
+        'avg_daily_calls': total_calls / days if days > 0 else 0
+    }
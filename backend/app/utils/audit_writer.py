@@ -0,0 +1,324 @@
+"""
+Buffered Audit Writer
+=====================
+Audit log and event log rows are written off the request path:
+
+- `enqueue()` puts a row on an in-process bounded queue and returns. Rows
+  staged with `after_commit=True` wait in session.info until the caller's
+  transaction commits, and are dropped if it rolls back. This replaces the
+  old commit=False behaviour of joining the caller's transaction.
+- A daemon thread drains the queue and bulk-inserts each table's rows with
+  one executemany, when `AUDIT_BATCH_SIZE` rows are waiting or
+  `AUDIT_FLUSH_INTERVAL` seconds have passed. It uses its own engine
+  connection, never the request's session, so a failed insert cannot roll
+  back request state.
+- If a batch fails or takes longer than `AUDIT_SLOW_FLUSH_SECONDS`, the
+  writer is degraded for `AUDIT_DEGRADED_SECONDS`. While degraded, batches
+  are appended to the JSON-lines spool file `AUDIT_SPOOL_FILE` instead of
+  the database. Rows that arrive while the queue is full are spooled too.
+  The first healthy flush afterwards replays the spool, as does
+  `flask replay-audit-spool`.
+- The queue is drained at interpreter exit (atexit). The thread starts on
+  first use and restarts in forked workers.
+
+With AUDIT_WRITER_ASYNC=false, rows are inserted as soon as they are
+enqueued. The insert still uses a separate connection. This mode is for
+scripts and single-connection SQLite databases.
+
+Typical use:
+
+    audit_writer.enqueue(AuditLog.__table__, row)
+    audit_writer.enqueue(EventLog.__table__, row, after_commit=True)
+"""
+
+from app import db
+from datetime import date, datetime
+from enum import Enum
+from sqlalchemy import DateTime, event
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_SLOW_FLUSH_SECONDS = 2.0
+DEFAULT_DEGRADED_SECONDS = 30.0
+DEFAULT_SPOOL_FILE = 'logs/audit_spool.jsonl'
+
+_PENDING = 'audit_writer_rows'
+_STOP = object()
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _decode(table, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Undo `_encode` for a spooled row, using the table's column types."""
+    decoded = {}
+    for key, value in row.items():
+        column = table.columns.get(key)
+        if value is not None and column is not None:
+            enum_class = getattr(column.type, 'enum_class', None)
+            if enum_class is not None:
+                value = enum_class[value]
+            elif isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+        decoded[key] = value
+    return decoded
+
+
+class AuditWriter:
+    """In-process audit/event row buffer with a background bulk-insert flusher."""
+
+    def __init__(self):
+        self.app = None
+        self.queue: Optional[queue.Queue] = None
+        self.thread: Optional[threading.Thread] = None
+        self.pid = None
+        self.degraded_until = 0.0
+        self.stats = {'enqueued': 0, 'written': 0, 'spooled': 0, 'replayed': 0, 'batches': 0}
+        self._start_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.async_writes = app.config.get('AUDIT_WRITER_ASYNC', True)
+        self.queue_size = app.config.get('AUDIT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self.slow_flush_seconds = app.config.get('AUDIT_SLOW_FLUSH_SECONDS', DEFAULT_SLOW_FLUSH_SECONDS)
+        self.degraded_seconds = app.config.get('AUDIT_DEGRADED_SECONDS', DEFAULT_DEGRADED_SECONDS)
+        spool_file = app.config.get('AUDIT_SPOOL_FILE', DEFAULT_SPOOL_FILE)
+        self.spool_file = spool_file if os.path.isabs(spool_file) else os.path.join(app.root_path, '..', spool_file)
+        if not event.contains(Session, 'after_commit', _release_pending):
+            event.listen(Session, 'after_commit', _release_pending)
+            event.listen(Session, 'after_rollback', _discard_pending)
+            atexit.register(self.shutdown)
+
+    # ==================== PRODUCERS ====================
+
+    def enqueue(self, table, row: Dict[str, Any], after_commit: bool = False) -> None:
+        """
+        Buffer one row for `table`. With after_commit=True it is held until
+        the current db.session transaction commits.
+        """
+        if after_commit:
+            db.session.info.setdefault(_PENDING, []).append((table, row))
+            return
+        self.stats['enqueued'] += 1
+        if not self.async_writes:
+            self._write([(table, row)])
+            return
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((table, row))
+        except queue.Full:
+            # Never block a request on a backed-up writer
+            self._spool([(table, row)])
+
+    def _ensure_started(self) -> None:
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        with self._start_lock:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            # Fresh queue in a forked worker: the parent's flusher thread does not exist here
+            self.queue = queue.Queue(maxsize=self.queue_size)
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self.thread.start()
+
+    # ==================== FLUSHER ====================
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Tuple[Any, Dict[str, Any]]] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+            elif not stopping and self._spool_waiting():
+                self.replay_spool()
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """Write everything queued so far and stop the flusher (it restarts on the next enqueue)."""
+        thread = self.thread
+        if thread is None or not thread.is_alive() or self.pid != os.getpid():
+            return
+        self.queue.put(_STOP)
+        thread.join(timeout)
+        self.thread = None
+
+    def shutdown(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Audit writer shutdown flush failed: {str(e)}")
+
+    def _insert(self, table, rows: List[Dict[str, Any]]):
+        """
+        Insert rows with one executemany on a connection of its own.
+        Returns (written, retry, rejected). When the database refuses the
+        data itself (a constraint or type error), the rows are retried one by
+        one and only those that still fail are rejected. Any other error
+        (connection lost, timeout) returns every row for retry.
+        """
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert(), rows)
+            return len(rows), [], []
+        except (IntegrityError, DataError):
+            pass
+        except Exception as e:
+            logger.error(f"Audit writer failed to insert {len(rows)} {table.name} rows: {str(e)}")
+            return 0, rows, []
+
+        written, rejected = 0, []
+        for position, row in enumerate(rows):
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(table.insert(), [row])
+                written += 1
+            except (IntegrityError, DataError):
+                rejected.append(row)
+            except Exception:
+                return written, rows[position:], rejected
+        return written, [], rejected
+
+    def _write(self, batch: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        if time.monotonic() < self.degraded_until:
+            self._spool(batch)
+            return
+        by_table: Dict[Any, List[Dict[str, Any]]] = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+
+        started = time.monotonic()
+        retry: List[Tuple[Any, Dict[str, Any]]] = []
+        with self.app.app_context():
+            for table, rows in by_table.items():
+                written, failed, rejected = self._insert(table, rows)
+                self.stats['written'] += written
+                retry.extend((table, row) for row in failed)
+                if rejected:
+                    self._reject([(table, row) for row in rejected])
+        self.stats['batches'] += 1
+
+        elapsed = time.monotonic() - started
+        if retry or elapsed > self.slow_flush_seconds:
+            if retry:
+                self._spool(retry)
+            self.degraded_until = time.monotonic() + self.degraded_seconds
+            logger.warning(f"Audit writer spooling to {self.spool_file} for {self.degraded_seconds:.0f}s "
+                           f"(flush took {elapsed:.2f}s, {len(retry)} rows failed)")
+        elif self._spool_waiting():
+            self.replay_spool()
+
+    # ==================== SPOOL ====================
+
+    def _spool_waiting(self) -> bool:
+        return time.monotonic() >= self.degraded_until and os.path.exists(self.spool_file)
+
+    def _append(self, path: str, batch: List[Tuple[Any, Dict[str, Any]]]) -> bool:
+        try:
+            with self._spool_lock:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as spool:
+                    for table, row in batch:
+                        spool.write(json.dumps({
+                            'table': table.name,
+                            'row': {key: _encode(value) for key, value in row.items()}
+                        }, default=str) + '\n')
+            return True
+        except Exception as e:
+            logger.error(f"Audit writer failed to write {len(batch)} rows to {path}, dropping them: {str(e)}")
+            return False
+
+    def _spool(self, batch: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        if self._append(self.spool_file, batch):
+            self.stats['spooled'] += len(batch)
+
+    def _reject(self, batch: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        logger.error(f"Audit writer rejected {len(batch)} rows the database refused; "
+                     f"kept in {self.spool_file}.rejected")
+        self._append(f'{self.spool_file}.rejected', batch)
+
+    def replay_spool(self) -> int:
+        """
+        Insert spooled rows into the database; returns how many were written.
+        Rows the database refuses (e.g. their user was deleted since) move to
+        `<spool>.rejected`; rows that fail for other reasons stay spooled.
+        """
+        replaying = f'{self.spool_file}.{os.getpid()}.replay'
+        with self._spool_lock:
+            try:
+                os.replace(self.spool_file, replaying)
+            except FileNotFoundError:
+                return 0
+
+        written = 0
+        with self.app.app_context():
+            tables = db.metadata.tables
+            by_table: Dict[Any, List[Dict[str, Any]]] = {}
+            with open(replaying, encoding='utf-8') as spool:
+                for line in spool:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    table = tables.get(entry['table'])
+                    if table is None:
+                        logger.error(f"Audit spool row for unknown table {entry['table']} dropped")
+                        continue
+                    by_table.setdefault(table, []).append(_decode(table, entry['row']))
+            for table, rows in by_table.items():
+                for start in range(0, len(rows), self.batch_size):
+                    inserted, retry, rejected = self._insert(table, rows[start:start + self.batch_size])
+                    written += inserted
+                    if retry:
+                        # Still failing: put this chunk and the rest back, and stop
+                        self._append(self.spool_file, [(table, row) for row in retry + rows[start + self.batch_size:]])
+                        break
+                    if rejected:
+                        self._reject([(table, row) for row in rejected])
+        os.remove(replaying)
+        self.stats['replayed'] += written
+        return written
+
+
+audit_writer = AuditWriter()
+
+
+def _release_pending(session: Session) -> None:
+    for table, row in session.info.pop(_PENDING, None) or ():
+        audit_writer.enqueue(table, row)
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING, None)
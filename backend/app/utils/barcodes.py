@@ -0,0 +1,250 @@
+"""
+Barcode Service
+===============
+Scanner lookups and barcode generation.
+
+Lookups are answered from a per-business index held in memory: on the
+first scan for a business, one query loads every active product that has
+a barcode or SKU, joined with its category and supplier names, into two
+dicts (barcode -> summary, SKU -> summary). Later scans are dict hits
+checked with one primary key lookup of the product's `updated_at`, instead
+of the joined query.
+
+- A committed product write (new, changed or deleted product) drops the
+  business's index in this process, so the next scan reloads it.
+- Writes from other workers (and checkout's bulk stock UPDATE, which also
+  sets `updated_at`) are caught on the hit: a product whose `updated_at`
+  moved is reloaded on its own before it is returned, so a scan never
+  hands out a stale price. A code missing from the index is looked up in
+  the table before answering not found.
+- At most `MAX_INDEXED_BUSINESSES` indexes are kept (least recently
+  scanned evicted).
+
+Generated barcodes are EAN-13 codes in the GS1 in-store range (prefix 2),
+so they never clash with manufacturer codes. `reserve_barcodes()` draws N
+candidates and checks them against the business's products with a single
+query, so bulk generation does not make a round trip per code.
+
+Typical use:
+
+    product, matched_by = lookup(business_id, scanned_code)
+    codes = reserve_barcodes(business_id, len(products))
+"""
+
+from app import db
+from app.models.category import Category
+from app.models.product import Product
+from app.models.supplier import Supplier
+from app.utils.cache import TTLCache
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Set, Tuple
+import random
+import threading
+
+INDEX_TTL = 60
+MAX_INDEXED_BUSINESSES = 64
+
+# GS1 prefix for restricted (in-store) circulation numbers
+IN_STORE_PREFIX = '2'
+
+_indexes = TTLCache(ttl=INDEX_TTL, maxsize=MAX_INDEXED_BUSINESSES)
+_warm_locks: Dict[int, threading.Lock] = {}
+_warm_locks_guard = threading.Lock()
+_random = random.SystemRandom()
+
+_PENDING = 'barcode_index_businesses'
+
+
+# ==================== EAN-13 ====================
+
+def ean13_check_digit(digits: str) -> str:
+    """Check digit for the first 12 digits of an EAN-13 code."""
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_ean13(code: str) -> bool:
+    return len(code) == 13 and code.isdigit() and ean13_check_digit(code) == code[-1]
+
+
+def _random_ean13() -> str:
+    body = IN_STORE_PREFIX + ''.join(_random.choices('0123456789', k=11))
+    return body + ean13_check_digit(body)
+
+
+def reserve_barcodes(business_id: int, count: int, taken: Optional[Set[str]] = None) -> List[str]:
+    """
+    `count` distinct EAN-13 codes that no product of the business uses.
+
+    Candidates are drawn in batches and checked with one IN query per
+    batch; with 10^11 possible codes a second batch is practically never
+    needed. `taken` adds codes to avoid beyond the database (e.g. ones
+    assigned earlier in the same transaction).
+    """
+    codes: List[str] = []
+    seen = set(taken or ())
+    while len(codes) < count:
+        needed = count - len(codes)
+        candidates = set()
+        while len(candidates) < needed:
+            code = _random_ean13()
+            if code not in seen:
+                candidates.add(code)
+        used = {barcode for (barcode,) in db.session.query(Product.barcode).filter(
+            Product.business_id == business_id, Product.barcode.in_(candidates)
+        ).all()}
+        fresh = sorted(candidates - used)
+        codes.extend(fresh)
+        seen.update(candidates)
+    return codes[:count]
+
+
+# ==================== SCAN INDEX ====================
+
+def _summary(row) -> Dict[str, Any]:
+    """The lookup payload for a product: its columns plus category and supplier names."""
+    return {
+        'id': row.id,
+        'business_id': row.business_id,
+        'product_id': row.product_id,
+        'name': row.name,
+        'description': row.description,
+        'sku': row.sku,
+        'barcode': row.barcode,
+        'category_id': row.category_id,
+        'supplier_id': row.supplier_id,
+        'unit_price': float(row.unit_price) if row.unit_price else 0.0,
+        'cost_price': float(row.cost_price) if row.cost_price else 0.0,
+        'unit_of_measure': row.unit_of_measure,
+        'stock_quantity': row.stock_quantity,
+        'reorder_level': row.reorder_level,
+        'brand': row.brand,
+        'is_active': row.is_active,
+        'image': row.image,
+        'category': {'id': row.category_id, 'name': row.category_name} if row.category_id else None,
+        'supplier': {'id': row.supplier_id, 'name': row.supplier_name} if row.supplier_id else None
+    }
+
+
+def _query_summaries(business_id: int, *criteria) -> list:
+    return db.session.query(
+        Product.id, Product.business_id, Product.product_id, Product.name, Product.description,
+        Product.sku, Product.barcode, Product.category_id, Product.supplier_id, Product.unit_price,
+        Product.cost_price, Product.unit_of_measure, Product.stock_quantity, Product.reorder_level,
+        Product.brand, Product.is_active, Product.image, Product.updated_at,
+        Category.name.label('category_name'), Supplier.company_name.label('supplier_name')
+    ).outerjoin(Category, Category.id == Product.category_id).outerjoin(
+        Supplier, Supplier.id == Product.supplier_id
+    ).filter(
+        Product.business_id == business_id,
+        Product.is_active.is_(True),
+        *criteria
+    ).all()
+
+
+def _put(index, row) -> None:
+    """Add a product row to an index, replacing the product's previous entries."""
+    by_barcode, by_sku, products = index
+    previous = products.get(row.id)
+    if previous is not None:
+        for codes, code in ((by_barcode, previous[1]['barcode']), (by_sku, previous[1]['sku'])):
+            if code and codes.get(code) is previous[1]:
+                del codes[code]
+    summary = _summary(row)
+    if row.barcode:
+        by_barcode[row.barcode] = summary
+    if row.sku:
+        by_sku[row.sku] = summary
+    products[row.id] = (row.updated_at, summary)
+
+
+def _load_index(business_id: int) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]], Dict[int, Tuple]]:
+    """(barcode -> summary, SKU -> summary, product id -> (updated_at, summary)) of the business's active products."""
+    index = ({}, {}, {})
+    for row in _query_summaries(business_id, or_(Product.barcode.isnot(None), Product.sku.isnot(None))):
+        _put(index, row)
+    return index
+
+
+def _index(business_id: int):
+    index = _indexes.get(business_id)
+    if index is None:
+        with _warm_locks_guard:
+            lock = _warm_locks.setdefault(business_id, threading.Lock())
+        # One warm per business at a time; concurrent scans wait for it
+        with lock:
+            index = _indexes.get(business_id)
+            if index is None:
+                index = _load_index(business_id)
+                _indexes.set(business_id, index)
+    return index
+
+
+def _find(index, code: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    by_barcode, by_sku, _ = index
+    product = by_barcode.get(code)
+    if product:
+        return product, 'barcode'
+    product = by_sku.get(code)
+    if product:
+        return product, 'sku'
+    return None, None
+
+
+def lookup(business_id: int, code: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """(product summary, 'barcode' or 'sku') for a scanned code, or (None, None)."""
+    index = _index(business_id)
+    product, matched_by = _find(index, code)
+    if product is not None:
+        # The product may have been changed by another worker since the index was loaded
+        current = db.session.query(Product.updated_at).filter(
+            Product.id == product['id'], Product.business_id == business_id, Product.is_active.is_(True)
+        ).first()
+        if current is not None and current.updated_at == index[2][product['id']][0]:
+            return product, matched_by
+        rows = _query_summaries(business_id, Product.id == product['id'])
+    else:
+        rows = _query_summaries(business_id, or_(Product.barcode == code, Product.sku == code))
+    # Barcode matches win over SKU matches, as in the index
+    rows.sort(key=lambda row: row.barcode != code)
+    if rows and code in (rows[0].barcode, rows[0].sku):
+        _put(index, rows[0])
+        return _find(index, code)
+    if product is None:
+        return None, None
+    # The code no longer leads to the indexed product: reload the business's index
+    invalidate_barcode_index(business_id)
+    return _find(_index(business_id), code)
+
+
+def invalidate_barcode_index(business_id: Optional[int] = None) -> None:
+    """Drop the scan index of one business, or of all when None."""
+    if business_id is None:
+        _indexes.clear()
+    else:
+        _indexes.delete(business_id)
+
+
+def _collect_changes(session: Session, flush_context) -> None:
+    businesses = session.info.setdefault(_PENDING, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Product):
+            businesses.add(obj.business_id)
+
+
+def _apply_invalidations(session: Session) -> None:
+    for business_id in session.info.pop(_PENDING, None) or ():
+        invalidate_barcode_index(business_id)
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def register_barcode_listeners() -> None:
+    """Drop a business's scan index after commits that change its products."""
+    if not event.contains(Session, 'after_flush', _collect_changes):
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'after_commit', _apply_invalidations)
+        event.listen(Session, 'after_rollback', _discard_pending)
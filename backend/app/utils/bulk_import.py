@@ -0,0 +1,629 @@
+"""
+Bulk Import Engine
+==================
+Imports product, customer and employee CSV files in two passes:
+
+1. Validate: rows are read one at a time from the spooled upload. Every
+   lookup a row needs (categories, existing SKUs, barcodes, emails, ids) is
+   answered from dicts and sets loaded once up front, and values taken by
+   earlier rows of the same file are added to them, so duplicates inside
+   the file are caught too. Valid rows become plain column mappings.
+2. Insert: mappings are written with `bulk_insert_mappings` in chunks of
+   `CHUNK_SIZE`, one commit per chunk, updating the job's progress. Each
+   chunk's search documents are written in the same transaction.
+
+Side effects are consolidated: a product import queues a single
+'low_stock.check' outbox event for all new products at or below the low
+stock limit instead of notifying (and emailing) per product.
+
+Small files are imported inside the request; larger ones run in a
+background thread and are tracked through `ImportJob`:
+
+    job = create_import_job(business_id, user_id, 'products', file)
+    if should_run_inline(job):
+        run_import_job(job.id, branch_id=branch_id)
+    else:
+        start_import_job(job.id, branch_id=branch_id)
+"""
+
+from flask import current_app, request
+from app import db
+from app.models.import_job import ImportJob
+from app.utils.search_index import index_imported
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type
+import csv
+import logging
+import os
+import re
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+# Uploads up to this size are imported synchronously by the request
+INLINE_MAX_BYTES = 256 * 1024
+
+# Row errors and created keys kept on the job (counts are always exact)
+MAX_REPORTED_ROWS = 1000
+
+EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), 'bulk_imports')
+
+
+class RowError(ValueError):
+    """A row that fails validation; the message is reported to the user."""
+
+
+# ==================== ROW HELPERS ====================
+
+def iter_csv_rows(path: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """(row number, row) for each data row; row 1 is the header."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row_num, row in enumerate(csv.DictReader(f), 2):
+            yield row_num, row
+
+
+def _header_map(row: Dict[str, str]) -> Dict[str, str]:
+    return {key.strip().lower(): key for key in row if key is not None}
+
+
+def get_value(row: Dict[str, str], headers: Dict[str, str], *candidates: str) -> str:
+    """Stripped value of the first matching header (case-insensitive), or ''."""
+    for candidate in candidates:
+        key = headers.get(candidate.lower())
+        if key is not None and row.get(key) not in (None, ''):
+            return str(row[key]).strip()
+    return ''
+
+
+def parse_float(value: str, field: str, default: Optional[float] = None) -> Optional[float]:
+    if value == '':
+        return default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        raise RowError(f'Invalid {field}: {value}')
+
+
+def parse_int(value: str, field: str, default: Optional[int] = None) -> Optional[int]:
+    if value == '':
+        return default
+    try:
+        return int(float(value))
+    except (ValueError, TypeError):
+        raise RowError(f'Invalid {field}: {value}')
+
+
+def parse_bool(value: str, default: bool = True) -> bool:
+    if value == '':
+        return default
+    return value.lower() in ['true', '1', 'yes', 'on']
+
+
+def next_sequence(values: Set[str], prefix: str, width: int = 4) -> Iterator[str]:
+    """
+    Yield unused ids of the form PREFIX0001, continuing after the highest
+    numeric id already in values.
+    """
+    pattern = re.compile(rf'^{re.escape(prefix)}(\d+)$')
+    highest = max((int(m.group(1)) for m in map(pattern.match, values) if m), default=0)
+    while True:
+        highest += 1
+        candidate = f'{prefix}{highest:0{width}d}'
+        if candidate not in values:
+            yield candidate
+
+
+# ==================== IMPORTERS ====================
+
+class BulkImporter:
+    """
+    Base class for one kind of import. Subclasses set `model` and implement
+    `preload`, `validate_row` and `created_key`.
+    """
+    kind: str = ''
+    model: Type[db.Model] = None
+    user_id: Optional[int] = None  # Who started the job
+
+    def __init__(self, business_id: int, branch_id: Optional[int] = None):
+        self.business_id = business_id
+        self.branch_id = branch_id
+
+    def preload(self) -> None:
+        """Load the lookup dicts and sets used by validate_row."""
+
+    def validate_row(self, row: Dict[str, str], headers: Dict[str, str]) -> Dict[str, Any]:
+        """Return the column mapping for a row or raise RowError."""
+        raise NotImplementedError
+
+    def created_key(self, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        """Identifying fields of a created record, for the job result."""
+        raise NotImplementedError
+
+    def before_insert(self, mappings: List[Dict[str, Any]]) -> None:
+        """Hook run once after validation, before the first chunk is inserted."""
+
+    def after_insert(self, mappings: List[Dict[str, Any]]) -> None:
+        """Hook run after each chunk is inserted, inside its transaction."""
+
+    def finish(self) -> None:
+        """Hook run after the last chunk; changes are committed by the caller."""
+
+
+class ProductImporter(BulkImporter):
+    kind = 'products'
+
+    def __init__(self, business_id: int, branch_id: Optional[int] = None):
+        super().__init__(business_id, branch_id)
+        from app.models.product import Product
+        self.model = Product
+        self.low_stock_product_ids: List[int] = []
+
+    def preload(self) -> None:
+        from app.models.category import Category
+        from app.utils.notifications import get_low_stock_limit
+
+        Product = self.model
+        self.categories_by_id: Set[int] = set()
+        self.categories_by_name: Dict[str, int] = {}
+        for category_id, name in db.session.query(Category.id, Category.name).filter(
+            Category.business_id == self.business_id
+        ).all():
+            self.categories_by_id.add(category_id)
+            self.categories_by_name.setdefault(name, category_id)
+
+        self.product_ids: Set[str] = set()
+        self.skus: Set[str] = set()
+        self.barcodes: Set[str] = set()
+        for product_id, sku, barcode in db.session.query(Product.product_id, Product.sku, Product.barcode).filter(
+            Product.business_id == self.business_id
+        ).all():
+            self.product_ids.add(product_id)
+            if sku:
+                self.skus.add(sku)
+            if barcode:
+                self.barcodes.add(barcode)
+        self._generated_ids = next_sequence(self.product_ids, 'PROD')
+        self.low_stock_limit = get_low_stock_limit(self.business_id)
+
+    def _category(self, row, headers) -> Tuple[Optional[int], Optional[str]]:
+        raw_id = get_value(row, headers, 'category_id')
+        if raw_id:
+            try:
+                category_id = int(raw_id)
+            except ValueError:
+                raise RowError('Invalid category_id format')
+            if category_id not in self.categories_by_id:
+                raise RowError(f'Category id {category_id} not found for this business')
+            return category_id, None
+
+        name = get_value(row, headers, 'category') or 'Uncategorized'
+        if name in self.categories_by_name:
+            return self.categories_by_name[name], None
+        return None, name
+
+    def validate_row(self, row, headers):
+        name = get_value(row, headers, 'name', 'product_name')
+        if not name:
+            raise RowError('Missing product name')
+
+        category_id, category_name = self._category(row, headers)
+
+        mapping = {
+            'business_id': self.business_id,
+            'name': name,
+            'description': get_value(row, headers, 'description'),
+            'sku': get_value(row, headers, 'sku') or None,
+            'barcode': get_value(row, headers, 'barcode') or None,
+            'category_id': category_id,
+            'unit_price': parse_float(get_value(row, headers, 'unit_price'), 'unit_price', 0.0),
+            'cost_price': parse_float(get_value(row, headers, 'cost_price'), 'cost_price'),
+            'unit_of_measure': get_value(row, headers, 'unit_of_measure') or None,
+            'stock_quantity': parse_int(get_value(row, headers, 'stock_quantity'), 'stock_quantity', 0),
+            'reorder_level': parse_int(get_value(row, headers, 'reorder_level'), 'reorder_level', 0),
+            'min_stock_level': parse_int(get_value(row, headers, 'min_stock_level'), 'min_stock_level', 0),
+            'max_stock_level': parse_int(get_value(row, headers, 'max_stock_level'), 'max_stock_level'),
+            'weight': parse_float(get_value(row, headers, 'weight'), 'weight'),
+            'dimensions': get_value(row, headers, 'dimensions') or None,
+            'color': get_value(row, headers, 'color') or None,
+            'size': get_value(row, headers, 'size') or None,
+            'brand': get_value(row, headers, 'brand') or None,
+            'is_active': parse_bool(get_value(row, headers, 'is_active')),
+            '_category_name': category_name,
+        }
+
+        product_id = get_value(row, headers, 'product_id')
+        if product_id and product_id in self.product_ids:
+            raise RowError(f'Product ID {product_id} already exists for this business')
+        if mapping['sku'] and mapping['sku'] in self.skus:
+            raise RowError(f"SKU {mapping['sku']} already exists for this business")
+        if mapping['barcode'] and mapping['barcode'] in self.barcodes:
+            raise RowError(f"Barcode {mapping['barcode']} already exists for this business")
+
+        mapping['product_id'] = product_id or next(self._generated_ids)
+        self.product_ids.add(mapping['product_id'])
+        if mapping['sku']:
+            self.skus.add(mapping['sku'])
+        if mapping['barcode']:
+            self.barcodes.add(mapping['barcode'])
+        return mapping
+
+    def created_key(self, mapping):
+        return {'product_id': mapping['product_id'], 'name': mapping['name']}
+
+    def before_insert(self, mappings):
+        from app.models.category import Category
+
+        # Categories named by valid rows that do not exist yet
+        names = sorted({m['_category_name'] for m in mappings if m['_category_name']})
+        new_categories: Dict[str, int] = {}
+        if names:
+            today = datetime.now().strftime('%Y-%m-%d')
+            db.session.bulk_insert_mappings(Category, [{
+                'business_id': self.business_id,
+                'name': name,
+                'description': ('Default category for products without a specified category'
+                                if name == 'Uncategorized'
+                                else f"Auto-created during bulk upload on {today}")
+            } for name in names])
+            for category_id, name in db.session.query(Category.id, Category.name).filter(
+                Category.business_id == self.business_id,
+                Category.name.in_(names)
+            ).all():
+                new_categories.setdefault(name, category_id)
+
+        for mapping in mappings:
+            category_name = mapping.pop('_category_name')
+            if category_name:
+                mapping['category_id'] = new_categories[category_name]
+
+    def after_insert(self, mappings):
+        from app.models.inventory_transaction import TransactionType
+        from app.utils.stock_ledger import record_movements
+
+        Product = self.model
+        stock = {m['product_id']: m['stock_quantity'] for m in mappings}
+        ids = dict(db.session.query(Product.product_id, Product.id).filter(
+            Product.business_id == self.business_id,
+            Product.product_id.in_(list(stock))
+        ).all())
+        self.low_stock_product_ids.extend(
+            ids[product_id] for product_id, quantity in stock.items() if quantity <= self.low_stock_limit
+        )
+        # Opening stock goes into the ledger (without a user the rebuild books it later)
+        if self.user_id:
+            record_movements(self.business_id, self.user_id, TransactionType.ADJUSTMENT_IN,
+                             {ids[product_id]: quantity for product_id, quantity in stock.items()},
+                             branch_id=self.branch_id, notes='Opening stock (import)')
+
+    def finish(self):
+        from app.utils.barcodes import invalidate_barcode_index
+        from app.utils.catalogue import invalidate_catalogue
+        from app.utils.outbox import enqueue_event
+
+        # Bulk inserts bypass the session listeners that drop these caches
+        invalidate_barcode_index(self.business_id)
+        invalidate_catalogue(self.business_id)
+        if self.low_stock_product_ids:
+            enqueue_event(self.business_id, 'low_stock.check', {'product_ids': self.low_stock_product_ids})
+
+
+class CustomerImporter(BulkImporter):
+    kind = 'customers'
+
+    def __init__(self, business_id: int, branch_id: Optional[int] = None):
+        super().__init__(business_id, branch_id)
+        from app.models.customer import Customer
+        self.model = Customer
+
+    def preload(self):
+        Customer = self.model
+        self.customer_ids: Set[str] = set()
+        self.emails: Set[str] = set()
+        for customer_id, email in db.session.query(Customer.customer_id, Customer.email).filter(
+            Customer.business_id == self.business_id
+        ).all():
+            self.customer_ids.add(customer_id)
+            self.emails.add(email)
+
+    def validate_row(self, row, headers):
+        first_name = get_value(row, headers, 'first_name', 'First Name')
+        last_name = get_value(row, headers, 'last_name', 'Last Name')
+        email = get_value(row, headers, 'email')
+        if not first_name or not last_name or not email:
+            raise RowError('Missing required fields: first_name, last_name, email')
+        if not EMAIL_REGEX.match(email):
+            raise RowError(f'Invalid email format: {email}')
+        if email in self.emails:
+            raise RowError(f'Email {email} already exists for this business')
+
+        customer_id = get_value(row, headers, 'customer_id', 'Customer ID')
+        if customer_id and customer_id in self.customer_ids:
+            raise RowError(f'Customer ID {customer_id} already exists for this business')
+
+        mapping = {
+            'business_id': self.business_id,
+            'branch_id': self.branch_id,
+            'first_name': first_name,
+            'last_name': last_name,
+            'company': get_value(row, headers, 'company'),
+            'email': email,
+            'phone': get_value(row, headers, 'phone'),
+            'address': get_value(row, headers, 'address'),
+            'city': get_value(row, headers, 'city'),
+            'state': get_value(row, headers, 'state'),
+            'country': get_value(row, headers, 'country'),
+            'zip_code': get_value(row, headers, 'zip_code', 'Postal Code'),
+            'customer_type': get_value(row, headers, 'customer_type', 'Customer Type') or 'Individual',
+            'notes': get_value(row, headers, 'notes'),
+            'credit_limit': parse_float(get_value(row, headers, 'credit_limit', 'Credit Limit'), 'credit_limit', 0.0),
+            'balance': parse_float(get_value(row, headers, 'balance'), 'balance', 0.0),
+            'is_active': parse_bool(get_value(row, headers, 'is_active', 'Is Active')),
+        }
+        # Rows without an id get one from the CUST sequence in before_insert
+        mapping['customer_id'] = customer_id or None
+        if customer_id:
+            self.customer_ids.add(customer_id)
+        self.emails.add(email)
+        return mapping
+
+    def before_insert(self, mappings):
+        from app.utils.sequences import advance_sequence, format_id, parse_id, reserve_ids
+
+        # Ids given in the file first, so generated ones continue after them
+        given = [value for value in (parse_id('CUST', m['customer_id']) for m in mappings) if value is not None]
+        if given:
+            advance_sequence(self.business_id, 'CUST', format_id('CUST', max(given)))
+
+        missing = [m for m in mappings if not m['customer_id']]
+        while missing:
+            first = reserve_ids(self.business_id, 'CUST', len(missing))
+            candidates = [format_id('CUST', value) for value in range(first, first + len(missing))]
+            free = [candidate for candidate in candidates if candidate not in self.customer_ids]
+            for mapping, candidate in zip(missing, free):
+                mapping['customer_id'] = candidate
+            missing = missing[len(free):]
+        # Keep the reservation even if a chunk is rolled back
+        db.session.commit()
+
+    def created_key(self, mapping):
+        return {'customer_id': mapping['customer_id'], 'email': mapping['email']}
+
+
+class EmployeeImporter(BulkImporter):
+    """Links employees to existing users by email; no user accounts are created."""
+    kind = 'employees'
+
+    def __init__(self, business_id: int, branch_id: Optional[int] = None):
+        super().__init__(business_id, branch_id)
+        from app.models.employee import Employee
+        self.model = Employee
+
+    def preload(self):
+        from app.models.user import User
+
+        Employee = self.model
+        self.employee_ids: Set[str] = {employee_id for (employee_id,) in db.session.query(Employee.employee_id).filter(
+            Employee.business_id == self.business_id
+        ).all()}
+        # user_id is unique across all employees, not just this business
+        self.linked_user_ids = {user_id for (user_id,) in db.session.query(Employee.user_id).join(
+            User, Employee.user_id == User.id
+        ).filter(User.business_id == self.business_id).all()}
+        self.users_by_email: Dict[str, int] = {
+            email.lower(): user_id for user_id, email in db.session.query(User.id, User.email).filter(
+                User.business_id == self.business_id
+            ).all() if email
+        }
+
+    def validate_row(self, row, headers):
+        employee_id = get_value(row, headers, 'employee_id', 'Employee ID')
+        user_email = get_value(row, headers, 'user_email', 'User Email', 'email')
+        if not employee_id:
+            raise RowError('Missing required field: employee_id')
+        if employee_id in self.employee_ids:
+            raise RowError(f'Employee ID {employee_id} already exists for this business')
+
+        user_id = None
+        if user_email:
+            user_id = self.users_by_email.get(user_email.lower())
+            if user_id is None:
+                raise RowError(f'User with email {user_email} not found for this business')
+            if user_id in self.linked_user_ids:
+                raise RowError(f'User {user_email} already has an employee record')
+
+        department = get_value(row, headers, 'department')
+        position = get_value(row, headers, 'position')
+        hire_date_raw = get_value(row, headers, 'hire_date', 'Hire Date')
+        if not department or not position or not hire_date_raw:
+            raise RowError('Missing required fields: department, position, hire_date')
+        try:
+            hire_date = datetime.strptime(hire_date_raw, '%Y-%m-%d').date()
+        except ValueError:
+            raise RowError(f'Invalid hire_date (expected YYYY-MM-DD): {hire_date_raw}')
+
+        mapping = {
+            'business_id': self.business_id,
+            'branch_id': self.branch_id,
+            'user_id': user_id,
+            'employee_id': employee_id,
+            'department': department,
+            'position': position,
+            'hire_date': hire_date,
+            'salary': parse_float(get_value(row, headers, 'salary'), 'salary'),
+            'address': get_value(row, headers, 'address'),
+            'emergency_contact_name': get_value(row, headers, 'emergency_contact_name', 'Emergency Contact Name'),
+            'emergency_contact_phone': get_value(row, headers, 'emergency_contact_phone', 'Emergency Contact Phone'),
+            'bank_account': get_value(row, headers, 'bank_account', 'Bank Account'),
+            'is_active': parse_bool(get_value(row, headers, 'is_active', 'Is Active')),
+        }
+        self.employee_ids.add(employee_id)
+        if user_id:
+            self.linked_user_ids.add(user_id)
+        return mapping
+
+    def created_key(self, mapping):
+        return {'employee_id': mapping['employee_id'], 'user_id': mapping['user_id']}
+
+
+IMPORTERS: Dict[str, Type[BulkImporter]] = {
+    'products': ProductImporter,
+    'customers': CustomerImporter,
+    'employees': EmployeeImporter,
+}
+
+
+# ==================== JOBS ====================
+
+def _upload_path(job_id: int) -> str:
+    return os.path.join(UPLOAD_DIR, f'import_{job_id}.csv')
+
+
+def create_import_job(business_id: int, user_id: Optional[int], kind: str, file) -> ImportJob:
+    """Record a queued job and spool the uploaded file to disk."""
+    job = ImportJob(business_id=business_id, user_id=user_id, kind=kind, filename=file.filename)
+    db.session.add(job)
+    db.session.commit()
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file.save(_upload_path(job.id))
+    return job
+
+
+def should_run_inline(job: ImportJob) -> bool:
+    return os.path.getsize(_upload_path(job.id)) <= INLINE_MAX_BYTES
+
+
+def _report(items: List[Dict[str, Any]], item: Dict[str, Any]) -> None:
+    if len(items) < MAX_REPORTED_ROWS:
+        items.append(item)
+
+
+def run_import_job(job_id: int, branch_id: Optional[int] = None) -> ImportJob:
+    """Validate and insert the job's file. Never raises; failures are recorded on the job."""
+    job = db.session.get(ImportJob, job_id)
+    path = _upload_path(job_id)
+    errors: List[Dict[str, Any]] = []
+    created: List[Dict[str, Any]] = []
+    try:
+        importer = IMPORTERS[job.kind](job.business_id, branch_id)
+        importer.user_id = job.user_id
+        job.status = 'validating'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        # Pass 1: validate every row against the preloaded lookups
+        importer.preload()
+        valid: List[Tuple[int, Dict[str, Any]]] = []
+        headers = None
+        total = 0
+        for row_num, row in iter_csv_rows(path):
+            total += 1
+            if headers is None:
+                headers = _header_map(row)
+            try:
+                valid.append((row_num, importer.validate_row(row, headers)))
+            except RowError as e:
+                job.error_count += 1
+                _report(errors, {'row': row_num, 'error': str(e)})
+
+        job.total_rows = total
+        job.processed_rows = job.error_count
+        job.status = 'importing'
+        job.errors = errors
+        db.session.commit()
+
+        # Pass 2: chunked inserts, one transaction per chunk
+        importer.before_insert([mapping for _, mapping in valid])
+        for i in range(0, len(valid), CHUNK_SIZE):
+            chunk = valid[i:i + CHUNK_SIZE]
+            mappings = [mapping for _, mapping in chunk]
+            try:
+                db.session.bulk_insert_mappings(importer.model, mappings)
+                importer.after_insert(mappings)
+                index_imported(importer.model, job.business_id, mappings)
+                job.created_count += len(chunk)
+                for row_num, mapping in chunk:
+                    _report(created, {'row': row_num, **importer.created_key(mapping)})
+            except Exception as e:
+                # A constraint hit by a concurrent writer fails the whole chunk
+                db.session.rollback()
+                job = db.session.get(ImportJob, job_id)
+                job.error_count += len(chunk)
+                for row_num, _ in chunk:
+                    _report(errors, {'row': row_num, 'error': str(getattr(e, 'orig', e))})
+            job.processed_rows += len(chunk)
+            job.errors = list(errors)
+            job.created = list(created)
+            db.session.commit()
+
+        importer.finish()
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Import job %s failed", job_id)
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.errors = errors
+        job.created = created
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return job
+
+
+def start_import_job(job_id: int, branch_id: Optional[int] = None) -> None:
+    """Run an import job in a background thread with its own app context."""
+    app = current_app._get_current_object()
+
+    def target():
+        with app.app_context():
+            try:
+                run_import_job(job_id, branch_id)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=target, name=f'import-job-{job_id}', daemon=True).start()
+
+
+def import_response(job: ImportJob) -> Dict[str, Any]:
+    """The bulk upload response shape shared by the upload endpoints."""
+    return {
+        'job': job.to_dict(),
+        'created': job.created or [],
+        'errors': job.errors or [],
+        'created_count': job.created_count,
+        'error_count': job.error_count
+    }
+
+
+def background_requested() -> Optional[bool]:
+    """?background=true|false forces the mode; None leaves it to the file size."""
+    value = request.args.get('background')
+    if value is None:
+        return None
+    return parse_bool(value.strip(), default=False)
+
+
+def submit_import(business_id: int, user_id: Optional[int], kind: str, file,
+                  branch_id: Optional[int] = None, background: Optional[bool] = None) -> Tuple[Dict[str, Any], int]:
+    """
+    Create the job and import the file: inline for small uploads (200 with
+    the result) or in the background (202 with the job to poll).
+    """
+    job = create_import_job(business_id, user_id, kind, file)
+    if background is None:
+        background = not should_run_inline(job)
+    if background:
+        start_import_job(job.id, branch_id=branch_id)
+        return {'message': 'Import started', 'job': job.to_dict()}, 202
+    return import_response(run_import_job(job.id, branch_id=branch_id)), 200
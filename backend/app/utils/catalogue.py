@@ -0,0 +1,314 @@
+"""
+Storefront Catalogue
+====================
+Read side of the customer portal shop, built to stay cheap for businesses
+with tens of thousands of products:
+
+- Products are listed with keyset pagination: each page ends with an
+  opaque cursor holding the last row's sort key and id, so page 500 costs
+  the same index range scan as page 1 (no OFFSET).
+- Pages select a fixed set of columns (`LIST_FIELDS`) instead of loading
+  models, so no category or supplier is lazily loaded per product.
+- Search uses ILIKE, which PostgreSQL answers from the pg_trgm GIN index on
+  products.name (db_migrations/0047). Terms shorter than three characters
+  are matched as prefixes, the form a trigram index can still serve. On
+  SQLite the same filter runs as a plain LIKE.
+- `catalogue_version()` summarises a business's products (count and last
+  update) for ETag / Last-Modified checks, so an unchanged page is answered
+  with 304 before it is queried.
+- Business lookups by slug and category lists are cached in-process and
+  dropped when businesses, categories or product placement change.
+
+Typical use:
+
+    business_id = resolve_business_id(slug=request.args.get('business_slug'))
+    page = list_products(business_id, search='rice', sort='price_low', cursor=cursor)
+"""
+
+from app import db
+from app.models.business import Business
+from app.models.category import Category
+from app.models.product import Product
+from app.utils.cache import TTLCache
+from decimal import Decimal
+from sqlalchemy import event, func, inspect, tuple_
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Set, Tuple
+import base64
+import hashlib
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Shortest search term matched anywhere in the name; shorter ones match prefixes
+MIN_INFIX_SEARCH = 3
+
+# sort name -> (column, descending); every sort is tie-broken on id
+SORTS = {
+    'name': (Product.name, False),
+    'price_low': (Product.unit_price, False),
+    'price_high': (Product.unit_price, True),
+    'newest': (None, True),
+}
+
+LIST_FIELDS = (
+    Product.id, Product.product_id, Product.name, Product.sku, Product.brand,
+    Product.category_id, Product.unit_price, Product.unit_of_measure,
+    Product.stock_quantity, Product.image,
+)
+
+_business_cache = TTLCache(ttl=300, maxsize=4096)   # slug or '' (default shop) -> business dict
+_category_cache = TTLCache(ttl=300, maxsize=2048)   # business id -> category list
+
+_PENDING = 'catalogue_invalidations'
+_MISSING = object()
+
+
+# ==================== BUSINESSES & CATEGORIES ====================
+
+def get_business(slug: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    The business serialised for the shop (cached), by slug or, without one,
+    the first active business. None when no such business exists.
+    """
+    key = slug or ''
+    business = _business_cache.get(key, _MISSING)
+    if business is _MISSING:
+        query = Business.query.filter_by(slug=slug) if slug else \
+            Business.query.filter_by(is_active=True).order_by(Business.id)
+        row = query.first()
+        business = row.to_dict() if row else None
+        _business_cache.set(key, business)
+    return business
+
+
+def resolve_business_id(slug: Optional[str] = None, business_id: Optional[int] = None) -> Optional[int]:
+    """Business id for a shop request: the slug wins, then business_id, then the default shop."""
+    if slug:
+        business = get_business(slug)
+        if business:
+            return business['id']
+    if business_id:
+        return business_id
+    business = get_business()
+    return business['id'] if business else None
+
+
+def list_categories(business_id: int) -> List[Dict[str, Any]]:
+    """Active categories with their number of active products (cached)."""
+    categories = _category_cache.get(business_id)
+    if categories is None:
+        counts = dict(db.session.query(Product.category_id, func.count(Product.id)).filter(
+            Product.business_id == business_id, Product.is_active.is_(True)
+        ).group_by(Product.category_id).all())
+        rows = db.session.query(Category.id, Category.name, Category.description, Category.parent_id).filter(
+            Category.business_id == business_id, Category.is_active.is_(True)
+        ).order_by(Category.name).all()
+        categories = [{
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'parent_id': row.parent_id,
+            'products_count': counts.get(row.id, 0),
+        } for row in rows]
+        _category_cache.set(business_id, categories)
+    return categories
+
+
+# ==================== PRODUCTS ====================
+
+def catalogue_version(business_id: int) -> Tuple[int, Optional[Any]]:
+    """
+    (product count, latest products.updated_at) for the business.
+
+    Every product write, including checkout's stock decrement, bumps
+    updated_at and deletions change the count, so the pair changes whenever
+    a catalogue page could.
+    """
+    count, last_updated = db.session.query(func.count(Product.id), func.max(Product.updated_at)).filter(
+        Product.business_id == business_id
+    ).one()
+    return count, last_updated
+
+
+def catalogue_etag(business_id: int, version: Tuple[int, Optional[Any]], params: Dict[str, Any]) -> str:
+    """Strong ETag for one catalogue response: the business, its version and the request parameters."""
+    count, last_updated = version
+    raw = json.dumps([business_id, count, last_updated.isoformat() if last_updated else None,
+                      sorted((k, str(v)) for k, v in params.items())])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def encode_cursor(sort: str, value: Any, product_id: int) -> str:
+    raw = json.dumps([sort, str(value) if isinstance(value, Decimal) else value, product_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """(sort value, id) from a cursor; ValueError if it is malformed or from another sort."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        product_id = int(product_id)
+        if SORTS[cursor_sort][0] is Product.unit_price:
+            value = Decimal(value)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort:
+        raise ValueError('Cursor does not match the requested sort')
+    return value, product_id
+
+
+def _escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _serialize(row) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'product_id': row.product_id,
+        'name': row.name,
+        'sku': row.sku,
+        'brand': row.brand,
+        'category_id': row.category_id,
+        'unit_price': float(row.unit_price) if row.unit_price else 0.0,
+        'unit_of_measure': row.unit_of_measure,
+        'stock_quantity': row.stock_quantity,
+        'in_stock': row.stock_quantity > 0,
+        'image': row.image,
+    }
+
+
+def list_products(business_id: int, category_id: Optional[int] = None, search: Optional[str] = None,
+                  min_price: Optional[float] = None, max_price: Optional[float] = None,
+                  in_stock: bool = False, sort: str = 'name', cursor: Optional[str] = None,
+                  per_page: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    One page of active products.
+
+    Returns {'products': [...], 'pagination': {'per_page', 'has_more',
+    'next_cursor'}}; pass next_cursor back to get the following page.
+    Raises ValueError for an unknown sort or a bad cursor.
+    """
+    if sort not in SORTS:
+        raise ValueError(f"Invalid sort: {sort}. Must be one of: {', '.join(SORTS)}")
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    column, descending = SORTS[sort]
+
+    query = db.session.query(*LIST_FIELDS).filter(
+        Product.business_id == business_id, Product.is_active.is_(True)
+    )
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    if min_price is not None:
+        query = query.filter(Product.unit_price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.unit_price <= max_price)
+    if in_stock:
+        query = query.filter(Product.stock_quantity > 0)
+
+    search = (search or '').strip()
+    if search:
+        term = _escape_like(search)
+        pattern = f'%{term}%' if len(search) >= MIN_INFIX_SEARCH else f'{term}%'
+        query = query.filter(Product.name.ilike(pattern, escape='\\'))
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if column is None:
+            query = query.filter(Product.id < last_id if descending else Product.id > last_id)
+        elif descending:
+            query = query.filter(tuple_(column, Product.id) < tuple_(value, last_id))
+        else:
+            query = query.filter(tuple_(column, Product.id) > tuple_(value, last_id))
+
+    if column is None:
+        order = [Product.id.desc() if descending else Product.id]
+    else:
+        order = [column.desc(), Product.id.desc()] if descending else [column, Product.id]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, column.key) if column is not None else None, last.id)
+
+    return {
+        'products': [_serialize(row) for row in rows],
+        'pagination': {
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+        },
+    }
+
+
+def get_product(business_id: int, product_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Full details of one active product. The supplier is joined in the same
+    query and the category comes from the cached category list, so its
+    product count is not computed by loading the whole category.
+    """
+    product = Product.query.options(
+        db.noload(Product.category_obj), db.joinedload(Product.supplier_obj)
+    ).filter_by(id=product_id, business_id=business_id, is_active=True).first()
+    if not product:
+        return None
+    data = product.to_dict()
+    data['category'] = next((category for category in list_categories(business_id)
+                             if category['id'] == product.category_id), None)
+    return data
+
+
+# ==================== INVALIDATION ====================
+
+def invalidate_catalogue(business_id: Optional[int] = None) -> None:
+    """Drop cached categories for a business, or everything cached when business_id is None."""
+    if business_id is None:
+        _category_cache.clear()
+        _business_cache.clear()
+    else:
+        _category_cache.delete(business_id)
+
+
+def _collect_changes(session: Session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING, {'businesses': set(), 'shops': False})
+    businesses: Set[int] = pending['businesses']
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Business):
+            # A renamed slug's old value is often not loaded, so any business write drops every shop
+            pending['shops'] = True
+        elif isinstance(obj, Category):
+            businesses.add(obj.business_id)
+        elif isinstance(obj, Product):
+            # Category product counts only move when products appear, go or change category/status
+            attrs = inspect(obj).attrs
+            if obj in session.dirty and not (attrs.category_id.history.has_changes()
+                                             or attrs.is_active.history.has_changes()):
+                continue
+            businesses.add(obj.business_id)
+
+
+def _apply_invalidations(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    for business_id in pending['businesses']:
+        _category_cache.delete(business_id)
+    if pending['shops']:
+        _business_cache.clear()
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def register_catalogue_listeners() -> None:
+    """Invalidate cached shop businesses and categories after commits that change them."""
+    if not event.contains(Session, 'after_flush', _collect_changes):
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'after_commit', _apply_invalidations)
+        event.listen(Session, 'after_rollback', _discard_pending)
@@ -0,0 +1,632 @@
+"""
+Checkout Engine
+===============
+Creates a sale - order, items, invoice, customer balance, audit entry and
+outbox events - in one transaction with a single commit. Used by
+`/sales/pos` and `/sales/orders`; `checkout_batch` records a batch of
+offline POS sales the same way (`/sales/pos/sync`).
+
+Stock is handled set-based so that tills selling overlapping baskets
+neither deadlock nor oversell:
+
+1. All products of the basket are locked with one
+   `SELECT ... WHERE id IN (...) ORDER BY id FOR UPDATE`. Every checkout
+   takes its row locks in id order (products first, then the customers it
+   charges, locked the same way before their balances are updated), so
+   concurrent checkouts can wait on each other but never deadlock.
+2. Stock is decremented with one `UPDATE ... SET stock_quantity =
+   stock_quantity - CASE id ... END` guarded by `stock_quantity >= qty`.
+   If any row fails the guard the whole sale is rejected.
+3. The sale is written to the inventory transaction log, which moves the
+   selling branch's stock level (`app.utils.stock_ledger`).
+
+Typical use:
+
+    try:
+        order = checkout(business_id, branch_id, user_id, data, pos=True)
+    except CheckoutError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+`scripts/pos_load_test.py` measures checkouts/sec under contention.
+"""
+
+from flask import request
+from app import db
+from app.models.customer import Customer
+from app.models.product import Product
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.api_integrations import WebhookEvent
+from app.models.audit_log import create_audit_log, AuditAction
+from app.utils.outbox import enqueue_event
+from app.utils.sequences import next_id, reserve_ids, format_id
+from app.utils.stock_ledger import record_sales
+from sqlalchemy import case, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from datetime import date, datetime, timedelta, timezone
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+WALK_IN_NAME = 'Walk-in Customer'
+INVOICE_DUE_DAYS = 30
+
+# Offline sync
+MAX_BATCH_SIZE = 500
+IDEMPOTENCY_KEY_LENGTH = 64
+
+
+class CheckoutError(Exception):
+    """A sale that cannot be made as requested; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _parse_date(value):
+    if value and isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+
+def _validate_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    lines = []
+    for item_data in items:
+        for field in ['product_id', 'quantity', 'unit_price']:
+            if field not in item_data:
+                raise CheckoutError(f'Item {field} is required')
+        try:
+            product_id = int(item_data['product_id'])
+            quantity = int(item_data['quantity'])
+            unit_price = float(item_data['unit_price'])
+            discount_percent = float(item_data.get('discount_percent') or 0)
+        except (TypeError, ValueError):
+            raise CheckoutError('Item product_id, quantity, unit_price and discount_percent must be numbers')
+        if not math.isfinite(unit_price) or not math.isfinite(discount_percent):
+            raise CheckoutError('Item unit_price and discount_percent must be finite numbers')
+        if quantity <= 0:
+            raise CheckoutError('Item quantity must be greater than zero')
+
+        line_total = quantity * unit_price
+        if discount_percent > 0:
+            line_total -= line_total * (discount_percent / 100)
+        lines.append({
+            'product_id': product_id,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'discount_percent': discount_percent,
+            'line_total': line_total
+        })
+    return lines
+
+
+def _validate_sale(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a sale payload with its customer id, amounts and dates parsed."""
+    sale = dict(data)
+    if sale.get('customer_id'):
+        try:
+            sale['customer_id'] = int(sale['customer_id'])
+        except (TypeError, ValueError):
+            raise CheckoutError('customer_id must be an integer')
+    try:
+        for field in ('tax_rate', 'discount_amount', 'shipping_cost', 'amount_paid'):
+            sale[field] = float(sale.get(field) or 0)
+            if not math.isfinite(sale[field]):
+                raise ValueError(field)
+    except (TypeError, ValueError):
+        raise CheckoutError('tax_rate, discount_amount, shipping_cost and amount_paid must be numbers')
+    try:
+        for field in ('order_date', 'required_date', 'shipped_date'):
+            sale[field] = _parse_date(sale.get(field))
+            if sale[field] is not None and not isinstance(sale[field], date):
+                raise ValueError(field)
+    except (TypeError, ValueError):
+        raise CheckoutError('order_date, required_date and shipped_date must be dates (YYYY-MM-DD)')
+    return sale
+
+
+def resolve_customer(business_id: int, customer_id: Optional[int],
+                     customer_name: Optional[str]) -> Optional[Customer]:
+    """
+    The sale's customer: the given customer, or for a named walk-in the
+    customer with that name, created on first purchase. None for anonymous
+    walk-ins.
+    """
+    if customer_id:
+        customer = Customer.query.filter_by(id=customer_id, business_id=business_id).first()
+        if not customer:
+            raise CheckoutError('Customer not found for this business', 404)
+        return customer
+
+    if not customer_name or customer_name == WALK_IN_NAME:
+        return None
+
+    name_parts = customer_name.split(' ', 1)
+    first_name = name_parts[0]
+    last_name = name_parts[1] if len(name_parts) > 1 else ''
+    customer = Customer.query.filter_by(
+        business_id=business_id, first_name=first_name, last_name=last_name
+    ).first()
+    if customer:
+        return customer
+
+    customer = Customer(
+        business_id=business_id,
+        customer_id=next_id(business_id, 'CUST'),
+        first_name=first_name,
+        last_name=last_name,
+        email=f'walkin-{first_name.lower()}@example.com',  # Default email for walk-ins
+        phone='',
+        address='',
+        is_active=True
+    )
+    db.session.add(customer)
+    return customer
+
+
+def lock_products(business_id: int, product_ids) -> Dict[int, Product]:
+    """Load and row-lock the business's products, always in id order."""
+    return {
+        product.id: product for product in Product.query.filter(
+            Product.business_id == business_id,
+            Product.id.in_(sorted(product_ids))
+        ).order_by(Product.id).with_for_update().all()
+    }
+
+
+def take_stock(business_id: int, quantities: Dict[int, int], products: Dict[int, Product]) -> None:
+    """
+    Take quantities {product_id: qty} off the (locked) products' stock in one
+    guarded UPDATE and show the new levels on the loaded products.
+    """
+    product_ids = sorted(quantities)
+    quantity = case(quantities, value=Product.id)
+    rows = db.session.execute(
+        update(Product).where(
+            Product.business_id == business_id,
+            Product.id.in_(product_ids),
+            Product.stock_quantity >= quantity
+        ).values(
+            stock_quantity=Product.stock_quantity - quantity,
+            updated_at=datetime.utcnow()
+        ).returning(Product.id, Product.stock_quantity).execution_options(synchronize_session=False)
+    ).all()
+
+    # Only possible without row locks (SQLite): another sale took the stock in between
+    if len(rows) != len(product_ids):
+        sold = {product_id for product_id, _ in rows}
+        short = next(products[product_id] for product_id in product_ids if product_id not in sold)
+        raise CheckoutError(f'Insufficient stock for product {short.name}')
+
+    for product_id, stock_quantity in rows:
+        set_committed_value(products[product_id], 'stock_quantity', stock_quantity)
+
+
+def reserve_stock(business_id: int, quantities: Dict[int, int]) -> Dict[int, Product]:
+    """
+    Lock the products and take quantities {product_id: qty} off their stock.
+    Returns the products by id, with stock_quantity showing the new level.
+    """
+    products = lock_products(business_id, quantities)
+    for product_id in sorted(quantities):
+        product = products.get(product_id)
+        if not product:
+            raise CheckoutError(f'Product with ID {product_id} not found for this business', 404)
+        if product.stock_quantity < quantities[product_id]:
+            raise CheckoutError(f'Insufficient stock for product {product.name}. '
+                                f'Available: {product.stock_quantity}, Requested: {quantities[product_id]}')
+    take_stock(business_id, quantities, products)
+    return products
+
+
+def payment_terms(payment_status: str, payment_method: str, total_amount: float,
+                  amount_paid: float = 0) -> Tuple[InvoiceStatus, float, float, Optional[str]]:
+    """(invoice status, amount paid, amount due, order note) for a payment status."""
+    if payment_status == 'PAID':
+        # Full payment received immediately
+        return InvoiceStatus.PAID, total_amount, 0, None
+    if payment_status == 'PARTIAL':
+        # Customer pays a portion now, rest is owed later
+        if amount_paid <= 0:
+            amount_paid = round(total_amount / 2, 2)  # default to 50%
+        amount_paid = min(amount_paid, total_amount)  # cap at total
+        amount_due = round(total_amount - amount_paid, 2)
+        return (InvoiceStatus.PARTIALLY_PAID if amount_due > 0 else InvoiceStatus.PAID), amount_paid, amount_due, None
+    if payment_status == 'PENDING':
+        # Payment initiated but not yet confirmed (e.g., mobile money, bank transfer in progress)
+        return InvoiceStatus.SENT, 0, total_amount, f"Payment pending via {payment_method}"
+    if payment_status == 'FAILED':
+        # Payment attempt was made but failed - treat as unpaid, flag for follow-up
+        return InvoiceStatus.SENT, 0, total_amount, f"Payment FAILED via {payment_method} - follow up required"
+    if payment_status == 'REFUNDED':
+        # Payment was made and then refunded: nothing paid, nothing owed
+        return InvoiceStatus.PAID, 0, 0, f"REFUNDED via {payment_method}"
+    # UNPAID and unknown statuses: credit/on-account sale
+    return InvoiceStatus.SENT, 0, total_amount, None
+
+
+def _quantities(lines: List[Dict[str, Any]]) -> Dict[int, int]:
+    quantities: Dict[int, int] = {}
+    for line in lines:
+        quantities[line['product_id']] = quantities.get(line['product_id'], 0) + line['quantity']
+    return quantities
+
+
+def _build_order(business_id: int, branch_id: Optional[int], user_id: int, data: Dict[str, Any],
+                 lines: List[Dict[str, Any]], customer: Optional[Customer], products: Dict[int, Product],
+                 order_id: str, pos: bool) -> Order:
+    """The order with its items and invoice for a sale checked by `_validate_sale`; not yet added to the session."""
+    subtotal = sum(line['line_total'] for line in lines)
+    tax_rate = data['tax_rate']
+    tax_amount = subtotal * (tax_rate / 100) if tax_rate > 0 else 0
+    discount_amount = data['discount_amount']
+    shipping_cost = data['shipping_cost']
+    total_amount = subtotal + tax_amount - discount_amount + shipping_cost
+
+    if pos:
+        # POS sales are paid immediately and delivered on spot
+        status = OrderStatus.DELIVERED
+    elif data.get('status') in [s.name for s in OrderStatus]:
+        status = OrderStatus[data['status']]
+    else:
+        status = OrderStatus.PENDING
+
+    payment_method = data.get('payment_method', 'cash')  # cash, card, mobile_money, bank_transfer
+    invoice_status, amount_paid, amount_due, payment_note = payment_terms(
+        str(data.get('payment_status') or 'PAID').upper(), payment_method, total_amount, data['amount_paid']
+    )
+    notes = data.get('notes', '')
+    if payment_note:
+        notes = f"{notes} | {payment_note}" if notes else payment_note
+
+    order_date = data['order_date'] or datetime.utcnow().date()
+    order = Order(
+        business_id=business_id,
+        branch_id=branch_id,
+        order_id=order_id,
+        customer=customer,
+        customer_name=data.get('customer_name', WALK_IN_NAME),  # Store walk-in customer name
+        user_id=user_id,
+        order_date=order_date,
+        required_date=data['required_date'],
+        shipped_date=data['shipped_date'],
+        status=status,
+        subtotal=subtotal,
+        tax_amount=tax_amount,
+        discount_amount=discount_amount,
+        shipping_cost=shipping_cost,
+        total_amount=total_amount,
+        notes=notes,
+        returns=[]
+    )
+    for line in lines:
+        order.order_items.append(OrderItem(product=products[line['product_id']], **{
+            key: value for key, value in line.items() if key != 'product_id'
+        }))
+    order.invoice = Invoice(
+        business_id=business_id,
+        branch_id=branch_id,
+        invoice_id=f"INV-{order.order_id}",
+        customer=customer,
+        issue_date=order_date,
+        due_date=order_date + timedelta(days=INVOICE_DUE_DAYS),
+        total_amount=total_amount,
+        amount_paid=amount_paid,
+        amount_due=amount_due,
+        status=invoice_status
+    )
+    return order
+
+
+def _charge_customers(charges: Dict[int, float]) -> None:
+    """
+    Add unpaid amounts {customer id: amount} to the customers' balances in
+    one UPDATE, after locking the customers in id order.
+    """
+    charges = {customer_id: amount for customer_id, amount in charges.items() if amount > 0}
+    if charges:
+        db.session.execute(
+            select(Customer.id).where(Customer.id.in_(sorted(charges))).order_by(Customer.id).with_for_update()
+        ).all()
+        db.session.execute(
+            update(Customer).where(Customer.id.in_(list(charges))).values(
+                balance=func.coalesce(Customer.balance, 0) + case(charges, value=Customer.id)
+            ).execution_options(synchronize_session='fetch')
+        )
+
+
+def _enqueue_order_created(order: Order) -> None:
+    # Webhooks are delivered by the outbox worker; the order transaction only records the event
+    enqueue_event(order.business_id, 'webhook', {
+        'event': WebhookEvent.ORDER_CREATED.value,
+        'data': {
+            'id': order.id,
+            'order_id': order.order_id,
+            'customer_id': order.customer_id,
+            'status': order.status.value,
+            'total_amount': float(order.total_amount),
+            'created_at': order.created_at.isoformat() if order.created_at else None
+        }
+    })
+
+
+def checkout(business_id: int, branch_id: Optional[int], user_id: int,
+             data: Dict[str, Any], pos: bool = False) -> Dict[str, Any]:
+    """
+    Create and commit a sale from an order payload and return it as
+    `Order.to_dict()`. POS sales are delivered on the spot; other orders
+    take their status from the payload. Raises CheckoutError for invalid
+    requests (nothing is written then).
+    """
+    if not data.get('items'):
+        raise CheckoutError('items is required')
+    lines = _validate_items(data['items'])
+    data = _validate_sale(data)
+    customer = resolve_customer(business_id, data.get('customer_id'), data.get('customer_name', WALK_IN_NAME))
+    quantities = _quantities(lines)
+    products = reserve_stock(business_id, quantities)
+
+    order = _build_order(business_id, branch_id, user_id, data, lines, customer, products,
+                         next_id(business_id, 'ORD'), pos)
+    db.session.add(order)
+    record_sales(business_id, user_id, branch_id, [order])
+    db.session.flush()
+
+    # Unpaid/partial amounts go on the customer's account
+    if customer:
+        _charge_customers({customer.id: float(order.invoice.amount_due)})
+
+    enqueue_event(business_id, 'low_stock.check', {'product_ids': sorted(quantities)})
+    _enqueue_order_created(order)
+
+    create_audit_log(
+        user_id=user_id,
+        business_id=business_id,
+        action=AuditAction.CREATE,
+        entity_type='order',
+        entity_id=order.id,
+        branch_id=branch_id,
+        ip_address=request.remote_addr if request else None,
+        user_agent=request.headers.get('User-Agent') if request else None,
+        new_values={
+            'order_id': order.order_id,
+            'customer_name': order.customer_name,
+            'total_amount': float(order.total_amount),
+            'status': order.status.value,
+            'is_pos_sale': pos,
+            'item_count': len(lines),
+            'created_by': user_id
+        },
+        commit=False
+    )
+
+    # Serialized before the commit, which would expire everything just loaded
+    result = order.to_dict()
+    db.session.commit()
+    return result
+
+
+# ==================== OFFLINE SYNC ====================
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    """ISO 8601 time of an offline sale as naive UTC, like created_at."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _batch_customers(business_id: int, sales: List[Dict[str, Any]]) -> Dict[int, Any]:
+    """
+    Customers of a batch of validated sales by sale index, with two queries for the whole batch:
+    a Customer, None for anonymous walk-ins, or a CheckoutError. Named
+    walk-ins seen for the first time get one new record per name; it is
+    left out of the session and saved with the first accepted order using it.
+    """
+    ids = {sale['data']['customer_id'] for sale in sales if sale['data'].get('customer_id')}
+    by_id = {customer.id: customer for customer in Customer.query.filter(
+        Customer.business_id == business_id, Customer.id.in_(ids)
+    ).all()} if ids else {}
+
+    names = {}
+    for sale in sales:
+        name = sale['data'].get('customer_name', WALK_IN_NAME)
+        if not sale['data'].get('customer_id') and name and name != WALK_IN_NAME:
+            parts = name.split(' ', 1)
+            names[name] = (parts[0], parts[1] if len(parts) > 1 else '')
+    by_name = {}
+    if names:
+        for customer in Customer.query.filter(
+            Customer.business_id == business_id,
+            Customer.first_name.in_({first for first, _ in names.values()})
+        ).order_by(Customer.id).all():
+            by_name.setdefault((customer.first_name, customer.last_name), customer)
+
+    customers = {}
+    for sale in sales:
+        data = sale['data']
+        if data.get('customer_id'):
+            customers[sale['index']] = by_id.get(data['customer_id']) or \
+                CheckoutError('Customer not found for this business', 404)
+            continue
+        name = data.get('customer_name', WALK_IN_NAME)
+        if name not in names:
+            customers[sale['index']] = None
+            continue
+        first_name, last_name = names[name]
+        if (first_name, last_name) not in by_name:
+            by_name[(first_name, last_name)] = Customer(
+                business_id=business_id,
+                customer_id=next_id(business_id, 'CUST'),
+                first_name=first_name,
+                last_name=last_name,
+                email=f'walkin-{first_name.lower()}@example.com',  # Default email for walk-ins
+                phone='',
+                address='',
+                is_active=True
+            )
+        customers[sale['index']] = by_name[(first_name, last_name)]
+    return customers
+
+
+def checkout_batch(business_id: int, branch_id: Optional[int], user_id: int,
+                   sales: List[Dict[str, Any]], _retry: bool = True) -> List[Dict[str, Any]]:
+    """
+    Record a batch of POS sales queued offline, in one transaction with a
+    single commit, and return one result per sale in payload order:
+
+        {'index': 0, 'idempotency_key': 'till-3-000123', 'status': 'created',
+         'id': 812, 'order_id': 'ORD0812'}
+
+    status is 'created', 'duplicate' (the key is already recorded, in the
+    database or earlier in the batch; id/order_id name the existing order)
+    or 'rejected' (with 'error'; nothing is written for that sale, and the
+    rest of the batch is still recorded). Stock is
+    checked for the whole batch against one ordered lock of all its
+    products; sales are accepted in payload order while stock lasts.
+    """
+    results: List[Dict[str, Any]] = []
+    pending: List[Dict[str, Any]] = []
+    first_with_key: Dict[str, int] = {}
+
+    for index, data in enumerate(sales):
+        data = data if isinstance(data, dict) else {}
+        key = str(data.get('idempotency_key') or '').strip()
+        result = {'index': index, 'idempotency_key': key or None}
+        results.append(result)
+        if not key or len(key) > IDEMPOTENCY_KEY_LENGTH:
+            result.update(status='rejected', error=f'idempotency_key is required (at most {IDEMPOTENCY_KEY_LENGTH} characters)')
+            continue
+        if key in first_with_key:
+            result.update(status='duplicate', duplicate_of=first_with_key[key])
+            continue
+        first_with_key[key] = index
+        try:
+            if not data.get('items'):
+                raise CheckoutError('items is required')
+            sold_at = _parse_timestamp(data.get('sold_at'))
+            pending.append({'index': index, 'key': key, 'data': _validate_sale(data), 'sold_at': sold_at,
+                            'lines': _validate_items(data['items'])})
+        except (CheckoutError, ValueError) as e:
+            result.update(status='rejected', error=str(e))
+
+    # Replays: keys recorded by an earlier sync
+    if pending:
+        recorded = {key: (pk, order_id) for key, pk, order_id in db.session.query(
+            Order.idempotency_key, Order.id, Order.order_id
+        ).filter(
+            Order.business_id == business_id,
+            Order.idempotency_key.in_([sale['key'] for sale in pending])
+        ).all()}
+        for sale in pending:
+            if sale['key'] in recorded:
+                pk, order_id = recorded[sale['key']]
+                results[sale['index']].update(status='duplicate', id=pk, order_id=order_id)
+        pending = [sale for sale in pending if sale['key'] not in recorded]
+
+    customers = _batch_customers(business_id, pending) if pending else {}
+    products = lock_products(business_id, {line['product_id'] for sale in pending for line in sale['lines']}) \
+        if pending else {}
+
+    # Accept sales in order while the locked stock lasts
+    remaining = {product_id: product.stock_quantity for product_id, product in products.items()}
+    accepted = []
+    for sale in pending:
+        result = results[sale['index']]
+        customer = customers[sale['index']]
+        quantities = _quantities(sale['lines'])
+        missing = next((product_id for product_id in sorted(quantities) if product_id not in products), None)
+        short = next((product_id for product_id in sorted(quantities)
+                      if product_id in products and remaining[product_id] < quantities[product_id]), None)
+        if isinstance(customer, CheckoutError):
+            result.update(status='rejected', error=str(customer))
+        elif missing is not None:
+            result.update(status='rejected', error=f'Product with ID {missing} not found for this business')
+        elif short is not None:
+            result.update(status='rejected', error=f'Insufficient stock for product {products[short].name}. '
+                                                   f'Available: {remaining[short]}, Requested: {quantities[short]}')
+        else:
+            for product_id, quantity in quantities.items():
+                remaining[product_id] -= quantity
+            accepted.append(sale)
+
+    if not accepted:
+        db.session.rollback()
+        return _link_duplicates(results)
+
+    sold = {}
+    for sale in accepted:
+        for product_id, quantity in _quantities(sale['lines']).items():
+            sold[product_id] = sold.get(product_id, 0) + quantity
+    take_stock(business_id, sold, products)
+
+    first = reserve_ids(business_id, 'ORD', len(accepted))
+    orders = []
+    for number, sale in enumerate(accepted, start=first):
+        data = dict(sale['data'])
+        if sale['sold_at'] and not data.get('order_date'):
+            data['order_date'] = sale['sold_at'].date()
+        order = _build_order(business_id, branch_id, user_id, data, sale['lines'], customers[sale['index']],
+                             products, format_id('ORD', number), pos=True)
+        order.idempotency_key = sale['key']
+        if sale['sold_at']:
+            order.created_at = sale['sold_at']
+        orders.append(order)
+    db.session.add_all(orders)
+    record_sales(business_id, user_id, branch_id, orders)
+    db.session.flush()
+
+    charges: Dict[int, float] = {}
+    for order in orders:
+        if order.customer is not None:
+            charges[order.customer.id] = charges.get(order.customer.id, 0) + float(order.invoice.amount_due)
+    _charge_customers(charges)
+
+    enqueue_event(business_id, 'low_stock.check', {'product_ids': sorted(sold)})
+    for order in orders:
+        _enqueue_order_created(order)
+
+    create_audit_log(
+        user_id=user_id,
+        business_id=business_id,
+        action=AuditAction.CREATE,
+        entity_type='order',
+        entity_id=None,
+        branch_id=branch_id,
+        ip_address=request.remote_addr if request else None,
+        user_agent=request.headers.get('User-Agent') if request else None,
+        new_values={
+            'order_ids': [order.order_id for order in orders],
+            'total_amount': float(sum(float(order.total_amount) for order in orders)),
+            'is_pos_sale': True,
+            'offline_sync': True,
+            'sale_count': len(sales),
+            'created_by': user_id
+        },
+        description=f"Offline POS sync: {len(orders)} of {len(sales)} sales recorded",
+        commit=False
+    )
+
+    for sale, order in zip(accepted, orders):
+        results[sale['index']].update(status='created', id=order.id, order_id=order.order_id)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent sync of the same keys won the race; answer from what it recorded
+        db.session.rollback()
+        if not _retry:
+            raise
+        return checkout_batch(business_id, branch_id, user_id, sales, _retry=False)
+    return _link_duplicates(results)
+
+
+def _link_duplicates(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Give sales repeated within a batch the order of their first occurrence."""
+    for result in results:
+        if 'duplicate_of' in result:
+            first = results[result['duplicate_of']]
+            result.update({key: first[key] for key in ('id', 'order_id') if key in first})
+    return results
@@ -0,0 +1,368 @@
+"""
+Dashboard Metrics Aggregation Module
+====================================
+Computes the headline figures for the dashboard `/stats` endpoint for the
+current and the previous period together. Every source table is read with a
+single statement that uses conditional (CASE WHEN) aggregates, one column per
+period, instead of one scalar query per metric and period.
+
+Statements issued per call:
+- orders            revenue (both periods) and order count
+- order_items       COGS (both periods) and revenue by category
+- returns           returns value (both periods)
+- return_items      returns COGS (both periods) and returns by category
+- expenses          approved/paid expenses (both periods)
+- payrolls          approved/paid payroll (both periods)
+- customers         new customers in the current period
+- products          active product count, inventory value, average price
+- invoices          outstanding invoice amount
+
+When both periods cover whole days and the business's daily rollups are
+built (see app/utils/rollups.py), the period totals come from one query on
+`daily_sales_rollups` instead, and only the current period's order and
+return items are read for the revenue-by-category breakdown.
+"""
+
+from app import db
+from app.models.customer import Customer
+from app.models.product import Product
+from app.models.category import Category
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.expense import Expense, ExpenseStatus
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.payroll import Payroll, PayrollStatus
+from app.models.returns import Return, ReturnStatus, ReturnItem
+from sqlalchemy import func, case, and_, or_
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+# Must include RETURNED so we don't accidentally double-deduct by dropping
+# the gross order AND subtracting the Return record.
+SUCCESSFUL_ORDER_STATUSES = [
+    OrderStatus.DELIVERED, OrderStatus.COMPLETED, OrderStatus.RETURNED
+]
+
+# Returns value matches the Income Statement (Pending + Approved + Processed)
+RETURN_VALUE_STATUSES = [
+    ReturnStatus.PENDING, ReturnStatus.APPROVED, ReturnStatus.PROCESSED
+]
+
+# Returns COGS and per-category returns only count confirmed returns
+RETURN_CONFIRMED_STATUSES = [ReturnStatus.APPROVED, ReturnStatus.PROCESSED]
+
+EXPENSE_STATUSES = [ExpenseStatus.APPROVED, ExpenseStatus.PAID]
+PAYROLL_STATUSES = [PayrollStatus.APPROVED, PayrollStatus.PAID]
+
+Period = Tuple[datetime, Optional[datetime]]
+
+
+def _in_range(column, start, end):
+    """Half-open range predicate; an end of None leaves the range open."""
+    if end is None:
+        return column >= start
+    return and_(column >= start, column < end)
+
+
+def _date_or_none(value):
+    return value.date() if value is not None else None
+
+
+def _sum_if(condition, expr):
+    return func.coalesce(func.sum(case((condition, expr), else_=0)), 0)
+
+
+def _count_if(condition, expr):
+    return func.count(case((condition, expr), else_=None))
+
+
+class DashboardMetricsAggregator:
+    """
+    Aggregates dashboard metrics for a current and a previous period in a
+    fixed number of round trips, independent of the metric count.
+    """
+
+    def __init__(self, business_id: int, branch_id: Optional[int] = None):
+        self.business_id = business_id
+        self.branch_id = branch_id
+
+    def _branch_filter(self, query, column):
+        if self.branch_id:
+            return query.filter(column == self.branch_id)
+        return query
+
+    def _window_filter(self, query, column, current: Period, previous: Period, as_date=False):
+        """Restrict a query to the smallest range covering both periods."""
+        starts = [current[0], previous[0]]
+        ends = [current[1], previous[1]]
+        lower = min(starts)
+        upper = None if any(e is None for e in ends) else max(ends)
+        if as_date:
+            lower, upper = lower.date(), _date_or_none(upper)
+        return query.filter(_in_range(column, lower, upper))
+
+    def _order_totals(self, current: Period, previous: Period):
+        net_amount = Order.total_amount - Order.shipping_cost - Order.tax_amount
+        is_successful = Order.status.in_(SUCCESSFUL_ORDER_STATUSES)
+        in_current = _in_range(Order.created_at, *current)
+        in_previous = _in_range(Order.created_at, *previous)
+
+        query = db.session.query(
+            _sum_if(and_(is_successful, in_current), net_amount).label('revenue_current'),
+            _sum_if(and_(is_successful, in_previous), net_amount).label('revenue_previous'),
+            _count_if(in_current, Order.id).label('orders_current'),
+        ).filter(Order.business_id == self.business_id)
+        query = self._window_filter(query, Order.created_at, current, previous)
+        query = self._branch_filter(query, Order.branch_id)
+        return query.one()
+
+    def _order_item_totals(self, current: Period, previous: Period):
+        """COGS for both periods and current revenue, grouped by category."""
+        cost = OrderItem.quantity * Product.cost_price
+        in_current = _in_range(Order.created_at, *current)
+        in_previous = _in_range(Order.created_at, *previous)
+
+        query = db.session.query(
+            Category.name.label('category'),
+            _sum_if(in_current, cost).label('cogs_current'),
+            _sum_if(in_previous, cost).label('cogs_previous'),
+            _sum_if(in_current, OrderItem.line_total).label('revenue_current'),
+            _count_if(in_current, OrderItem.id).label('items_current'),
+        ).select_from(OrderItem).join(
+            Order, OrderItem.order_id == Order.id
+        ).join(
+            Product, OrderItem.product_id == Product.id
+        ).outerjoin(
+            Category, Product.category_id == Category.id
+        ).filter(
+            Order.business_id == self.business_id,
+            Order.status.in_(SUCCESSFUL_ORDER_STATUSES)
+        )
+        query = self._window_filter(query, Order.created_at, current, previous)
+        query = self._branch_filter(query, Order.branch_id)
+        return query.group_by(Category.name).all()
+
+    def _return_totals(self, current: Period, previous: Period):
+        start_c, end_c = current[0].date(), _date_or_none(current[1])
+        start_p, end_p = previous[0].date(), _date_or_none(previous[1])
+
+        query = db.session.query(
+            _sum_if(_in_range(Return.return_date, start_c, end_c), Return.total_amount).label('returns_current'),
+            _sum_if(_in_range(Return.return_date, start_p, end_p), Return.total_amount).label('returns_previous'),
+        ).filter(
+            Return.business_id == self.business_id,
+            Return.status.in_(RETURN_VALUE_STATUSES)
+        )
+        query = self._window_filter(query, Return.return_date, current, previous, as_date=True)
+        query = self._branch_filter(query, Return.branch_id)
+        return query.one()
+
+    def _return_item_totals(self, current: Period, previous: Period):
+        """
+        Returns COGS for both periods (by return_date) and current returns per
+        category (by created_at, as the category breakdown always has).
+        """
+        start_c, end_c = current[0].date(), _date_or_none(current[1])
+        start_p, end_p = previous[0].date(), _date_or_none(previous[1])
+        cost = ReturnItem.quantity * Product.cost_price
+        cogs_current = _in_range(Return.return_date, start_c, end_c)
+        cogs_previous = _in_range(Return.return_date, start_p, end_p)
+        category_current = _in_range(Return.created_at, *current)
+
+        lower = min(current[0], previous[0])
+        query = db.session.query(
+            Category.name.label('category'),
+            _sum_if(cogs_current, cost).label('cogs_current'),
+            _sum_if(cogs_previous, cost).label('cogs_previous'),
+            _sum_if(category_current, ReturnItem.line_total).label('returns_current'),
+        ).select_from(ReturnItem).join(
+            Return, ReturnItem.return_id == Return.id
+        ).join(
+            Product, ReturnItem.product_id == Product.id
+        ).outerjoin(
+            Category, Product.category_id == Category.id
+        ).filter(
+            Return.business_id == self.business_id,
+            Return.status.in_(RETURN_CONFIRMED_STATUSES),
+            or_(Return.return_date >= lower.date(), Return.created_at >= lower)
+        )
+        query = self._branch_filter(query, Return.branch_id)
+        return query.group_by(Category.name).all()
+
+    def _expense_totals(self, current: Period, previous: Period):
+        start_c, end_c = current[0].date(), _date_or_none(current[1])
+        start_p, end_p = previous[0].date(), _date_or_none(previous[1])
+
+        query = db.session.query(
+            _sum_if(_in_range(Expense.expense_date, start_c, end_c), Expense.amount).label('current'),
+            _sum_if(_in_range(Expense.expense_date, start_p, end_p), Expense.amount).label('previous'),
+        ).filter(
+            Expense.business_id == self.business_id,
+            Expense.status.in_(EXPENSE_STATUSES)
+        )
+        query = self._window_filter(query, Expense.expense_date, current, previous, as_date=True)
+        query = self._branch_filter(query, Expense.branch_id)
+        return query.one()
+
+    def _payroll_totals(self, current: Period, previous: Period):
+        # Use payment_date to strictly match the Income Statement
+        start_c, end_c = current[0].date(), _date_or_none(current[1])
+        start_p, end_p = previous[0].date(), _date_or_none(previous[1])
+
+        query = db.session.query(
+            _sum_if(_in_range(Payroll.payment_date, start_c, end_c), Payroll.gross_pay).label('current'),
+            _sum_if(_in_range(Payroll.payment_date, start_p, end_p), Payroll.gross_pay).label('previous'),
+        ).filter(
+            Payroll.business_id == self.business_id,
+            Payroll.status.in_(PAYROLL_STATUSES)
+        )
+        query = self._window_filter(query, Payroll.payment_date, current, previous, as_date=True)
+        query = self._branch_filter(query, Payroll.branch_id)
+        return query.one()
+
+    def _rollup_days(self, current: Period, previous: Period):
+        """Both periods as day ranges if they can be answered from rollups, else None."""
+        from app.utils.rollups import whole_days, rollups_available
+
+        days = (whole_days(*current), whole_days(*previous))
+        if None in days or not rollups_available(self.business_id):
+            return None
+        return days
+
+    def _rollup_totals(self, current_days, previous_days):
+        """Period totals for both periods from the daily rollups."""
+        from app.models.sales_rollup import DailySalesRollup as R
+        from app.utils.rollups import rollup_query
+
+        in_current = _in_range(R.day, *current_days)
+        in_previous = _in_range(R.day, *previous_days)
+        lower = min(current_days[0], previous_days[0])
+        upper = None if None in (current_days[1], previous_days[1]) else max(current_days[1], previous_days[1])
+
+        query = rollup_query(
+            self.business_id, self.branch_id,
+            _sum_if(in_current, R.net_revenue).label('revenue_current'),
+            _sum_if(in_previous, R.net_revenue).label('revenue_previous'),
+            _sum_if(in_current, R.order_count).label('orders_current'),
+            _sum_if(in_current, R.cogs).label('cogs_current'),
+            _sum_if(in_previous, R.cogs).label('cogs_previous'),
+            _sum_if(in_current, R.returns_value).label('returns_current'),
+            _sum_if(in_previous, R.returns_value).label('returns_previous'),
+            _sum_if(in_current, R.returns_cogs).label('returns_cogs_current'),
+            _sum_if(in_previous, R.returns_cogs).label('returns_cogs_previous'),
+            _sum_if(in_current, R.expenses).label('expenses_current'),
+            _sum_if(in_previous, R.expenses).label('expenses_previous'),
+            _sum_if(in_current, R.payroll_gross).label('payroll_current'),
+            _sum_if(in_previous, R.payroll_gross).label('payroll_previous'),
+        )
+        return query.filter(_in_range(R.day, lower, upper)).one()
+
+    def _customer_count(self, current: Period) -> int:
+        query = db.session.query(func.count(Customer.id)).filter(
+            Customer.business_id == self.business_id,
+            _in_range(Customer.created_at, *current)
+        )
+        query = self._branch_filter(query, Customer.branch_id)
+        return query.scalar() or 0
+
+    def _product_totals(self):
+        # Products are tracked per business, not per branch
+        return db.session.query(
+            func.count(Product.id).label('count'),
+            func.coalesce(func.sum(Product.stock_quantity * Product.cost_price), 0).label('inventory_value'),
+            func.coalesce(func.avg(Product.unit_price), 0).label('avg_unit_price'),
+        ).filter(
+            Product.business_id == self.business_id,
+            Product.is_active == True
+        ).one()
+
+    def _outstanding_invoices(self) -> float:
+        return float(db.session.query(func.coalesce(func.sum(Invoice.amount_due), 0)).filter(
+            Invoice.business_id == self.business_id,
+            Invoice.status != InvoiceStatus.PAID,
+            Invoice.status != InvoiceStatus.CANCELLED
+        ).scalar() or 0)
+
+    def get_period_metrics(self, current: Period, previous: Period) -> Dict[str, Any]:
+        """
+        Compute revenue, COGS, expenses, payroll and profit for both periods
+        plus the current-period totals shown on the dashboard cards.
+
+        Each period is a (start, end) tuple of datetimes; an end of None means
+        the period is open-ended.
+        """
+        rollup_days = self._rollup_days(current, previous)
+        if rollup_days:
+            totals = self._rollup_totals(*rollup_days)
+            # Items are still read for the category breakdown, current period only
+            order_items = self._order_item_totals(current, current)
+            return_items = self._return_item_totals(current, current)
+            orders_current = totals.orders_current
+            gross_rev = (float(totals.revenue_current or 0), float(totals.revenue_previous or 0))
+            returns_val = (float(totals.returns_current or 0), float(totals.returns_previous or 0))
+            gross_cogs = (float(totals.cogs_current or 0), float(totals.cogs_previous or 0))
+            returns_cogs = (float(totals.returns_cogs_current or 0), float(totals.returns_cogs_previous or 0))
+            exp = (float(totals.expenses_current or 0), float(totals.expenses_previous or 0))
+            pay = (float(totals.payroll_current or 0), float(totals.payroll_previous or 0))
+        else:
+            orders = self._order_totals(current, previous)
+            order_items = self._order_item_totals(current, previous)
+            returns = self._return_totals(current, previous)
+            return_items = self._return_item_totals(current, previous)
+            expenses = self._expense_totals(current, previous)
+            payroll = self._payroll_totals(current, previous)
+
+            orders_current = orders.orders_current
+            gross_rev = (float(orders.revenue_current or 0), float(orders.revenue_previous or 0))
+            returns_val = (float(returns.returns_current or 0), float(returns.returns_previous or 0))
+            gross_cogs = (
+                sum((float(row.cogs_current or 0) for row in order_items), 0.0),
+                sum((float(row.cogs_previous or 0) for row in order_items), 0.0)
+            )
+            returns_cogs = (
+                sum((float(row.cogs_current or 0) for row in return_items), 0.0),
+                sum((float(row.cogs_previous or 0) for row in return_items), 0.0)
+            )
+            exp = (float(expenses.current or 0), float(expenses.previous or 0))
+            pay = (float(payroll.current or 0), float(payroll.previous or 0))
+
+        def build(gross_rev, returns_val, gross_cogs, returns_cogs, exp, pay):
+            rev = gross_rev - returns_val
+            cogs = gross_cogs - returns_cogs
+            return {
+                'revenue': rev,
+                'cogs': cogs,
+                'expenses': exp,
+                'payroll': pay,
+                # Tax collected from customers is a liability, already stripped from revenue
+                'tax': 0.0,
+                'profit': rev - cogs - exp - pay
+            }
+
+        current_metrics = build(gross_rev[0], returns_val[0], gross_cogs[0], returns_cogs[0], exp[0], pay[0])
+        previous_metrics = build(gross_rev[1], returns_val[1], gross_cogs[1], returns_cogs[1], exp[1], pay[1])
+
+        # Revenue by category (net of returns), only for categories with sales
+        category_returns = {
+            row.category: float(row.returns_current or 0)
+            for row in return_items if row.category is not None
+        }
+        revenue_distribution = {}
+        for row in order_items:
+            if row.category is None or not row.items_current:
+                continue
+            gross_amount = float(row.revenue_current or 0)
+            revenue_distribution[row.category] = max(0, gross_amount - category_returns.get(row.category, 0))
+
+        products = self._product_totals()
+
+        return {
+            'current': current_metrics,
+            'previous': previous_metrics,
+            'total_orders': int(orders_current or 0),
+            'total_customers': self._customer_count(current),
+            'total_products': int(products.count or 0),
+            'total_inventory_value': float(products.inventory_value or 0),
+            'avg_unit_price': float(products.avg_unit_price or 0),
+            'outstanding_invoices': self._outstanding_invoices(),
+            'revenue_distribution': revenue_distribution
+        }
@@ -1,8 +1,8 @@
 from flask import jsonify
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended import verify_jwt_in_request
 from functools import wraps
-from app.models.user import User, UserRole
-from app import db
+from app.models.user import UserRole
+from app.utils.tenant_context import get_tenant_context
 from datetime import datetime
 
 BUSINESS_ROLES = {UserRole.admin, UserRole.manager, UserRole.staff}
@@ -19,11 +19,8 @@ def role_required(allowed_roles):
             # Verify JWT token
             verify_jwt_in_request()
             
-            # Get current user ID from token
-            current_user_id = get_jwt_identity()
-            
-            # Get user from database (refresh to ensure latest data)
-            user = db.session.get(User, current_user_id)
+            # Get current user from the request's tenant context
+            user = get_tenant_context()
             
             if not user:
                 return jsonify({'error': 'User not found'}), 404
@@ -0,0 +1,363 @@
+"""
+Payroll Disbursements
+=====================
+Pays approved payrolls out to employees' mobile wallets as a background
+job instead of one blocking provider call (and one commit) per employee
+inside the request:
+
+1. Claim: the payrolls are loaded with their employees in one query and
+   marked 'processing' with one guarded UPDATE, so a second batch started
+   while this one runs cannot pay the same payroll twice.
+2. Send: payouts go out from a bounded thread pool (DISBURSEMENT_WORKERS)
+   through a per-provider token bucket (DISBURSEMENT_RATE_LIMITS, requests
+   per second, shared by every job in the process). Workers share the
+   provider's cached access token and keep their HTTP connections open.
+   Throttled (429) requests are retried with the same reference id.
+3. Record: results are written back in batches of `FLUSH_SIZE` (or every
+   `FLUSH_INTERVAL` seconds), one bulk UPDATE and one commit per batch,
+   together with the job's progress.
+
+Small batches run inside the request; larger ones in a background thread
+tracked through `DisbursementJob`:
+
+    body, status = submit_disbursement(business_id, user_id, payroll_ids)
+"""
+
+from flask import current_app
+from app import db
+from app.models.disbursement_job import DisbursementJob
+from app.models.employee import Employee
+from app.models.payroll import Payroll, PayrollStatus
+from app.utils import momo, rollups
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from sqlalchemy import or_, update
+from sqlalchemy.orm import joinedload
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+import uuid
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Results written back per commit, and the longest a result waits for one
+FLUSH_SIZE = 50
+FLUSH_INTERVAL = 2.0
+
+# Batches up to this many payrolls are paid out synchronously by the request
+INLINE_MAX_PAYROLLS = 10
+
+# Per-payroll results kept on the job (counts are always exact)
+MAX_REPORTED_RESULTS = 1000
+
+# Attempts after a 429 from the provider, with exponential backoff
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF = 1.0
+
+PROVIDERS = {
+    'mtn_momo': {
+        'send': momo.disburse_to_wallet,
+        'token': momo.get_disbursement_token,
+        'reset_token': momo.clear_token_cache,
+    },
+}
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second (bursts up to one second's worth)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def provider_limiter(provider: str) -> RateLimiter:
+    """The process-wide limiter for a provider, at its configured rate."""
+    rate = float(current_app.config.get('DISBURSEMENT_RATE_LIMITS', {}).get(provider, 0))
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = RateLimiter(rate)
+        limiter.rate = rate
+        return limiter
+
+
+# ==================== CLAIM ====================
+
+def _result(payroll_id: int, success: bool, **fields) -> Dict[str, Any]:
+    return {'payroll_id': payroll_id, 'success': success, **fields}
+
+
+def _claim(job: DisbursementJob) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Load and claim the job's payrolls. Returns the payouts to send (plain
+    dicts, safe to hand to worker threads) and the results of payrolls
+    that cannot be paid.
+    """
+    query = Payroll.query.options(
+        joinedload(Payroll.employee).joinedload(Employee.user)
+    ).filter(Payroll.business_id == job.business_id)
+    if job.payroll_ids:
+        query = query.filter(Payroll.id.in_(job.payroll_ids))
+    else:
+        query = query.filter(Payroll.status == PayrollStatus.APPROVED)
+    payrolls = {payroll.id: payroll for payroll in query.order_by(Payroll.id).all()}
+
+    skipped = [_result(payroll_id, False, error='Payroll record not found')
+               for payroll_id in job.payroll_ids or [] if payroll_id not in payrolls]
+    candidates = {}
+    for payroll in payrolls.values():
+        employee = payroll.employee
+        if payroll.status != PayrollStatus.APPROVED:
+            skipped.append(_result(payroll.id, False, error='Payroll must be approved before disbursement'))
+        elif not employee or not employee.user or not employee.user.phone:
+            skipped.append(_result(payroll.id, False, error='Missing phone'))
+        else:
+            candidates[payroll.id] = {
+                'payroll_id': payroll.id,
+                'employee_id': payroll.employee_id,
+                'phone': employee.user.phone,
+                'amount': float(payroll.net_pay),
+                'currency': payroll.disbursement_currency or 'EUR',
+                'note': f'Payroll {payroll.id}',
+            }
+
+    claimed = set()
+    if candidates:
+        claimed = set(db.session.execute(
+            update(Payroll).where(
+                Payroll.id.in_(list(candidates)),
+                Payroll.status == PayrollStatus.APPROVED,
+                or_(Payroll.disbursement_status.is_(None), Payroll.disbursement_status != 'processing')
+            ).values(
+                disbursement_status='processing',
+                disbursement_provider=job.provider,
+                updated_at=datetime.utcnow()
+            ).returning(Payroll.id),
+            execution_options={'synchronize_session': False}
+        ).scalars())
+    skipped.extend(_result(payroll_id, False, error='Disbursement already in progress')
+                   for payroll_id in candidates if payroll_id not in claimed)
+    return [item for payroll_id, item in candidates.items() if payroll_id in claimed], skipped
+
+
+# ==================== SEND ====================
+
+def _send(provider: Dict[str, Any], limiter: RateLimiter, item: Dict[str, Any],
+          sessions: threading.local) -> Dict[str, Any]:
+    """One payout, run on a worker thread. Never raises."""
+    if not hasattr(sessions, 'http'):
+        sessions.http = requests.Session()
+    reference_id = str(uuid.uuid4())
+    reset_token = True
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            result = provider['send'](
+                amount=item['amount'], phone_number=item['phone'], currency=item['currency'],
+                payee_note=item['note'], reference_id=reference_id, session=sessions.http
+            )
+        except Exception as e:
+            return {'success': False, 'reference_id': reference_id, 'status': 'error', 'error': str(e)}
+
+        status = result.get('http_status')
+        if status == 401 and reset_token:
+            # Token revoked or expired early: fetch a new one once
+            reset_token = False
+            provider['reset_token']()
+            continue
+        if status == 429 and attempt < RATE_LIMIT_RETRIES:
+            time.sleep(RATE_LIMIT_BACKOFF * 2 ** attempt)
+            attempt += 1
+            continue
+        return result
+
+
+# ==================== RECORD ====================
+
+def _report(results: List[Dict[str, Any]], item: Dict[str, Any]) -> None:
+    if len(results) < MAX_REPORTED_RESULTS:
+        results.append(item)
+
+
+def _flush(job: DisbursementJob, buffer: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+           results: List[Dict[str, Any]]) -> None:
+    """Write a batch of payout results and the job's progress in one commit."""
+    if not buffer:
+        return
+    now = datetime.utcnow()
+    mappings = []
+    for item, result in buffer:
+        if result.get('success'):
+            mappings.append({
+                'id': item['payroll_id'],
+                'disbursement_reference': result.get('reference_id'),
+                'disbursement_status': result.get('status', 'pending'),
+                'disbursement_amount': item['amount'],
+                'disbursement_currency': item['currency'],
+                'disbursed_at': now,
+                'disbursement_metadata': result,
+                'status': PayrollStatus.PAID,
+                'payment_date': now.date(),
+                'updated_at': now,
+            })
+            job.succeeded_count += 1
+            job.disbursed_amount = float(job.disbursed_amount or 0) + item['amount']
+            _report(results, _result(item['payroll_id'], True, reference=result.get('reference_id')))
+        else:
+            mappings.append({
+                'id': item['payroll_id'],
+                'disbursement_status': result.get('status', 'failed'),
+                'disbursement_metadata': result,
+                'updated_at': now,
+            })
+            job.failed_count += 1
+            _report(results, _result(item['payroll_id'], False, error=result.get('error') or result.get('status')))
+    # bulk_update_mappings skips the flush listeners: refresh the rollup days of paid payroll
+    paid_ids = [mapping['id'] for mapping in mappings if 'payment_date' in mapping]
+    if paid_ids:
+        previous_days = db.session.query(Payroll.payment_date).filter(
+            Payroll.id.in_(paid_ids), Payroll.payment_date.isnot(None)
+        ).distinct().all()
+        rollups.mark_days(db.session, [(job.business_id, now.date())] +
+                          [(job.business_id, day) for day, in previous_days])
+    db.session.bulk_update_mappings(Payroll, mappings)
+    job.processed_count += len(buffer)
+    job.results = list(results)
+    db.session.commit()
+    buffer.clear()
+
+
+# ==================== JOBS ====================
+
+def create_disbursement_job(business_id: int, user_id: Optional[int],
+                            payroll_ids: Optional[List[int]] = None, provider: str = 'mtn_momo') -> DisbursementJob:
+    if provider not in PROVIDERS:
+        raise ValueError(f'Unknown disbursement provider: {provider}')
+    job = DisbursementJob(business_id=business_id, user_id=user_id, provider=provider,
+                          payroll_ids=[int(payroll_id) for payroll_id in payroll_ids or []])
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_disbursement_job(job_id: int) -> DisbursementJob:
+    """Claim, pay out and record the job's payrolls. Never raises; failures are recorded on the job."""
+    job = db.session.get(DisbursementJob, job_id)
+    results: List[Dict[str, Any]] = []
+    pending: Dict[int, Dict[str, Any]] = {}
+    try:
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        items, skipped = _claim(job)
+        pending = {item['payroll_id']: item for item in items}
+        for result in skipped:
+            _report(results, result)
+        job.total_count = len(items) + len(skipped)
+        job.processed_count = job.failed_count = len(skipped)
+        job.total_amount = sum(item['amount'] for item in items)
+        job.results = list(results)
+        db.session.commit()
+
+        if items:
+            provider = PROVIDERS[job.provider]
+            limiter = provider_limiter(job.provider)
+            workers = max(1, int(current_app.config.get('DISBURSEMENT_WORKERS', 8)))
+            # Fetch the access token once before the workers all ask for it
+            provider['token']()
+
+            sessions = threading.local()
+            buffer: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+            flushed_at = time.monotonic()
+            with ThreadPoolExecutor(max_workers=min(workers, len(items)),
+                                    thread_name_prefix=f'disburse-{job_id}') as pool:
+                futures = {pool.submit(_send, provider, limiter, item, sessions): item for item in items}
+                for future in as_completed(futures):
+                    item = futures[future]
+                    buffer.append((item, future.result()))
+                    pending.pop(item['payroll_id'], None)
+                    if len(buffer) >= FLUSH_SIZE or time.monotonic() - flushed_at >= FLUSH_INTERVAL:
+                        _flush(job, buffer, results)
+                        flushed_at = time.monotonic()
+            _flush(job, buffer, results)
+
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Disbursement job %s failed", job_id)
+        # Release payrolls that were claimed but never sent
+        if pending:
+            db.session.execute(
+                update(Payroll).where(
+                    Payroll.id.in_(list(pending)),
+                    Payroll.disbursement_status == 'processing'
+                ).values(disbursement_status='failed', updated_at=datetime.utcnow()),
+                execution_options={'synchronize_session': False}
+            )
+        job = db.session.get(DisbursementJob, job_id)
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.results = results
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
+
+
+def start_disbursement_job(job_id: int) -> None:
+    """Run a disbursement job in a background thread with its own app context."""
+    app = current_app._get_current_object()
+
+    def target():
+        with app.app_context():
+            try:
+                run_disbursement_job(job_id)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=target, name=f'disbursement-job-{job_id}', daemon=True).start()
+
+
+def submit_disbursement(business_id: int, user_id: Optional[int], payroll_ids: Optional[List[int]] = None,
+                        background: Optional[bool] = None) -> Tuple[Dict[str, Any], int]:
+    """
+    Create the job and pay out: inline for small batches (200 with the
+    results) or in the background (202 with the job to poll).
+    """
+    job = create_disbursement_job(business_id, user_id, payroll_ids)
+    if background is None:
+        if payroll_ids:
+            count = len(payroll_ids)
+        else:
+            count = Payroll.query.filter_by(business_id=business_id, status=PayrollStatus.APPROVED).count()
+        background = count > INLINE_MAX_PAYROLLS
+    if background:
+        start_disbursement_job(job.id)
+        return {'message': 'Disbursement started', 'job': job.to_dict()}, 202
+    job = run_disbursement_job(job.id)
+    return {'message': 'Disbursement finished', 'job': job.to_dict(), 'results': job.results or []}, 200
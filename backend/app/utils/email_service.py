@@ -1,7 +1,7 @@
 from flask_mail import Message
 from flask import current_app
 from app import db, mail
-from app.models.settings import SystemSetting
+from app.utils.settings_service import get_settings
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -11,19 +11,25 @@ class EmailService:
     @staticmethod
     def get_email_config(business_id=None):
         """Retrieve email configuration from database - only global settings from superadmin"""
-        config = {}
-        
         # Always use global settings (business_id is None) - configured in superadmin only
         # Business-specific email settings are disabled
-        global_email_settings = SystemSetting.query.filter(
-            SystemSetting.business_id.is_(None),  # Global settings only
-            SystemSetting.setting_key.like('email_%')
-        ).all()
-        
-        for setting in global_email_settings:
-            config[setting.setting_key.replace('email_', '')] = setting.setting_value
-        
-        return config
+        return get_settings(None, prefix='email_')
+
+    @staticmethod
+    def is_configured():
+        """Whether an SMTP host and username are available to send with"""
+        email_config = EmailService.get_email_config()
+        smtp_host = (
+            email_config.get('smtp_host')
+            or email_config.get('email_smtp_host')
+            or current_app.config.get('MAIL_SERVER')
+        )
+        smtp_username = (
+            email_config.get('smtp_username')
+            or email_config.get('email_smtp_username')
+            or current_app.config.get('MAIL_USERNAME')
+        )
+        return bool(smtp_host and smtp_username)
 
     @staticmethod
     def send_email(to_email, subject, body, business_id=None, html_body=None, force=False, custom_config=None):
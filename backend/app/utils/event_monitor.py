@@ -9,7 +9,11 @@ from typing import Dict, Any, Optional, List
 from enum import Enum
 from flask import request, g
 from app import db
+from app.utils.audit_writer import audit_writer
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 import logging
+import queue
 from dataclasses import dataclass, asdict
 import traceback
 
@@ -131,13 +135,17 @@ class EventMonitor:
         app.after_request(self._after_request)
         app.teardown_appcontext(self._teardown_request)
         
-        # Configure event logger
+        # Configure event logger; file writes happen on a listener thread, off the request
         handler = logging.FileHandler(app.config.get('EVENT_LOG_FILE', 'logs/events.log'))
         formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
         handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+        log_queue = queue.Queue(-1)
+        self.log_listener = QueueListener(log_queue, handler)
+        self.log_listener.start()
+        atexit.register(self.log_listener.stop)
+        self.logger.addHandler(QueueHandler(log_queue))
         self.logger.setLevel(logging.INFO)
     
     def _before_request(self):
@@ -196,8 +204,11 @@ class EventMonitor:
                   new_values: Dict[str, Any] = None,
                   user_id: str = None,
                   business_id: str = None,
-                  tags: List[str] = None) -> str:
-        """Log an event with comprehensive details"""
+                  tags: List[str] = None,
+                  commit: bool = True) -> str:
+        """Log an event with comprehensive details. The row is written in the
+        background by app.utils.audit_writer; with commit=False it is only
+        queued once the caller's transaction commits."""
         
         try:
             # Create event object
@@ -209,7 +220,7 @@ class EventMonitor:
                 severity=severity,
                 user_id=user_id or getattr(g, 'user_id', None),
                 business_id=business_id or getattr(g, 'business_id', None),
-                ip_address=request.remote_addr if request else 'N/A',
+                ip_address=(request.remote_addr or 'N/A') if request else 'N/A',
                 user_agent=request.headers.get('User-Agent', 'N/A') if request else 'N/A',
                 endpoint=request.endpoint if request else 'N/A',
                 method=request.method if request else 'N/A',
@@ -226,7 +237,7 @@ class EventMonitor:
             )
             
             # Store in database (if event model exists)
-            self._store_event(event)
+            self._store_event(event, commit=commit)
             
             # Log to file
             self._log_to_file(event)
@@ -241,38 +252,35 @@ class EventMonitor:
             self.logger.error(f"Failed to log event: {str(e)}")
             return None
     
-    def _store_event(self, event: Event):
-        """Store event in database"""
+    def _store_event(self, event: Event, commit: bool = True):
+        """Queue the event row for the background writer"""
         try:
             from app.models.event import EventLog
-            event_log = EventLog(
-                id=event.id,
-                timestamp=event.timestamp,
-                category=event.category.value,
-                event_type=event.event_type.value,
-                severity=event.severity.value,
-                user_id=event.user_id,
-                business_id=event.business_id,
-                ip_address=event.ip_address,
-                user_agent=event.user_agent,
-                endpoint=event.endpoint,
-                method=event.method,
-                description=event.description,
-                details=json.dumps(event.details),
-                entity_type=event.entity_type,
-                entity_id=event.entity_id,
-                old_values=json.dumps(event.old_values) if event.old_values else None,
-                new_values=json.dumps(event.new_values) if event.new_values else None,
-                session_id=event.session_id,
-                correlation_id=event.correlation_id,
-                source=event.source,
-                tags=json.dumps(event.tags)
-            )
-            db.session.add(event_log)
-            db.session.commit()
+            audit_writer.enqueue(EventLog.__table__, {
+                'id': event.id,
+                'timestamp': event.timestamp,
+                'category': event.category.value,
+                'event_type': event.event_type.value,
+                'severity': event.severity.value,
+                'user_id': event.user_id,
+                'business_id': event.business_id,
+                'ip_address': event.ip_address,
+                'user_agent': event.user_agent,
+                'endpoint': event.endpoint,
+                'method': event.method,
+                'description': event.description,
+                'details': json.dumps(event.details),
+                'entity_type': event.entity_type,
+                'entity_id': event.entity_id,
+                'old_values': json.dumps(event.old_values) if event.old_values else None,
+                'new_values': json.dumps(event.new_values) if event.new_values else None,
+                'session_id': event.session_id,
+                'correlation_id': event.correlation_id,
+                'source': event.source,
+                'tags': json.dumps(event.tags)
+            }, after_commit=not commit)
         except Exception as e:
-            self.logger.error(f"Failed to store event in database: {str(e)}")
-            db.session.rollback()
+            self.logger.error(f"Failed to queue event for storage: {str(e)}")
     
     def _log_to_file(self, event: Event):
         """Log event to file"""
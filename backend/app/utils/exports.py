@@ -0,0 +1,176 @@
+"""
+Streaming Export Utility Module
+===============================
+Builds CSV, XLSX and PDF downloads without holding the whole result set in
+memory:
+
+- Rows come from column queries (joined columns, no ORM objects) read with
+  `yield_per`, which uses a server-side cursor on PostgreSQL.
+- CSV is generated row by row straight into the response.
+- XLSX uses openpyxl's write-only workbook, which spools rows to disk, and
+  the finished file is streamed back in chunks.
+- PDF pages are drawn one at a time with page compression into a temporary
+  file, which is then streamed. ReportLab cannot emit a page before the
+  document is saved, so this bounds memory rather than time to first byte.
+
+Typical use:
+
+    rows = (format_row(row) for row in iter_rows(query))
+    return streaming_response(csv_chunks(HEADER, rows), 'text/csv', 'orders.csv')
+"""
+
+from flask import Response, stream_with_context
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+import csv
+import io
+import os
+import tempfile
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+try:
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+except ImportError:
+    canvas = None
+    letter = None
+
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_MIMETYPE = 'application/pdf'
+
+FETCH_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+# (header, x position, max characters) for a PDF table column
+PdfColumn = Tuple[str, float, int]
+
+
+def iter_rows(query, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[Any]:
+    """Iterate a query in batches of batch_size rows via a server-side cursor."""
+    return iter(query.yield_per(batch_size))
+
+
+def _file_chunks(path: str) -> Iterator[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def _temp_path(suffix: str) -> str:
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    os.close(handle)
+    return path
+
+
+def csv_chunks(header: Sequence[str], rows: Iterable[Sequence[Any]], flush_every: int = 500) -> Iterator[str]:
+    """CSV text in chunks of flush_every rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def xlsx_chunks(sheet_title: str, header: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """An XLSX workbook with one sheet, written in openpyxl's write-only mode."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append(list(row))
+
+    path = _temp_path('.xlsx')
+    try:
+        workbook.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return _file_chunks(path)
+
+
+def pdf_chunks(title: str, columns: List[PdfColumn], rows: Iterable[Sequence[Any]],
+               subtitle_lines: Optional[List[str]] = None, footer_lines: Optional[List[str]] = None) -> Iterator[bytes]:
+    """
+    A tabular PDF report. Every row is printed; the column headers are
+    repeated at the top of each page.
+    """
+    path = _temp_path('.pdf')
+    try:
+        p = canvas.Canvas(path, pagesize=letter, pageCompression=1)
+        width, height = letter
+        page = 1
+
+        def draw_headers(y):
+            p.setFont("Helvetica-Bold", 9)
+            for header, x, _ in columns:
+                p.drawString(x, y, header)
+            p.setFont("Helvetica", 8)
+            return y - 15
+
+        def draw_page_number():
+            p.setFont("Helvetica", 8)
+            p.drawRightString(width - 50, 30, f"Page {page}")
+
+        # Title
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(50, height - 50, title)
+        y_position = height - 70
+        p.setFont("Helvetica", 12)
+        for line in subtitle_lines or []:
+            p.drawString(50, y_position, line)
+            y_position -= 20
+        y_position = draw_headers(y_position - 10)
+
+        for row in rows:
+            if y_position < 50:
+                draw_page_number()
+                p.showPage()
+                page += 1
+                y_position = draw_headers(height - 50)
+            for (_, x, max_chars), value in zip(columns, row):
+                p.drawString(x, y_position, str(value if value is not None else '')[:max_chars])
+            y_position -= 12
+
+        if footer_lines:
+            p.setFont("Helvetica-Bold", 10)
+            for line in footer_lines:
+                if y_position < 50:
+                    draw_page_number()
+                    p.showPage()
+                    page += 1
+                    y_position = height - 50
+                    p.setFont("Helvetica-Bold", 10)
+                y_position -= 8
+                p.drawString(50, y_position, line)
+                y_position -= 12
+
+        draw_page_number()
+        p.save()
+    except Exception:
+        os.remove(path)
+        raise
+    return _file_chunks(path)
+
+
+def streaming_response(chunks: Iterable[Any], mimetype: str, filename: str) -> Response:
+    """Attachment response fed by a generator; keeps the request context open while streaming."""
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
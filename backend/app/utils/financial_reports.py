@@ -31,22 +31,46 @@ from app.models.payroll import Payroll, PayrollStatus
 from app.models.settings import CompanyProfile
 from app.models.employee import Employee
 from app.models.asset import Asset, AssetStatus
+from app.models.sales_rollup import DailySalesRollup
+from app.utils.rollups import whole_days, rollups_available, rollup_query
+from app.utils.dashboard_metrics import _sum_if
 from sqlalchemy import func, desc, case, and_, or_, cast, String
+from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta, date
 from decimal import Decimal
+from functools import wraps
 from typing import Dict, List, Any, Optional
 import json
 
 
+def _cached_fact(method):
+    """
+    Memoize a calculator method on the calculator instance, keyed by
+    (method, business, branch, arguments). A calculator lives for one
+    request, so each fact is queried at most once per request.
+    """
+    @wraps(method)
+    def wrapper(self, *args):
+        key = (method.__name__, self.business_id, self.branch_id) + args
+        if key not in self._facts:
+            self._facts[key] = method(self, *args)
+        return self._facts[key]
+    return wrapper
+
+
 class FinancialReportCalculator:
     """
     Advanced Financial Report Calculator
-    Provides comprehensive financial calculations and report generation
+    Provides comprehensive financial calculations and report generation.
+    Shared sums (sales, COGS, returns, expenses, payroll, invoices, bills)
+    and whole statements are cached per instance, so reports generated
+    together reuse each other's queries.
     """
     
     def __init__(self, business_id: int, branch_id: Optional[int] = None):
         self.business_id = business_id
         self.branch_id = branch_id
+        self._facts: Dict[tuple, Any] = {}
     
     def _apply_branch_filter(self, query):
         """Apply branch filter to query if branch_id is specified"""
@@ -69,187 +93,344 @@ class FinancialReportCalculator:
             return 0.0
         return round((numerator / denominator) * 100, 2)
     
-    # ==================== COMPREHENSIVE INCOME STATEMENT ====================
+    # ==================== SHARED FACTS ====================
+    # Primitive sums shared by several reports. Each is fetched once per
+    # calculator (one request) and reused by every report that needs it.
     
-    def get_comprehensive_income_statement(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """
-        Generate Comprehensive Income Statement (Profit & Loss)
-        Includes detailed revenue, COGS, expenses, and profit analysis
-        """
-        successful_statuses = self._get_successful_order_statuses()
-        
-        # ============== REVENUE SECTION ==============
-        # Gross Sales Revenue (Revenue BEFORE any discounts are applied)
-        gross_sales_query = db.session.query(
-            func.sum(OrderItem.quantity * OrderItem.unit_price)
-        ).join(Order, OrderItem.order_id == Order.id).filter(
-            Order.business_id == self.business_id,
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            Order.status.in_(successful_statuses)
-        )
-        if self.branch_id:
-            gross_sales_query = gross_sales_query.filter(Order.branch_id == self.branch_id)
-        gross_sales = float(gross_sales_query.scalar() or 0)
-        
-        # Total Sales Discounts (Line-level discounts + Global order discounts)
-        line_discounts_query = db.session.query(
-            func.sum(OrderItem.quantity * OrderItem.unit_price * (OrderItem.discount_percent / 100))
-        ).join(Order, OrderItem.order_id == Order.id).filter(
-            Order.business_id == self.business_id,
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            Order.status.in_(successful_statuses)
-        )
-        
-        global_discounts_query = db.session.query(func.sum(Order.discount_amount)).filter(
+    @_cached_fact
+    def _order_item_facts(self, start_date: datetime, end_date: datetime) -> Dict[str, float]:
+        """Gross sales, line discounts and COGS of successful orders created in the period"""
+        query = db.session.query(
+            func.sum(OrderItem.quantity * OrderItem.unit_price).label('gross_sales'),
+            func.sum(OrderItem.quantity * OrderItem.unit_price * (OrderItem.discount_percent / 100)).label('line_discounts'),
+            func.sum(OrderItem.quantity * Product.cost_price).label('cogs')
+        ).select_from(OrderItem).join(
+            Order, OrderItem.order_id == Order.id
+        ).outerjoin(
+            Product, OrderItem.product_id == Product.id
+        ).filter(
             Order.business_id == self.business_id,
             Order.created_at >= start_date,
             Order.created_at <= end_date,
-            Order.status.in_(successful_statuses)
+            Order.status.in_(self._get_successful_order_statuses())
         )
-        
         if self.branch_id:
-            line_discounts_query = line_discounts_query.filter(Order.branch_id == self.branch_id)
-            global_discounts_query = global_discounts_query.filter(Order.branch_id == self.branch_id)
-            
-        line_discounts = float(line_discounts_query.scalar() or 0)
-        global_discounts = float(global_discounts_query.scalar() or 0)
-        sales_discounts = line_discounts + global_discounts
-        
-        # Sales Tax Liability (collected but not revenue)
-        tax_liability_query = db.session.query(func.sum(Order.tax_amount)).filter(
+            query = query.filter(Order.branch_id == self.branch_id)
+        row = query.one()
+        return {
+            'gross_sales': float(row.gross_sales or 0),
+            'line_discounts': float(row.line_discounts or 0),
+            'cogs': float(row.cogs or 0)
+        }
+    
+    @_cached_fact
+    def _order_facts(self, start_date: datetime, end_date: datetime) -> Dict[str, float]:
+        """Order-level discounts, tax and count of successful orders created in the period"""
+        query = db.session.query(
+            func.sum(Order.discount_amount).label('discount_amount'),
+            func.sum(Order.tax_amount).label('tax_amount'),
+            func.count(Order.id).label('order_count')
+        ).filter(
             Order.business_id == self.business_id,
             Order.created_at >= start_date,
             Order.created_at <= end_date,
-            Order.status.in_(successful_statuses)
+            Order.status.in_(self._get_successful_order_statuses())
         )
         if self.branch_id:
-            tax_liability_query = tax_liability_query.filter(Order.branch_id == self.branch_id)
-        tax_liability = float(tax_liability_query.scalar() or 0)
-        
-        # Sales Returns & Allowances
-        # Include APPROVED and PROCESSED returns as confirmed deductions
-        # Also include PENDING returns so they appear in reports (user can see all returns)
-        sales_returns_query = db.session.query(
-            func.sum(Return.total_amount)
+            query = query.filter(Order.branch_id == self.branch_id)
+        row = query.one()
+        return {
+            'discount_amount': float(row.discount_amount or 0),
+            'tax_amount': float(row.tax_amount or 0),
+            'order_count': row.order_count or 0
+        }
+    
+    @_cached_fact
+    def _return_facts(self, start_day: date, end_day: date) -> Dict[str, float]:
+        """Return value (pending, approved, processed), pending value and returned COGS in the period"""
+        # Return value is filtered by the order's branch, returned COGS by the return's
+        value_query = db.session.query(
+            func.sum(Return.total_amount).label('returns_value'),
+            _sum_if(Return.status == ReturnStatus.PENDING, Return.total_amount).label('pending_returns')
         ).join(Order, Return.order_id == Order.id).filter(
             Return.business_id == self.business_id,
-            Return.return_date >= start_date.date(),
-            Return.return_date <= end_date.date(),
+            Return.return_date >= start_day,
+            Return.return_date <= end_day,
             Return.status.in_([ReturnStatus.PENDING, ReturnStatus.APPROVED, ReturnStatus.PROCESSED])
         )
         if self.branch_id:
-            sales_returns_query = sales_returns_query.filter(Order.branch_id == self.branch_id)
-        sales_returns = float(sales_returns_query.scalar() or 0)
-        
-        # Pending returns (for informational purposes)
-        pending_returns_query = db.session.query(
-            func.sum(Return.total_amount)
-        ).join(Order, Return.order_id == Order.id).filter(
-            Return.business_id == self.business_id,
-            Return.return_date >= start_date.date(),
-            Return.return_date <= end_date.date(),
-            Return.status == ReturnStatus.PENDING
-        )
-        if self.branch_id:
-            pending_returns_query = pending_returns_query.filter(Order.branch_id == self.branch_id)
-        pending_returns = float(pending_returns_query.scalar() or 0)
-        
-        # Note: Shipping cost is excluded from Net Sales as it's typically a direct pass-through or expense offset
-        net_sales = gross_sales - sales_discounts - sales_returns
-        
-        # ============== COST OF GOODS SOLD ==============
-        # COGS from order items - use coalesce to handle null cost_price values
-        cogs_query = db.session.query(
-            func.coalesce(func.sum(OrderItem.quantity * Product.cost_price), 0)
-        ).join(
-            Order, OrderItem.order_id == Order.id
-        ).join(
-            Product, OrderItem.product_id == Product.id
-        ).filter(
-            Order.business_id == self.business_id,
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            Order.status.in_(successful_statuses)
-        )
-        if self.branch_id:
-            cogs_query = cogs_query.filter(Order.branch_id == self.branch_id)
-        cogs_result = cogs_query.scalar()
-        gross_cogs = float(cogs_result) if cogs_result is not None else 0
+            value_query = value_query.filter(Order.branch_id == self.branch_id)
+        values = value_query.one()
         
-        # Calculate returns COGS
-        ret_cogs_q = db.session.query(func.sum(ReturnItem.quantity * Product.cost_price)).join(
+        cogs_query = db.session.query(func.sum(ReturnItem.quantity * Product.cost_price)).join(
             Return, ReturnItem.return_id == Return.id
         ).join(
             Product, ReturnItem.product_id == Product.id
         ).filter(
             Return.business_id == self.business_id,
             Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED]),
-            Return.return_date >= start_date.date(),
-            Return.return_date <= end_date.date()
+            Return.return_date >= start_day,
+            Return.return_date <= end_day
         )
         if self.branch_id:
-            ret_cogs_q = ret_cogs_q.filter(Return.branch_id == self.branch_id)
-        returns_cogs = float(ret_cogs_q.scalar() or 0)
-        
-        total_cogs = gross_cogs - returns_cogs
+            cogs_query = cogs_query.filter(Return.branch_id == self.branch_id)
         
-        # GROSS PROFIT
-        gross_profit = net_sales - total_cogs
-        gross_profit_margin = self._calculate_percentage(gross_profit, net_sales)
-        
-        # ============== OPERATING EXPENSES ==============
-        # Get all approved expenses
-        expenses_query = db.session.query(
+        return {
+            'returns_value': float(values.returns_value or 0),
+            'pending_returns': float(values.pending_returns or 0),
+            'returns_cogs': float(cogs_query.scalar() or 0)
+        }
+    
+    @_cached_fact
+    def _expense_breakdown(self, start_day: date, end_day: date) -> List[Any]:
+        """Approved and paid expenses in the period, grouped by category and status"""
+        query = db.session.query(
             Expense.category,
+            Expense.status,
             func.sum(Expense.amount).label('total'),
             func.count(Expense.id).label('count')
         ).filter(
             Expense.business_id == self.business_id,
-            Expense.expense_date >= start_date.date(),
-            Expense.expense_date <= end_date.date(),
+            Expense.expense_date >= start_day,
+            Expense.expense_date <= end_day,
             Expense.status.in_([ExpenseStatus.APPROVED, ExpenseStatus.PAID])
         )
         if self.branch_id:
-            expenses_query = expenses_query.filter(Expense.branch_id == self.branch_id)
-        
-        expense_breakdown = expenses_query.group_by(Expense.category).all()
-        
-        # Categorize expenses
-        operating_expenses = {}
-        total_operating_expenses = 0
-        
-        for exp in expense_breakdown:
-            category_name = exp.category.value if hasattr(exp.category, 'value') else str(exp.category)
-            amount = float(exp.total)
-            operating_expenses[category_name] = {
-                'amount': amount,
-                'count': exp.count,
-                'percentage': self._calculate_percentage(amount, gross_profit) if gross_profit != 0 else 0
-            }
-            total_operating_expenses += amount
-        
-        # ============== PAYROLL COSTS ==============
-        payroll_query = db.session.query(
+            query = query.filter(Expense.branch_id == self.branch_id)
+        return query.group_by(Expense.category, Expense.status).all()
+    
+    @_cached_fact
+    def _payroll_facts(self, start_day: date, end_day: date) -> Dict[str, float]:
+        """Approved and paid payroll in the period, plus the paid gross alone"""
+        is_paid = Payroll.status == PayrollStatus.PAID
+        query = db.session.query(
             func.sum(Payroll.gross_pay).label('gross'),
-            func.sum(Payroll.net_pay).label('net'),
             func.sum(Payroll.tax_deductions).label('tax'),
             func.sum(Payroll.other_deductions).label('benefits'),
-            func.count(Payroll.id).label('count')
+            _sum_if(is_paid, Payroll.gross_pay).label('paid_gross')
         ).filter(
             Payroll.business_id == self.business_id,
-            Payroll.payment_date >= start_date.date(),
-            Payroll.payment_date <= end_date.date(),
+            Payroll.payment_date >= start_day,
+            Payroll.payment_date <= end_day,
             Payroll.status.in_([PayrollStatus.APPROVED, PayrollStatus.PAID])
         )
         if self.branch_id:
-            payroll_query = payroll_query.filter(Payroll.branch_id == self.branch_id)
+            query = query.filter(Payroll.branch_id == self.branch_id)
+        row = query.one()
+        return {
+            'gross': float(row.gross or 0),
+            'tax': float(row.tax or 0),
+            'benefits': float(row.benefits or 0),
+            'paid_gross': float(row.paid_gross or 0)
+        }
+    
+    @_cached_fact
+    def _sales_to_date(self, as_of_date: datetime) -> Dict[str, float]:
+        """Cumulative delivered/completed revenue and COGS up to as_of_date"""
+        sale_statuses = [OrderStatus.DELIVERED, OrderStatus.COMPLETED]
+        revenue_query = db.session.query(func.sum(Order.total_amount)).filter(
+            Order.business_id == self.business_id,
+            Order.created_at <= as_of_date,
+            Order.status.in_(sale_statuses)
+        )
+        cogs_query = db.session.query(
+            func.sum(OrderItem.quantity * Product.cost_price)
+        ).join(Order, OrderItem.order_id == Order.id).join(
+            Product, OrderItem.product_id == Product.id
+        ).filter(
+            Order.business_id == self.business_id,
+            Order.created_at <= as_of_date,
+            Order.status.in_(sale_statuses)
+        )
+        if self.branch_id:
+            revenue_query = revenue_query.filter(Order.branch_id == self.branch_id)
+            cogs_query = cogs_query.filter(Order.branch_id == self.branch_id)
+        return {
+            'revenue': float(revenue_query.scalar() or 0),
+            'cogs': float(cogs_query.scalar() or 0)
+        }
+    
+    @_cached_fact
+    def _invoice_position(self, as_of_day: date) -> Dict[str, float]:
+        """Receipts and receivables from invoices issued up to as_of_day, and all receivables"""
+        issued = Invoice.issue_date <= as_of_day
+        is_outstanding = cast(Invoice.status, String).in_(['sent', 'viewed', 'partially_paid', 'overdue'])
+        query = db.session.query(
+            _sum_if(and_(issued, Invoice.status.in_([InvoiceStatus.PAID, InvoiceStatus.PARTIALLY_PAID])),
+                    Invoice.amount_paid).label('receipts'),
+            _sum_if(and_(issued, is_outstanding), Invoice.amount_due).label('receivable'),
+            _sum_if(is_outstanding, Invoice.amount_due).label('receivable_total')
+        ).filter(Invoice.business_id == self.business_id)
+        if self.branch_id:
+            query = query.filter(Invoice.branch_id == self.branch_id)
+        row = query.one()
+        return {name: float(getattr(row, name) or 0) for name in ('receipts', 'receivable', 'receivable_total')}
+    
+    @_cached_fact
+    def _supplier_bill_position(self, as_of_day: date) -> Dict[str, float]:
+        """Bills paid up to as_of_day and bills still outstanding"""
+        query = db.session.query(
+            _sum_if(and_(SupplierBill.status == 'paid', SupplierBill.bill_date <= as_of_day),
+                    SupplierBill.total_amount).label('paid'),
+            _sum_if(SupplierBill.status.in_(['pending', 'partial', 'overdue']),
+                    SupplierBill.total_amount).label('payable')
+        ).filter(SupplierBill.business_id == self.business_id)
+        if self.branch_id:
+            query = query.filter(SupplierBill.branch_id == self.branch_id)
+        row = query.one()
+        return {'paid': float(row.paid or 0), 'payable': float(row.payable or 0)}
+    
+    @_cached_fact
+    def _expense_position(self, as_of_day: date) -> Dict[str, float]:
+        """Paid, prepaid, accrued and incurred expense totals as of as_of_day"""
+        is_paid = Expense.status == ExpenseStatus.PAID
+        is_approved = Expense.status == ExpenseStatus.APPROVED
+        query = db.session.query(
+            _sum_if(and_(is_paid, Expense.paid_date <= as_of_day), Expense.amount).label('paid'),
+            _sum_if(and_(is_paid, Expense.expense_date >= as_of_day), Expense.amount).label('prepaid'),
+            _sum_if(and_(is_approved, Expense.paid_date.is_(None)), Expense.amount).label('accrued'),
+            _sum_if(and_(is_paid, Expense.expense_date <= as_of_day), Expense.amount).label('paid_incurred'),
+            _sum_if(and_(is_approved, Expense.expense_date <= as_of_day), Expense.amount).label('approved_incurred')
+        ).filter(Expense.business_id == self.business_id)
+        if self.branch_id:
+            query = query.filter(Expense.branch_id == self.branch_id)
+        row = query.one()
+        return {
+            name: float(getattr(row, name) or 0)
+            for name in ('paid', 'prepaid', 'accrued', 'paid_incurred', 'approved_incurred')
+        }
+    
+    @_cached_fact
+    def _payroll_position(self, as_of_day: date) -> Dict[str, float]:
+        """Payroll paid up to as_of_day (net and gross) and tax withheld on approved payroll"""
+        paid = and_(Payroll.status == PayrollStatus.PAID, Payroll.payment_date <= as_of_day)
+        query = db.session.query(
+            _sum_if(paid, Payroll.net_pay).label('paid_net'),
+            _sum_if(paid, Payroll.gross_pay).label('paid_gross'),
+            _sum_if(Payroll.status == PayrollStatus.APPROVED, Payroll.tax_deductions).label('tax_liability')
+        ).filter(Payroll.business_id == self.business_id)
+        if self.branch_id:
+            query = query.filter(Payroll.branch_id == self.branch_id)
+        row = query.one()
+        return {name: float(getattr(row, name) or 0) for name in ('paid_net', 'paid_gross', 'tax_liability')}
+    
+    @_cached_fact
+    def _inventory_value(self) -> Dict[str, float]:
+        """Active stock at cost, counting only positive stock and all stock"""
+        # Product model does not support branch-specific filtering currently
+        value = Product.stock_quantity * Product.cost_price
+        row = db.session.query(
+            _sum_if(Product.stock_quantity > 0, value).label('in_stock'),
+            func.sum(value).label('total')
+        ).filter(
+            Product.business_id == self.business_id,
+            Product.is_active == True
+        ).one()
+        return {'in_stock': float(row.in_stock or 0), 'total': float(row.total or 0)}
+    
+    # ==================== COMPREHENSIVE INCOME STATEMENT ====================
+    
+    def _income_figures(self, start_date: datetime, end_date: datetime) -> Dict[str, float]:
+        """
+        Sales, returns, COGS and payroll totals for the income statement.
+        Whole-day ranges are read from the daily sales rollups when the
+        business has them; anything else is aggregated from the raw rows.
+        """
+        days = whole_days(start_date, end_date, end_inclusive=True)
+        if days and rollups_available(self.business_id):
+            return self._income_figures_from_rollups(*days)
+        return self._income_figures_live(start_date, end_date)
+    
+    @_cached_fact
+    def _income_figures_from_rollups(self, start_day: date, end_day: date) -> Dict[str, float]:
+        """Income statement totals for days in [start_day, end_day) from DailySalesRollup"""
+        names = [
+            'gross_sales', 'line_discounts', 'discount_amount', 'tax_amount', 'returns_value',
+            'pending_returns', 'cogs', 'returns_cogs', 'payroll_gross', 'payroll_tax', 'payroll_other',
+            'sales_count', 'returned_order_count'
+        ]
+        row = rollup_query(self.business_id, self.branch_id, *[
+            func.coalesce(func.sum(getattr(DailySalesRollup, name)), 0).label(name) for name in names
+        ]).filter(
+            DailySalesRollup.day >= start_day,
+            DailySalesRollup.day < end_day
+        ).one()
+        figures = {name: float(getattr(row, name)) for name in names}
+        figures['order_count'] = int(row.sales_count) + int(row.returned_order_count)
+        return figures
+    
+    def _income_figures_live(self, start_date: datetime, end_date: datetime) -> Dict[str, float]:
+        """Income statement totals aggregated from orders, returns and payroll"""
+        items = self._order_item_facts(start_date, end_date)
+        orders = self._order_facts(start_date, end_date)
+        returns = self._return_facts(start_date.date(), end_date.date())
+        payroll = self._payroll_facts(start_date.date(), end_date.date())
+        return {
+            'gross_sales': items['gross_sales'],
+            'line_discounts': items['line_discounts'],
+            'discount_amount': orders['discount_amount'],
+            'tax_amount': orders['tax_amount'],
+            'returns_value': returns['returns_value'],
+            'pending_returns': returns['pending_returns'],
+            'cogs': items['cogs'],
+            'returns_cogs': returns['returns_cogs'],
+            'payroll_gross': payroll['gross'],
+            'payroll_tax': payroll['tax'],
+            'payroll_other': payroll['benefits'],
+            'order_count': orders['order_count']
+        }
+    
+    @_cached_fact
+    def get_comprehensive_income_statement(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """
+        Generate Comprehensive Income Statement (Profit & Loss)
+        Includes detailed revenue, COGS, expenses, and profit analysis
+        """
+        figures = self._income_figures(start_date, end_date)
         
-        payroll_data = payroll_query.first()
-        total_payroll = float(payroll_data.gross or 0) if payroll_data else 0
-        payroll_tax = float(payroll_data.tax or 0) if payroll_data else 0
-        payroll_benefits = float(payroll_data.benefits or 0) if payroll_data else 0
+        # ============== REVENUE SECTION ==============
+        # Gross Sales Revenue (Revenue BEFORE any discounts are applied)
+        gross_sales = figures['gross_sales']
+        
+        # Total Sales Discounts (Line-level discounts + Global order discounts)
+        sales_discounts = figures['line_discounts'] + figures['discount_amount']
+        
+        # Sales Tax Liability (collected but not revenue)
+        tax_liability = figures['tax_amount']
+        
+        # Sales Returns & Allowances (pending, approved and processed)
+        sales_returns = figures['returns_value']
+        pending_returns = figures['pending_returns']
+        
+        # Note: Shipping cost is excluded from Net Sales as it's typically a direct pass-through or expense offset
+        net_sales = gross_sales - sales_discounts - sales_returns
+        
+        # ============== COST OF GOODS SOLD ==============
+        total_cogs = figures['cogs'] - figures['returns_cogs']
+        
+        # GROSS PROFIT
+        gross_profit = net_sales - total_cogs
+        gross_profit_margin = self._calculate_percentage(gross_profit, net_sales)
+        
+        # ============== OPERATING EXPENSES ==============
+        # Approved and paid expenses by category
+        operating_expenses = {}
+        total_operating_expenses = 0
+        
+        for exp in self._expense_breakdown(start_date.date(), end_date.date()):
+            category_name = exp.category.value if hasattr(exp.category, 'value') else str(exp.category)
+            entry = operating_expenses.setdefault(category_name, {'amount': 0.0, 'count': 0})
+            entry['amount'] += float(exp.total)
+            entry['count'] += exp.count
+            total_operating_expenses += float(exp.total)
+        
+        for entry in operating_expenses.values():
+            entry['percentage'] = self._calculate_percentage(entry['amount'], gross_profit) if gross_profit != 0 else 0
+        
+        # ============== PAYROLL COSTS ==============
+        total_payroll = figures['payroll_gross']
+        payroll_tax = figures['payroll_tax']
+        payroll_benefits = figures['payroll_other']
         
         # ============== OTHER INCOME/EXPENSES ==============
         # Interest income (placeholder - would need payment model)
@@ -330,20 +511,24 @@ class FinancialReportCalculator:
                 'total_revenue': net_sales,
                 'total_costs': total_cogs + total_operating_costs,
                 'net_profit': net_profit_after_tax,
-                'profit_per_order': round(net_profit_after_tax / max(gross_sales_query.filter(
-                    Order.status.in_(successful_statuses)
-                ).count() or 1, 1), 2)
+                'profit_per_order': round(net_profit_after_tax / max(figures['order_count'], 1), 2)
             }
         }
     
     # ==================== BALANCE SHEET ====================
     
+    @_cached_fact
     def get_balance_sheet(self, as_of_date: datetime) -> Dict[str, Any]:
         """
         Generate Balance Sheet Report
         Includes Assets, Liabilities, and Equity sections
         """
         # ============== ASSETS ==============
+        as_of_day = as_of_date.date()
+        invoices = self._invoice_position(as_of_day)
+        bills = self._supplier_bill_position(as_of_day)
+        expenses = self._expense_position(as_of_day)
+        payroll = self._payroll_position(as_of_day)
         
         # Current Assets
         
@@ -351,47 +536,13 @@ class FinancialReportCalculator:
         # Cash on Hand = (Total Receipts from Invoices) - (Paid Expenses) - (Paid Payroll) - (Paid Supplier Bills)
         
         # Cash Inflow (Receipts)
-        cash_in_query = db.session.query(func.sum(Invoice.amount_paid)).filter(
-            Invoice.business_id == self.business_id,
-            Invoice.issue_date <= as_of_date.date(),
-            Invoice.status.in_([InvoiceStatus.PAID, InvoiceStatus.PARTIALLY_PAID])
-        )
-        if self.branch_id:
-            cash_in_query = cash_in_query.filter(Invoice.branch_id == self.branch_id)
-        total_receipts = float(cash_in_query.scalar() or 0)
-        
-        # Cash Outflow (Payments)
-        # Paid Expenses
-        from app.models.expense import Expense, ExpenseStatus
-        exp_out_query = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.business_id == self.business_id,
-            Expense.status == ExpenseStatus.PAID,
-            Expense.paid_date <= as_of_date.date()
-        )
-        if self.branch_id:
-            exp_out_query = exp_out_query.filter(Expense.branch_id == self.branch_id)
-        paid_expenses = float(exp_out_query.scalar() or 0)
-        
-        # Paid Payroll
-        from app.models.payroll import Payroll, PayrollStatus
-        payroll_out_query = db.session.query(func.sum(Payroll.net_pay)).filter(
-            Payroll.business_id == self.business_id,
-            Payroll.status == PayrollStatus.PAID,
-            Payroll.payment_date <= as_of_date.date()
-        )
-        if self.branch_id:
-            payroll_out_query = payroll_out_query.filter(Payroll.branch_id == self.branch_id)
-        paid_payroll = float(payroll_out_query.scalar() or 0)
+        total_receipts = invoices['receipts']
         
-        # Paid Supplier Bills (This requires tracking amount_paid on bills, fallback to total amount for paid status)
-        bill_out_query = db.session.query(func.sum(SupplierBill.total_amount)).filter(
-            SupplierBill.business_id == self.business_id,
-            SupplierBill.status == 'paid',
-            SupplierBill.bill_date <= as_of_date.date()
-        )
-        if self.branch_id:
-            bill_out_query = bill_out_query.filter(SupplierBill.branch_id == self.branch_id)
-        paid_supplier_bills = float(bill_out_query.scalar() or 0)
+        # Cash Outflow (Payments): paid expenses, paid payroll (net) and paid
+        # supplier bills (no amount_paid tracking on bills, so the total amount)
+        paid_expenses = expenses['paid']
+        paid_payroll = payroll['paid_net']
+        paid_supplier_bills = bills['paid']
         
         cash_and_equivalents = total_receipts - paid_expenses - paid_payroll - paid_supplier_bills
         if cash_and_equivalents < 0:
@@ -400,38 +551,15 @@ class FinancialReportCalculator:
             pass
             
         # 2. Accounts Receivable (outstanding invoices up to as_of_date)
-        ar_query = db.session.query(func.sum(Invoice.amount_due)).filter(
-            Invoice.business_id == self.business_id,
-            Invoice.issue_date <= as_of_date.date(),
-            cast(Invoice.status, String).in_(['sent', 'viewed', 'partially_paid', 'overdue'])
-        )
-        if self.branch_id:
-            ar_query = ar_query.filter(Invoice.branch_id == self.branch_id)
-        accounts_receivable = float(ar_query.scalar() or 0)
+        accounts_receivable = invoices['receivable']
         
         # 3. Inventory (current stock value)
         # Inventory is recorded at cost. Note: ideally should be stock as of as_of_date.
-        inventory_query = db.session.query(
-            func.sum(Product.stock_quantity * Product.cost_price)
-        ).filter(
-            Product.business_id == self.business_id,
-            Product.is_active == True,
-            Product.stock_quantity > 0
-        )
-        # Product model does not support branch-specific filtering currently
-
-        inventory = float(inventory_query.scalar() or 0)
+        inventory = self._inventory_value()['in_stock']
         
         # Prepaid Expenses (expenses paid in advance - use actual prepaid status if available)
         # For now, estimate based on expenses paid but not yet incurred
-        prepaid_query = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.business_id == self.business_id,
-            Expense.status == ExpenseStatus.PAID,
-            Expense.expense_date >= as_of_date.date()  # Future expenses are prepaid
-        )
-        if self.branch_id:
-            prepaid_query = prepaid_query.filter(Expense.branch_id == self.branch_id)
-        prepaid_expenses = float(prepaid_query.scalar() or 0)
+        prepaid_expenses = expenses['prepaid']
         
         # Total Current Assets
         total_current_assets = cash_and_equivalents + accounts_receivable + inventory + prepaid_expenses
@@ -459,32 +587,13 @@ class FinancialReportCalculator:
         # Current Liabilities
         
         # Accounts Payable (outstanding supplier bills)
-        ap_query = db.session.query(func.sum(SupplierBill.total_amount)).filter(
-            SupplierBill.business_id == self.business_id,
-            SupplierBill.status.in_(['pending', 'partial', 'overdue'])
-        )
-        if self.branch_id:
-            ap_query = ap_query.filter(SupplierBill.branch_id == self.branch_id)
-        accounts_payable = float(ap_query.scalar() or 0)
+        accounts_payable = bills['payable']
         
         # Accrued Expenses (approved but unpaid expenses)
-        accrued_query = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.business_id == self.business_id,
-            Expense.status == ExpenseStatus.APPROVED,
-            Expense.paid_date.is_(None)
-        )
-        if self.branch_id:
-            accrued_query = accrued_query.filter(Expense.branch_id == self.branch_id)
-        accrued_expenses = float(accrued_query.scalar() or 0)
+        accrued_expenses = expenses['accrued']
         
         # Payroll Liabilities (estimated)
-        payroll_liability_query = db.session.query(func.sum(Payroll.tax_deductions)).filter(
-            Payroll.business_id == self.business_id,
-            Payroll.status == PayrollStatus.APPROVED
-        )
-        if self.branch_id:
-            payroll_liability_query = payroll_liability_query.filter(Payroll.branch_id == self.branch_id)
-        payroll_liabilities = float(payroll_liability_query.scalar() or 0)
+        payroll_liabilities = payroll['tax_liability']
         
         # Total Current Liabilities
         total_current_liabilities = accounts_payable + accrued_expenses + payroll_liabilities
@@ -501,40 +610,12 @@ class FinancialReportCalculator:
         # Retained Earnings (cumulative net income from actual profit calculations)
         # Calculate from the beginning of business until as_of_date
         # Use comprehensive income statement logic for accuracy
-        from_start_query = db.session.query(
-            func.sum(Order.total_amount)
-        ).filter(
-            Order.business_id == self.business_id,
-            Order.created_at <= as_of_date,
-            Order.status.in_([OrderStatus.DELIVERED, OrderStatus.COMPLETED])
-        )
-        if self.branch_id:
-            from_start_query = from_start_query.filter(Order.branch_id == self.branch_id)
-        cumulative_revenue = float(from_start_query.scalar() or 0)
-        
-        # Calculate cumulative COGS
-        cogs_query = db.session.query(
-            func.sum(OrderItem.quantity * Product.cost_price)
-        ).join(Order, OrderItem.order_id == Order.id).join(
-            Product, OrderItem.product_id == Product.id
-        ).filter(
-            Order.business_id == self.business_id,
-            Order.created_at <= as_of_date,
-            Order.status.in_([OrderStatus.DELIVERED, OrderStatus.COMPLETED])
-        )
-        if self.branch_id:
-            cogs_query = cogs_query.filter(Order.branch_id == self.branch_id)
-        cumulative_cogs = float(cogs_query.scalar() or 0)
+        sales_to_date = self._sales_to_date(as_of_date)
+        cumulative_revenue = sales_to_date['revenue']
+        cumulative_cogs = sales_to_date['cogs']
         
-        # Calculate cumulative expenses (only paid expenses for conservative estimate)
-        cum_expenses_query = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.business_id == self.business_id,
-            Expense.status == ExpenseStatus.PAID,
-            Expense.expense_date <= as_of_date.date()
-        )
-        if self.branch_id:
-            cum_expenses_query = cum_expenses_query.filter(Expense.branch_id == self.branch_id)
-        cumulative_expenses = float(cum_expenses_query.scalar() or 0)
+        # Cumulative expenses (only paid expenses for conservative estimate)
+        cumulative_expenses = expenses['paid_incurred']
         
         # Cumulative net profit (retained earnings)
         retained_earnings = cumulative_revenue - cumulative_cogs - cumulative_expenses
@@ -609,7 +690,7 @@ class FinancialReportCalculator:
         
         # Get all outstanding invoices - use cast to string for enum comparison
         outstanding_statuses = ['sent', 'viewed', 'partially_paid', 'overdue']
-        invoices_query = db.session.query(Invoice).filter(
+        invoices_query = db.session.query(Invoice).options(selectinload(Invoice.customer)).filter(
             Invoice.business_id == self.business_id,
             cast(Invoice.status, String).in_(outstanding_statuses)
         )
@@ -691,7 +772,7 @@ class FinancialReportCalculator:
         today = date.today()
         
         # Get all outstanding supplier bills
-        bills_query = db.session.query(SupplierBill).filter(
+        bills_query = db.session.query(SupplierBill).options(selectinload(SupplierBill.supplier)).filter(
             SupplierBill.business_id == self.business_id,
             SupplierBill.status.in_(['pending', 'partial', 'overdue'])
         )
@@ -933,27 +1014,14 @@ class FinancialReportCalculator:
             inflow_query = inflow_query.filter(Invoice.branch_id == self.branch_id)
         cash_inflow = float(inflow_query.scalar() or 0)
 
-        # Outflows - Operating Expenses
-        expense_query = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.business_id == self.business_id,
-            Expense.expense_date >= start_date.date(),
-            Expense.expense_date <= end_date.date(),
-            Expense.status == ExpenseStatus.APPROVED
+        # Outflows - Operating Expenses (approved)
+        operating_outflow = sum(
+            float(exp.total) for exp in self._expense_breakdown(start_date.date(), end_date.date())
+            if exp.status == ExpenseStatus.APPROVED
         )
-        if self.branch_id:
-            expense_query = expense_query.filter(Expense.branch_id == self.branch_id)
-        operating_outflow = float(expense_query.scalar() or 0)
 
         # Outflows - Payroll
-        payroll_query = db.session.query(func.sum(Payroll.gross_pay)).filter(
-            Payroll.business_id == self.business_id,
-            Payroll.payment_date >= start_date.date(),
-            Payroll.payment_date <= end_date.date(),
-            Payroll.status == PayrollStatus.PAID
-        )
-        if self.branch_id:
-            payroll_query = payroll_query.filter(Payroll.branch_id == self.branch_id)
-        payroll_outflow = float(payroll_query.scalar() or 0)
+        payroll_outflow = self._payroll_facts(start_date.date(), end_date.date())['paid_gross']
 
         net_cash_flow = cash_inflow - operating_outflow - payroll_outflow
 
@@ -988,97 +1056,38 @@ class FinancialReportCalculator:
         Generate Trial Balance Report
         Shows all account balances
         """
+        as_of_day = as_of_date.date()
+        sales_to_date = self._sales_to_date(as_of_date)
         
         # Revenue Accounts
-        revenue_query = db.session.query(func.sum(Order.total_amount)).filter(
-            Order.business_id == self.business_id,
-            Order.created_at <= as_of_date,
-            Order.status.in_([OrderStatus.DELIVERED, OrderStatus.COMPLETED])
-        )
-        if self.branch_id:
-            revenue_query = revenue_query.filter(Order.branch_id == self.branch_id)
-        revenue = float(revenue_query.scalar() or 0)
+        revenue = sales_to_date['revenue']
         
         # Sales Returns
         returns_query = db.session.query(func.sum(Return.refund_amount)).filter(
             Return.business_id == self.business_id,
-            Return.return_date <= as_of_date.date(),
+            Return.return_date <= as_of_day,
             Return.status.in_([ReturnStatus.APPROVED, ReturnStatus.PROCESSED])
         )
         returns = float(returns_query.scalar() or 0)
         
-        # COGS - use coalesce to handle null cost_price values
-        cogs_query = db.session.query(
-            func.coalesce(func.sum(OrderItem.quantity * Product.cost_price), 0)
-        ).join(Order, OrderItem.order_id == Order.id).join(
-            Product, OrderItem.product_id == Product.id
-        ).filter(
-            Order.business_id == self.business_id,
-            Order.created_at <= as_of_date,
-            Order.status.in_([OrderStatus.DELIVERED, OrderStatus.COMPLETED])
-        )
-        if self.branch_id:
-            cogs_query = cogs_query.filter(Order.branch_id == self.branch_id)
-        cogs_result = cogs_query.scalar()
-        cogs = float(cogs_result) if cogs_result is not None else 0
+        # COGS
+        cogs = sales_to_date['cogs']
         
         # Expenses
-        expense_query = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.business_id == self.business_id,
-            Expense.expense_date <= as_of_date.date(),
-            Expense.status == ExpenseStatus.APPROVED
-        )
-        if self.branch_id:
-            expense_query = expense_query.filter(Expense.branch_id == self.branch_id)
-        expenses = float(expense_query.scalar() or 0)
+        expenses = self._expense_position(as_of_day)['approved_incurred']
         
         # Payroll
-        payroll_query = db.session.query(func.sum(Payroll.gross_pay)).filter(
-            Payroll.business_id == self.business_id,
-            Payroll.payment_date <= as_of_date.date(),
-            Payroll.status == PayrollStatus.PAID
-        )
-        if self.branch_id:
-            payroll_query = payroll_query.filter(Payroll.branch_id == self.branch_id)
-        payroll = float(payroll_query.scalar() or 0)
+        payroll = self._payroll_position(as_of_day)['paid_gross']
         
         # Assets
-        asset_query = db.session.query(
-            func.sum(Product.stock_quantity * Product.cost_price)
-        ).filter(
-            Product.business_id == self.business_id,
-            Product.is_active == True
-        )
-        # Product model does not support branch-specific filtering
-        assets = float(asset_query.scalar() or 0)
-        
-        # Liabilities
-        liability_query = db.session.query(func.sum(SupplierBill.total_amount)).filter(
-            SupplierBill.business_id == self.business_id,
-            SupplierBill.status.in_(['pending', 'partial', 'overdue'])
-        )
-        if self.branch_id:
-            liability_query = liability_query.filter(SupplierBill.branch_id == self.branch_id)
-        liabilities = float(liability_query.scalar() or 0)
+        assets = self._inventory_value()['total']
         
-        # Accounts Receivable - use cast to string for enum compatibility
-        outstanding_invoice_statuses = ['sent', 'viewed', 'partially_paid', 'overdue']
-        ar_query = db.session.query(func.sum(Invoice.amount_due)).filter(
-            Invoice.business_id == self.business_id,
-            cast(Invoice.status, String).in_(outstanding_invoice_statuses)
-        )
-        if self.branch_id:
-            ar_query = ar_query.filter(Invoice.branch_id == self.branch_id)
-        accounts_receivable = float(ar_query.scalar() or 0)
+        # Liabilities and Accounts Payable (outstanding supplier bills)
+        liabilities = self._supplier_bill_position(as_of_day)['payable']
+        accounts_payable = liabilities
         
-        # Accounts Payable
-        ap_query = db.session.query(func.sum(SupplierBill.total_amount)).filter(
-            SupplierBill.business_id == self.business_id,
-            SupplierBill.status.in_(['pending', 'partial', 'overdue'])
-        )
-        if self.branch_id:
-            ap_query = ap_query.filter(SupplierBill.branch_id == self.branch_id)
-        accounts_payable = float(ap_query.scalar() or 0)
+        # Accounts Receivable (all outstanding invoices)
+        accounts_receivable = self._invoice_position(as_of_day)['receivable_total']
         
         # Calculate Net Income
         net_income = revenue - returns - cogs - expenses - payroll
@@ -1,8 +1,8 @@
 from flask import jsonify, request
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
 from functools import wraps
-from app.models.user import User, UserRole
-from app import db
+from app.models.user import UserRole
+from app.utils.tenant_context import get_tenant_context
 
 def get_business_id():
     """
@@ -13,12 +13,9 @@ def get_business_id():
     if business_id is None:
         # Try to get from user
         try:
-            from flask_jwt_extended import get_jwt_identity
-            from app.models.user import User
-            current_user_id = get_jwt_identity()
-            user = db.session.get(User, current_user_id)
-            if user:
-                return user.business_id
+            context = get_tenant_context()
+            if context:
+                return context.business_id
         except Exception:
             pass
     return business_id
@@ -27,10 +24,8 @@ def get_active_branch_id():
     """
     Helper to get the current user's active branch ID
     """
-    from app.models.branch import UserBranchAccess
-    current_user_id = get_jwt_identity()
-    access = UserBranchAccess.query.filter_by(user_id=current_user_id, is_default=True).first()
-    return access.branch_id if access and access.branch_id else None
+    context = get_tenant_context()
+    return context.default_branch_id if context and context.default_branch_id else None
 
 def check_module_access(user, module_name, permission_type='view'):
     """
@@ -72,11 +67,8 @@ def module_required(module_name):
             # Verify JWT token
             verify_jwt_in_request()
             
-            # Get current user ID from token
-            current_user_id = get_jwt_identity()
-            
-            # Get user from database
-            user = db.session.get(User, current_user_id)
+            # Get current user from the request's tenant context
+            user = get_tenant_context()
             
             if not user:
                 return jsonify({'error': 'User not found'}), 404
@@ -91,9 +83,7 @@ def module_required(module_name):
                     return jsonify({'error': 'User is not associated with any business'}), 403
                 
                 # Check if business is active
-                from app.models.business import Business
-                business = db.session.get(Business, user.business_id)
-                if not business or not business.is_active:
+                if not user.business_active:
                     return jsonify({'error': 'Business account is blocked. Please contact support.'}), 403
             
             return fn(*args, **kwargs)
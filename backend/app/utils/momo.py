@@ -12,11 +12,14 @@ Environment variables required:
 - MOMO_API_KEY: API Key (from MTN MoMo developer portal)  
 - MOMO_SUBSCRIPTION_KEY: Subscription Key for the application
 - MOMO_ENVIRONMENT: 'sandbox' or 'production' (default: sandbox)
+- MOMO_BASE_URL: optional API root overriding the environment default
+  (e.g. a local stub server, see scripts/momo_stub_server.py)
 """
 
 import os
 import uuid
 import base64
+import threading
 import requests
 from datetime import datetime, timedelta
 from flask import current_app
@@ -37,6 +40,9 @@ _disbursement_token_cache = {
     'expires_at': None
 }
 
+# Serialises token refreshes so concurrent payouts share one token request
+_token_lock = threading.RLock()
+
 
 def get_momo_config():
     """Get MoMo configuration from environment variables."""
@@ -65,6 +71,9 @@ def get_momo_config():
 
 def get_base_url():
     """Get the base URL based on environment."""
+    override = os.getenv('MOMO_BASE_URL')
+    if override:
+        return override.rstrip('/')
     config = get_momo_config()
     if config['environment'] == 'production':
         return PRODUCTION_BASE_URL
@@ -132,7 +141,10 @@ def get_access_token():
     if _is_token_valid():
         return _token_cache['access_token']
     
-    return generate_access_token()
+    with _token_lock:
+        if _is_token_valid():
+            return _token_cache['access_token']
+        return generate_access_token()
 
 
 def _is_disbursement_token_valid():
@@ -214,7 +226,10 @@ def get_disbursement_token():
     if _is_disbursement_token_valid():
         return _disbursement_token_cache['access_token']
     
-    return generate_disbursement_token()
+    with _token_lock:
+        if _is_disbursement_token_valid():
+            return _disbursement_token_cache['access_token']
+        return generate_disbursement_token()
 
 
 def request_to_pay(amount, phone_number, external_id=None, currency="EUR", payer_message="Payment", payee_note="Payment"):
@@ -538,7 +553,8 @@ def clear_token_cache():
     }
 
 
-def disburse_to_wallet(amount, phone_number, external_id=None, currency="EUR", payee_note="Payroll disbursement"):
+def disburse_to_wallet(amount, phone_number, external_id=None, currency="EUR", payee_note="Payroll disbursement",
+                       reference_id=None, session=None):
     """
     Disburse funds to a mobile wallet (payout / transfer).
 
@@ -548,13 +564,17 @@ def disburse_to_wallet(amount, phone_number, external_id=None, currency="EUR", p
         external_id (str, optional): External reference ID
         currency (str): Currency code
         payee_note (str): Note for recipient
+        reference_id (str, optional): X-Reference-Id to use; pass the same one
+            when retrying so MoMo treats it as the same transfer
+        session (requests.Session, optional): Session to reuse connections
 
     Returns:
-        dict: Result with success flag and reference_id/status
+        dict: Result with success flag, reference_id/status and http_status
     """
     config = get_momo_config()
 
-    reference_id = str(uuid.uuid4())
+    if reference_id is None:
+        reference_id = str(uuid.uuid4())
     if external_id is None:
         external_id = str(uuid.uuid4())
 
@@ -585,7 +605,7 @@ def disburse_to_wallet(amount, phone_number, external_id=None, currency="EUR", p
     }
 
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = (session or requests).post(url, headers=headers, json=data, timeout=30)
 
         if response.status_code in [200, 201, 202]:
             return {
@@ -603,6 +623,7 @@ def disburse_to_wallet(amount, phone_number, external_id=None, currency="EUR", p
                 'success': False,
                 'reference_id': reference_id,
                 'status': 'failed',
+                'http_status': response.status_code,
                 'error': f"Disbursement failed with status {response.status_code}",
                 'details': response.text
             }
@@ -3,6 +3,7 @@ from app.models.communication import Notification
 from app.models.user import User
 from app.utils.email import send_low_stock_report_email, send_expired_products_report_email
 from app.models.api_integrations import WebhookDelivery
+from app.utils.cache import TTLCache
 from datetime import datetime
 import uuid
 import json
@@ -10,6 +11,35 @@ import hmac
 import hashlib
 import requests
 
+# Unread badge counts keyed by (business_id, user_id, branch_id). The TTL bounds
+# staleness for notifications written by other workers or the alert scanner.
+_unread_count_cache = TTLCache(ttl=30, maxsize=50000)
+
+
+def get_unread_count(business_id, user_id, branch_id=None):
+    """
+    Returns the user's unread notification count, served from a short-lived
+    in-process cache.
+    """
+    def count():
+        query = Notification.query.filter_by(business_id=business_id, user_id=user_id, is_read=False)
+        if branch_id:
+            query = query.filter_by(branch_id=branch_id)
+        return query.count()
+
+    return _unread_count_cache.get_or_set((business_id, int(user_id), branch_id), count)
+
+
+def invalidate_unread_count(business_id, user_id=None):
+    """
+    Drops cached unread counts for one user, or for every user of a business.
+    """
+    if user_id is None:
+        _unread_count_cache.delete_where(lambda key: key[0] == business_id)
+    else:
+        _unread_count_cache.delete_where(lambda key: key[0] == business_id and key[1] == int(user_id))
+
+
 def create_notification(business_id, user_id, title, message, type='info'):
     """
     Creates a notification for a specific user.
@@ -24,6 +54,7 @@ def create_notification(business_id, user_id, title, message, type='info'):
         )
         db.session.add(notification)
         db.session.commit()
+        invalidate_unread_count(business_id, user_id)
         return notification
     except Exception as e:
         db.session.rollback()
@@ -55,50 +86,68 @@ def notify_managers(business_id, title, message, type='info'):
             notifications.append(notification)
         
         db.session.commit()
+        invalidate_unread_count(business_id)
         return notifications
     except Exception as e:
         db.session.rollback()
         print(f"Error notifying managers: {str(e)}")
         return []
 
-def check_low_stock_and_notify(product):
+def get_low_stock_limit(business_id):
     """
-    Checks if a product's stock is low and creates a notification if it is.
-    Also sends an email to business admins.
-    Uses configurable low stock limit from system settings.
+    Returns the business's configurable low stock limit (default 20).
+    """
+    from app.utils.settings_service import get_int_setting
+    return get_int_setting(business_id, 'low_stock_limit', 20)
+
+def get_low_stock_products(business_id, low_stock_limit):
+    """
+    Returns the business's products at or below the low stock limit or their
+    own reorder level, for the low stock report email.
+    """
+    from app.models.product import Product
+    return Product.query.filter(
+        Product.business_id == business_id,
+        db.or_(
+            Product.stock_quantity <= low_stock_limit,
+            Product.stock_quantity <= Product.reorder_level
+        )
+    ).all()
+
+def low_stock_alert(product, low_stock_limit):
+    """
+    Returns (level, title, message, type) for a product at or below the low
+    stock limit, or None if its stock is fine.
     """
-    title = None
-    message = None
-    type = 'info'
-    
-    # Get configurable low stock limit from system settings
-    from app.models.settings import SystemSetting
-    low_stock_setting = SystemSetting.query.filter_by(
-        business_id=product.business_id, 
-        setting_key='low_stock_limit'
-    ).first()
-    
-    # Default to 20 if not set
-    low_stock_limit = int(low_stock_setting.setting_value) if low_stock_setting else 20
-    
     # Check for out of stock first
     if product.stock_quantity == 0:
-        title = "Out of Stock Alert"
-        message = f"Product '{product.name}' (ID: {product.product_id}) is out of stock!"
-        type = 'danger'
+        return ('out', "Out of Stock Alert",
+                f"Product '{product.name}' (ID: {product.product_id}) is out of stock!", 'danger')
     # Check for critical low stock (5 or below)
-    elif product.stock_quantity <= 5:
-        title = "Critical Low Stock Alert"
-        message = f"Product '{product.name}' (ID: {product.product_id}) has critical low stock. Current quantity: {product.stock_quantity}. Low stock limit: {low_stock_limit}."
-        type = 'danger'
+    if product.stock_quantity <= 5:
+        return ('critical', "Critical Low Stock Alert",
+                f"Product '{product.name}' (ID: {product.product_id}) has critical low stock. Current quantity: {product.stock_quantity}. Low stock limit: {low_stock_limit}.", 'danger')
     # Check for general low stock based on configurable limit
-    elif product.stock_quantity <= low_stock_limit:
-        title = "Low Stock Alert"
-        message = f"Product '{product.name}' (ID: {product.product_id}) is low on stock. Current quantity: {product.stock_quantity}. Low stock limit: {low_stock_limit}."
-        type = 'warning'
+    if product.stock_quantity <= low_stock_limit:
+        return ('low', "Low Stock Alert",
+                f"Product '{product.name}' (ID: {product.product_id}) is low on stock. Current quantity: {product.stock_quantity}. Low stock limit: {low_stock_limit}.", 'warning')
+    return None
+
+def check_low_stock_and_notify(product):
+    """
+    Checks if a product's stock is low and creates a notification if it is.
+    Also sends an email to business admins.
+    Uses configurable low stock limit from system settings.
+
+    Runs synchronously; request paths that must stay fast (order creation)
+    enqueue a 'low_stock.check' outbox event instead.
+    """
+    low_stock_limit = get_low_stock_limit(product.business_id)
+    alert = low_stock_alert(product, low_stock_limit)
     
     # If we have a notification to send
-    if title and message:
+    if alert:
+        _, title, message, type = alert
         # Check if a similar notification was already created recently to avoid spamming
         # For now, we'll just create it. In a real app, we might check the last notification date.
         notify_managers(product.business_id, title, message, type)
@@ -115,20 +164,7 @@ def check_low_stock_and_notify(product):
                     User.role.in_([UserRole.admin, UserRole.manager])
                 ).all()
                 
-                # Get low stock products for the business using the configurable limit
-                from app.models.product import Product
-                low_stock_query = Product.query.filter(
-                    Product.business_id == product.business_id,
-                    Product.stock_quantity <= low_stock_limit
-                )
-                # Also check reorder level if it's lower than the configurable limit
-                low_stock_query = low_stock_query.filter(
-                    db.or_(
-                        Product.stock_quantity <= low_stock_limit,
-                        Product.stock_quantity <= Product.reorder_level
-                    )
-                )
-                low_stock_products = low_stock_query.all()
+                low_stock_products = get_low_stock_products(product.business_id, low_stock_limit)
                 
                 for admin in admins:
                     send_low_stock_report_email(admin, business, low_stock_products)
@@ -190,77 +226,84 @@ def check_expiry_and_notify(product):
         except Exception as email_err:
             print(f"Warning: Could not send expiry email: {email_err}")
 
-def trigger_webhook(webhook, payload):
+def deliver_webhook(subscription, event, data, attempt=1):
     """
-    Triggers a webhook by sending a POST request to the webhook URL.
-    Records the delivery attempt in WebhookDelivery.
+    POSTs a signed event to a webhook subscription and records the attempt
+    as a WebhookDelivery. The delivery is added to the session; the caller
+    commits.
     """
+    webhook_payload = {
+        'event': event,
+        'timestamp': datetime.utcnow().isoformat(),
+        'data': data
+    }
+    payload_json = json.dumps(webhook_payload, default=str)
+
+    # Generate signature for webhook authenticity
+    signature = hmac.new(
+        subscription.webhook_secret.encode(),
+        payload_json.encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+    delivery = WebhookDelivery(
+        subscription_id=subscription.id,
+        delivery_id=f"DLV{uuid.uuid4().hex[:20].upper()}",
+        event=event,
+        payload=json.loads(payload_json),
+        payload_signature=signature,
+        status='failed',
+        attempt=attempt
+    )
+
+    headers = {
+        'Content-Type': 'application/json',
+        'X-Webhook-Signature': signature,
+        'X-Webhook-ID': delivery.delivery_id,
+        'X-Webhook-Event': event
+    }
+
     try:
-        # Prepare the payload
-        webhook_payload = {
-            'event': webhook.event,
-            'timestamp': datetime.utcnow().isoformat(),
-            'data': payload
-        }
-        
-        # Convert payload to JSON string
-        payload_json = json.dumps(webhook_payload)
-        
-        # Generate signature for webhook authenticity
-        signature = hmac.new(
-            webhook.secret.encode(),
-            payload_json.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        # Prepare headers
-        headers = {
-            'Content-Type': 'application/json',
-            'X-Webhook-Signature': signature,
-            'X-Webhook-ID': webhook.id
-        }
-        
-        # Make the POST request
         response = requests.post(
-            webhook.url,
+            subscription.webhook_url,
             data=payload_json,
             headers=headers,
-            timeout=10
+            timeout=subscription.timeout_seconds or 10
         )
-        
-        # Record the delivery
-        delivery = WebhookDelivery(
-            webhook_id=webhook.id,
-            event=webhook.event,
-            status_code=response.status_code,
-            request_body=payload_json,
-            response_body=response.text[:1000],  # Limit response size
-            success=200 <= response.status_code < 300
-        )
-        db.session.add(delivery)
+        delivery.response_status_code = response.status_code
+        delivery.response_body = response.text[:1000]  # Limit response size
+        if 200 <= response.status_code < 300:
+            delivery.status = 'success'
+            delivery.delivered_at = datetime.utcnow()
+    except requests.exceptions.Timeout:
+        delivery.response_body = 'Timeout'
+    except requests.exceptions.RequestException as e:
+        delivery.response_body = str(e)[:1000]
+
+    db.session.add(delivery)
+    return delivery
+
+def trigger_webhook(webhook, payload):
+    """
+    Triggers a webhook by sending a POST request to the webhook URL.
+    Records the delivery attempt in WebhookDelivery.
+    """
+    try:
+        event = payload.get('event', 'test') if isinstance(payload, dict) else 'test'
+        delivery = deliver_webhook(webhook, event, payload)
         db.session.commit()
-        
+
+        if delivery.response_body == 'Timeout':
+            return {'status': 'error', 'message': 'Webhook request timed out'}
+
+        success = delivery.status == 'success'
         return {
-            'status': 'success' if delivery.success else 'failed',
-            'status_code': response.status_code,
-            'message': 'Webhook delivered successfully' if delivery.success else 'Webhook delivery failed'
+            'status': 'success' if success else 'failed',
+            'status_code': delivery.response_status_code,
+            'message': 'Webhook delivered successfully' if success else 'Webhook delivery failed'
         }
-        
-    except requests.exceptions.Timeout:
-        # Record timeout
-        delivery = WebhookDelivery(
-            webhook_id=webhook.id,
-            event=webhook.event,
-            status_code=None,
-            request_body=json.dumps(payload),
-            response_body='Timeout',
-            success=False
-        )
-        db.session.add(delivery)
-        db.session.commit()
-        return {'status': 'error', 'message': 'Webhook request timed out'}
-        
+
     except Exception as e:
+        db.session.rollback()
         print(f"Error triggering webhook: {str(e)}")
         return {'status': 'error', 'message': str(e)}
-
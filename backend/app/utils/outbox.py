@@ -0,0 +1,378 @@
+"""
+Transactional Outbox
+====================
+Side effects that are slow or can fail (manager notifications, SMTP email,
+webhook POSTs) are not performed inside request handlers. Instead the
+request adds an `OutboxEvent` row to its own transaction with
+`enqueue_event()`, so the event exists if and only if the change committed.
+
+The outbox worker (`flask outbox-worker`) then:
+
+- claims due rows in batches (FOR UPDATE SKIP LOCKED on PostgreSQL, so
+  several workers can run side by side),
+- hands coalescing handlers every event of one type for one business at
+  once, e.g. all 'low_stock.check' events from a burst of POS sales become
+  one stock query, one dedupe lookup and one summary notification,
+- retries failed events with exponential backoff and parks them as 'dead'
+  after `max_attempts`,
+- deletes 'done' events older than `retention_days` (default
+  `DONE_RETENTION_DAYS`) once every `prune_interval` seconds, so the table
+  and its claim query stay small. Dead events are kept for inspection.
+  `flask outbox-prune` does the same once, e.g. from cron where no worker
+  runs.
+
+Event types:
+
+- low_stock.check        {'product_ids': [...]}
+- email.low_stock_report {'user_id': ...}                       (one per recipient)
+- webhook                {'event': 'order.created', 'data': {...}}
+- webhook.delivery       {'subscription_id': ..., 'event': ..., 'data': {...}}
+- rollup.refresh         {'days': ['YYYY-MM-DD', ...]}             (days touched by a commit)
+"""
+
+from app import db
+from app.models.outbox import OutboxEvent
+from app.models.user import User
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Any
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# event_type -> (handler, coalesce)
+_HANDLERS: Dict[str, tuple] = {}
+
+DONE_RETENTION_DAYS = 7
+PRUNE_BATCH_SIZE = 5000
+
+
+def enqueue_event(business_id: int, event_type: str, payload: Dict[str, Any],
+                  available_at: Optional[datetime] = None) -> OutboxEvent:
+    """
+    Add an outbox event to the current session. The caller commits it
+    together with the change that produced it.
+    """
+    event = OutboxEvent(
+        business_id=business_id,
+        event_type=event_type,
+        payload=payload,
+        available_at=available_at or datetime.utcnow()
+    )
+    db.session.add(event)
+    return event
+
+
+def outbox_handler(event_type: str, coalesce: bool = True):
+    """
+    Register a handler for an event type.
+
+    The handler is called as handler(business_id, events). With coalesce=True
+    it receives every claimed event of its type for the business at once and
+    the events succeed or fail together; otherwise it is called once per
+    event so a failing recipient does not hold back the others.
+    """
+    def decorator(func: Callable[[int, List[OutboxEvent]], None]):
+        _HANDLERS[event_type] = (func, coalesce)
+        return func
+    return decorator
+
+
+class OutboxWorker:
+    """Claims, dispatches and retries outbox events."""
+
+    def __init__(self, batch_size: int = 100, max_attempts: int = 8,
+                 base_delay: int = 30, max_delay: int = 3600, lock_timeout: int = 600,
+                 retention_days: int = DONE_RETENTION_DAYS, prune_interval: int = 3600):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock_timeout = lock_timeout
+        self.retention_days = retention_days
+        self.prune_interval = prune_interval
+        self._last_prune = None
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        # Jitter so events that failed together do not retry in lockstep
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def claim_batch(self) -> List[int]:
+        """
+        Mark up to batch_size due events as processing and return their ids.
+        Events left in processing by a crashed worker are reclaimed after
+        lock_timeout.
+        """
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lock_timeout)
+
+        query = OutboxEvent.query.filter(db.or_(
+            db.and_(OutboxEvent.status == 'pending', OutboxEvent.available_at <= now),
+            db.and_(OutboxEvent.status == 'processing', OutboxEvent.locked_at < stale)
+        )).order_by(OutboxEvent.id).limit(self.batch_size)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+
+        events = query.all()
+        for event in events:
+            event.status = 'processing'
+            event.locked_at = now
+        ids = [event.id for event in events]
+        db.session.commit()
+        return ids
+
+    def _fail(self, event_ids: List[int], error: Exception) -> None:
+        now = datetime.utcnow()
+        for event in OutboxEvent.query.filter(OutboxEvent.id.in_(event_ids)).all():
+            event.attempts += 1
+            event.last_error = f"{type(error).__name__}: {error}"[:2000]
+            event.locked_at = None
+            if event.attempts >= self.max_attempts:
+                event.status = 'dead'
+                logger.error("Outbox event %s (%s) is dead after %s attempts: %s",
+                             event.id, event.event_type, event.attempts, event.last_error)
+            else:
+                event.status = 'pending'
+                event.available_at = now + self._backoff(event.attempts)
+        db.session.commit()
+
+    def _dispatch(self, handler: Callable, business_id: int, events: List[OutboxEvent]) -> bool:
+        event_ids = [event.id for event in events]
+        try:
+            handler(business_id, events)
+            now = datetime.utcnow()
+            for event in events:
+                event.status = 'done'
+                event.processed_at = now
+                event.locked_at = None
+                event.last_error = None
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Outbox events %s failed: %s", event_ids, e)
+            self._fail(event_ids, e)
+            return False
+
+    def run_once(self) -> Dict[str, int]:
+        """Process one batch. Returns counts of processed and failed events."""
+        stats = {'claimed': 0, 'done': 0, 'failed': 0}
+        ids = self.claim_batch()
+        if not ids:
+            return stats
+        stats['claimed'] = len(ids)
+
+        # Group by (event_type, business_id), keeping claim order
+        groups: Dict[tuple, List[OutboxEvent]] = {}
+        for event in OutboxEvent.query.filter(OutboxEvent.id.in_(ids)).order_by(OutboxEvent.id).all():
+            groups.setdefault((event.event_type, event.business_id), []).append(event)
+
+        for (event_type, business_id), events in groups.items():
+            registered = _HANDLERS.get(event_type)
+            if registered is None:
+                self._fail([e.id for e in events], LookupError(f"No outbox handler for '{event_type}'"))
+                stats['failed'] += len(events)
+                continue
+
+            handler, coalesce = registered
+            batches = [events] if coalesce else [[event] for event in events]
+            for batch in batches:
+                if self._dispatch(handler, business_id, batch):
+                    stats['done'] += len(batch)
+                else:
+                    stats['failed'] += len(batch)
+
+        db.session.expunge_all()
+        return stats
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """Delete done events processed more than retention_days ago, in batches; returns the count."""
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        deleted = 0
+        while True:
+            ids = [event_id for (event_id,) in db.session.query(OutboxEvent.id).filter(
+                OutboxEvent.status == 'done', OutboxEvent.processed_at < cutoff
+            ).order_by(OutboxEvent.id).limit(PRUNE_BATCH_SIZE).all()]
+            if not ids:
+                return deleted
+            OutboxEvent.query.filter(OutboxEvent.id.in_(ids), OutboxEvent.status == 'done').delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+            deleted += len(ids)
+
+    def _prune_if_due(self) -> None:
+        if self._last_prune is not None and time.monotonic() - self._last_prune < self.prune_interval:
+            return
+        self._last_prune = time.monotonic()
+        try:
+            deleted = self.prune()
+            if deleted:
+                logger.info("Outbox: pruned %s done event(s)", deleted)
+        except Exception as e:
+            # Pruning is housekeeping; delivery goes on
+            db.session.rollback()
+            logger.warning("Outbox prune failed: %s", e)
+
+    def run(self, interval: float = 5, once: bool = False) -> None:
+        """Drain the outbox, then poll every interval seconds, pruning done events every prune_interval."""
+        while True:
+            self._prune_if_due()
+            stats = self.run_once()
+            if stats['claimed']:
+                logger.info("Outbox batch: %s", stats)
+                continue
+            if once:
+                return
+            time.sleep(interval)
+
+
+# ==================== HANDLERS ====================
+
+@outbox_handler('low_stock.check')
+def handle_low_stock_check(business_id: int, events: List[OutboxEvent]) -> None:
+    """
+    Coalesce the products touched by a burst of sales into one stock check,
+    raise one notification per manager and queue one report email per admin.
+    """
+    from app.models.product import Product
+    from app.models.user import UserRole
+    from app.models.communication import Notification
+    from app.models.api_integrations import WebhookEvent
+    from app.utils.alert_scanner import claim_alert_keys
+    from app.utils.notifications import get_low_stock_limit, low_stock_alert, invalidate_unread_count
+
+    product_ids = sorted({pid for event in events for pid in (event.payload.get('product_ids') or [])})
+    if not product_ids:
+        return
+
+    low_stock_limit = get_low_stock_limit(business_id)
+    products = Product.query.filter(
+        Product.business_id == business_id,
+        Product.id.in_(product_ids),
+        Product.stock_quantity <= low_stock_limit
+    ).order_by(Product.id).all()
+
+    alerts = {}
+    for product in products:
+        alert = low_stock_alert(product, low_stock_limit)
+        if alert:
+            alerts[f"low_stock:{product.id}:{alert[0]}"] = (product, alert)
+    if not alerts:
+        return
+
+    # Skip products already alerted at the same level within the dedupe window
+    due_keys = claim_alert_keys(business_id, list(alerts))
+    due = [alerts[key] for key in alerts if key in due_keys]
+    if not due:
+        return
+
+    if len(due) == 1:
+        _, title, message, type = due[0][1]
+    else:
+        names = ', '.join(f"'{product.name}'" for product, _ in due[:10])
+        more = f" and {len(due) - 10} more" if len(due) > 10 else ''
+        title = "Low Stock Alert"
+        message = f"{len(due)} products are low on stock: {names}{more}."
+        type = 'danger' if any(alert[3] == 'danger' for _, alert in due) else 'warning'
+
+    managers = db.session.query(User.id, User.role).filter(
+        User.business_id == business_id,
+        User.role.in_([UserRole.manager, UserRole.admin, UserRole.superadmin])
+    ).all()
+    db.session.add_all([
+        Notification(business_id=business_id, user_id=user_id, title=title, message=message, type=type)
+        for user_id, _ in managers
+    ])
+
+    # Report emails go out as separate events so each recipient retries on its own
+    for user_id, role in managers:
+        if role in (UserRole.admin, UserRole.manager):
+            enqueue_event(business_id, 'email.low_stock_report', {'user_id': user_id})
+
+    enqueue_event(business_id, 'webhook', {
+        'event': WebhookEvent.INVENTORY_LOW.value,
+        'data': {'products': [{
+            'id': product.id,
+            'product_id': product.product_id,
+            'name': product.name,
+            'stock_quantity': product.stock_quantity,
+            'reorder_level': product.reorder_level
+        } for product, _ in due]}
+    })
+
+    invalidate_unread_count(business_id)
+
+
+@outbox_handler('email.low_stock_report', coalesce=False)
+def handle_low_stock_report_email(business_id: int, events: List[OutboxEvent]) -> None:
+    from app.models.business import Business
+    from app.utils.email import send_low_stock_report_email
+    from app.utils.email_service import EmailService
+    from app.utils.notifications import get_low_stock_limit, get_low_stock_products
+
+    user = db.session.get(User, events[0].payload.get('user_id'))
+    business = db.session.get(Business, business_id)
+    if not user or not business or not user.email:
+        return
+
+    products = get_low_stock_products(business_id, get_low_stock_limit(business_id))
+    sent = send_low_stock_report_email(user, business, products)
+    # Without SMTP settings the email is only logged; retrying would not help
+    if not sent and EmailService.is_configured():
+        raise RuntimeError(f"Low stock report email to {user.email} was not sent")
+
+
+@outbox_handler('webhook')
+def handle_webhook_event(business_id: int, events: List[OutboxEvent]) -> None:
+    """Fan an event out to one 'webhook.delivery' per subscribed endpoint."""
+    from app.models.api_integrations import APIClient, WebhookSubscription
+
+    subscriptions = WebhookSubscription.query.join(APIClient).filter(
+        APIClient.business_id == business_id,
+        APIClient.is_active == True,
+        WebhookSubscription.is_active == True
+    ).all()
+    if not subscriptions:
+        return
+
+    for event in events:
+        name = event.payload.get('event')
+        for subscription in subscriptions:
+            if name in (subscription.events or []):
+                enqueue_event(business_id, 'webhook.delivery', {
+                    'subscription_id': subscription.id,
+                    'event': name,
+                    'data': event.payload.get('data')
+                })
+
+
+@outbox_handler('webhook.delivery', coalesce=False)
+def handle_webhook_delivery(business_id: int, events: List[OutboxEvent]) -> None:
+    from app.models.api_integrations import WebhookSubscription
+    from app.utils.notifications import deliver_webhook
+
+    event = events[0]
+    subscription = db.session.get(WebhookSubscription, event.payload.get('subscription_id'))
+    if not subscription or not subscription.is_active:
+        return
+
+    delivery = deliver_webhook(subscription, event.payload.get('event'), event.payload.get('data'),
+                               attempt=event.attempts + 1)
+    if delivery.status != 'success':
+        # Keep the failed attempt on record, then let the worker schedule a retry
+        db.session.commit()
+        raise RuntimeError(
+            f"Webhook {subscription.webhook_url} returned {delivery.response_status_code or delivery.response_body}"
+        )
+
+
+@outbox_handler('rollup.refresh')
+def handle_rollup_refresh(business_id: int, events: List[OutboxEvent]) -> None:
+    """Recompute the daily rollups of the days touched by the committed writes."""
+    from app.utils.rollups import refresh_days
+
+    days = {datetime.strptime(day, '%Y-%m-%d').date() for event in events for day in (event.payload.get('days') or [])}
+    refresh_days(db.session, [(business_id, day) for day in days])
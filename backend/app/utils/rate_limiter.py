@@ -0,0 +1,302 @@
+"""
+Rate Limiter
+============
+One rate-limit engine for the `rate_limit` decorators and `APIRateLimiter`.
+It uses the sliding window counter algorithm. Each key keeps two integers,
+the hits in the current and the previous fixed window. The previous count
+is weighted by how much of it still overlaps the sliding window:
+
+    estimate = previous * (1 - elapsed / window) + current
+
+A hit is allowed while estimate + cost <= limit. Refused hits are not
+counted, so a client that keeps retrying is let back in as the window
+slides. Every check is O(1) in time and state, whatever the limit.
+
+Where the counters live:
+
+- `RedisBackend` (REDIS_URL set and reachable): one Lua script call per
+  hit, so all hosts share the limits. Counter keys expire after two windows.
+- `SQLiteBackend` (default without Redis): a SQLite file that every worker
+  on the host opens, so gunicorn workers share the limits. Expired rows
+  are pruned every `SQLiteBackend.PRUNE_EVERY` hits.
+- `MemoryBackend`: per process, an LRU bounded to RATE_LIMIT_MAX_KEYS keys.
+  It is used with RATE_LIMIT_BACKEND=memory, and for any hit the shared
+  backend fails on, so a Redis or disk outage degrades limits to
+  per-worker instead of failing requests.
+
+Typical use:
+
+    result = get_rate_limiter().hit(f'login:{ip}', limit=10, window=300)
+    if not result.allowed:
+        return jsonify({'error': 'Rate limit exceeded'}), 429
+"""
+
+from collections import OrderedDict, namedtuple
+from flask import current_app
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_KEYS = 100000
+DEFAULT_SQLITE_PATH = 'logs/rate_limits.sqlite'
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'reset_at', 'retry_after'])
+
+
+def sliding_window(previous: int, current: int, elapsed: float, window: int, limit: int, cost: int = 1):
+    """(allowed, estimate) for a hit at `elapsed` seconds into the current fixed window."""
+    estimate = previous * (1 - elapsed / window) + current
+    return estimate + cost <= limit, estimate
+
+
+# ==================== BACKENDS ====================
+
+class MemoryBackend:
+    """Counters in this process, least recently used keys evicted beyond `max_keys`."""
+
+    def __init__(self, max_keys: int = DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()  # key -> [window number, current, previous]
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: int, now: float, cost: int = 1):
+        """(allowed, previous, current) after counting the hit if allowed."""
+        number = int(now // window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = [number, 0, 0]
+            elif counter[0] != number:
+                counter[2] = counter[1] if counter[0] == number - 1 else 0
+                counter[1] = 0
+                counter[0] = number
+            self._counters.move_to_end(key)
+            allowed, _ = sliding_window(counter[2], counter[1], now - number * window, window, limit, cost)
+            if allowed:
+                counter[1] += cost
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+            return allowed, counter[2], counter[1]
+
+    def reset(self, prefix: str = None) -> None:
+        with self._lock:
+            if prefix is None:
+                self._counters.clear()
+            else:
+                for key in [key for key in self._counters if key.startswith(prefix)]:
+                    del self._counters[key]
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class SQLiteBackend:
+    """
+    Counters in a SQLite file shared by the processes on one host. Each hit
+    is one short write transaction (WAL mode, no fsync: counters are not
+    worth a disk flush).
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._hits = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limits ('
+                'key TEXT PRIMARY KEY, window INTEGER NOT NULL, current INTEGER NOT NULL, '
+                'previous INTEGER NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID'
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def hit(self, key: str, limit: int, window: int, now: float, cost: int = 1):
+        conn = self._connection()
+        number = int(now // window)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT window, current, previous FROM rate_limits WHERE key = ?', (key,)).fetchone()
+            current = previous = 0
+            if row is not None:
+                if row[0] == number:
+                    current, previous = row[1], row[2]
+                elif row[0] == number - 1:
+                    previous = row[1]
+            allowed, _ = sliding_window(previous, current, now - number * window, window, limit, cost)
+            if allowed:
+                current += cost
+            conn.execute(
+                'INSERT INTO rate_limits (key, window, current, previous, expires_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET window = excluded.window, current = excluded.current, '
+                'previous = excluded.previous, expires_at = excluded.expires_at',
+                (key, number, current, previous, (number + 2) * window)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._hits += 1
+        if self._hits % self.PRUNE_EVERY == 0:
+            self.prune(now)
+        return allowed, previous, current
+
+    def prune(self, now: float = None) -> int:
+        """Delete counters whose windows have both passed."""
+        cursor = self._connection().execute('DELETE FROM rate_limits WHERE expires_at < ?', (now or time.time(),))
+        return cursor.rowcount
+
+    def reset(self, prefix: str = None) -> None:
+        conn = self._connection()
+        if prefix is None:
+            conn.execute('DELETE FROM rate_limits')
+        else:
+            conn.execute('DELETE FROM rate_limits WHERE substr(key, 1, ?) = ?', (len(prefix), prefix))
+
+
+class RedisBackend:
+    """Counters in Redis, one key per fixed window, checked and incremented by one script call."""
+
+    PREFIX = 'ratelimit:'
+
+    SCRIPT = """
+        local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+        local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+        local cost = tonumber(ARGV[4])
+        if previous * tonumber(ARGV[2]) + current + cost > tonumber(ARGV[1]) then
+            return {0, previous, current}
+        end
+        current = redis.call('INCRBY', KEYS[1], cost)
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        return {1, previous, current}
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._script = client.register_script(self.SCRIPT)
+
+    def _key(self, key: str, number: int) -> str:
+        # The hash tag keeps both windows of a key on the same cluster slot
+        return f'{self.PREFIX}{{{key}}}:{number}'
+
+    def hit(self, key: str, limit: int, window: int, now: float, cost: int = 1):
+        number = int(now // window)
+        weight = 1 - (now - number * window) / window
+        allowed, previous, current = self._script(
+            keys=[self._key(key, number), self._key(key, number - 1)],
+            args=[limit, repr(weight), window * 2, cost]
+        )
+        return bool(allowed), int(previous), int(current)
+
+    def reset(self, prefix: str = None) -> None:
+        escaped = '' if prefix is None else ''.join('\\' + c if c in '*?[]\\' else c for c in prefix)
+        for name in self.client.scan_iter(match=f'{self.PREFIX}{{{escaped}*', count=1000):
+            self.client.delete(name)
+
+
+# ==================== ENGINE ====================
+
+class RateLimiter:
+    """Sliding window counter limits over a backend, with a per-process fallback."""
+
+    def __init__(self, backend=None, fallback: MemoryBackend = None):
+        self.fallback = fallback if fallback is not None else MemoryBackend()
+        self.backend = backend if backend is not None else self.fallback
+        self._failing = False
+
+    def hit(self, key: str, limit: int, window: int, cost: int = 1, now: float = None) -> RateLimitResult:
+        """Count a hit against `limit` per `window` seconds unless that would exceed it."""
+        now = time.time() if now is None else now
+        # Keep counters for different windows apart even if callers reuse a key
+        key = f'{key}:{window}'
+        try:
+            allowed, previous, current = self.backend.hit(key, limit, window, now, cost)
+            if self._failing:
+                self._failing = False
+                logger.info("Rate limiter: shared backend recovered")
+        except Exception as e:
+            if not self._failing:
+                self._failing = True
+                logger.warning(f"Rate limiter: {type(self.backend).__name__} failed, using per-process limits: {e}")
+            allowed, previous, current = self.fallback.hit(key, limit, window, now, cost)
+
+        number = int(now // window)
+        elapsed = now - number * window
+        _, estimate = sliding_window(previous, current, elapsed, window, limit, 0)
+        reset_at = (number + 1) * window
+        retry_after = 0
+        if not allowed:
+            retry_after = reset_at - now
+            if current + cost <= limit:
+                # Wait until enough of the previous window has slid out
+                retry_after = min(retry_after, (previous + current + cost - limit) * window / previous - elapsed)
+            elif current:
+                # The current window alone is over the limit, and it still weighs on the next one
+                # until enough of it has slid out: current * (1 - t / window) + cost <= limit
+                retry_after += window * (current + cost - limit) / current
+            retry_after = max(1, math.ceil(retry_after))
+        return RateLimitResult(allowed, limit, max(0, int(limit - estimate)), int(reset_at), retry_after)
+
+    def reset(self, key: str = None) -> None:
+        """Forget the counters of one key (every window) or of all keys."""
+        prefix = None if key is None else f'{key}:'
+        for backend in ([self.backend, self.fallback] if self.backend is not self.fallback else [self.backend]):
+            try:
+                backend.reset(prefix)
+            except Exception as e:
+                logger.warning(f"Rate limiter: could not reset {type(backend).__name__}: {e}")
+
+
+def _redis_client(redis_url: str):
+    import redis
+    client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    client.ping()
+    return client
+
+
+def create_rate_limiter(config) -> RateLimiter:
+    """
+    Build the engine from RATE_LIMIT_BACKEND ('auto', 'redis', 'sqlite' or
+    'memory'). 'auto' uses Redis when REDIS_URL is set and reachable, else
+    the SQLite file at RATE_LIMIT_SQLITE_PATH.
+    """
+    fallback = MemoryBackend(config.get('RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS))
+    choice = (config.get('RATE_LIMIT_BACKEND') or 'auto').lower()
+    redis_url = config.get('REDIS_URL') or os.getenv('REDIS_URL')
+
+    if choice in ('auto', 'redis') and redis_url:
+        try:
+            return RateLimiter(RedisBackend(_redis_client(redis_url)), fallback)
+        except Exception as e:
+            logger.warning(f"Rate limiter: Redis unavailable: {e}")
+    if choice in ('auto', 'redis', 'sqlite'):
+        try:
+            return RateLimiter(SQLiteBackend(config.get('RATE_LIMIT_SQLITE_PATH') or DEFAULT_SQLITE_PATH), fallback)
+        except Exception as e:
+            logger.warning(f"Rate limiter: SQLite file unavailable, using per-process limits: {e}")
+    return RateLimiter(fallback=fallback)
+
+
+def get_rate_limiter() -> RateLimiter:
+    """The current app's rate limiter, created on first use."""
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        limiter = current_app.extensions['rate_limiter'] = create_rate_limiter(current_app.config)
+    return limiter
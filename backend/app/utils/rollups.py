@@ -0,0 +1,439 @@
+"""
+Daily Sales Rollups
+===================
+Maintains `DailySalesRollup`: one row per business, branch and UTC day with
+the revenue, COGS, returns, expenses, payroll and order count figures the
+dashboard and the income statement used to re-aggregate from raw rows on
+every request.
+
+Maintenance is incremental and durable:
+
+- An `after_flush` listener records which (business, day) pairs were touched
+  by inserted, updated or deleted orders, order items, returns, return
+  items, expenses and payroll rows, including the old day when a date
+  column changes.
+- A `before_commit` listener only records those days as a 'rollup.refresh'
+  outbox event in the committing transaction. Neither the writer (e.g. a
+  POS checkout holding product row locks) nor its request waits for a day
+  to be re-aggregated.
+- The outbox worker (`flask outbox-worker`) recomputes the days, coalescing
+  every event of a business claimed together into one refresh, so a burst
+  of sales re-aggregates each day once. On PostgreSQL each day is guarded
+  by an advisory lock, so concurrent refreshes of the same day run one
+  after another. Rollups therefore lag writes by the worker's poll
+  interval; failed refreshes are retried with the outbox backoff.
+
+Writes that bypass the ORM unit of work (bulk updates, raw SQL) report
+their days with `mark_days()`. Anything else they miss, and product cost
+changes (COGS is taken at the cost price current when a day is
+refreshed), is picked up by `flask rebuild-rollups`, which also backfills
+history. Reports only read rollups for businesses with a `SalesRollupState`
+row, which a full rebuild sets; new businesses get one when created.
+
+Reading:
+
+    days = whole_days(start, end)
+    if days and rollups_available(business_id):
+        query = rollup_query(business_id, branch_id, func.sum(DailySalesRollup.cogs))
+"""
+
+from app import db
+from app.models.business import Business
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product
+from app.models.returns import Return, ReturnItem, ReturnStatus
+from app.models.expense import Expense
+from app.models.outbox import OutboxEvent
+from app.models.payroll import Payroll
+from app.models.sales_rollup import DailySalesRollup, SalesRollupState
+from app.utils.dashboard_metrics import (
+    SUCCESSFUL_ORDER_STATUSES, RETURN_VALUE_STATUSES, RETURN_CONFIRMED_STATUSES,
+    EXPENSE_STATUSES, PAYROLL_STATUSES, _sum_if, _count_if
+)
+from app.utils.time_series import bucket_expression
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, date
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Days refreshed per statement batch (and per transaction in a rebuild)
+REFRESH_CHUNK_DAYS = 31
+
+SALE_STATUSES = [OrderStatus.DELIVERED, OrderStatus.COMPLETED]
+
+METRICS = [
+    'order_count', 'sales_count', 'sales_amount', 'returned_order_count', 'returned_order_amount',
+    'net_revenue', 'tax_amount', 'discount_amount', 'gross_sales', 'line_discounts', 'cogs',
+    'returns_value', 'pending_returns', 'returns_cogs', 'returns_confirmed_amount',
+    'expenses', 'payroll_gross', 'payroll_tax', 'payroll_other',
+]
+
+_PENDING_DAYS = 'rollup_days'
+_PENDING_ORDERS = 'rollup_order_ids'
+_PENDING_RETURNS = 'rollup_return_ids'
+_NEW_BUSINESSES = 'rollup_new_businesses'
+
+DayKey = Tuple[int, date]
+
+
+# ==================== COMPUTING ====================
+
+def _day_key(value) -> date:
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def _aggregate(session: Session, business_id: int, start: date, end: date) -> Dict[Tuple[int, date], Dict[str, Any]]:
+    """Every metric for days in [start, end), keyed by (branch_id or 0, day)."""
+    start_at, end_at = _midnight(start), _midnight(end)
+    results: Dict[Tuple[int, date], Dict[str, Any]] = {}
+
+    def merge(query, names):
+        for row in query.all():
+            target = results.setdefault((row.branch_id or 0, _day_key(row.day)), {})
+            for name in names:
+                target[name] = getattr(row, name) or 0
+
+    # Orders by created_at
+    day = bucket_expression(Order.created_at, 'day').label('day')
+    is_sale = Order.status.in_(SALE_STATUSES)
+    is_returned = Order.status == OrderStatus.RETURNED
+    is_successful = Order.status.in_(SUCCESSFUL_ORDER_STATUSES)
+    merge(session.query(
+        Order.branch_id.label('branch_id'), day,
+        func.count(Order.id).label('order_count'),
+        _count_if(is_sale, Order.id).label('sales_count'),
+        _sum_if(is_sale, Order.total_amount).label('sales_amount'),
+        _count_if(is_returned, Order.id).label('returned_order_count'),
+        _sum_if(is_returned, Order.total_amount).label('returned_order_amount'),
+        _sum_if(is_successful, Order.total_amount - Order.shipping_cost - Order.tax_amount).label('net_revenue'),
+        _sum_if(is_successful, Order.tax_amount).label('tax_amount'),
+        _sum_if(is_successful, Order.discount_amount).label('discount_amount'),
+    ).filter(
+        Order.business_id == business_id,
+        Order.created_at >= start_at,
+        Order.created_at < end_at
+    ).group_by(Order.branch_id, day), [
+        'order_count', 'sales_count', 'sales_amount', 'returned_order_count', 'returned_order_amount',
+        'net_revenue', 'tax_amount', 'discount_amount'
+    ])
+
+    # Order items of successful orders
+    merge(session.query(
+        Order.branch_id.label('branch_id'), day,
+        func.sum(OrderItem.quantity * OrderItem.unit_price).label('gross_sales'),
+        func.sum(OrderItem.quantity * OrderItem.unit_price * (OrderItem.discount_percent / 100)).label('line_discounts'),
+        func.sum(OrderItem.quantity * Product.cost_price).label('cogs'),
+    ).select_from(OrderItem).join(
+        Order, OrderItem.order_id == Order.id
+    ).join(
+        Product, OrderItem.product_id == Product.id
+    ).filter(
+        Order.business_id == business_id,
+        Order.status.in_(SUCCESSFUL_ORDER_STATUSES),
+        Order.created_at >= start_at,
+        Order.created_at < end_at
+    ).group_by(Order.branch_id, day), ['gross_sales', 'line_discounts', 'cogs'])
+
+    # Returns by return_date
+    day = bucket_expression(Return.return_date, 'day').label('day')
+    merge(session.query(
+        Return.branch_id.label('branch_id'), day,
+        func.sum(Return.total_amount).label('returns_value'),
+        _sum_if(Return.status == ReturnStatus.PENDING, Return.total_amount).label('pending_returns'),
+    ).filter(
+        Return.business_id == business_id,
+        Return.status.in_(RETURN_VALUE_STATUSES),
+        Return.return_date >= start,
+        Return.return_date < end
+    ).group_by(Return.branch_id, day), ['returns_value', 'pending_returns'])
+
+    merge(session.query(
+        Return.branch_id.label('branch_id'), day,
+        func.sum(ReturnItem.quantity * Product.cost_price).label('returns_cogs'),
+    ).select_from(ReturnItem).join(
+        Return, ReturnItem.return_id == Return.id
+    ).join(
+        Product, ReturnItem.product_id == Product.id
+    ).filter(
+        Return.business_id == business_id,
+        Return.status.in_(RETURN_CONFIRMED_STATUSES),
+        Return.return_date >= start,
+        Return.return_date < end
+    ).group_by(Return.branch_id, day), ['returns_cogs'])
+
+    # Confirmed returns by created_at (netted from the sales chart)
+    day = bucket_expression(Return.created_at, 'day').label('day')
+    merge(session.query(
+        Return.branch_id.label('branch_id'), day,
+        func.sum(Return.total_amount).label('returns_confirmed_amount'),
+    ).filter(
+        Return.business_id == business_id,
+        Return.status.in_(RETURN_CONFIRMED_STATUSES),
+        Return.created_at >= start_at,
+        Return.created_at < end_at
+    ).group_by(Return.branch_id, day), ['returns_confirmed_amount'])
+
+    # Expenses by expense_date
+    day = bucket_expression(Expense.expense_date, 'day').label('day')
+    merge(session.query(
+        Expense.branch_id.label('branch_id'), day,
+        func.sum(Expense.amount).label('expenses'),
+    ).filter(
+        Expense.business_id == business_id,
+        Expense.status.in_(EXPENSE_STATUSES),
+        Expense.expense_date >= start,
+        Expense.expense_date < end
+    ).group_by(Expense.branch_id, day), ['expenses'])
+
+    # Payroll by payment_date
+    day = bucket_expression(Payroll.payment_date, 'day').label('day')
+    merge(session.query(
+        Payroll.branch_id.label('branch_id'), day,
+        func.sum(Payroll.gross_pay).label('payroll_gross'),
+        func.sum(Payroll.tax_deductions).label('payroll_tax'),
+        func.sum(Payroll.other_deductions).label('payroll_other'),
+    ).filter(
+        Payroll.business_id == business_id,
+        Payroll.status.in_(PAYROLL_STATUSES),
+        Payroll.payment_date >= start,
+        Payroll.payment_date < end
+    ).group_by(Payroll.branch_id, day), ['payroll_gross', 'payroll_tax', 'payroll_other'])
+
+    return results
+
+
+def _lock_days(session: Session, business_id: int, days: Iterable[date]) -> None:
+    """Serialize refreshes of the same business day on PostgreSQL (released at commit)."""
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    for day in sorted(days):
+        session.execute(text('SELECT pg_advisory_xact_lock(:business_id, :day)'),
+                        {'business_id': business_id, 'day': day.toordinal()})
+
+
+def refresh_range(session: Session, business_id: int, start: date, end: date) -> int:
+    """
+    Recompute the rollups of one business for days in [start, end).
+    Changes are made in the session's transaction; the caller commits.
+    Returns the number of rollup rows written.
+    """
+    _lock_days(session, business_id, (start + timedelta(days=i) for i in range((end - start).days)))
+
+    results = _aggregate(session, business_id, start, end)
+    session.query(DailySalesRollup).filter(
+        DailySalesRollup.business_id == business_id,
+        DailySalesRollup.day >= start,
+        DailySalesRollup.day < end
+    ).delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    mappings = [
+        dict({name: 0 for name in METRICS}, **values,
+             business_id=business_id, branch_id=branch_id, day=day, refreshed_at=now)
+        for (branch_id, day), values in results.items()
+        if any(values.values())
+    ]
+    if mappings:
+        session.bulk_insert_mappings(DailySalesRollup, mappings)
+    return len(mappings)
+
+
+def _day_runs(days: Iterable[date], max_days: int = REFRESH_CHUNK_DAYS) -> List[Tuple[date, date]]:
+    """Group days into [start, end) runs of consecutive days."""
+    runs: List[Tuple[date, date]] = []
+    for day in sorted(set(days)):
+        if runs and runs[-1][1] == day and (day - runs[-1][0]).days < max_days:
+            runs[-1] = (runs[-1][0], day + timedelta(days=1))
+        else:
+            runs.append((day, day + timedelta(days=1)))
+    return runs
+
+
+def refresh_days(session: Session, keys: Iterable[DayKey]) -> None:
+    """Recompute the given (business_id, day) pairs."""
+    by_business: Dict[int, Set[date]] = {}
+    for business_id, day in keys:
+        by_business.setdefault(business_id, set()).add(day)
+    for business_id in sorted(by_business):
+        for start, end in _day_runs(by_business[business_id]):
+            refresh_range(session, business_id, start, end)
+
+
+def rebuild(business_id: int, since: Optional[date] = None, until: Optional[date] = None) -> int:
+    """
+    Recompute a business's rollups from since (default: its first record)
+    through until (default: today), committing every REFRESH_CHUNK_DAYS
+    days. A full rebuild marks the business as ready for rollup reads.
+    Returns the number of rollup rows written.
+    """
+    full = since is None and until is None
+    if since is None:
+        firsts = [
+            db.session.query(func.min(Order.created_at)).filter(Order.business_id == business_id).scalar(),
+            db.session.query(func.min(Return.return_date)).filter(Return.business_id == business_id).scalar(),
+            db.session.query(func.min(Return.created_at)).filter(Return.business_id == business_id).scalar(),
+            db.session.query(func.min(Expense.expense_date)).filter(Expense.business_id == business_id).scalar(),
+            db.session.query(func.min(Payroll.payment_date)).filter(Payroll.business_id == business_id).scalar(),
+        ]
+        firsts = [_day_key(value) for value in firsts if value is not None]
+        since = min(firsts) if firsts else datetime.utcnow().date()
+    until = until or datetime.utcnow().date()
+
+    written = 0
+    start = since
+    while start <= until:
+        end = min(start + timedelta(days=REFRESH_CHUNK_DAYS), until + timedelta(days=1))
+        written += refresh_range(db.session, business_id, start, end)
+        db.session.commit()
+        start = end
+
+    if full:
+        # Rows dated after today (e.g. post-dated expenses) are kept current by later writes
+        state = db.session.get(SalesRollupState, business_id)
+        if state is None:
+            db.session.add(SalesRollupState(business_id=business_id))
+        else:
+            state.built_at = datetime.utcnow()
+        db.session.commit()
+    return written
+
+
+# ==================== CHANGE TRACKING ====================
+
+def _column_values(obj, attr: str) -> List[Any]:
+    """Current value of an attribute plus any value it had before this flush."""
+    values = [getattr(obj, attr, None)]
+    history = inspect(obj).attrs[attr].history
+    values.extend(history.deleted or [])
+    return [value for value in values if value is not None]
+
+
+def _collect_changes(session: Session, flush_context) -> None:
+    days: Set[DayKey] = session.info.setdefault(_PENDING_DAYS, set())
+    order_ids: Set[int] = session.info.setdefault(_PENDING_ORDERS, set())
+    return_ids: Set[int] = session.info.setdefault(_PENDING_RETURNS, set())
+
+    def add_days(obj, *attrs):
+        for attr in attrs:
+            for value in _column_values(obj, attr):
+                days.add((obj.business_id, _day_key(value)))
+
+    changed = list(session.new) + list(session.deleted) + [
+        obj for obj in session.dirty if session.is_modified(obj, include_collections=False)
+    ]
+    for obj in changed:
+        if isinstance(obj, Order):
+            add_days(obj, 'created_at')
+        elif isinstance(obj, Return):
+            add_days(obj, 'return_date', 'created_at')
+        elif isinstance(obj, Expense):
+            add_days(obj, 'expense_date')
+        elif isinstance(obj, Payroll):
+            add_days(obj, 'payment_date')
+        elif isinstance(obj, OrderItem):
+            order_ids.update(_column_values(obj, 'order_id'))
+        elif isinstance(obj, ReturnItem):
+            return_ids.update(_column_values(obj, 'return_id'))
+        elif isinstance(obj, Business) and obj in session.new:
+            session.info.setdefault(_NEW_BUSINESSES, set()).add(obj.id)
+
+
+def mark_days(session: Session, keys: Iterable[DayKey]) -> None:
+    """
+    Refresh (business_id, day) pairs when the session commits, for writes
+    the flush listener cannot see (bulk_update_mappings, query.update()).
+    """
+    session.info.setdefault(_PENDING_DAYS, set()).update((business_id, _day_key(day)) for business_id, day in keys)
+
+
+def _pop_pending(session: Session) -> Set[DayKey]:
+    days = set(session.info.pop(_PENDING_DAYS, ()))
+    order_ids = session.info.pop(_PENDING_ORDERS, set())
+    return_ids = session.info.pop(_PENDING_RETURNS, set())
+    if order_ids:
+        for business_id, created_at in session.query(Order.business_id, Order.created_at).filter(
+            Order.id.in_(order_ids)
+        ).all():
+            days.add((business_id, _day_key(created_at)))
+    if return_ids:
+        for business_id, return_date, created_at in session.query(
+            Return.business_id, Return.return_date, Return.created_at
+        ).filter(Return.id.in_(return_ids)).all():
+            days.update((business_id, _day_key(value)) for value in (return_date, created_at) if value)
+    return days
+
+
+def _queue_refresh(session: Session) -> None:
+    session.flush()
+    for business_id in session.info.pop(_NEW_BUSINESSES, ()):
+        session.add(SalesRollupState(business_id=business_id))
+    if not any(session.info.get(key) for key in (_PENDING_DAYS, _PENDING_ORDERS, _PENDING_RETURNS)):
+        return
+
+    by_business: Dict[int, Set[date]] = {}
+    for business_id, day in _pop_pending(session):
+        by_business.setdefault(business_id, set()).add(day)
+    # Flushed by the commit itself, after this listener
+    now = datetime.utcnow()
+    session.add_all([OutboxEvent(
+        business_id=business_id, event_type='rollup.refresh',
+        payload={'days': sorted(day.isoformat() for day in days)}, available_at=now
+    ) for business_id, days in sorted(by_business.items())])
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    for key in (_PENDING_DAYS, _PENDING_ORDERS, _PENDING_RETURNS, _NEW_BUSINESSES):
+        session.info.pop(key, None)
+
+
+def register_rollup_listeners() -> None:
+    """Keep the rollups in step with ORM writes (called once from create_app)."""
+    if not event.contains(Session, 'after_flush', _collect_changes):
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'before_commit', _queue_refresh)
+        event.listen(Session, 'after_rollback', _discard_pending)
+
+
+# ==================== READING ====================
+
+def whole_days(start: datetime, end: Optional[datetime], end_inclusive: bool = False) -> Optional[Tuple[date, Optional[date]]]:
+    """
+    (first day, day after the last) when a datetime range covers whole
+    days, otherwise None. An end of None means open-ended. With
+    end_inclusive, an end of 23:59:59.999999 counts as the end of that day.
+    """
+    if start.time() != datetime.min.time():
+        return None
+    if end is None:
+        return start.date(), None
+    if end_inclusive:
+        end = end + timedelta(microseconds=1)
+    if end.time() != datetime.min.time():
+        return None
+    return start.date(), end.date()
+
+
+def rollups_available(business_id: int) -> bool:
+    """True once the business's rollups cover its history."""
+    return db.session.query(SalesRollupState.business_id).filter(
+        SalesRollupState.business_id == business_id
+    ).first() is not None
+
+
+def rollup_query(business_id: int, branch_id: Optional[int], *columns):
+    """A query over one business's rollups, restricted to a branch when given."""
+    query = db.session.query(*columns).filter(DailySalesRollup.business_id == business_id)
+    if branch_id:
+        query = query.filter(DailySalesRollup.branch_id == branch_id)
+    return query
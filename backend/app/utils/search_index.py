@@ -0,0 +1,411 @@
+"""
+Search Index
+============
+Indexed search over products, customers, suppliers and employees, used by
+the /api/search typeahead and by the `search` filter of the list
+endpoints.
+
+Each record has one `SearchDocument` row holding its normalised tokens:
+lower-cased words, plus their letter and digit runs so that "CUST0042" is
+found by "cust", "cust00", "0042" and "42". A flush listener rewrites the rows
+of new, changed and deleted records in the same transaction, so the index
+never disagrees with committed data. Bulk imports, which bypass the ORM,
+call `index_imported()`.
+
+Matching is word-prefix: every query word must begin some word of the
+record ("jo sm" finds "John Smith"). PostgreSQL answers it from the GIN
+index on to_tsvector('simple', search_text) with `word:* & word:*`
+queries ranked by ts_rank. SQLite uses the FTS5 table with `"word"*`
+queries ranked by bm25. Both indexes are created with search_documents
+(see app/models/search_document.py).
+
+Typeahead results are cached per business for a few seconds and dropped
+when an indexed record of that business is committed. A business without
+`SearchIndexState` (created with the business, or by a rebuild) is indexed on
+its first search; `flask rebuild-search-index` rebuilds everything.
+
+Typical use:
+
+    results = search(business_id, 'jo sm', types=['customers'])
+    query = query.filter(search_filter(Customer.id, business_id, 'customer', term))
+"""
+
+from app import db
+from app.models.customer import Customer
+from app.models.employee import Employee
+from app.models.product import Product
+from app.models.business import Business
+from app.models.search_document import SearchDocument, SearchIndexState
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.utils.cache import TTLCache
+from datetime import datetime
+from sqlalchemy import bindparam, delete, event, false, inspect, text, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+# Query words beyond this are ignored
+MAX_TERMS = 8
+
+RESULT_TTL = 10
+REBUILD_BATCH_SIZE = 500
+
+_WORD = re.compile(r'[^\W_]+')
+_RUNS = re.compile(r'[^\W\d_]+|\d+')
+
+_results = TTLCache(ttl=RESULT_TTL, maxsize=5000)   # (business_id, ...) -> results
+_indexed_businesses: Set[int] = set()
+
+_PENDING = 'search_index_businesses'
+_documents = SearchDocument.__table__
+_states = SearchIndexState.__table__
+
+
+# ==================== DOCUMENTS ====================
+
+def tokenize(*values: Any) -> List[str]:
+    """Distinct lower-cased words of the values, each followed by its letter/digit runs (unpadded)."""
+    tokens: Dict[str, None] = {}
+    for value in values:
+        if value is None:
+            continue
+        for word in _WORD.findall(str(value).lower()):
+            tokens[word] = None
+            runs = _RUNS.findall(word)
+            if len(runs) > 1:
+                tokens.update(dict.fromkeys(runs))
+            # Codes are zero padded: 0042 is also found by 42
+            tokens.update(dict.fromkeys(run.lstrip('0') for run in runs if run[0] == '0' and run.strip('0')))
+    return list(tokens)
+
+
+def _digits(phone: Optional[str]) -> Optional[str]:
+    return re.sub(r'\D', '', phone) if phone else None
+
+
+def _full_name(first_name: Optional[str], last_name: Optional[str]) -> str:
+    return ' '.join(part for part in (first_name, last_name) if part)
+
+
+def _product_document(product: Product) -> Tuple[str, Optional[str], List[Any]]:
+    return product.name, product.sku or product.product_id, [
+        product.product_id, product.name, product.sku, product.barcode, product.brand
+    ]
+
+
+def _customer_document(customer: Customer) -> Tuple[str, Optional[str], List[Any]]:
+    name = _full_name(customer.first_name, customer.last_name)
+    return name, customer.company or customer.email, [
+        customer.customer_id, name, customer.company, customer.email, customer.phone,
+        _digits(customer.phone), customer.customer_type
+    ]
+
+
+def _supplier_document(supplier: Supplier) -> Tuple[str, Optional[str], List[Any]]:
+    return supplier.company_name, supplier.contact_person or supplier.email, [
+        supplier.supplier_id, supplier.company_name, supplier.contact_person, supplier.email,
+        supplier.phone, _digits(supplier.phone)
+    ]
+
+
+def _employee_document(employee: Employee) -> Tuple[str, Optional[str], List[Any]]:
+    user = employee.user
+    name = _full_name(user.first_name, user.last_name) if user else ''
+    return name or employee.employee_id, employee.position or employee.department, [
+        employee.employee_id, name, employee.department, employee.position
+    ]
+
+
+# entity type -> (model, code column, document builder, indexed columns)
+ENTITIES: Dict[str, Tuple[Any, str, Callable, Tuple[str, ...]]] = {
+    'product': (Product, 'product_id', _product_document,
+                ('product_id', 'name', 'sku', 'barcode', 'brand', 'is_active')),
+    'customer': (Customer, 'customer_id', _customer_document,
+                 ('customer_id', 'first_name', 'last_name', 'company', 'email', 'phone', 'customer_type',
+                  'is_active')),
+    'supplier': (Supplier, 'supplier_id', _supplier_document,
+                 ('supplier_id', 'company_name', 'contact_person', 'email', 'phone', 'is_active')),
+    'employee': (Employee, 'employee_id', _employee_document,
+                 ('employee_id', 'user_id', 'department', 'position', 'is_active')),
+}
+_TYPE_BY_MODEL = {model: entity_type for entity_type, (model, _, _, _) in ENTITIES.items()}
+
+# /api/search "types" names
+TYPES = {'products': 'product', 'customers': 'customer', 'suppliers': 'supplier', 'employees': 'employee'}
+
+
+def _document_row(entity_type: str, obj: Any) -> Dict[str, Any]:
+    title, subtitle, values = ENTITIES[entity_type][2](obj)
+    return {
+        'business_id': obj.business_id,
+        'entity_type': entity_type,
+        'entity_id': obj.id,
+        'title': (title or '')[:255],
+        'subtitle': subtitle[:255] if subtitle else None,
+        'search_text': ' '.join(tokenize(*values)),
+        'is_active': bool(obj.is_active),
+        'updated_at': datetime.utcnow(),
+    }
+
+
+def _insert(conn, table):
+    dialect = postgresql if conn.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
+
+
+def _write_documents(conn, entity_type: str, objects: Iterable[Any] = (), deleted_ids: Iterable[int] = ()) -> None:
+    """Upsert the documents of objects and drop those of deleted_ids, on conn's transaction."""
+    rows = [_document_row(entity_type, obj) for obj in objects]
+    deleted_ids = list(deleted_ids)
+    if deleted_ids:
+        conn.execute(delete(_documents).where(
+            _documents.c.entity_type == entity_type, _documents.c.entity_id.in_(deleted_ids)
+        ))
+    if rows:
+        # Concurrent writers of the same record (or rebuilds) update rather than collide
+        statement = _insert(conn, _documents)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=['entity_type', 'entity_id'],
+            set_={name: statement.excluded[name] for name in rows[0] if name not in ('entity_type', 'entity_id')}
+        ), rows)
+
+
+def _mark_indexed(conn, business_ids: Iterable[int]) -> None:
+    rows = [{'business_id': business_id, 'built_at': datetime.utcnow()} for business_id in business_ids]
+    if rows:
+        statement = _insert(conn, _states)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=['business_id'], set_={'built_at': statement.excluded.built_at}
+        ), rows)
+
+
+def index_imported(model: Any, business_id: int, mappings: List[Dict[str, Any]]) -> None:
+    """Index records written with bulk_insert_mappings, found by their per-business code."""
+    entity_type = _TYPE_BY_MODEL.get(model)
+    if not entity_type:
+        return
+    code_column = getattr(model, ENTITIES[entity_type][1])
+    codes = [mapping[ENTITIES[entity_type][1]] for mapping in mappings]
+    query = model.query.filter(model.business_id == business_id, code_column.in_(codes))
+    if model is Employee:
+        query = query.options(db.joinedload(Employee.user))
+    _write_documents(db.session.connection(), entity_type, query.all())
+    db.session.info.setdefault(_PENDING, set()).add(business_id)
+
+
+def rebuild_search_index(business_id: Optional[int] = None) -> int:
+    """Rewrite the documents of one business (or all) from the source tables; returns how many."""
+    conn = db.session.connection()
+    criterion = _documents.c.business_id == business_id if business_id else true()
+    conn.execute(delete(_documents).where(criterion))
+    count = 0
+    for entity_type, (model, _, _, _) in ENTITIES.items():
+        query = model.query
+        if business_id:
+            query = query.filter(model.business_id == business_id)
+        if model is Employee:
+            query = query.options(db.joinedload(Employee.user))
+        batch = []
+        for obj in query.order_by(model.id).yield_per(REBUILD_BATCH_SIZE):
+            batch.append(obj)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                _write_documents(conn, entity_type, batch)
+                count += len(batch)
+                batch = []
+        _write_documents(conn, entity_type, batch)
+        count += len(batch)
+    _mark_indexed(conn, [business_id] if business_id else [row[0] for row in db.session.query(Business.id)])
+    db.session.commit()
+    invalidate_search(business_id)
+    if business_id:
+        _indexed_businesses.add(business_id)
+    return count
+
+
+def _ensure_indexed(business_id: int) -> None:
+    """
+    Index a business on its first search unless it is marked as indexed
+    (records from before the index get no documents until then, even if
+    some of their neighbours were edited since).
+    """
+    if business_id in _indexed_businesses:
+        return
+    if db.session.get(SearchIndexState, business_id) is None:
+        logger.info(f"Search index: building documents for business {business_id}")
+        rebuild_search_index(business_id)
+    _indexed_businesses.add(business_id)
+
+
+# ==================== QUERIES ====================
+
+def query_terms(q: Optional[str]) -> List[str]:
+    return _WORD.findall((q or '').lower())[:MAX_TERMS]
+
+
+def _is_postgres() -> bool:
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def _match_sql(terms: List[str]) -> Tuple[str, str, str, str]:
+    """(FROM clause, match condition, score expression, match parameter) for the dialect."""
+    if _is_postgres():
+        return (
+            "search_documents d",
+            "to_tsvector('simple', d.search_text) @@ to_tsquery('simple', :search_match)",
+            "ts_rank(to_tsvector('simple', d.search_text), to_tsquery('simple', :search_match))",
+            ' & '.join(f'{term}:*' for term in terms),
+        )
+    return (
+        "search_documents_fts JOIN search_documents d ON d.id = search_documents_fts.rowid",
+        "search_documents_fts MATCH :search_match",
+        "-bm25(search_documents_fts)",
+        ' '.join(f'"{term}"*' for term in terms),
+    )
+
+
+def search_filter(column, business_id: int, entity_type: str, q: str):
+    """Criterion limiting column (the model's id) to records matching q."""
+    terms = query_terms(q)
+    if not terms:
+        return false()
+    _ensure_indexed(business_id)
+    from_sql, match_sql, _, match = _match_sql(terms)
+    ids = text(
+        f"SELECT d.entity_id FROM {from_sql} "
+        f"WHERE {match_sql} AND d.business_id = :search_business_id AND d.entity_type = :search_entity_type"
+    ).bindparams(search_match=match, search_business_id=business_id, search_entity_type=entity_type)
+    return column.in_(ids.columns(SearchDocument.entity_id).subquery().select())
+
+
+def search(business_id: int, q: str, types: Optional[Iterable[str]] = None, limit: int = DEFAULT_LIMIT,
+           include_inactive: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Best matches for a typeahead query, up to limit per type:
+    {'products': [{'id', 'title', 'subtitle', 'is_active'}, ...], ...}.
+    Titles starting with the first query word rank first.
+    """
+    terms = query_terms(q)
+    types = sorted(set(types or TYPES))
+    limit = max(1, min(limit, MAX_LIMIT))
+    if not terms:
+        return {name: [] for name in types}
+
+    key = (business_id, tuple(types), ' '.join(terms), limit, include_inactive)
+    results = _results.get(key)
+    if results is not None:
+        return results
+
+    _ensure_indexed(business_id)
+    from_sql, match_sql, score_sql, match = _match_sql(terms)
+    active_sql = '' if include_inactive else 'AND d.is_active = :active'
+    statement = text(f"""
+        SELECT entity_type, entity_id, title, subtitle, is_active FROM (
+            SELECT d.entity_type, d.entity_id, d.title, d.subtitle, d.is_active,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY d.entity_type
+                       ORDER BY CASE WHEN lower(d.title) LIKE :title_prefix THEN 0 ELSE 1 END,
+                                {score_sql} DESC, d.title
+                   ) AS position
+            FROM {from_sql}
+            WHERE {match_sql} AND d.business_id = :business_id
+              AND d.entity_type IN :entity_types {active_sql}
+        ) ranked
+        WHERE position <= :limit
+        ORDER BY entity_type, position
+    """).bindparams(bindparam('entity_types', expanding=True))
+    params = {
+        'search_match': match,
+        'title_prefix': f'{terms[0]}%',
+        'business_id': business_id,
+        'entity_types': [TYPES[name] for name in types],
+        'limit': limit,
+    }
+    if not include_inactive:
+        params['active'] = True
+
+    names = {entity_type: name for name, entity_type in TYPES.items()}
+    results = {name: [] for name in types}
+    for row in db.session.execute(statement, params):
+        results[names[row.entity_type]].append({
+            'id': row.entity_id,
+            'title': row.title,
+            'subtitle': row.subtitle,
+            'is_active': bool(row.is_active),
+        })
+    _results.set(key, results)
+    return results
+
+
+# ==================== MAINTENANCE ====================
+
+def invalidate_search(business_id: Optional[int] = None) -> None:
+    """Drop cached typeahead results for a business, or for all when None."""
+    if business_id is None:
+        _results.clear()
+    else:
+        _results.delete_where(lambda key: key[0] == business_id)
+
+
+def _index_changes(session: Session, flush_context) -> None:
+    changed: Dict[str, Dict[int, Any]] = {}
+    deleted: Dict[str, Set[int]] = {}
+    businesses: Set[int] = session.info.setdefault(_PENDING, set())
+
+    for obj in list(session.new) + list(session.dirty):
+        entity_type = _TYPE_BY_MODEL.get(type(obj))
+        if entity_type:
+            if obj in session.dirty:
+                attrs = inspect(obj).attrs
+                if not any(attrs[name].history.has_changes() for name in ENTITIES[entity_type][3]):
+                    continue
+            changed.setdefault(entity_type, {})[obj.id] = obj
+            businesses.add(obj.business_id)
+        elif isinstance(obj, User) and obj in session.dirty:
+            # Employee documents carry the user's name
+            attrs = inspect(obj).attrs
+            if (attrs.first_name.history.has_changes() or attrs.last_name.history.has_changes()) and obj.employee:
+                changed.setdefault('employee', {})[obj.employee.id] = obj.employee
+                businesses.add(obj.employee.business_id)
+
+    for obj in session.deleted:
+        entity_type = _TYPE_BY_MODEL.get(type(obj))
+        if entity_type:
+            deleted.setdefault(entity_type, set()).add(obj.id)
+            businesses.add(obj.business_id)
+
+    # A new business has nothing to backfill
+    new_businesses = [obj.id for obj in session.new if isinstance(obj, Business)]
+    if new_businesses:
+        _mark_indexed(session.connection(), new_businesses)
+
+    if not changed and not deleted:
+        return
+    conn = session.connection()
+    for entity_type in set(changed) | set(deleted):
+        _write_documents(conn, entity_type, changed.get(entity_type, {}).values(),
+                         deleted.get(entity_type, ()))
+
+
+def _apply_invalidations(session: Session) -> None:
+    for business_id in session.info.pop(_PENDING, None) or ():
+        invalidate_search(business_id)
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def register_search_index_listeners() -> None:
+    """Keep search documents in step with indexed records and drop stale cached results."""
+    if not event.contains(Session, 'after_flush', _index_changes):
+        event.listen(Session, 'after_flush', _index_changes)
+        event.listen(Session, 'after_commit', _apply_invalidations)
+        event.listen(Session, 'after_rollback', _discard_pending)
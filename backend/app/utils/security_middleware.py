@@ -107,35 +107,21 @@ class SecurityMiddleware:
 
 # Rate limiting decorator
 def rate_limit(max_requests: int = 100, window_seconds: int = 60, per_ip: bool = True):
-    """Rate limiting decorator"""
+    """Rate limiting decorator (sliding window, shared across workers; see app.utils.rate_limiter)"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Simple in-memory rate limiting (for production, use Redis)
-            if not hasattr(rate_limit, 'requests'):
-                rate_limit.requests = {}
-            
+            from .rate_limiter import get_rate_limiter
+
             # Scope by endpoint + IP so different routes have separate counters
             endpoint = request.endpoint or func.__name__
             ip = request.remote_addr if per_ip else 'global'
-            key = f"{endpoint}:{ip}"
-            current_time = time.time()
-            
-            # Clean old entries
-            if key in rate_limit.requests:
-                rate_limit.requests[key] = [
-                    req_time for req_time in rate_limit.requests[key]
-                    if current_time - req_time < window_seconds
-                ]
-            else:
-                rate_limit.requests[key] = []
+            result = get_rate_limiter().hit(f"{endpoint}:{ip}", max_requests, window_seconds)
             
-            # Check rate limit
-            if len(rate_limit.requests[key]) >= max_requests:
-                return jsonify({'error': 'Rate limit exceeded. Please wait a few minutes and try again.'}), 429
-            
-            # Add current request
-            rate_limit.requests[key].append(current_time)
+            if not result.allowed:
+                response = jsonify({'error': 'Rate limit exceeded. Please wait a few minutes and try again.'})
+                response.headers['Retry-After'] = str(result.retry_after)
+                return response, 429
             
             return func(*args, **kwargs)
         return wrapper
@@ -143,8 +129,11 @@ def rate_limit(max_requests: int = 100, window_seconds: int = 60, per_ip: bool =
 
 def clear_rate_limits():
     """Clear all rate limit counters (useful for development/testing)"""
-    if hasattr(rate_limit, 'requests'):
-        rate_limit.requests = {}
+    from flask import has_app_context
+    from .rate_limiter import get_rate_limiter
+    
+    if has_app_context():
+        get_rate_limiter().reset()
 
 # Input validation decorator
 def validate_json_input(schema: dict = None):
@@ -0,0 +1,186 @@
+"""
+Id Sequences
+============
+Allocates human-readable ids (ORD0001, CUST0001, INV0001, ITX0001, WH-0001,
+PO0001) from a per-business, per-prefix counter row in `id_sequences`. The
+old approach read the newest row, parsed its id and added one, which raced
+under concurrent checkouts and collided on the unique constraints.
+
+- On PostgreSQL the counter is advanced with one `UPDATE ... RETURNING` in
+  its own short transaction, so allocation neither waits on nor holds locks
+  for the request's transaction. As with a database sequence, numbers taken
+  by a request that rolls back are not reused.
+- A worker can reserve a block of numbers at once (ID_SEQUENCE_BLOCK_SIZE,
+  default 1) and hand them out from memory. With blocks larger than one,
+  ids from different workers are no longer in creation order.
+- SQLite serialises writers anyway, so there the counter is advanced in
+  the caller's transaction and rolls back with it; blocks are not used.
+- The first allocation for a business and prefix seeds the counter from the
+  highest existing id. Ids typed in by users are folded in with
+  `advance_sequence` so the counter never hands them out again.
+
+Typical use:
+
+    order_id = next_id(business_id, 'ORD')
+"""
+
+from flask import current_app
+from app import db
+from app.models.id_sequence import IdSequence
+from app.models.order import Order
+from app.models.customer import Customer
+from app.models.invoice import Invoice
+from app.models.inventory_transaction import InventoryTransaction
+from app.models.warehouse import Warehouse
+from app.models.purchase_order import PurchaseOrder
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import os
+import re
+import threading
+
+ID_WIDTH = 4
+
+# Suffixes longer than this are timestamp fallbacks of the old generator
+MAX_SEQUENCE_DIGITS = 11
+
+# Candidate rows read when seeding a counter from existing ids
+SEED_SCAN_LIMIT = 200
+
+# prefix -> (model, id column)
+SEQUENCES = {
+    'ORD': (Order, Order.order_id),
+    'CUST': (Customer, Customer.customer_id),
+    'INV': (Invoice, Invoice.invoice_id),
+    'ITX': (InventoryTransaction, InventoryTransaction.transaction_id),
+    'WH-': (Warehouse, Warehouse.warehouse_id),
+    'PO': (PurchaseOrder, PurchaseOrder.order_id),
+}
+
+_sequences = IdSequence.__table__
+
+# (business_id, prefix) -> [next value, last value] reserved by this process
+_blocks: Dict[Tuple[int, str], List[int]] = {}
+_blocks_pid = os.getpid()
+_blocks_lock = threading.Lock()
+
+
+def format_id(prefix: str, value: int) -> str:
+    return f'{prefix}{value:0{ID_WIDTH}d}'
+
+
+def parse_id(prefix: str, identifier: Optional[str]) -> Optional[int]:
+    """Numeric part of an id like PREFIX0042, or None for any other format."""
+    match = re.match(rf'^{re.escape(prefix)}(\d{{1,{MAX_SEQUENCE_DIGITS}}})$', identifier or '')
+    return int(match.group(1)) if match else None
+
+
+def _autonomous() -> bool:
+    """Whether counters are advanced in their own transaction (PostgreSQL)."""
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _highest_existing(conn, business_id: int, prefix: str) -> int:
+    model, column = SEQUENCES[prefix]
+    rows = conn.execute(
+        select(column).where(
+            model.business_id == business_id,
+            column.like(prefix + '%'),
+            func.length(column) <= len(prefix) + MAX_SEQUENCE_DIGITS
+        ).order_by(func.length(column).desc(), column.desc()).limit(SEED_SCAN_LIMIT)
+    ).scalars()
+    for identifier in rows:
+        value = parse_id(prefix, identifier)
+        if value is not None:
+            return value
+    return 0
+
+
+def _insert_ignore(values: dict):
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(_sequences).values(**values).on_conflict_do_nothing(
+        index_elements=['business_id', 'prefix']
+    )
+
+
+def _reserve(conn, business_id: int, prefix: str, count: int) -> int:
+    """Advance the counter by count and return its new (last reserved) value."""
+    key = (_sequences.c.business_id == business_id, _sequences.c.prefix == prefix)
+    bump = update(_sequences).where(*key).values(
+        last_value=_sequences.c.last_value + count,
+        updated_at=datetime.utcnow()
+    ).returning(_sequences.c.last_value)
+
+    value = conn.execute(bump).scalar()
+    if value is None:
+        seed = _highest_existing(conn, business_id, prefix)
+        conn.execute(_insert_ignore({
+            'business_id': business_id, 'prefix': prefix,
+            'last_value': seed, 'updated_at': datetime.utcnow()
+        }))
+        value = conn.execute(bump).scalar()
+    return value
+
+
+def reserve_ids(business_id: int, prefix: str, count: int = 1) -> int:
+    """
+    Reserve count consecutive numbers and return the first. Bypasses the
+    per-process blocks; use for bulk inserts.
+    """
+    if prefix not in SEQUENCES:
+        raise ValueError(f'Unknown id prefix: {prefix}')
+    if _autonomous():
+        with db.engine.begin() as conn:
+            last = _reserve(conn, business_id, prefix, count)
+    else:
+        last = _reserve(db.session, business_id, prefix, count)
+    return last - count + 1
+
+
+def _block_size() -> int:
+    if not _autonomous():
+        return 1
+    return max(1, int(current_app.config.get('ID_SEQUENCE_BLOCK_SIZE', 1)))
+
+
+def next_id(business_id: int, prefix: str) -> str:
+    """The next id for a business and prefix, e.g. next_id(1, 'ORD') -> 'ORD0042'."""
+    global _blocks_pid
+    block_size = _block_size()
+    if block_size == 1:
+        return format_id(prefix, reserve_ids(business_id, prefix))
+
+    with _blocks_lock:
+        if _blocks_pid != os.getpid():
+            # Blocks reserved before a fork belong to the parent
+            _blocks.clear()
+            _blocks_pid = os.getpid()
+        block = _blocks.get((business_id, prefix))
+        if block is None or block[0] > block[1]:
+            first = reserve_ids(business_id, prefix, block_size)
+            block = _blocks[(business_id, prefix)] = [first, first + block_size - 1]
+        value = block[0]
+        block[0] += 1
+    return format_id(prefix, value)
+
+
+def advance_sequence(business_id: int, prefix: str, identifier: Optional[str]) -> None:
+    """
+    Make sure the counter is at least the number in identifier, for ids
+    entered by hand or imported. Ids in other formats are ignored.
+    """
+    value = parse_id(prefix, identifier)
+    if value is None:
+        return
+    statement = update(_sequences).where(
+        _sequences.c.business_id == business_id,
+        _sequences.c.prefix == prefix,
+        _sequences.c.last_value < value
+    ).values(last_value=value, updated_at=datetime.utcnow())
+    if _autonomous():
+        with db.engine.begin() as conn:
+            conn.execute(statement)
+    else:
+        db.session.execute(statement)
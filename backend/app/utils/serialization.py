@@ -0,0 +1,144 @@
+"""
+Serialization Utility Module
+============================
+Listing endpoints return trees of `to_dict()` output (orders with items,
+products with category and supplier, transactions with product and user).
+Serialized one row at a time, every relationship is a lazy load per row.
+
+This module keeps one declarative eager-load plan per serialized shape. A
+plan lists the selectinload options that cover everything the matching
+`to_dict()` touches, so a page costs a fixed number of queries whatever
+its size:
+
+    query = with_load_plan(Order.query.filter_by(business_id=business_id), 'order')
+    orders = query.paginate(page=page, per_page=per_page, error_out=False)
+    return jsonify({'orders': serialize(orders.items, requested_fields())})
+
+Clients may trim the payload with `?fields=id,order_id,items.quantity`.
+Dotted names select keys inside nested objects and lists. Field selection
+only shapes the response; the plan still loads what `to_dict()` reads.
+"""
+
+from flask import request
+from sqlalchemy.orm import selectinload
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+
+def _product_plan() -> list:
+    from app.models.product import Product
+    from app.models.category import Category
+
+    return [
+        # Category.to_dict counts its products; only their ids are needed
+        selectinload(Product.category_obj).selectinload(Category.product_list).load_only(Product.id),
+        selectinload(Product.supplier_obj),
+    ]
+
+
+def _user_plan() -> list:
+    from app.models.user import User
+
+    return [
+        selectinload(User.business),
+        selectinload(User.permissions),
+    ]
+
+
+def _order_plan() -> list:
+    from app.models.order import Order, OrderItem
+    from app.models.returns import Return
+
+    return [
+        selectinload(Order.order_items).joinedload(OrderItem.product),
+        selectinload(Order.customer),
+        selectinload(Order.invoice),
+        selectinload(Order.returns).options(
+            selectinload(Return.customer),
+            selectinload(Return.invoice),
+        ),
+    ]
+
+
+def _invoice_plan() -> list:
+    from app.models.invoice import Invoice
+    from app.models.order import Order, OrderItem
+    from app.models.product import Product
+
+    return [
+        selectinload(Invoice.customer),
+        selectinload(Invoice.business),
+        selectinload(Invoice.order).selectinload(Order.order_items)
+            .joinedload(OrderItem.product).selectinload(Product.category_obj),
+    ]
+
+
+def _inventory_transaction_plan() -> list:
+    from app.models.inventory_transaction import InventoryTransaction
+
+    return [
+        selectinload(InventoryTransaction.product).options(*_product_plan()),
+        selectinload(InventoryTransaction.user).options(*_user_plan()),
+    ]
+
+
+def _audit_log_plan() -> list:
+    from app.models.audit_log import AuditLog
+
+    return [
+        selectinload(AuditLog.user).options(*_user_plan()),
+    ]
+
+
+# Built on demand so mappers (and backrefs such as User.permissions) are configured
+LOAD_PLANS: Dict[str, Callable[[], list]] = {
+    'product': _product_plan,
+    'user': _user_plan,
+    'order': _order_plan,
+    'invoice': _invoice_plan,
+    'inventory_transaction': _inventory_transaction_plan,
+    'audit_log': _audit_log_plan,
+}
+
+
+def with_load_plan(query, plan: str):
+    """Apply a named eager-load plan to a query."""
+    return query.options(*LOAD_PLANS[plan]())
+
+
+def requested_fields(param: str = 'fields') -> Optional[Set[str]]:
+    """Fields requested with ?fields=a,b,c.d, or None for the full payload."""
+    raw = request.args.get(param, '')
+    fields = {field.strip() for field in raw.split(',') if field.strip()}
+    return fields or None
+
+
+def _field_tree(fields: Iterable[str]) -> Dict[str, dict]:
+    tree: Dict[str, dict] = {}
+    for field in fields:
+        node = tree
+        for part in field.split('.'):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _pick(data: Any, tree: Dict[str, dict]) -> Any:
+    if not tree:
+        return data
+    if isinstance(data, list):
+        return [_pick(item, tree) for item in data]
+    if isinstance(data, dict):
+        return {key: _pick(data[key], subtree) for key, subtree in tree.items() if key in data}
+    return data
+
+
+def pick_fields(data: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Keep only the requested (possibly dotted) fields of a serialized dict."""
+    if not fields:
+        return data
+    return _pick(data, _field_tree(fields))
+
+
+def serialize(objects: Iterable[Any], fields: Optional[Iterable[str]] = None, **kwargs) -> List[Dict[str, Any]]:
+    """to_dict() every object, trimmed to fields when given."""
+    tree = _field_tree(fields) if fields else None
+    return [_pick(obj.to_dict(**kwargs), tree) if tree else obj.to_dict(**kwargs) for obj in objects]
@@ -0,0 +1,194 @@
+"""
+Settings Service
+================
+Typed, cached access to `SystemSetting` values. Each scope (one business,
+or the global settings with business_id NULL) is loaded with a single query
+and cached as a whole, so hot paths like low stock checks and email sending
+read configuration from memory:
+
+- An in-process LRU (TTLCache) holds recently used scopes.
+- When REDIS_URL is set and reachable, scopes are also cached in Redis so
+  that workers share them; the in-process entries then live only a few
+  seconds. Redis errors fall back to the database.
+- Committed writes to `SystemSetting` drop the affected scopes from both
+  tiers, whichever route made them.
+
+Typical use:
+
+    limit = get_int_setting(business_id, 'low_stock_limit', 20)
+    email_config = get_settings(None, prefix='email_')
+"""
+
+from app import db
+from app.models.settings import SystemSetting
+from app.utils.cache import TTLCache
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Optional, Set
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Seconds a scope stays in the in-process cache, without and with Redis
+LOCAL_TTL = 60
+LOCAL_TTL_WITH_REDIS = 5
+REDIS_TTL = 300
+REDIS_KEY_PREFIX = 'settings:'
+
+TRUE_VALUES = {'true', '1', 'yes', 'on'}
+
+_PENDING_SCOPES = 'settings_scopes'
+_MISSING = object()
+
+_local_cache = TTLCache(ttl=LOCAL_TTL, maxsize=2048)
+_redis = None
+_redis_checked = False
+
+
+def _redis_client():
+    """The shared Redis client, or None when REDIS_URL is unset or unusable."""
+    global _redis, _redis_checked
+    if not _redis_checked:
+        _redis_checked = True
+        redis_url = os.getenv('REDIS_URL')
+        if redis_url:
+            try:
+                import redis
+                client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                client.ping()
+                _redis = client
+            except Exception as e:
+                logger.warning(f"Settings cache: Redis unavailable, using in-process cache only: {e}")
+    return _redis
+
+
+def _scope_key(business_id: Optional[int]) -> str:
+    return 'global' if business_id is None else str(business_id)
+
+
+def _load_scope(business_id: Optional[int]) -> Dict[str, Optional[str]]:
+    query = db.session.query(SystemSetting.setting_key, SystemSetting.setting_value)
+    if business_id is None:
+        query = query.filter(SystemSetting.business_id.is_(None))
+    else:
+        query = query.filter(SystemSetting.business_id == business_id)
+    return {key: value for key, value in query.all()}
+
+
+def _get_scope(business_id: Optional[int]) -> Dict[str, Optional[str]]:
+    scope = _scope_key(business_id)
+    values = _local_cache.get(scope, _MISSING)
+    if values is not _MISSING:
+        return values
+
+    client = _redis_client()
+    if client is not None:
+        try:
+            cached = client.get(REDIS_KEY_PREFIX + scope)
+            if cached is not None:
+                values = json.loads(cached)
+        except Exception as e:
+            logger.warning(f"Settings cache: Redis read failed: {e}")
+
+    if values is _MISSING:
+        values = _load_scope(business_id)
+        if client is not None:
+            try:
+                client.setex(REDIS_KEY_PREFIX + scope, REDIS_TTL, json.dumps(values))
+            except Exception as e:
+                logger.warning(f"Settings cache: Redis write failed: {e}")
+
+    _local_cache.set(scope, values, LOCAL_TTL_WITH_REDIS if client is not None else None)
+    return values
+
+
+# ==================== ACCESSORS ====================
+
+def get_settings(business_id: Optional[int], prefix: str = '') -> Dict[str, Optional[str]]:
+    """Raw values of a scope whose keys start with prefix, with the prefix removed."""
+    values = _get_scope(business_id)
+    return {key[len(prefix):]: value for key, value in values.items() if key.startswith(prefix)}
+
+
+def get_setting(business_id: Optional[int], key: str, default: Optional[str] = None) -> Optional[str]:
+    """Raw string value, or default when the setting does not exist."""
+    value = _get_scope(business_id).get(key)
+    return default if value is None else value
+
+
+def get_int_setting(business_id: Optional[int], key: str, default: int) -> int:
+    """Integer value, or default when missing or not a number."""
+    value = get_setting(business_id, key)
+    try:
+        return int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        return default
+
+
+def get_float_setting(business_id: Optional[int], key: str, default: float) -> float:
+    """Float value, or default when missing or not a number."""
+    value = get_setting(business_id, key)
+    try:
+        return float(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        return default
+
+
+def get_bool_setting(business_id: Optional[int], key: str, default: bool = False) -> bool:
+    """Boolean value ('true', '1', 'yes', 'on', case-insensitive), or default when missing."""
+    value = get_setting(business_id, key)
+    if value is None or value == '':
+        return default
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def get_json_setting(business_id: Optional[int], key: str, default: Any = None) -> Any:
+    """Parsed JSON value, or default when missing or invalid."""
+    value = get_setting(business_id, key)
+    if value in (None, ''):
+        return default
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def invalidate_settings(business_id: Optional[int] = None) -> None:
+    """Drops one scope (None = the global settings) from both cache tiers."""
+    scope = _scope_key(business_id)
+    _local_cache.delete(scope)
+    client = _redis_client()
+    if client is not None:
+        try:
+            client.delete(REDIS_KEY_PREFIX + scope)
+        except Exception as e:
+            logger.warning(f"Settings cache: Redis invalidation failed: {e}")
+
+
+# ==================== INVALIDATION ====================
+
+def _collect_changes(session: Session, flush_context) -> None:
+    scopes: Set[Optional[int]] = session.info.setdefault(_PENDING_SCOPES, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, SystemSetting):
+            scopes.add(obj.business_id)
+            scopes.update(inspect(obj).attrs.business_id.history.deleted)
+
+
+def _apply_invalidations(session: Session) -> None:
+    for business_id in session.info.pop(_PENDING_SCOPES, None) or ():
+        invalidate_settings(business_id)
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING_SCOPES, None)
+
+
+def register_settings_listeners() -> None:
+    """Invalidate cached settings after commits that change them."""
+    if not event.contains(Session, 'after_flush', _collect_changes):
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'after_commit', _apply_invalidations)
+        event.listen(Session, 'after_rollback', _discard_pending)
@@ -0,0 +1,372 @@
+"""
+Stock Ledger
+============
+Keeps `StockLevel` - the quantity on hand per product, branch and
+warehouse - equal to the sum of the business's `InventoryTransaction`
+rows plus each product's opening balance, so that branch-scoped availability and low stock reads are single
+indexed lookups instead of scans of the transaction log.
+
+- Every stock movement (sales, goods receipts, customer and supplier
+  returns, adjustments, opening stock) is written as inventory
+  transactions with `record_movements`, alongside the existing
+  `Product.stock_quantity` update, which stays the business-wide total.
+- An `after_flush` listener turns the inserted, updated or deleted
+  transactions into per-level deltas and applies them with one
+  `INSERT ... ON CONFLICT DO UPDATE SET quantity = quantity + delta` in
+  the same transaction, so levels commit and roll back with the log and
+  concurrent writers never lose an increment. Warehouse `total_items` and
+  `capacity_percentage` move with their levels.
+- The opening balance is stock that predates the ledger: the part of
+  `Product.stock_quantity` that the log does not explain. It is seeded
+  straight into the level of the opening branch, never written as a
+  transaction, so movement reports only show movements someone made. The
+  first movement of a product that has no level yet seeds it in the same
+  flush, with the product's levels written from its whole log, so they
+  never start from zero. Callers update `stock_quantity` before their
+  movements are flushed.
+- `rebuild_stock_levels` (`flask rebuild-stock-levels`) recomputes the
+  levels from the log, e.g. after writes that bypassed the ORM, and seeds
+  the opening balances again.
+
+Reading:
+
+    stock = available_stock(business_id, [12, 15], branch_id=3)  # {12: 40, 15: 0}
+    levels = branch_stock(business_id, branch_id)  # subquery of (product_id, quantity)
+"""
+
+from app import db
+from app.models.branch import Branch
+from app.models.inventory_transaction import InventoryTransaction, TransactionType
+from app.models.product import Product
+from app.models.stock_level import StockLevel, UNASSIGNED
+from app.models.warehouse import Warehouse
+from app.utils.sequences import reserve_ids, format_id
+from sqlalchemy import case, event, func, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+INBOUND = (TransactionType.PURCHASE, TransactionType.ADJUSTMENT_IN, TransactionType.RETURN)
+OUTBOUND = (TransactionType.SALE, TransactionType.ADJUSTMENT_OUT, TransactionType.DAMAGED)
+
+_levels = StockLevel.__table__
+_warehouses = Warehouse.__table__
+
+LevelKey = Tuple[int, int, int, int]  # business, product, branch, warehouse
+
+
+def signed_quantity(transaction_type: TransactionType, quantity: int) -> int:
+    """The change in stock a transaction makes (quantities are stored positive)."""
+    return -quantity if transaction_type in OUTBOUND else quantity
+
+
+def record_movements(business_id: int, user_id: int, transaction_type: TransactionType,
+                     quantities: Dict[int, int], branch_id: Optional[int] = None,
+                     warehouse_id: Optional[int] = None, reference_id: Optional[str] = None,
+                     notes: Optional[str] = None,
+                     unit_prices: Optional[Dict[int, float]] = None) -> List[InventoryTransaction]:
+    """
+    Add one inventory transaction per product for quantities
+    {product_id: qty} to the session; the levels follow on flush. Does not
+    touch `Product.stock_quantity`, which callers update as before.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity and quantity > 0}
+    if not quantities:
+        return []
+    first = reserve_ids(business_id, 'ITX', len(quantities))
+    transactions = [InventoryTransaction(
+        business_id=business_id,
+        branch_id=branch_id,
+        warehouse_id=warehouse_id,
+        transaction_id=format_id('ITX', number),
+        product_id=product_id,
+        transaction_type=transaction_type,
+        quantity=quantities[product_id],
+        unit_price=(unit_prices or {}).get(product_id),
+        reference_id=reference_id,
+        notes=notes,
+        created_by=user_id
+    ) for number, product_id in enumerate(sorted(quantities), start=first)]
+    db.session.add_all(transactions)
+    return transactions
+
+
+def record_sales(business_id: int, user_id: int, branch_id: Optional[int], orders) -> List[InventoryTransaction]:
+    """
+    Add SALE transactions for new orders (one per order and product,
+    referencing the order number), numbered from a single ITX block.
+    """
+    movements = []
+    for order in orders:
+        quantities: Dict[int, int] = {}
+        prices: Dict[int, float] = {}
+        for item in order.order_items:
+            product_id = item.product_id if item.product_id is not None else item.product.id
+            quantities[product_id] = quantities.get(product_id, 0) + item.quantity
+            prices.setdefault(product_id, item.unit_price)
+        movements.extend((order.order_id, product_id, quantities[product_id], prices[product_id])
+                         for product_id in sorted(quantities))
+    if not movements:
+        return []
+    first = reserve_ids(business_id, 'ITX', len(movements))
+    transactions = [InventoryTransaction(
+        business_id=business_id,
+        branch_id=branch_id,
+        transaction_id=format_id('ITX', number),
+        product_id=product_id,
+        transaction_type=TransactionType.SALE,
+        quantity=quantity,
+        unit_price=unit_price,
+        reference_id=order_id,
+        created_by=user_id
+    ) for number, (order_id, product_id, quantity, unit_price) in enumerate(movements, start=first)]
+    db.session.add_all(transactions)
+    return transactions
+
+
+# ==================== APPLYING ====================
+
+def _upsert(conn, rows: List[dict]):
+    dialect = postgresql if conn.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(_levels).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=['business_id', 'product_id', 'branch_id', 'warehouse_id'],
+        set_={
+            'quantity': _levels.c.quantity + statement.excluded.quantity,
+            'updated_at': statement.excluded.updated_at
+        }
+    )
+
+
+def _capacity(total):
+    percentage = total * 100 / _warehouses.c.max_capacity
+    return case(
+        (func.coalesce(_warehouses.c.max_capacity, 0) <= 0, 0),
+        (percentage > 100, 100),
+        (percentage < 0, 0),
+        else_=percentage
+    )
+
+
+def apply_deltas(conn, deltas: Dict[LevelKey, int]) -> None:
+    """Add deltas {(business, product, branch, warehouse): change} to the levels atomically."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    # Sorted so that concurrent writers lock level rows in the same order
+    conn.execute(_upsert(conn, [{
+        'business_id': business_id, 'product_id': product_id, 'branch_id': branch_id,
+        'warehouse_id': warehouse_id, 'quantity': delta, 'updated_at': now
+    } for (business_id, product_id, branch_id, warehouse_id), delta in sorted(deltas.items())]))
+
+    by_warehouse: Dict[int, int] = {}
+    for (_, _, _, warehouse_id), delta in deltas.items():
+        if warehouse_id != UNASSIGNED:
+            by_warehouse[warehouse_id] = by_warehouse.get(warehouse_id, 0) + delta
+    if by_warehouse:
+        total = func.coalesce(_warehouses.c.total_items, 0) + case(by_warehouse, value=_warehouses.c.id)
+        conn.execute(update(_warehouses).where(_warehouses.c.id.in_(sorted(by_warehouse))).values(
+            total_items=total, capacity_percentage=_capacity(total), updated_at=now
+        ))
+
+
+def _level_key(obj, previous: bool = False) -> Tuple[LevelKey, int]:
+    """The level a transaction counts towards and its signed quantity (before this flush if previous)."""
+    state = inspect(obj)
+
+    def value(attr):
+        if previous:
+            history = state.attrs[attr].history
+            if history.deleted:
+                return history.deleted[0]
+        return getattr(obj, attr)
+
+    key = (value('business_id'), value('product_id'),
+           value('branch_id') or UNASSIGNED, value('warehouse_id') or UNASSIGNED)
+    return key, signed_quantity(value('transaction_type'), value('quantity') or 0)
+
+
+def _signed_log():
+    return case((InventoryTransaction.transaction_type.in_(OUTBOUND), -InventoryTransaction.quantity),
+                else_=InventoryTransaction.quantity)
+
+
+def _open_levels(session: Session, movements: List[InventoryTransaction]) -> Dict[LevelKey, int]:
+    """
+    Levels {key: quantity} of the moved products that have none yet: their
+    whole log, plus their opening balances at the opening branch.
+    """
+    conn = session.connection()
+    levels: Dict[LevelKey, int] = {}
+    by_business: Dict[int, set] = {}
+    for movement in movements:
+        by_business.setdefault(movement.business_id, set()).add(movement.product_id)
+
+    for business_id, moved in sorted(by_business.items()):
+        leveled = set(conn.execute(select(_levels.c.product_id).where(
+            _levels.c.business_id == business_id, _levels.c.product_id.in_(sorted(moved))
+        ).distinct()).scalars())
+        product_ids = sorted(moved - leveled)
+        if not product_ids:
+            continue
+
+        logged = dict(conn.execute(select(InventoryTransaction.product_id, func.sum(_signed_log())).where(
+            InventoryTransaction.business_id == business_id, InventoryTransaction.product_id.in_(product_ids)
+        ).group_by(InventoryTransaction.product_id)).all())
+        gaps = {product_id: int((stock or 0) - (logged.get(product_id) or 0)) for product_id, stock in conn.execute(
+            select(Product.id, Product.stock_quantity).where(Product.id.in_(product_ids))
+        ).all()}
+        gaps = {product_id: gap for product_id, gap in gaps.items() if gap}
+        opening = _opening_branch(business_id) or UNASSIGNED if gaps else None
+
+        branch = func.coalesce(InventoryTransaction.branch_id, UNASSIGNED)
+        warehouse = func.coalesce(InventoryTransaction.warehouse_id, UNASSIGNED)
+        for product_id, branch_id, warehouse_id, quantity in conn.execute(select(
+            InventoryTransaction.product_id, branch, warehouse, func.sum(_signed_log())
+        ).where(
+            InventoryTransaction.business_id == business_id, InventoryTransaction.product_id.in_(product_ids)
+        ).group_by(InventoryTransaction.product_id, branch, warehouse)).all():
+            levels[(business_id, product_id, branch_id, warehouse_id)] = int(quantity or 0)
+        for product_id, gap in gaps.items():
+            key = (business_id, product_id, opening, UNASSIGNED)
+            levels[key] = levels.get(key, 0) + gap
+    return levels
+
+
+def _apply_movements(session: Session, flush_context) -> None:
+    deltas: Dict[LevelKey, int] = {}
+
+    def add(key, delta):
+        deltas[key] = deltas.get(key, 0) + delta
+
+    for obj in session.new:
+        if isinstance(obj, InventoryTransaction):
+            add(*_level_key(obj))
+    for obj in session.deleted:
+        if isinstance(obj, InventoryTransaction):
+            key, delta = _level_key(obj, previous=True)
+            add(key, -delta)
+    for obj in session.dirty:
+        if isinstance(obj, InventoryTransaction) and session.is_modified(obj, include_collections=False):
+            key, delta = _level_key(obj, previous=True)
+            add(key, -delta)
+            add(*_level_key(obj))
+    movements = [obj for obj in session.new if isinstance(obj, InventoryTransaction)]
+    opened = _open_levels(session, movements) if movements else {}
+    if opened:
+        # The log of a newly leveled product, this flush included, replaces its deltas
+        products = {(business_id, product_id) for business_id, product_id, _, _ in opened}
+        deltas = {key: delta for key, delta in deltas.items() if (key[0], key[1]) not in products}
+        deltas.update(opened)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def register_stock_ledger_listeners() -> None:
+    """Keep the stock levels in step with inventory transactions (called once from create_app)."""
+    if not event.contains(Session, 'after_flush', _apply_movements):
+        event.listen(Session, 'after_flush', _apply_movements)
+
+
+# ==================== READING ====================
+
+def branch_stock(business_id: int, branch_id: Optional[int] = None, warehouse_id: Optional[int] = None):
+    """
+    Subquery of (product_id, quantity) on hand at a branch and/or warehouse,
+    summed over the levels it covers. Join it to Product with an outer join
+    and coalesce: products without a level have none there.
+    """
+    query = select(StockLevel.product_id, func.sum(StockLevel.quantity).label('quantity')).where(
+        StockLevel.business_id == business_id
+    )
+    if branch_id is not None:
+        query = query.where(StockLevel.branch_id == (branch_id or UNASSIGNED))
+    if warehouse_id is not None:
+        query = query.where(StockLevel.warehouse_id == (warehouse_id or UNASSIGNED))
+    return query.group_by(StockLevel.product_id).subquery('branch_stock')
+
+
+def available_stock(business_id: int, product_ids: Iterable[int], branch_id: Optional[int] = None,
+                    warehouse_id: Optional[int] = None) -> Dict[int, int]:
+    """Quantity on hand {product_id: qty} at a branch/warehouse (0 where nothing is recorded)."""
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+    query = db.session.query(StockLevel.product_id, func.sum(StockLevel.quantity)).filter(
+        StockLevel.business_id == business_id,
+        StockLevel.product_id.in_(product_ids)
+    )
+    if branch_id is not None:
+        query = query.filter(StockLevel.branch_id == (branch_id or UNASSIGNED))
+    if warehouse_id is not None:
+        query = query.filter(StockLevel.warehouse_id == (warehouse_id or UNASSIGNED))
+    found = dict(query.group_by(StockLevel.product_id).all())
+    return {product_id: int(found.get(product_id) or 0) for product_id in product_ids}
+
+
+# ==================== REBUILDING ====================
+
+def _opening_branch(business_id: int) -> Optional[int]:
+    """Where stock that predates the ledger is held: the only branch, else headquarters."""
+    branches = db.session.query(Branch.id, Branch.is_headquarters).filter(
+        Branch.business_id == business_id, Branch.is_active == True
+    ).all()
+    if len(branches) == 1:
+        return branches[0][0]
+    return next((branch_id for branch_id, is_headquarters in branches if is_headquarters), None)
+
+
+def rebuild_stock_levels(business_id: int, opening_balances: bool = True) -> Dict[str, int]:
+    """
+    Recompute a business's levels from its transaction log, then (unless
+    opening_balances is False) seed the difference to each product's
+    `stock_quantity` as its opening balance. Returns counts of levels
+    written, opening balances seeded and products left out of step.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        # Writers wait for the rebuild; those already in flight are waited for, so no delta is lost
+        db.session.execute(db.text('LOCK TABLE stock_levels IN EXCLUSIVE MODE'))
+    db.session.execute(_levels.delete().where(_levels.c.business_id == business_id))
+
+    signed = _signed_log()
+    branch = func.coalesce(InventoryTransaction.branch_id, UNASSIGNED)
+    warehouse = func.coalesce(InventoryTransaction.warehouse_id, UNASSIGNED)
+    written = db.session.execute(insert(_levels).from_select(
+        ['business_id', 'product_id', 'branch_id', 'warehouse_id', 'quantity', 'updated_at'],
+        select(InventoryTransaction.business_id, InventoryTransaction.product_id, branch, warehouse,
+               func.sum(signed), func.now()).where(
+            InventoryTransaction.business_id == business_id
+        ).group_by(InventoryTransaction.business_id, InventoryTransaction.product_id, branch, warehouse)
+    )).rowcount
+
+    # Products whose business-wide stock the log does not add up to
+    totals = branch_stock(business_id)
+    gaps = {product_id: int(stock - (logged or 0)) for product_id, stock, logged in db.session.query(
+        Product.id, Product.stock_quantity, totals.c.quantity
+    ).outerjoin(totals, totals.c.product_id == Product.id).filter(
+        Product.business_id == business_id,
+        Product.stock_quantity != func.coalesce(totals.c.quantity, 0)
+    ).all()}
+
+    seeded = 0
+    if gaps and opening_balances:
+        opening = _opening_branch(business_id) or UNASSIGNED
+        apply_deltas(db.session.connection(), {
+            (business_id, product_id, opening, UNASSIGNED): gap for product_id, gap in gaps.items()
+        })
+        seeded = len(gaps)
+
+    # Warehouse counters from the rebuilt levels
+    in_warehouse = select(func.coalesce(func.sum(_levels.c.quantity), 0)).where(
+        _levels.c.business_id == business_id, _levels.c.warehouse_id == _warehouses.c.id
+    ).scalar_subquery()
+    db.session.execute(update(_warehouses).where(_warehouses.c.business_id == business_id).values(
+        total_items=in_warehouse, capacity_percentage=_capacity(in_warehouse)
+    ))
+    db.session.commit()
+    return {'levels': written, 'opening_balances': seeded, 'out_of_step': len(gaps) - seeded}
@@ -0,0 +1,166 @@
+"""
+Streaming Statistics
+====================
+Fixed-memory, O(1)-per-observation summaries for hot paths (per-request
+monitoring) where keeping and rescanning a window of raw samples is too
+expensive:
+
+- `RunningStats`: Welford mean/variance, either over everything seen or
+  exponentially decayed so old samples fade out (alpha = 2 / (span + 1),
+  the usual EMA equivalent of a span-sized window).
+- `DecayedRate`: exponentially decayed rate of a yes/no event, e.g. the
+  share of recent requests that failed.
+- `P2Quantile`: the P-square estimator (Jain & Chlamtac, 1985) for one
+  quantile, tracked with five markers instead of the samples themselves.
+
+Decayed summaries warm up as plain averages: until 1/n drops below alpha
+each sample is weighted 1/n, so the first few values are not swamped by
+the zero starting point.
+
+Typical use:
+
+    latency = RunningStats(span=100)
+    latency.add(0.120)
+    z = (value - latency.mean) / latency.std
+"""
+
+from typing import List, Optional
+import math
+
+
+def span_alpha(span: Optional[int]) -> Optional[float]:
+    """Decay factor equivalent to a window of `span` samples (None for no decay)."""
+    return 2.0 / (span + 1) if span else None
+
+
+class RunningStats:
+    """Mean, variance, min and max in O(1) memory (Welford / West update)."""
+
+    __slots__ = ('alpha', 'count', 'mean', 'variance', 'min', 'max')
+
+    def __init__(self, span: Optional[int] = None):
+        self.alpha = span_alpha(span)
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        weight = 1.0 / self.count
+        if self.alpha is not None and self.alpha > weight:
+            weight = self.alpha
+        delta = value - self.mean
+        self.mean += weight * delta
+        # Population variance; with weight = 1/n this is Welford's recurrence
+        self.variance = (1.0 - weight) * (self.variance + weight * delta * delta)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        if self.alpha is None:
+            # Sample standard deviation, as statistics.stdev
+            return math.sqrt(self.variance * self.count / (self.count - 1))
+        return math.sqrt(self.variance)
+
+
+class DecayedRate:
+    """Exponentially decayed share of observations for which an event happened."""
+
+    __slots__ = ('alpha', 'count', 'rate')
+
+    def __init__(self, span: int):
+        self.alpha = span_alpha(span)
+        self.count = 0
+        self.rate = 0.0
+
+    def add(self, happened: bool) -> None:
+        self.count += 1
+        weight = max(self.alpha, 1.0 / self.count)
+        self.rate += weight * ((1.0 if happened else 0.0) - self.rate)
+
+
+class P2Quantile:
+    """
+    Running estimate of quantile `p` (0 < p < 1) from five markers.
+
+    Exact for the first five values; after that marker heights are moved
+    with the P-square parabolic (or linear) adjustment, typically within a
+    few percent of the true quantile for latency-like distributions.
+    """
+
+    __slots__ = ('p', 'count', 'heights', 'positions', 'desired', 'increments')
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.desired = [1.0, 1.0 + 2 * p, 1.0 + 4 * p, 3.0 + 2 * p, 5.0]
+        self.increments = [0.0, p / 2, p, (1.0 + p) / 2, 1.0]
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            if self.count == 5:
+                heights.sort()
+            return
+
+        # Find the cell the value falls in, widening the extremes if needed
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        positions = self.positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        desired = self.desired
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            offset = desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / \
+                        (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self) -> Optional[float]:
+        if not self.count:
+            return None
+        if self.count >= 5:
+            return self.heights[2]
+        # Fewer than five values: interpolate like numpy.percentile
+        ordered = sorted(self.heights)
+        rank = self.p * (len(ordered) - 1)
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
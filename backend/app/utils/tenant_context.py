@@ -0,0 +1,194 @@
+"""
+Tenant Context
+==============
+Resolves who is making the request (user, role, active flags, business and
+default branch) once per request, instead of every decorator and helper
+loading `User`, `Business` and `UserBranchAccess` on its own.
+
+- Within a request the context is stored on `g` (`g.tenant_context`).
+- Across requests it is kept in an in-process TTL cache keyed by user id,
+  tagged with the user's and the business's `TenantContextVersion`. A hit
+  costs one primary key lookup of those versions instead of the
+  user/business/branch join, and is only used if they are unchanged.
+- Writes to users, branch access rows and business activation bump the
+  versions in the same transaction, so once they commit every worker
+  reloads the context on its next request. The versions are read before
+  (or with) the context they tag, so a fill that raced an invalidation is
+  stored under the old version and never served.
+
+Typical use:
+
+    context = get_tenant_context()
+    if context is None:
+        return jsonify({'error': 'User not found'}), 404
+"""
+
+from flask import g, has_app_context
+from flask_jwt_extended import get_jwt_identity
+from app import db
+from app.models.user import User, UserRole
+from app.models.business import Business
+from app.models.branch import UserBranchAccess
+from app.models.tenant_context_version import TenantContextVersion
+from app.utils.cache import TTLCache
+from dataclasses import dataclass
+from sqlalchemy import and_, event, func, inspect, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Optional, Set, Tuple
+
+# Only bounds memory: entries are checked against the shared versions on every hit
+CONTEXT_TTL = 300
+
+_PENDING_USERS = 'tenant_context_users'
+_PENDING_ALL = 'tenant_context_all'
+_MISSING_USER = object()
+
+# (user version, business version, context) keyed by user id; _MISSING_USER marks an unknown id
+_context_cache = TTLCache(ttl=CONTEXT_TTL, maxsize=50000)
+_versions = TenantContextVersion.__table__
+
+
+@dataclass(frozen=True)
+class TenantContext:
+    user_id: int
+    role: UserRole
+    is_active: bool
+    business_id: Optional[int]
+    business_active: bool
+    default_branch_id: Optional[int]
+
+
+def _version(kind: str, scope_id) -> object:
+    return func.coalesce(select(_versions.c.version).where(
+        _versions.c.kind == kind, _versions.c.scope_id == scope_id
+    ).scalar_subquery(), 0)
+
+
+def _load_context(user_id: int) -> Tuple[int, int, object]:
+    """(user version, business version, context), each version read no later than what it covers."""
+    user_version = db.session.query(_version('user', user_id)).scalar()
+    row = db.session.query(
+        User.id, User.role, User.is_active, User.business_id,
+        Business.is_active.label('business_active'),
+        UserBranchAccess.branch_id.label('default_branch_id'),
+        _version('business', User.business_id).label('business_version')
+    ).outerjoin(
+        Business, User.business_id == Business.id
+    ).outerjoin(
+        UserBranchAccess, and_(UserBranchAccess.user_id == User.id, UserBranchAccess.is_default == True)
+    ).filter(User.id == user_id).first()
+    if row is None:
+        return user_version, 0, _MISSING_USER
+    return user_version, row.business_version, TenantContext(
+        user_id=row.id,
+        role=row.role,
+        is_active=bool(row.is_active),
+        business_id=row.business_id,
+        business_active=bool(row.business_active),
+        default_branch_id=row.default_branch_id
+    )
+
+
+def _is_current(user_id: int, entry: Tuple[int, int, object]) -> bool:
+    user_version, business_version, context = entry
+    business_id = context.business_id if context is not _MISSING_USER else None
+    scopes = and_(_versions.c.kind == 'user', _versions.c.scope_id == user_id)
+    if business_id is not None:
+        scopes = or_(scopes, and_(_versions.c.kind == 'business', _versions.c.scope_id == business_id))
+    current = {'user': 0, 'business': 0}
+    current.update(db.session.execute(select(_versions.c.kind, _versions.c.version).where(scopes)).all())
+    return current['user'] == user_version and (business_id is None or current['business'] == business_version)
+
+
+def get_tenant_context() -> Optional[TenantContext]:
+    """
+    Context of the JWT identity of the current request, or None when the
+    user does not exist. Call after the JWT has been verified.
+    """
+    identity = get_jwt_identity()
+    cached = g.get('tenant_context')
+    if cached is not None and cached[0] == identity:
+        return cached[1]
+
+    try:
+        user_id = int(identity)
+    except (TypeError, ValueError):
+        context = None
+    else:
+        entry = _context_cache.get(user_id)
+        if entry is None or not _is_current(user_id, entry):
+            entry = _load_context(user_id)
+            _context_cache.set(user_id, entry)
+        context = entry[2]
+        if context is _MISSING_USER:
+            context = None
+    # Keyed by identity: g outlives the request when an app context was already pushed
+    g.tenant_context = (identity, context)
+    return context
+
+
+def invalidate_tenant_context(user_id: Optional[int] = None) -> None:
+    """Drops the cached context of one user, or of everyone."""
+    if user_id is None:
+        _context_cache.clear()
+    else:
+        _context_cache.delete(int(user_id))
+    if has_app_context():
+        g.pop('tenant_context', None)
+
+
+# ==================== INVALIDATION ====================
+
+def _bump_versions(session: Session, scopes: Set[Tuple[str, int]]) -> None:
+    """Advance the versions in the flushing transaction, so they commit (or roll back) with the change."""
+    conn = session.connection()
+    dialect = postgresql if conn.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(_versions)
+    conn.execute(statement.on_conflict_do_update(
+        index_elements=['kind', 'scope_id'], set_={'version': _versions.c.version + 1}
+    ), [{'kind': kind, 'scope_id': scope_id, 'version': 1} for kind, scope_id in sorted(scopes)])
+
+
+def _collect_changes(session: Session, flush_context) -> None:
+    users: Set[int] = session.info.setdefault(_PENDING_USERS, set())
+    scopes: Set[Tuple[str, int]] = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            if obj.id is not None and (obj not in session.dirty or session.is_modified(obj)):
+                users.add(obj.id)
+                scopes.add(('user', obj.id))
+        elif isinstance(obj, UserBranchAccess):
+            history = inspect(obj).attrs.user_id.history
+            changed = {value for value in list(history.added) + list(history.deleted) + list(history.unchanged)
+                       if value is not None}
+            users.update(changed)
+            scopes.update(('user', user_id) for user_id in changed)
+        elif isinstance(obj, Business):
+            if obj in session.deleted or inspect(obj).attrs.is_active.history.has_changes():
+                session.info[_PENDING_ALL] = True
+                scopes.add(('business', obj.id))
+    if scopes:
+        _bump_versions(session, scopes)
+
+
+def _apply_invalidations(session: Session) -> None:
+    users = session.info.pop(_PENDING_USERS, None)
+    if session.info.pop(_PENDING_ALL, False):
+        invalidate_tenant_context()
+        return
+    for user_id in users or ():
+        invalidate_tenant_context(user_id)
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING_USERS, None)
+    session.info.pop(_PENDING_ALL, None)
+
+
+def register_tenant_context_listeners() -> None:
+    """Invalidate cached contexts after commits that change them."""
+    if not event.contains(Session, 'after_flush', _collect_changes):
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'after_commit', _apply_invalidations)
+        event.listen(Session, 'after_rollback', _discard_pending)
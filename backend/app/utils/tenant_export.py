@@ -0,0 +1,573 @@
+"""
+Tenant Export & Restore
+=======================
+Full-tenant export to a portable archive, and restore from one, run as
+background jobs tracked by `TenantExport`.
+
+Archive format (FORMAT_VERSION 1): an uncompressed tar holding
+`manifest.json` (business, tables in restore order, row counts, column
+names) and one `<table>.ndjson.gz` per table: gzip-compressed JSON lines,
+one row per line, in primary key order. Enums are stored by name,
+dates/times as ISO strings, decimals as strings and binary as base64.
+
+Export:
+
+- The tables are those owned by the business, found from the schema:
+  tables with a business_id column, plus child tables reached through a
+  NOT NULL foreign key (order_items through orders, and so on).
+  Queues, job bookkeeping and data that is rebuilt from other tables
+  (`EXCLUDED_TABLES`) are left out.
+- Each table is read in `CHUNK_SIZE` keyset pages on its own connection
+  with a server-side cursor (stream_results). Each page is appended to
+  the table's file as one gzip member, so memory stays flat whatever the
+  tenant's size.
+- After every page the job records (table, last primary key, file
+  offset). A resumed job truncates the file to that offset and continues
+  after that key, so nothing is written twice.
+- When every table is done, the files are bundled into the tar. The
+  superadmin downloads it through an authenticated endpoint; the exports
+  folder is never served by /uploads.
+
+Restore reads the same archive in the same order:
+
+- Rows are inserted in chunks with their original primary keys and ON
+  CONFLICT DO NOTHING, so rows that already exist are skipped. A restore
+  is meant for a deleted tenant or a fresh database.
+- Tables are ordered by their NOT NULL foreign keys. Nullable foreign
+  keys that point to the same or a later table (users.approved_by,
+  departments.head_id) are inserted as NULL and filled in by a second pass.
+- Rows the database still refuses (e.g. a reference to a user outside
+  the tenant) are counted as rejected and reported on the job instead of
+  failing it.
+- Progress is checkpointed per chunk (phase, table, line). Afterwards
+  PostgreSQL sequences are moved past the restored ids, and search
+  documents, stock levels and sales rollups are rebuilt.
+
+Typical use:
+
+    job = create_export_job(business_id, user_id)
+    start_tenant_job(job.id)      # or run_tenant_job(job.id) inline
+"""
+
+from flask import current_app
+from app import db
+from app.models.tenant_export import TenantExport
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from sqlalchemy import (Date, DateTime, LargeBinary, Numeric, Time, bindparam, func, select, text,
+                        tuple_, update)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+import secrets
+import shutil
+import tarfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 5000
+
+# A running job that has not checkpointed for this long is considered dead and may be resumed
+STALE_AFTER = timedelta(minutes=5)
+
+MAX_REPORTED_ERRORS = 100
+
+# Folder (under the exports folder) for archives uploaded for restore
+RESTORE_UPLOADS = 'restores'
+
+EXCLUDED_TABLES = {
+    # Job bookkeeping and queues
+    'tenant_exports', 'import_jobs', 'disbursement_jobs', 'outbox_events', 'alert_dedupe_keys',
+    # Derived data, rebuilt after a restore or re-collected
+    'search_documents', 'search_index_states', 'stock_levels', 'daily_sales_rollups', 'sales_rollup_states', 'api_usage_hourly',
+}
+
+
+class TenantArchiveError(ValueError):
+    """The uploaded or stored archive cannot be restored."""
+
+
+# ==================== SCHEMA PLAN ====================
+
+def _scope(table, business_id: int, seen: Tuple[str, ...] = ()):
+    """WHERE clause selecting the business's rows of `table`, or None if it has none."""
+    if table.name == 'businesses':
+        return table.c.id == business_id
+    if 'business_id' in table.c:
+        return table.c.business_id == business_id
+    # Child tables: follow a NOT NULL foreign key to a tenant table
+    for fk in sorted(table.foreign_keys, key=lambda fk: fk.parent.name):
+        parent = fk.column.table
+        if fk.parent.nullable or parent is table or parent.name in seen or parent.name in EXCLUDED_TABLES:
+            continue
+        parent_scope = _scope(parent, business_id, seen + (table.name,))
+        if parent_scope is not None:
+            return fk.parent.in_(select(fk.column).where(parent_scope))
+    return None
+
+
+def tenant_tables() -> List[Any]:
+    """
+    Tables holding tenant data, parents before children: ordered by their
+    NOT NULL foreign keys (which never form cycles), ties broken by the
+    table name.
+    """
+    candidates = [table for _, table in sorted(db.metadata.tables.items())
+                  if table.name not in EXCLUDED_TABLES and _scope(table, 0) is not None]
+    names = {table.name for table in candidates}
+    requires = {table.name: {fk.column.table.name for fk in table.foreign_keys
+                             if not fk.parent.nullable and fk.column.table is not table
+                             and fk.column.table.name in names}
+                for table in candidates}
+    ordered, placed = [], set()
+    while len(ordered) < len(candidates):
+        ready = [table for table in candidates if table.name not in placed and requires[table.name] <= placed]
+        if not ready:
+            # Should not happen; keep going rather than lose tables
+            ready = [table for table in candidates if table.name not in placed]
+        for table in ready:
+            ordered.append(table)
+            placed.add(table.name)
+    return ordered
+
+
+def deferred_columns(table, order: List[str]) -> List[str]:
+    """Nullable foreign key columns of `table` that point to it or to a table restored after it."""
+    position = order.index(table.name)
+    return sorted({fk.parent.name for fk in table.foreign_keys
+                   if fk.parent.nullable and fk.column.table.name in order
+                   and order.index(fk.column.table.name) >= position})
+
+
+# ==================== VALUES ====================
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    return value
+
+
+def _decoder(column) -> Callable[[Any], Any]:
+    column_type = column.type
+    enum_class = getattr(column_type, 'enum_class', None)
+    if enum_class is not None:
+        return lambda value: enum_class[value]
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column_type, Date):
+        return date.fromisoformat
+    if isinstance(column_type, Time):
+        return time.fromisoformat
+    if isinstance(column_type, Numeric) and getattr(column_type, 'asdecimal', False):
+        return Decimal
+    if isinstance(column_type, LargeBinary):
+        return base64.b64decode
+    return lambda value: value
+
+
+def _row_decoder(table) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Decoder for archived rows of `table`; columns the table no longer has are dropped."""
+    decoders = {column.name: _decoder(column) for column in table.columns}
+
+    def decode(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: (decoders[key](value) if value is not None else None)
+                for key, value in row.items() if key in decoders}
+    return decode
+
+
+# ==================== JOBS ====================
+
+def exports_folder() -> str:
+    return current_app.config.get('TENANT_EXPORT_FOLDER') or \
+        os.path.join(current_app.config['UPLOAD_FOLDER'], 'exports')
+
+
+def _work_dir(job: TenantExport) -> str:
+    return os.path.join(exports_folder(), f'business_{job.business_id}', f'export_{job.id}.parts')
+
+
+def _report(job: TenantExport, table: str, error: Any) -> None:
+    errors = list(job.errors or [])
+    if len(errors) < MAX_REPORTED_ERRORS:
+        errors.append({'table': table, 'error': str(getattr(error, 'orig', error))[:500]})
+        job.errors = errors
+
+
+def is_active(job: TenantExport) -> bool:
+    """Queued or running, and still checkpointing."""
+    return job.status in ('queued', 'running') and job.updated_at >= datetime.utcnow() - STALE_AFTER
+
+
+def create_export_job(business_id: int, user_id: Optional[int]) -> TenantExport:
+    job = TenantExport(business_id=business_id, user_id=user_id, kind='export')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def create_restore_job(user_id: Optional[int], export: Optional[TenantExport] = None, file=None,
+                       path: Optional[str] = None) -> TenantExport:
+    """
+    A restore from a finished export job's archive, an uploaded archive
+    (`file`, saved under the exports folder) or an archive already on disk
+    (`path`).
+    """
+    source_export_id = None
+    if export is not None:
+        if export.kind != 'export' or export.status != 'done' or not export.archive_path \
+                or not os.path.exists(export.archive_path):
+            raise TenantArchiveError('Export archive is not available')
+        path, source_export_id = export.archive_path, export.id
+    elif file is not None:
+        folder = os.path.join(exports_folder(), RESTORE_UPLOADS)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'upload_{secrets.token_hex(8)}.tar')
+        file.save(path)
+    if not path or not os.path.exists(path):
+        raise TenantArchiveError('Archive not found')
+
+    try:
+        manifest = _read_manifest(path)
+    except TenantArchiveError:
+        if file is not None:
+            os.remove(path)
+        raise
+    job = TenantExport(business_id=manifest['business_id'], user_id=user_id, kind='restore',
+                       source_export_id=source_export_id, archive_path=os.path.abspath(path))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_tenant_job(job_id: int) -> TenantExport:
+    """Run (or resume) an export or restore job. Never raises; failures are recorded on the job."""
+    job = db.session.get(TenantExport, job_id)
+    try:
+        job.status = 'running'
+        job.started_at = job.started_at or datetime.utcnow()
+        job.error_message = None
+        db.session.commit()
+        if job.kind == 'export':
+            _run_export(job)
+        else:
+            _run_restore(job)
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Tenant %s job %s failed", job.kind, job_id)
+        job = db.session.get(TenantExport, job_id)
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
+
+
+def start_tenant_job(job_id: int) -> None:
+    """Run a tenant export or restore job in a background thread with its own app context."""
+    app = current_app._get_current_object()
+
+    def target():
+        with app.app_context():
+            try:
+                run_tenant_job(job_id)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=target, name=f'tenant-job-{job_id}', daemon=True).start()
+
+
+# ==================== EXPORT ====================
+
+def _chunks(table, scope, last_pk: Optional[List[Any]]) -> Iterator[List[Any]]:
+    """Rows of the table after last_pk, CHUNK_SIZE per list, each page read with a server-side cursor."""
+    pk = list(table.primary_key.columns)
+    decoders = [_decoder(column) for column in pk]
+    while True:
+        query = select(table).where(scope)
+        if last_pk is not None:
+            values = [decode(value) for decode, value in zip(decoders, last_pk)]
+            query = query.where(pk[0] > values[0] if len(pk) == 1 else tuple_(*pk) > tuple_(*values))
+        query = query.order_by(*pk).limit(CHUNK_SIZE)
+        with db.engine.connect() as conn:
+            rows = conn.execution_options(stream_results=True, yield_per=1000).execute(query).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < CHUNK_SIZE:
+            return
+        last_pk = [_encode(rows[-1]._mapping[column.name]) for column in pk]
+
+
+def _run_export(job: TenantExport) -> None:
+    tables = {table.name: table for table in tenant_tables()}
+    if not job.tables:
+        job.tables = list(tables)
+        counts = {}
+        for name, table in tables.items():
+            counts[name] = db.session.execute(
+                select(func.count()).select_from(table).where(_scope(table, job.business_id))
+            ).scalar() or 0
+        job.table_counts = counts
+        job.total_rows = sum(counts.values())
+        job.checkpoint = {'table': job.tables[0] if job.tables else None, 'last_pk': None, 'offset': 0}
+        db.session.commit()
+
+    work_dir = _work_dir(job)
+    os.makedirs(work_dir, exist_ok=True)
+    checkpoint = dict(job.checkpoint or {})
+    start = job.tables.index(checkpoint['table']) if checkpoint.get('table') in job.tables else len(job.tables)
+
+    for name in job.tables[start:]:
+        table = tables.get(name)
+        if table is None:
+            raise RuntimeError(f'Table {name} is no longer part of the schema; start a new export')
+        if checkpoint.get('table') != name:
+            checkpoint = {'table': name, 'last_pk': None, 'offset': 0}
+        path = os.path.join(work_dir, f'{name}.ndjson.gz')
+        # Drop anything written after the last checkpoint
+        with open(path, 'ab') as out:
+            out.truncate(checkpoint['offset'])
+
+        pk = [column.name for column in table.primary_key.columns]
+        for rows in _chunks(table, _scope(table, job.business_id), checkpoint['last_pk']):
+            buffer = io.BytesIO()
+            with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) as member:
+                for row in rows:
+                    member.write(json.dumps({key: _encode(value) for key, value in row._mapping.items()},
+                                            separators=(',', ':'), default=str).encode() + b'\n')
+            with open(path, 'ab') as out:
+                out.write(buffer.getvalue())
+                out.flush()
+                os.fsync(out.fileno())
+                offset = out.tell()
+            checkpoint = {
+                'table': name,
+                'last_pk': [_encode(rows[-1]._mapping[key]) for key in pk],
+                'offset': offset
+            }
+            job.checkpoint = checkpoint
+            job.processed_rows += len(rows)
+            db.session.commit()
+
+    _bundle(job, tables, work_dir)
+
+
+def _bundle(job: TenantExport, tables: Dict[str, Any], work_dir: str) -> None:
+    from app.models.business import Business
+    business = db.session.get(Business, job.business_id)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'business_id': job.business_id,
+        'business_name': business.name if business else None,
+        'export_id': job.id,
+        'exported_at': datetime.utcnow().isoformat(),
+        'tables': [{
+            'name': name,
+            'rows': (job.table_counts or {}).get(name, 0),
+            'columns': [column.name for column in tables[name].columns]
+        } for name in job.tables],
+    }
+    folder = os.path.dirname(work_dir)
+    path = os.path.join(folder, f'business_{job.business_id}_export_{job.id}_{secrets.token_hex(8)}.tar')
+    partial = path + '.partial'
+    with tarfile.open(partial, 'w') as tar:
+        data = json.dumps(manifest, indent=2).encode()
+        info = tarfile.TarInfo('manifest.json')
+        info.size = len(data)
+        info.mtime = int(datetime.utcnow().timestamp())
+        tar.addfile(info, io.BytesIO(data))
+        for name in job.tables:
+            part = os.path.join(work_dir, f'{name}.ndjson.gz')
+            if os.path.exists(part):
+                tar.add(part, arcname=f'{name}.ndjson.gz')
+    os.replace(partial, path)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    job.archive_path = path
+    job.file_size = os.path.getsize(path)
+    job.checkpoint = {'table': None}
+    db.session.commit()
+
+
+# ==================== RESTORE ====================
+
+def _read_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with tarfile.open(path, 'r') as tar:
+            manifest = json.load(tar.extractfile('manifest.json'))
+    except (tarfile.TarError, KeyError, ValueError, TypeError):
+        raise TenantArchiveError('Not a tenant export archive')
+    if manifest.get('format') != FORMAT_VERSION:
+        raise TenantArchiveError(f"Unsupported archive format: {manifest.get('format')}")
+    return manifest
+
+
+def _archive_rows(tar: tarfile.TarFile, name: str, skip: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(line number, row) for the table's archived rows after the first `skip`."""
+    try:
+        member = tar.extractfile(f'{name}.ndjson.gz')
+    except KeyError:
+        return
+    with gzip.open(member, 'rt', encoding='utf-8') as lines:
+        for line_number, line in enumerate(lines, start=1):
+            if line_number > skip and line.strip():
+                yield line_number, json.loads(line)
+
+
+def _insert_statement(conn, table):
+    dialect = postgresql if conn.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+def _apply(job: TenantExport, table, rows: List[Dict[str, Any]], execute) -> int:
+    """
+    Run `execute(conn, rows)`, which returns how many rows it applied; on a
+    data error retry row by row and count the refused rows. Returns the
+    number of rows applied.
+    """
+    try:
+        with db.engine.begin() as conn:
+            return execute(conn, rows)
+    except (IntegrityError, DataError):
+        pass
+    applied = 0
+    for row in rows:
+        try:
+            with db.engine.begin() as conn:
+                applied += execute(conn, [row])
+        except (IntegrityError, DataError) as e:
+            job.rejected_rows += 1
+            _report(job, table.name, e)
+    return applied
+
+
+def _run_restore(job: TenantExport) -> None:
+    manifest = _read_manifest(job.archive_path)
+    job.business_id = manifest['business_id']
+    tables = {table.name: table for table in tenant_tables()}
+    archived = {entry['name']: entry for entry in manifest['tables']}
+
+    if not job.tables:
+        skipped = sorted(set(archived) - set(tables))
+        for name in skipped:
+            _report(job, name, 'Table is not part of this schema; skipped')
+        job.tables = [name for name in tables if name in archived]
+        job.table_counts = {name: archived[name]['rows'] for name in job.tables}
+        job.total_rows = sum(job.table_counts.values())
+        job.checkpoint = {'phase': 1, 'table': job.tables[0] if job.tables else None, 'line': 0}
+        db.session.commit()
+
+    checkpoint = dict(job.checkpoint or {})
+    with tarfile.open(job.archive_path, 'r') as tar:
+        for phase in (1, 2):
+            if checkpoint.get('phase', 1) > phase:
+                continue
+            names = job.tables
+            if checkpoint.get('phase') == phase and checkpoint.get('table') in names:
+                names = names[names.index(checkpoint['table']):]
+            for name in names:
+                table = tables[name]
+                deferred = deferred_columns(table, job.tables)
+                if phase == 2 and not deferred:
+                    continue
+                if checkpoint.get('phase') != phase or checkpoint.get('table') != name:
+                    checkpoint = {'phase': phase, 'table': name, 'line': 0}
+                decode = _row_decoder(table)
+                pk = [column.name for column in table.primary_key.columns]
+
+                if phase == 1:
+                    def execute(conn, rows, table=table):
+                        # Rows whose key already exists are skipped and not returned
+                        statement = _insert_statement(conn, table).returning(*table.primary_key.columns)
+                        return len(conn.execute(statement, rows).all())
+                else:
+                    # Only ever touch the business's own rows, never a conflicting row of another tenant
+                    statement = update(table).where(
+                        _scope(table, job.business_id), *[table.c[key] == bindparam(f'pk_{key}') for key in pk]
+                    ).values({column: bindparam(f'set_{column}') for column in deferred})
+
+                    def execute(conn, rows, statement=statement):
+                        conn.execute(statement, rows)
+                        return len(rows)
+
+                batch, line_number, skipped = [], checkpoint['line'], 0
+
+                def save(batch, line_number, table=table, execute=execute):
+                    """Apply a batch and checkpoint after `line_number`; returns rows skipped as already present."""
+                    rejected = job.rejected_rows
+                    applied = _apply(job, table, batch, execute) if batch else 0
+                    if phase == 1:
+                        job.processed_rows += line_number - checkpoint['line']
+                    job.checkpoint = {'phase': phase, 'table': table.name, 'line': line_number}
+                    db.session.commit()
+                    return len(batch) - applied - (job.rejected_rows - rejected)
+
+                for line_number, row in _archive_rows(tar, name, checkpoint['line']):
+                    row = decode(row)
+                    if phase == 1:
+                        for column in deferred:
+                            row[column] = None
+                        batch.append(row)
+                    elif any(row.get(column) is not None for column in deferred):
+                        params = {f'pk_{key}': row[key] for key in pk}
+                        params.update({f'set_{column}': row.get(column) for column in deferred})
+                        batch.append(params)
+                    if line_number - checkpoint['line'] >= CHUNK_SIZE:
+                        skipped += save(batch, line_number)
+                        checkpoint = dict(job.checkpoint)
+                        batch = []
+                skipped += save(batch, line_number)
+                checkpoint = dict(job.checkpoint)
+                if skipped:
+                    _report(job, name, f'{skipped} row(s) already present; left unchanged')
+                    db.session.commit()
+            checkpoint = {'phase': phase + 1, 'table': None, 'line': 0}
+
+    _reset_sequences([tables[name] for name in job.tables])
+    _rebuild_derived(job.business_id)
+    job.checkpoint = {'phase': 3, 'table': None}
+    db.session.commit()
+
+
+def _reset_sequences(tables: List[Any]) -> None:
+    """Move PostgreSQL id sequences past the restored rows (SQLite needs nothing)."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        for table in tables:
+            pk = list(table.primary_key.columns)
+            if len(pk) != 1 or not pk[0].autoincrement or pk[0].type.python_type is not int:
+                continue
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence(:table, :column), "
+                f"COALESCE((SELECT MAX({pk[0].name}) FROM {table.name}), 0) + 1, false) "
+                f"WHERE pg_get_serial_sequence(:table, :column) IS NOT NULL"
+            ), {'table': table.name, 'column': pk[0].name})
+
+
+def _rebuild_derived(business_id: int) -> None:
+    from app.utils.rollups import rebuild as rebuild_rollups
+    from app.utils.search_index import rebuild_search_index
+    from app.utils.stock_ledger import rebuild_stock_levels
+
+    rebuild_stock_levels(business_id)
+    rebuild_search_index(business_id)
+    rebuild_rollups(business_id)
@@ -0,0 +1,196 @@
+"""
+Time-Series Bucketing Utility Module
+====================================
+Builds chart and trend series with a single GROUP BY query per source table
+instead of one query per day, month or year.
+
+- The WHERE clause is a plain half-open range on the raw column, so the
+  (business_id, created_at) style indexes stay usable.
+- The bucket key is computed in SQL: date_trunc() on PostgreSQL and
+  date()/strftime() on the SQLite development fallback.
+- Buckets with no rows are filled in Python so every series has one entry
+  per bucket in the requested range.
+
+Typical use:
+
+    series = TimeSeries('month', start_date, end_date)
+    query = series.query(Order.created_at, func.sum(Order.total_amount).label('revenue'))
+    query = query.filter(Order.business_id == business_id)
+    rows = series.fetch(query)
+    revenue = [float(rows[b].revenue) if b in rows else 0.0 for b in series.buckets]
+"""
+
+from app import db
+from sqlalchemy import func, extract
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Any, Callable, Optional
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+
+# Labels used by the dashboard and report charts
+LABEL_FORMATS = {
+    'day': '%b %d',
+    'week': '%b %d',
+    'month': '%b %Y',
+    'year': '%Y',
+}
+
+
+def _dialect_name() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def bucket_start(value, granularity: str) -> date:
+    """Return the first day of the bucket containing value."""
+    d = _as_date(value)
+    if granularity == 'day':
+        return d
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    if granularity == 'month':
+        return d.replace(day=1)
+    if granularity == 'year':
+        return d.replace(month=1, day=1)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def next_bucket(bucket: date, granularity: str) -> date:
+    """Return the first day of the bucket following bucket."""
+    if granularity == 'day':
+        return bucket + timedelta(days=1)
+    if granularity == 'week':
+        return bucket + timedelta(days=7)
+    if granularity == 'month':
+        if bucket.month == 12:
+            return bucket.replace(year=bucket.year + 1, month=1)
+        return bucket.replace(month=bucket.month + 1)
+    if granularity == 'year':
+        return bucket.replace(year=bucket.year + 1)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def shift_bucket(bucket: date, granularity: str, count: int) -> date:
+    """Move a bucket start by count buckets (negative moves backwards)."""
+    if granularity == 'day':
+        return bucket + timedelta(days=count)
+    if granularity == 'week':
+        return bucket + timedelta(days=7 * count)
+    if granularity == 'month':
+        months = bucket.year * 12 + (bucket.month - 1) + count
+        return date(months // 12, months % 12 + 1, 1)
+    if granularity == 'year':
+        return bucket.replace(year=bucket.year + count)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def bucket_expression(column, granularity: str):
+    """SQL expression truncating column to the start of its bucket."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    if _dialect_name() == 'postgresql':
+        return func.date_trunc(granularity, column)
+
+    # SQLite: every variant yields an ISO 'YYYY-MM-DD' string
+    if granularity == 'day':
+        return func.date(column)
+    if granularity == 'week':
+        # Move forward to Sunday, then back to that week's Monday
+        return func.date(column, 'weekday 0', '-6 days')
+    if granularity == 'month':
+        return func.strftime('%Y-%m-01', column)
+    return func.strftime('%Y-01-01', column)
+
+
+def day_of_week_expression(column):
+    """SQL expression for the day of week, 0 = Sunday ... 6 = Saturday."""
+    return extract('dow', column)
+
+
+def _bucket_key(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return _as_date(value)
+
+
+class TimeSeries:
+    """
+    A contiguous range of buckets of one granularity, from the bucket
+    containing start to the bucket containing end (both inclusive).
+    """
+
+    def __init__(self, granularity: str, start, end):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unsupported granularity: {granularity}")
+        self.granularity = granularity
+        self.first = bucket_start(start, granularity)
+        self.last = bucket_start(end, granularity)
+
+        self.buckets: List[date] = []
+        current = self.first
+        while current <= self.last:
+            self.buckets.append(current)
+            current = next_bucket(current, granularity)
+
+    @classmethod
+    def last_n(cls, granularity: str, count: int, today: Optional[date] = None) -> 'TimeSeries':
+        """The count most recent buckets, ending with the one containing today."""
+        today = today or datetime.utcnow().date()
+        last = bucket_start(today, granularity)
+        return cls(granularity, shift_bucket(last, granularity, -(count - 1)), last)
+
+    def shifted(self, count: int) -> 'TimeSeries':
+        """The same number of buckets moved by count buckets."""
+        return TimeSeries(
+            self.granularity,
+            shift_bucket(self.first, self.granularity, count),
+            shift_bucket(self.last, self.granularity, count)
+        )
+
+    @property
+    def range_start(self) -> date:
+        return self.first
+
+    @property
+    def range_end(self) -> date:
+        """Exclusive end of the range (start of the bucket after the last)."""
+        return next_bucket(self.last, self.granularity)
+
+    def range_filter(self, column, is_date: bool = False):
+        """Index-friendly half-open range predicate covering every bucket."""
+        if is_date:
+            return (column >= self.range_start) & (column < self.range_end)
+        start = datetime.combine(self.range_start, datetime.min.time())
+        end = datetime.combine(self.range_end, datetime.min.time())
+        return (column >= start) & (column < end)
+
+    def query(self, column, *aggregates, is_date: bool = False):
+        """
+        Start a grouped query selecting the bucket key plus aggregates,
+        restricted to this series' range. Add tenant filters and pass the
+        result to fetch().
+        """
+        bucket = bucket_expression(column, self.granularity).label('bucket')
+        return db.session.query(bucket, *aggregates).filter(
+            self.range_filter(column, is_date=is_date)
+        ).group_by(bucket)
+
+    def fetch(self, query) -> Dict[date, Any]:
+        """Execute a query from query() and key its rows by bucket start."""
+        return {_bucket_key(row.bucket): row for row in query.all()}
+
+    def fill(self, rows: Dict[date, Any], value: Callable[[Any], Any], default: Any = 0.0) -> List[Any]:
+        """One value per bucket; buckets without a row get default."""
+        return [value(rows[b]) if b in rows else default for b in self.buckets]
+
+    def labels(self, fmt: Optional[str] = None) -> List[str]:
+        fmt = fmt or LABEL_FORMATS[self.granularity]
+        return [b.strftime(fmt) for b in self.buckets]
@@ -0,0 +1,16 @@
+-- Dedupe keys for the background alert scanner (flask scan-alerts)
+CREATE TABLE IF NOT EXISTS alert_dedupe_keys (
+    id SERIAL PRIMARY KEY,
+    business_id INTEGER NOT NULL REFERENCES businesses(id) ON DELETE CASCADE,
+    dedupe_key VARCHAR(200) NOT NULL,
+    last_alerted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT _business_alert_dedupe_key_uc UNIQUE (business_id, dedupe_key)
+);
+
+-- Create indexes
+CREATE INDEX IF NOT EXISTS idx_alert_dedupe_keys_last_alerted ON alert_dedupe_keys(business_id, last_alerted_at);
+
+-- Unread badge count and notification list lookups
+CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(business_id, user_id, is_read);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(business_id, user_id, created_at);
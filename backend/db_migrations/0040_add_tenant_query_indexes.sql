@@ -0,0 +1,53 @@
+-- Composite indexes for tenant-scoped hot queries.
+-- Nearly every list, report and dashboard query filters on business_id, often
+-- branch_id, plus status and a created_at / *_date range. Matching
+-- __table_args__ indexes are declared on the models for db.create_all().
+--
+-- On large production tables run each statement as CREATE INDEX CONCURRENTLY
+-- (outside a transaction) to avoid blocking writes.
+
+-- Orders
+CREATE INDEX IF NOT EXISTS idx_orders_business_status_created ON orders(business_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_business_created ON orders(business_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_business_branch_created ON orders(business_id, branch_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_business_order_date ON orders(business_id, order_date);
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_order_items_product_id ON order_items(product_id);
+
+-- Invoices
+CREATE INDEX IF NOT EXISTS idx_invoices_business_status_due ON invoices(business_id, status, due_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_business_created ON invoices(business_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_invoices_business_issue_date ON invoices(business_id, issue_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_order_id ON invoices(order_id);
+
+-- Returns
+CREATE INDEX IF NOT EXISTS idx_returns_business_status_created ON returns(business_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_returns_business_return_date ON returns(business_id, return_date);
+CREATE INDEX IF NOT EXISTS idx_returns_order_id ON returns(order_id);
+CREATE INDEX IF NOT EXISTS idx_return_items_return_id ON return_items(return_id);
+
+-- Expenses
+CREATE INDEX IF NOT EXISTS idx_expenses_business_status_date ON expenses(business_id, status, expense_date);
+CREATE INDEX IF NOT EXISTS idx_expenses_business_branch_date ON expenses(business_id, branch_id, expense_date);
+
+-- Payroll
+CREATE INDEX IF NOT EXISTS idx_payrolls_business_status_period ON payrolls(business_id, status, pay_period_end);
+CREATE INDEX IF NOT EXISTS idx_payrolls_business_employee_period ON payrolls(business_id, employee_id, pay_period_start);
+
+-- Inventory transactions
+CREATE INDEX IF NOT EXISTS idx_inventory_transactions_business_created ON inventory_transactions(business_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_inventory_transactions_business_product_created ON inventory_transactions(business_id, product_id, created_at);
+
+-- Notifications (supersedes the two indexes added in 0038)
+CREATE INDEX IF NOT EXISTS idx_notifications_user_read_created ON notifications(business_id, user_id, is_read, created_at);
+DROP INDEX IF EXISTS idx_notifications_user_unread;
+DROP INDEX IF EXISTS idx_notifications_user_created;
+
+-- Audit logs
+CREATE INDEX IF NOT EXISTS idx_audit_logs_business_created ON audit_logs(business_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_entity ON audit_logs(entity_type, entity_id);
+
+-- Products: low stock lookups
+CREATE INDEX IF NOT EXISTS idx_products_business_stock ON products(business_id, stock_quantity);
+CREATE INDEX IF NOT EXISTS idx_products_below_reorder ON products(business_id) WHERE stock_quantity <= reorder_level;
+CREATE INDEX IF NOT EXISTS idx_products_business_category ON products(business_id, category_id);
@@ -0,0 +1,35 @@
+-- Daily sales/finance rollups read by the dashboard and income statement.
+-- Backfill after applying: flask --app run rebuild-rollups
+CREATE TABLE IF NOT EXISTS daily_sales_rollups (
+    id SERIAL PRIMARY KEY,
+    business_id INTEGER NOT NULL REFERENCES businesses(id) ON DELETE CASCADE,
+    branch_id INTEGER NOT NULL DEFAULT 0,
+    day DATE NOT NULL,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    sales_count INTEGER NOT NULL DEFAULT 0,
+    sales_amount NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    returned_order_count INTEGER NOT NULL DEFAULT 0,
+    returned_order_amount NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    net_revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    tax_amount NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    discount_amount NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    gross_sales NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    line_discounts NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    cogs NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    returns_value NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    pending_returns NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    returns_cogs NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    returns_confirmed_amount NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    expenses NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    payroll_gross NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    payroll_tax NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    payroll_other NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT _business_day_branch_rollup_uc UNIQUE (business_id, day, branch_id)
+);
+
+-- Businesses whose rollups cover their whole history (set by a full rebuild)
+CREATE TABLE IF NOT EXISTS sales_rollup_states (
+    business_id INTEGER PRIMARY KEY REFERENCES businesses(id) ON DELETE CASCADE,
+    built_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,9 @@
+-- Per-business counters for human-readable ids (ORD0001, CUST0001, INV0001, ...)
+-- Rows are created on first use, seeded from the highest existing id
+CREATE TABLE IF NOT EXISTS id_sequences (
+    business_id INTEGER NOT NULL REFERENCES businesses(id) ON DELETE CASCADE,
+    prefix VARCHAR(10) NOT NULL,
+    last_value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (business_id, prefix)
+);
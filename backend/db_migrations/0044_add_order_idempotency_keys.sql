@@ -0,0 +1,7 @@
+-- Client-generated keys of offline POS sales, so replayed syncs are not sold twice
+ALTER TABLE orders
+    ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_orders_business_idempotency_key
+    ON orders (business_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
@@ -0,0 +1,23 @@
+-- Batch payroll payouts polled via /api/hr/payroll/disbursement-jobs/<id>
+CREATE TABLE IF NOT EXISTS disbursement_jobs (
+    id SERIAL PRIMARY KEY,
+    business_id INTEGER NOT NULL REFERENCES businesses(id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    provider VARCHAR(50) NOT NULL DEFAULT 'mtn_momo',
+    payroll_ids JSON,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    total_count INTEGER NOT NULL DEFAULT 0,
+    processed_count INTEGER NOT NULL DEFAULT 0,
+    succeeded_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    total_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    disbursed_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    results JSON,
+    error_message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Create indexes
+CREATE INDEX IF NOT EXISTS idx_disbursement_jobs_business_created ON disbursement_jobs(business_id, created_at);
@@ -0,0 +1,18 @@
+-- Stock on hand per product, branch and warehouse, maintained from inventory_transactions
+-- branch_id / warehouse_id are 0 when unassigned. Fill with `flask rebuild-stock-levels`.
+CREATE TABLE IF NOT EXISTS stock_levels (
+    business_id INTEGER NOT NULL REFERENCES businesses(id) ON DELETE CASCADE,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    branch_id INTEGER NOT NULL DEFAULT 0,
+    warehouse_id INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (business_id, product_id, branch_id, warehouse_id)
+);
+
+-- Create indexes
+CREATE INDEX IF NOT EXISTS idx_stock_levels_business_branch_quantity ON stock_levels(business_id, branch_id, quantity);
+CREATE INDEX IF NOT EXISTS idx_stock_levels_business_warehouse ON stock_levels(business_id, warehouse_id);
+
+-- Movements can name the warehouse they went in or out of
+ALTER TABLE inventory_transactions ADD COLUMN IF NOT EXISTS warehouse_id INTEGER REFERENCES warehouses(id);
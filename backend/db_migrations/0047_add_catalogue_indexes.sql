@@ -0,0 +1,16 @@
+-- Indexes for the customer portal catalogue (app/utils/catalogue.py).
+-- Keyset pages walk (business_id, name, id) or (business_id, unit_price, id),
+-- the ETag version reads count / max(updated_at) per business, and name
+-- search uses ILIKE served by a pg_trgm GIN index. The btree indexes are
+-- also declared on the Product model for db.create_all(); the trigram index
+-- is PostgreSQL-only and lives here.
+--
+-- On large production tables run each CREATE INDEX as CREATE INDEX
+-- CONCURRENTLY (outside a transaction) to avoid blocking writes.
+
+CREATE INDEX IF NOT EXISTS idx_products_business_name ON products(business_id, name, id);
+CREATE INDEX IF NOT EXISTS idx_products_business_price ON products(business_id, unit_price, id);
+CREATE INDEX IF NOT EXISTS idx_products_business_updated ON products(business_id, updated_at);
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING gin (name gin_trgm_ops);
@@ -0,0 +1,22 @@
+-- Search documents for /api/search and the list endpoints' search filter
+-- (app/utils/search_index.py). One row per product, customer, supplier and
+-- employee, rewritten in the same transaction as the record.
+--
+-- Documents are built on a business's first search, or for every business
+-- with `flask --app run rebuild-search-index`.
+
+CREATE TABLE IF NOT EXISTS search_documents (
+    id SERIAL PRIMARY KEY,
+    business_id INTEGER NOT NULL REFERENCES businesses(id) ON DELETE CASCADE,
+    entity_type VARCHAR(20) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    subtitle VARCHAR(255),
+    search_text TEXT NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT _search_document_entity_uc UNIQUE (entity_type, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_documents_business_type ON search_documents(business_id, entity_type);
+CREATE INDEX IF NOT EXISTS idx_search_documents_tsv ON search_documents USING gin (to_tsvector('simple', search_text));
@@ -0,0 +1,13 @@
+-- API calls per business, endpoint and hour, maintained by the request pipeline (app/utils/api_usage.py)
+CREATE TABLE IF NOT EXISTS api_usage_hourly (
+    business_id INTEGER NOT NULL REFERENCES businesses(id) ON DELETE CASCADE,
+    hour TIMESTAMP NOT NULL,
+    endpoint VARCHAR(120) NOT NULL,
+    request_count BIGINT NOT NULL DEFAULT 0,
+    error_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (business_id, hour, endpoint)
+);
+
+-- Create indexes
+CREATE INDEX IF NOT EXISTS idx_api_usage_hourly_hour ON api_usage_hourly(hour);
@@ -0,0 +1,26 @@
+-- Full-tenant export and restore jobs run in the background (app/utils/tenant_export.py)
+CREATE TABLE IF NOT EXISTS tenant_exports (
+    id SERIAL PRIMARY KEY,
+    business_id INTEGER NOT NULL,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    kind VARCHAR(10) NOT NULL DEFAULT 'export',
+    source_export_id INTEGER REFERENCES tenant_exports(id) ON DELETE SET NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    archive_path VARCHAR(500),
+    file_size BIGINT,
+    tables JSON,
+    table_counts JSON,
+    total_rows BIGINT NOT NULL DEFAULT 0,
+    processed_rows BIGINT NOT NULL DEFAULT 0,
+    rejected_rows BIGINT NOT NULL DEFAULT 0,
+    checkpoint JSON,
+    errors JSON,
+    error_message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create indexes
+CREATE INDEX IF NOT EXISTS idx_tenant_exports_business_created ON tenant_exports(business_id, created_at);
@@ -0,0 +1,7 @@
+-- Businesses whose search documents cover all their records (app/utils/search_index.py).
+-- A business without a row is indexed on its first search, or with
+-- `flask --app run rebuild-search-index`.
+CREATE TABLE IF NOT EXISTS search_index_states (
+    business_id INTEGER PRIMARY KEY REFERENCES businesses(id) ON DELETE CASCADE,
+    built_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
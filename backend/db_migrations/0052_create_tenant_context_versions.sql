@@ -0,0 +1,8 @@
+-- Change counters for cached tenant contexts (app/utils/tenant_context.py),
+-- bumped with every committed change to a user, their branch access or their business
+CREATE TABLE IF NOT EXISTS tenant_context_versions (
+    kind VARCHAR(10) NOT NULL,
+    scope_id INTEGER NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, scope_id)
+);
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Barcode Scan Benchmark
+======================
+Measures scanner lookups per second for one business, three ways:
+
+- db:    the former per-scan query on (business_id, barcode) + to_dict(),
+         over the first --db-scans scans only
+- index: app.utils.barcodes.lookup() against the warm in-memory index
+- http:  GET /api/barcode/lookup/<code> through the Flask test client
+
+and times EAN-13 generation with reserve_barcodes(). Scanned codes are
+drawn from the business's products (with --misses of them unknown codes).
+Run it against a staging copy with production-sized data:
+
+    python scripts/barcode_scan_benchmark.py --business-id 12 --scans 5000
+
+With --generate N, N temporary products with generated barcodes are
+created first and deleted afterwards.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.category import Category
+from app.models.product import Product
+from app.models.search_document import SearchDocument
+from app.models.user import User, UserRole
+from app.utils.barcodes import invalidate_barcode_index, is_valid_ean13, lookup, reserve_barcodes
+from flask_jwt_extended import create_access_token
+
+
+def timed(label, scans, fn):
+    started = time.perf_counter()
+    for code in scans:
+        fn(code)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<7} {len(scans) / elapsed:>12,.0f} scans/sec  ({elapsed * 1000 / len(scans):.3f} ms/scan)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark barcode scan lookups')
+    parser.add_argument('--business-id', type=int, required=True)
+    parser.add_argument('--scans', type=int, default=2000, help='Lookups per method')
+    parser.add_argument('--db-scans', type=int, default=200,
+                        help='Lookups for the (slow) per-scan query baseline')
+    parser.add_argument('--misses', type=float, default=0.05, help='Fraction of scans with unknown codes')
+    parser.add_argument('--generate', type=int, default=0, help='Temporary products to create first')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        created_ids = []
+        if args.generate:
+            category = Category.query.filter_by(business_id=args.business_id).first()
+            if not category:
+                print(f"Business {args.business_id} has no category for the temporary products")
+                return 1
+            started = time.perf_counter()
+            codes = reserve_barcodes(args.business_id, args.generate)
+            elapsed = time.perf_counter() - started
+            print(f"Reserved {len(codes)} EAN-13 codes in {elapsed * 1000:.1f} ms "
+                  f"(all valid: {all(is_valid_ean13(code) for code in codes)})")
+            products = [Product(
+                business_id=args.business_id, product_id=f'BENCH{i:07d}', name=f'Benchmark product {i}',
+                barcode=code, category_id=category.id, unit_price=1, stock_quantity=0
+            ) for i, code in enumerate(codes)]
+            db.session.add_all(products)
+            db.session.commit()
+            created_ids = [product.id for product in products]
+
+        try:
+            codes = [code for (code,) in db.session.query(Product.barcode).filter(
+                Product.business_id == args.business_id, Product.is_active.is_(True),
+                Product.barcode.isnot(None), Product.barcode != ''
+            ).all()]
+            if not codes:
+                print(f"Business {args.business_id} has no products with barcodes (try --generate 10000)")
+                return 1
+            scans = [f'9{random.randint(0, 10 ** 11):012d}' if random.random() < args.misses
+                     else random.choice(codes) for _ in range(args.scans)]
+            print(f"{len(codes)} barcoded products, {len(scans)} scans per method\n")
+
+            def db_lookup(code):
+                product = Product.query.filter_by(business_id=args.business_id, barcode=code, is_active=True).first()
+                if product:
+                    product.to_dict()
+                db.session.rollback()
+
+            db_scans = scans[:args.db_scans]
+            db_rate = len(db_scans) / timed('db', db_scans, db_lookup)
+
+            invalidate_barcode_index(args.business_id)
+            started = time.perf_counter()
+            lookup(args.business_id, scans[0])
+            print(f"  (index warm-up: {(time.perf_counter() - started) * 1000:.1f} ms)")
+            index_rate = len(scans) / timed('index', scans, lambda code: lookup(args.business_id, code))
+
+            admin = User.query.filter_by(business_id=args.business_id, role=UserRole.admin, is_active=True).first()
+            if admin:
+                token = create_access_token(identity=str(admin.id), additional_claims={
+                    'business_id': args.business_id, 'role': admin.role.value,
+                    'mfa_required': False, 'mfa_verified': True
+                }, expires_delta=timedelta(minutes=10))
+                headers = {'Authorization': f'Bearer {token}'}
+                client = app.test_client()
+                timed('http', scans, lambda code: client.get(f'/api/barcode/lookup/{code}', headers=headers))
+            else:
+                print("  http    skipped: no active admin user")
+
+            print(f"\nIndex speed-up over per-scan queries: {index_rate / db_rate:,.0f}x")
+        finally:
+            if created_ids:
+                SearchDocument.query.filter(SearchDocument.entity_type == 'product',
+                                            SearchDocument.entity_id.in_(created_ids)).delete(synchronize_session=False)
+                Product.query.filter(Product.id.in_(created_ids)).delete(synchronize_session=False)
+                db.session.commit()
+                invalidate_barcode_index(args.business_id)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Query Plan Checker
+==================
+Calls the main dashboard, report and listing endpoints for one business,
+captures every SELECT they issue and EXPLAINs it. Exits with status 1 if any
+plan sequentially scans a table with more than --min-rows rows.
+
+Run it against a staging copy with production-sized data after schema or
+query changes (see db_migrations/0040_add_tenant_query_indexes.sql):
+
+    python scripts/check_query_plans.py --business-id 12 --min-rows 10000
+
+Supports PostgreSQL (EXPLAIN FORMAT JSON) and the SQLite fallback
+(EXPLAIN QUERY PLAN).
+"""
+
+import argparse
+import os
+import re
+import sys
+from datetime import timedelta
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.user import User, UserRole
+from app.models.order import Order
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func, text
+
+# (method, url, json body) for the hot report and dashboard queries
+ENDPOINTS = [
+    ('GET', '/api/dashboard/stats', None),
+    ('GET', '/api/dashboard/stats?period=month', None),
+    ('GET', '/api/dashboard/recent-activity', None),
+    ('GET', '/api/dashboard/sales-chart?period=month', None),
+    ('GET', '/api/dashboard/revenue-expense-chart', None),
+    ('GET', '/api/dashboard/product-performance-chart', None),
+    ('POST', '/api/dashboard/filters/apply', {'date_range': 'this_month'}),
+    ('GET', '/api/reports/sales', None),
+    ('GET', '/api/reports/inventory', None),
+    ('GET', '/api/reports/orders', None),
+    ('GET', '/api/reports/financial', None),
+    ('GET', '/api/reports/summary', None),
+    ('GET', '/api/sales/orders?per_page=50', None),
+    ('GET', '/api/invoices/?per_page=50', None),
+    ('GET', '/api/inventory/products?low_stock=true&per_page=50', None),
+    ('GET', '/api/inventory/transactions?per_page=50', None),
+    ('GET', '/api/communication/notifications', None),
+    ('GET', '/api/audit-log/logs?per_page=50', None),
+]
+
+
+def pick_business_and_user(business_id=None):
+    if business_id is None:
+        business_id = db.session.query(Order.business_id).group_by(Order.business_id).order_by(
+            func.count(Order.id).desc()
+        ).limit(1).scalar()
+    if business_id is None:
+        return None, None
+    user = User.query.filter(
+        User.business_id == business_id,
+        User.role.in_([UserRole.admin, UserRole.manager])
+    ).order_by(User.role, User.id).first()
+    return business_id, user
+
+
+def capture_selects(app, business_id, user):
+    """Call every endpoint and return {endpoint: [(statement, parameters), ...]}."""
+    token = create_access_token(
+        identity=str(user.id),
+        additional_claims={
+            'business_id': business_id,
+            'role': user.role.value,
+            'mfa_required': False,
+            'mfa_verified': True
+        },
+        expires_delta=timedelta(minutes=10)
+    )
+    headers = {'Authorization': f'Bearer {token}'}
+
+    captured = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    results = {}
+    try:
+        client = app.test_client()
+        for method, url, body in ENDPOINTS:
+            captured.clear()
+            response = client.open(url, method=method, headers=headers, json=body)
+            results[f"{method} {url}"] = (response.status_code, list(captured))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+    return results
+
+
+class PlanInspector:
+    def __init__(self, min_rows):
+        self.min_rows = min_rows
+        self.dialect = db.engine.dialect.name
+        self._row_counts = {}
+
+    def table_rows(self, table):
+        if table not in self._row_counts:
+            with db.engine.connect() as conn:
+                if self.dialect == 'postgresql':
+                    rows = conn.execute(
+                        text("SELECT reltuples FROM pg_class WHERE relname = :t AND relkind = 'r'"),
+                        {'t': table}
+                    ).scalar()
+                else:
+                    rows = conn.exec_driver_sql(f'SELECT count(*) FROM "{table}"').scalar()
+            self._row_counts[table] = int(rows or 0)
+        return self._row_counts[table]
+
+    def seq_scanned_tables(self, statement, parameters):
+        """Tables the plan reads with a sequential scan."""
+        with db.engine.connect() as conn:
+            if self.dialect == 'postgresql':
+                plan = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+                return sorted(set(self._pg_seq_scans(plan[0]['Plan'])))
+
+            tables = set()
+            for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+                match = re.match(r'SCAN (?:TABLE )?(\w+)(.*)', row[-1])
+                if match and 'USING' not in match.group(2):
+                    tables.add(match.group(1))
+            return sorted(tables)
+
+    def _pg_seq_scans(self, node):
+        if node.get('Node Type') == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', []):
+            yield from self._pg_seq_scans(child)
+
+    def violations(self, statement, parameters):
+        return [
+            (table, self.table_rows(table))
+            for table in self.seq_scanned_tables(statement, parameters)
+            if self.table_rows(table) > self.min_rows
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN the hot report and dashboard queries.')
+    parser.add_argument('--business-id', type=int, help='Business to run the endpoints as (default: the one with most orders)')
+    parser.add_argument('--min-rows', type=int, default=10000, help='Fail on sequential scans of tables larger than this')
+    parser.add_argument('--verbose', action='store_true', help='Print every captured statement')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        business_id, user = pick_business_and_user(args.business_id)
+        if not user:
+            print("No business with an admin or manager user found")
+            return 2
+
+        print(f"Checking query plans for business {business_id} as {user.username} ({db.engine.dialect.name})")
+        inspector = PlanInspector(args.min_rows)
+        failures = 0
+        for endpoint, (status_code, statements) in capture_selects(app, business_id, user).items():
+            print(f"\n{endpoint} -> {status_code}, {len(statements)} queries")
+            seen = set()
+            for statement, parameters in statements:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                try:
+                    bad = inspector.violations(statement, parameters)
+                except Exception as e:
+                    print(f"  ! could not EXPLAIN: {e}")
+                    continue
+                if args.verbose or bad:
+                    print('  ' + ' '.join(statement.split())[:200])
+                for table, rows in bad:
+                    failures += 1
+                    print(f"  SEQ SCAN on {table} (~{rows} rows)")
+
+        print(f"\n{failures} sequential scan(s) of tables over {args.min_rows} rows")
+        return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
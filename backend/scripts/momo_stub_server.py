@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+MoMo Stub Server
+================
+A local stand-in for the MTN MoMo token and disbursement endpoints, for
+exercising payroll payouts without the sandbox. Point the app at it with
+MOMO_BASE_URL:
+
+    python scripts/momo_stub_server.py --port 8099 --latency 200 --rate 20
+    MOMO_BASE_URL=http://127.0.0.1:8099 MOMO_API_USER=stub MOMO_API_KEY=stub flask run
+
+It behaves like the real API where the payout engine depends on it:
+
+- POST /{collection,disbursement}/token/ issues a bearer token.
+- POST /disbursement/v1_0/transfer requires that token and a unique
+  X-Reference-Id (a repeated one is answered 409 and not paid again),
+  waits --latency ms, answers 429 above --rate requests/second and fails
+  a --fail-rate fraction of transfers with 500.
+- GET /disbursement/v1_0/transfer/<reference> reports SUCCESSFUL.
+- GET /_stats returns request counters and the transfers received.
+
+`start_stub_server()` runs it in a background thread for scripts such as
+scripts/payroll_disburse_test.py.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, latency=0.0, rate=0.0, fail_rate=0.0, token_ttl=3600):
+        self.latency = latency
+        self.rate = rate
+        self.fail_rate = fail_rate
+        self.token_ttl = token_ttl
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.transfers = {}  # reference id -> request body
+        self.counters = Counter()
+        self.recent = deque()  # monotonic times of recent transfer requests
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def throttled(self) -> bool:
+        if self.rate <= 0:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.rate:
+                return True
+            self.recent.append(now)
+            return False
+
+    def stats(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'max_in_flight': self.max_in_flight,
+                'transfers': list(self.transfers.values()),
+            }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'MoMoStub/1.0'
+
+    @property
+    def state(self) -> StubState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _authorized(self) -> bool:
+        token = (self.headers.get('Authorization') or '').replace('Bearer ', '', 1)
+        with self.state.lock:
+            return token in self.state.tokens
+
+    def do_POST(self):
+        if self.path in ('/collection/token/', '/disbursement/token/'):
+            token = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.tokens.add(token)
+                self.state.counters['token'] += 1
+            return self._send(200, {'access_token': token, 'token_type': 'access_token',
+                                    'expires_in': self.state.token_ttl})
+
+        if self.path == '/disbursement/v1_0/transfer':
+            body = self._body()
+            reference_id = self.headers.get('X-Reference-Id')
+            if not self._authorized():
+                with self.state.lock:
+                    self.state.counters['unauthorized'] += 1
+                return self._send(401, {'message': 'Invalid access token'})
+            if self.state.throttled():
+                with self.state.lock:
+                    self.state.counters['throttled'] += 1
+                return self._send(429, {'message': 'Rate limit exceeded'})
+
+            with self.state.lock:
+                self.state.in_flight += 1
+                self.state.max_in_flight = max(self.state.max_in_flight, self.state.in_flight)
+            try:
+                time.sleep(self.state.latency)
+                with self.state.lock:
+                    if not reference_id or reference_id in self.state.transfers:
+                        self.state.counters['duplicate'] += 1
+                        return self._send(409, {'code': 'RESOURCE_ALREADY_EXIST'})
+                    if random.random() < self.state.fail_rate:
+                        self.state.counters['failed'] += 1
+                        return self._send(500, {'message': 'Internal error'})
+                    self.state.transfers[reference_id] = {'reference_id': reference_id, **body}
+                    self.state.counters['transfer'] += 1
+                return self._send(202)
+            finally:
+                with self.state.lock:
+                    self.state.in_flight -= 1
+
+        return self._send(404, {'message': 'Not found'})
+
+    def do_GET(self):
+        if self.path == '/_stats':
+            return self._send(200, self.state.stats())
+        prefix = '/disbursement/v1_0/transfer/'
+        if self.path.startswith(prefix):
+            if not self._authorized():
+                return self._send(401, {'message': 'Invalid access token'})
+            with self.state.lock:
+                transfer = self.state.transfers.get(self.path[len(prefix):])
+            if not transfer:
+                return self._send(404, {'code': 'RESOURCE_NOT_FOUND'})
+            return self._send(200, {**transfer, 'status': 'SUCCESSFUL'})
+        return self._send(404, {'message': 'Not found'})
+
+
+def start_stub_server(host='127.0.0.1', port=0, **options):
+    """Serve the stub from a daemon thread; returns the server (see server.state, server.url)."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(**options)
+    server.url = f'http://{host}:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, name='momo-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local MTN MoMo stub server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=200, help='Milliseconds per transfer')
+    parser.add_argument('--rate', type=float, default=0, help='Transfers/second before 429s (0 = unlimited)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of transfers answered 500')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(latency=args.latency / 1000.0, rate=args.rate, fail_rate=args.fail_rate)
+    print(f"MoMo stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Payroll Disbursement Test
+=========================
+Runs a batch payout through /api/hr/payroll/batch-disburse against the
+local MoMo stub (scripts/momo_stub_server.py) and checks the outcome:
+
+- every approved test payroll was paid exactly once (no duplicate or
+  missing transfers, even with throttling and retries),
+- paid payrolls are PAID with the stub's reference, failed ones stay
+  APPROVED,
+- the job's counters match.
+
+It creates approved payrolls for employees of the business that have a
+phone number (round-robin), so run it against a staging copy:
+
+    python scripts/payroll_disburse_test.py --business-id 12 --payrolls 300 \\
+        --latency 300 --rate 40 --fail-rate 0.02
+
+The test payrolls are deleted afterwards unless --keep is given. Exits
+with status 1 if a check fails.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from momo_stub_server import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Test batch payroll disbursement against a MoMo stub')
+    parser.add_argument('--business-id', type=int, required=True)
+    parser.add_argument('--payrolls', type=int, default=100, help='Approved payrolls to create and pay')
+    parser.add_argument('--latency', type=float, default=200, help='Stub milliseconds per transfer')
+    parser.add_argument('--rate', type=float, default=0, help='Stub transfers/second before 429s')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of transfers the stub fails')
+    parser.add_argument('--workers', type=int, default=None, help='Override DISBURSEMENT_WORKERS')
+    parser.add_argument('--keep', action='store_true', help='Keep the test payrolls')
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency / 1000.0, rate=args.rate, fail_rate=args.fail_rate)
+    os.environ['MOMO_BASE_URL'] = stub.url
+    os.environ.setdefault('MOMO_API_USER', 'stub-user')
+    os.environ.setdefault('MOMO_API_KEY', 'stub-key')
+
+    from app import create_app, db
+    from app.models.employee import Employee
+    from app.models.payroll import Payroll, PayrollStatus
+    from app.models.user import User, UserRole
+    from app.utils import momo
+    from flask_jwt_extended import create_access_token
+
+    app = create_app()
+    if args.workers:
+        app.config['DISBURSEMENT_WORKERS'] = args.workers
+    momo.clear_token_cache()
+
+    with app.app_context():
+        admin = User.query.filter_by(business_id=args.business_id, role=UserRole.admin, is_active=True).first()
+        if not admin:
+            print(f"No active admin user for business {args.business_id}")
+            return 1
+        employees = Employee.query.join(User, Employee.user_id == User.id).filter(
+            Employee.business_id == args.business_id, User.phone.isnot(None), User.phone != ''
+        ).all()
+        if not employees:
+            print(f"Business {args.business_id} has no employees with a phone number")
+            return 1
+
+        today = date.today()
+        payrolls = [Payroll(
+            business_id=args.business_id, employee_id=employees[i % len(employees)].id,
+            pay_period_start=today, pay_period_end=today, basic_salary=100 + i, gross_pay=100 + i,
+            net_pay=100 + i, status=PayrollStatus.APPROVED, created_by=admin.id,
+            notes='payroll_disburse_test'
+        ) for i in range(args.payrolls)]
+        db.session.add_all(payrolls)
+        db.session.commit()
+        payroll_ids = [payroll.id for payroll in payrolls]
+        token = create_access_token(identity=str(admin.id), additional_claims={
+            'business_id': args.business_id, 'role': admin.role.value
+        })
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    print(f"Disbursing {len(payroll_ids)} payrolls "
+          f"(stub latency {args.latency:.0f}ms, rate {args.rate or 'unlimited'}/s, fail rate {args.fail_rate})")
+    started = time.perf_counter()
+    response = client.post('/api/hr/payroll/batch-disburse?background=true', headers=headers,
+                           json={'payroll_ids': payroll_ids})
+    if response.status_code != 202:
+        print(f"Unexpected response {response.status_code}: {response.get_json(silent=True)}")
+        return 1
+    job_id = response.get_json()['job']['id']
+
+    job = {}
+    while True:
+        job = client.get(f'/api/hr/payroll/disbursement-jobs/{job_id}', headers=headers).get_json()['job']
+        print(f"  {job['status']:<8} {job['processed_count']}/{job['total_count']} "
+              f"({job['succeeded_count']} paid, {job['failed_count']} failed)")
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(1)
+    wall = time.perf_counter() - started
+
+    stats = stub.state.stats()
+    sent = Counter(transfer['payerMessage'] for transfer in stats['transfers'])
+    print(f"\nWall time:        {wall:.2f}s ({len(payroll_ids) / wall:.1f} payrolls/sec)")
+    print(f"Stub counters:    {stats['counters']}, max in flight {stats['max_in_flight']}")
+
+    failures = []
+    if job['status'] != 'done':
+        failures.append(f"job ended {job['status']}: {job['error_message']}")
+    with app.app_context():
+        rows = Payroll.query.filter(Payroll.id.in_(payroll_ids)).all()
+        paid = [row for row in rows if row.status == PayrollStatus.PAID]
+        for row in rows:
+            transfers = sent[f'Payroll {row.id}']
+            if transfers > 1:
+                failures.append(f"payroll {row.id} paid {transfers} times")
+            if row.status == PayrollStatus.PAID and transfers != 1:
+                failures.append(f"payroll {row.id} is PAID but the stub received {transfers} transfers")
+            if row.status != PayrollStatus.PAID and transfers:
+                failures.append(f"payroll {row.id} was paid but is {row.status.value}")
+        if len(paid) != job['succeeded_count']:
+            failures.append(f"{len(paid)} payrolls PAID, job reports {job['succeeded_count']}")
+
+        if not args.keep:
+            Payroll.query.filter(Payroll.id.in_(payroll_ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+    print(f"\nCheck: {'OK' if not failures else 'FAILED'}")
+    for failure in failures[:20]:
+        print(f"  {failure}")
+    stub.shutdown()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+POS Load Test
+=============
+Fires concurrent checkouts at /api/sales/pos for one business and reports
+checkouts/sec, latency percentiles and failures. Every basket is drawn
+from a small set of "hot" products so that tills contend for the same
+rows, which is where lock ordering and the guarded stock update matter.
+
+It creates real orders and takes real stock: run it against a staging
+copy, never production.
+
+    python scripts/pos_load_test.py --business-id 12 --threads 16 --checkouts 2000
+
+After the run it checks that the stock taken from the hot products equals
+the quantities of the successful checkouts (no lost updates, no overselling)
+and exits with status 1 if it does not or if any request failed with a
+server error (e.g. a deadlock).
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.user import User, UserRole
+from app.models.product import Product
+from flask_jwt_extended import create_access_token
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def hot_products(business_id, count):
+    """The in-stock products with the most stock: {id: (unit_price, stock)}."""
+    rows = db.session.query(Product.id, Product.unit_price, Product.stock_quantity).filter(
+        Product.business_id == business_id,
+        Product.is_active == True,
+        Product.stock_quantity > 0
+    ).order_by(Product.stock_quantity.desc()).limit(count).all()
+    return {product_id: (float(unit_price or 0), stock) for product_id, unit_price, stock in rows}
+
+
+def stock_levels(product_ids):
+    db.session.expire_all()
+    return dict(db.session.query(Product.id, Product.stock_quantity).filter(Product.id.in_(product_ids)).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the POS checkout endpoint')
+    parser.add_argument('--business-id', type=int, required=True)
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent tills')
+    parser.add_argument('--checkouts', type=int, default=500, help='Total checkouts to attempt')
+    parser.add_argument('--hot-products', type=int, default=5, help='Products the baskets are drawn from')
+    parser.add_argument('--basket-size', type=int, default=3, help='Lines per basket')
+    parser.add_argument('--max-quantity', type=int, default=2, help='Maximum quantity per line')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible baskets')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        user = User.query.filter_by(business_id=args.business_id, role=UserRole.admin, is_active=True).first()
+        if not user:
+            print(f"No active admin user for business {args.business_id}")
+            return 1
+        token = create_access_token(identity=str(user.id), additional_claims={
+            'business_id': args.business_id, 'role': user.role.value
+        })
+        products = hot_products(args.business_id, args.hot_products)
+        if not products:
+            print(f"Business {args.business_id} has no products in stock")
+            return 1
+        stock_before = stock_levels(list(products))
+
+    headers = {'Authorization': f'Bearer {token}'}
+    rng = random.Random(args.seed)
+    baskets = []
+    for _ in range(args.checkouts):
+        lines = rng.sample(list(products), min(args.basket_size, len(products)))
+        baskets.append([{
+            'product_id': product_id,
+            'quantity': rng.randint(1, args.max_quantity),
+            'unit_price': products[product_id][0]
+        } for product_id in lines])
+
+    lock = threading.Lock()
+    next_basket = iter(range(len(baskets)))
+    latencies = []
+    outcomes = Counter()
+    errors = Counter()
+    sold = Counter()
+
+    def till():
+        client = app.test_client()
+        while True:
+            with lock:
+                index = next(next_basket, None)
+            if index is None:
+                return
+            basket = baskets[index]
+            started = time.perf_counter()
+            response = client.post('/api/sales/pos', headers=headers, json={
+                'items': basket, 'payment_status': 'PAID', 'payment_method': 'cash'
+            })
+            elapsed = time.perf_counter() - started
+            body = response.get_json(silent=True) or {}
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code == 201:
+                    outcomes['ok'] += 1
+                    for line in basket:
+                        sold[line['product_id']] += line['quantity']
+                elif response.status_code == 400 and 'stock' in str(body.get('error', '')).lower():
+                    outcomes['out_of_stock'] += 1
+                else:
+                    outcomes[f'http_{response.status_code}'] += 1
+                    errors[str(body.get('error', ''))[:120]] += 1
+
+    print(f"{args.checkouts} checkouts, {args.threads} tills, "
+          f"baskets of {args.basket_size} from {len(products)} hot products")
+    started = time.perf_counter()
+    threads = [threading.Thread(target=till) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    print(f"\nWall time:        {wall:.2f}s")
+    print(f"Checkouts/sec:    {outcomes['ok'] / wall:.1f} (attempts/sec {len(latencies) / wall:.1f})")
+    print(f"Latency p50/p95/p99: {percentile(latencies, 50) * 1000:.0f} / "
+          f"{percentile(latencies, 95) * 1000:.0f} / {percentile(latencies, 99) * 1000:.0f} ms")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome:<16}{count}")
+    for message, count in errors.most_common(10):
+        print(f"  {count:>5}  {message}")
+
+    with app.app_context():
+        stock_after = stock_levels(list(products))
+    mismatched = [product_id for product_id in products
+                  if stock_before[product_id] - stock_after[product_id] != sold[product_id]]
+    oversold = [product_id for product_id in products if stock_after[product_id] < 0]
+    print(f"\nStock check: {'OK' if not mismatched and not oversold else 'FAILED'}")
+    for product_id in mismatched:
+        print(f"  product {product_id}: stock fell by {stock_before[product_id] - stock_after[product_id]}, "
+              f"checkouts sold {sold[product_id]}")
+    for product_id in oversold:
+        print(f"  product {product_id}: negative stock {stock_after[product_id]}")
+
+    server_errors = sum(count for outcome, count in outcomes.items() if outcome.startswith('http_5'))
+    return 1 if mismatched or oversold or server_errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Rate Limit Benchmark
+====================
+Measures the cost per check, in microseconds, of the rate limiters:
+
+- list:   the former `security_middleware.rate_limit` store, a list of
+          timestamps per key rebuilt on every request (kept here for
+          comparison; it is per process and never forgets a key)
+- memory: app.utils.rate_limiter with the per-process LRU backend
+- sqlite: the same engine on a SQLite file shared by the workers of a host
+- redis:  the same engine on Redis, when --redis-url or REDIS_URL is set
+
+Each limiter sees the same traffic: --requests checks spread over --keys
+clients, against --limit requests per --window seconds. A high limit shows
+the cost of keeping per-request history. --processes runs the SQLite case
+from several processes at once, like gunicorn workers.
+
+    python scripts/rate_limit_benchmark.py --requests 20000 --limit 1000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.rate_limiter import MemoryBackend, RateLimiter, RedisBackend, SQLiteBackend
+
+
+class ListRateLimiter:
+    """The former timestamp-list store, reduced to its per-request work."""
+
+    def __init__(self):
+        self.requests = {}
+
+    def hit(self, key, limit, window):
+        current_time = time.time()
+        if key in self.requests:
+            self.requests[key] = [t for t in self.requests[key] if current_time - t < window]
+        else:
+            self.requests[key] = []
+        if len(self.requests[key]) >= limit:
+            return False
+        self.requests[key].append(current_time)
+        return True
+
+
+def run(limiter, keys, limit, window):
+    """(microseconds per check, allowed checks)"""
+    allowed = 0
+    started = time.perf_counter()
+    for key in keys:
+        result = limiter.hit(key, limit, window)
+        allowed += result if isinstance(result, bool) else result.allowed
+    return (time.perf_counter() - started) * 1e6 / len(keys), allowed
+
+
+def sqlite_worker(path, keys, limit, window, results):
+    results.put(run(RateLimiter(SQLiteBackend(path)), keys, limit, window))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rate limit backends')
+    parser.add_argument('--requests', type=int, default=20000, help='Checks per limiter')
+    parser.add_argument('--keys', type=int, default=20, help='Distinct clients')
+    parser.add_argument('--limit', type=int, default=1000, help='Requests allowed per window')
+    parser.add_argument('--window', type=int, default=60, help='Window in seconds')
+    parser.add_argument('--processes', type=int, default=4, help='Processes sharing the SQLite file')
+    parser.add_argument('--redis-url', default=os.getenv('REDIS_URL'), help='Also benchmark Redis')
+    args = parser.parse_args()
+
+    random.seed(42)
+    keys = [f'bench:{random.randrange(args.keys)}' for _ in range(args.requests)]
+    print(f"{args.requests} checks over {args.keys} keys, limit {args.limit} per {args.window}s")
+    print(f"{'limiter':<24}{'us/check':>10}{'allowed':>10}")
+
+    def report(name, timing):
+        print(f"{name:<24}{timing[0]:>10.1f}{timing[1]:>10}")
+
+    report('list', run(ListRateLimiter(), keys, args.limit, args.window))
+    report('memory', run(RateLimiter(MemoryBackend()), keys, args.limit, args.window))
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'rate_limits.sqlite')
+        report('sqlite', run(RateLimiter(SQLiteBackend(path)), keys, args.limit, args.window))
+
+        # Same traffic split over several processes sharing the file
+        SQLiteBackend(path).reset()
+        results = multiprocessing.Queue()
+        share = len(keys) // args.processes
+        workers = [multiprocessing.Process(
+            target=sqlite_worker, args=(path, keys[i * share:(i + 1) * share], args.limit, args.window, results)
+        ) for i in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        timings = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        report(f'sqlite x{args.processes} processes',
+               (sum(t[0] for t in timings) / len(timings), sum(t[1] for t in timings)))
+
+    if args.redis_url:
+        import redis
+        client = redis.Redis.from_url(args.redis_url)
+        backend = RedisBackend(client)
+        backend.reset('bench:')
+        report('redis', run(RateLimiter(backend), keys, args.limit, args.window))
+        backend.reset('bench:')
+
+
+if __name__ == '__main__':
+    main()
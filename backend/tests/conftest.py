@@ -0,0 +1,128 @@
+"""
+Shared fixtures. Run from backend/ with `python -m pytest -q`.
+
+The app is created once against a SQLite file in a temporary folder; every
+test gets freshly created tables (`db` fixture) and a seeded business
+(`business`, `admin`, `products`).
+"""
+
+from datetime import datetime
+from decimal import Decimal
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('backend')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{folder / 'test.db'}",
+        'FORCE_DB_FROM_ENV': '1',
+        'AUDIT_WRITER_ASYNC': 'false',
+        'AUDIT_SPOOL_FILE': str(folder / 'audit_spool.jsonl'),
+        'RATE_LIMIT_BACKEND': 'memory',
+    })
+    from app import create_app
+
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['TENANT_EXPORT_FOLDER'] = str(folder / 'exports')
+    return app
+
+
+@pytest.fixture
+def db(app):
+    from app import db
+    from app.utils.api_usage import flush_api_usage
+    from app.utils.tenant_context import invalidate_tenant_context
+
+    with app.app_context():
+        db.create_all()
+        try:
+            yield db
+        finally:
+            flush_api_usage()
+            db.session.remove()
+            db.drop_all()
+            # Ids restart with the tables, so cached contexts would point at other users
+            invalidate_tenant_context()
+
+
+@pytest.fixture
+def business(db):
+    from app.models.business import Business
+
+    business = Business(name='Shop', email='shop@example.com', slug='shop')
+    db.session.add(business)
+    db.session.commit()
+    return business
+
+
+@pytest.fixture
+def admin(db, business):
+    from app.models.user import User, UserRole
+
+    user = User(username='admin', email='admin@example.com', first_name='Ada', last_name='Admin',
+                role=UserRole.admin, business_id=business.id, password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def products(db, business):
+    from app.models.category import Category
+    from app.models.product import Product
+
+    category = Category(business_id=business.id, name='General')
+    db.session.add(category)
+    db.session.flush()
+    products = [
+        Product(business_id=business.id, product_id=f'PRD{i:04d}', name=f'Product {i}', sku=f'SKU{i}',
+                category_id=category.id,
+                unit_price=Decimal('10') + i, cost_price=Decimal('4') + i, stock_quantity=10,
+                reorder_level=5)
+        for i in range(3)
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+
+@pytest.fixture
+def auth_headers(app, admin, business):
+    from flask_jwt_extended import create_access_token
+
+    token = create_access_token(identity=str(admin.id),
+                                additional_claims={'business_id': business.id, 'role': 'admin'})
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_order(db, business, admin):
+    """make_order(products, status, created_at, quantity=1): a committed order of quantity of each product."""
+    from app.models.order import Order, OrderItem
+
+    def make_order(products, status, created_at: datetime, quantity: int = 1):
+        count = db.session.query(Order).count()
+        order = Order(business_id=business.id, order_id=f'ORD{count + 1:04d}', user_id=admin.id, status=status,
+                      created_at=created_at, order_date=created_at.date(), tax_amount=Decimal('0'),
+                      shipping_cost=Decimal('0'))
+        total = Decimal('0')
+        for product in products:
+            line_total = product.unit_price * quantity
+            order.order_items.append(OrderItem(product=product, quantity=quantity, unit_price=product.unit_price,
+                                               line_total=line_total))
+            total += line_total
+        order.subtotal = order.total_amount = total
+        db.session.add(order)
+        db.session.commit()
+        return order
+
+    return make_order
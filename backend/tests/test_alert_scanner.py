@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.communication import AlertDedupeKey, Notification
+from app.utils.alert_scanner import DEDUPE_RETENTION, DEDUPE_WINDOW, AlertScanner, claim_alert_keys
+
+NOW = datetime(2026, 3, 2, 9)
+
+
+@pytest.fixture
+def out_of_stock(db, admin, products):
+    products[0].stock_quantity = 0
+    products[1].stock_quantity = 3
+    db.session.commit()
+    return products[:2]
+
+
+def test_claim_alert_keys_dedupes_within_the_window(db, business):
+    keys = ['low_stock:1:out', 'low_stock:2:low', 'low_stock:1:out']
+
+    assert claim_alert_keys(business.id, keys, NOW) == {'low_stock:1:out', 'low_stock:2:low'}
+    db.session.commit()
+
+    assert claim_alert_keys(business.id, keys, NOW + DEDUPE_WINDOW - timedelta(minutes=1)) == set()
+    assert claim_alert_keys(business.id, ['low_stock:1:low'], NOW) == {'low_stock:1:low'}
+    db.session.commit()
+
+    later = NOW + DEDUPE_WINDOW + timedelta(minutes=1)
+    assert claim_alert_keys(business.id, keys, later) == {'low_stock:1:out', 'low_stock:2:low'}
+    db.session.commit()
+    assert AlertDedupeKey.query.filter_by(dedupe_key='low_stock:1:out').one().last_alerted_at == later
+
+
+def test_scan_business_notifies_once_per_window(db, business, admin, out_of_stock):
+    assert AlertScanner(now=NOW).scan_business(business.id) == 2
+    assert Notification.query.filter_by(user_id=admin.id).count() == 2
+
+    assert AlertScanner(now=NOW + timedelta(hours=1)).scan_business(business.id) == 0
+    assert Notification.query.filter_by(user_id=admin.id).count() == 2
+
+    assert AlertScanner(now=NOW + DEDUPE_WINDOW + timedelta(hours=1)).scan_business(business.id) == 2
+    assert Notification.query.filter_by(user_id=admin.id).count() == 4
+
+
+def test_scan_business_prunes_stale_dedupe_keys(db, business, admin):
+    db.session.add(AlertDedupeKey(business_id=business.id, dedupe_key='low_stock:99:out',
+                                  last_alerted_at=NOW - DEDUPE_RETENTION - timedelta(days=1)))
+    db.session.commit()
+
+    assert AlertScanner(now=NOW).scan_business(business.id) == 0
+    assert AlertDedupeKey.query.count() == 0
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from app.utils.api_monitoring import AnomalyDetector, APIMetric, APIMonitor, _percentile
+from app.utils.streaming_stats import P2Quantile
+
+LATENCIES = [0.12, 0.5, 0.31, 0.07, 0.9, 0.44, 0.2]
+
+
+def _metric(response_time, status_code=200, request_size=100):
+    return APIMetric(timestamp=0.0, endpoint='/api/products', method='GET', status_code=status_code,
+                     response_time=response_time, request_size=request_size, response_size=500)
+
+
+@pytest.mark.parametrize('values, percent, expected', [
+    # Reference values from numpy.percentile (linear interpolation)
+    (LATENCIES, 95, 0.78),
+    (LATENCIES, 99, 0.876),
+    (list(range(1, 11)), 95, 9.55),
+    (list(range(1, 11)), 50, 5.5),
+    ([0.3], 99, 0.3),
+    ([], 95, 0.0),
+])
+def test_percentile_interpolates_like_numpy(values, percent, expected):
+    assert _percentile(values, percent) == pytest.approx(expected)
+
+
+def test_metrics_summary_reports_percentiles():
+    monitor = APIMonitor(redis_client=object())
+    metrics = [
+        {'response_time': str(value), 'status_code': '500' if i == 0 else '200', 'ip_address': f'10.0.0.{i % 2}',
+         'user_id': ''}
+        for i, value in enumerate(LATENCIES)
+    ]
+
+    summary = monitor._calculate_metrics_summary(metrics)
+
+    assert summary['total_requests'] == len(LATENCIES)
+    assert summary['p95_response_time'] == pytest.approx(0.78)
+    assert summary['p99_response_time'] == pytest.approx(0.876)
+    assert summary['error_count'] == 1
+    assert summary['unique_ips'] == 2
+    assert summary['unique_users'] == 0
+    assert monitor._calculate_metrics_summary([]) == {}
+
+
+def test_p2_quantile_tracks_the_true_quantile():
+    rng = random.Random(7)
+    values = [rng.expovariate(10) for _ in range(5000)]
+    estimate = P2Quantile(0.95)
+    for value in values:
+        estimate.add(value)
+
+    assert estimate.value == pytest.approx(_percentile(values, 95), rel=0.05)
+
+
+def test_anomaly_detector_flags_slow_requests_and_error_bursts():
+    rng = random.Random(3)
+    detector = AnomalyDetector(window_size=100, threshold=2.5, recent_window=10)
+    for _ in range(200):
+        assert detector.observe(_metric(rng.uniform(0.18, 0.22))) == []
+
+    assert [anomaly['type'] for anomaly in detector.observe(_metric(0.9))] == ['response_time_anomaly']
+
+    anomalies = []
+    for _ in range(10):
+        anomalies = detector.observe(_metric(0.2, status_code=500))
+    assert 'error_rate_anomaly' in [anomaly['type'] for anomaly in anomalies]
+
+    baseline = detector.get_baseline_stats('/api/products', 'GET')
+    assert baseline['total_requests'] == 211
+    assert baseline['status_codes'] == {200: 201, 500: 10}
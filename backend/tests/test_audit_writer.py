@@ -0,0 +1,84 @@
+from datetime import datetime
+import json
+import os
+import time
+
+import pytest
+
+from app.models.audit_log import AuditAction, AuditLog
+from app.utils.audit_writer import audit_writer
+
+
+@pytest.fixture
+def writer(db, tmp_path, monkeypatch):
+    """The app's audit writer with a spool file of its own, healthy and synchronous."""
+    monkeypatch.setattr(audit_writer, 'spool_file', str(tmp_path / 'audit_spool.jsonl'))
+    monkeypatch.setattr(audit_writer, 'degraded_until', 0.0)
+    monkeypatch.setattr(audit_writer, 'async_writes', False)
+    return audit_writer
+
+
+def _row(entity_id, **values):
+    row = {'action': AuditAction.UPDATE, 'entity_type': 'product', 'entity_id': entity_id,
+           'new_values': {'price': entity_id}, 'created_at': datetime(2026, 3, 2, 9, 30)}
+    row.update(values)
+    return row
+
+
+def _entity_ids(db):
+    return sorted(entity_id for (entity_id,) in db.session.query(AuditLog.entity_id).all())
+
+
+def test_rows_held_until_commit_and_dropped_on_rollback(db, writer):
+    writer.enqueue(AuditLog.__table__, _row(1), after_commit=True)
+    assert _entity_ids(db) == []
+    db.session.commit()
+    assert _entity_ids(db) == [1]
+
+    writer.enqueue(AuditLog.__table__, _row(2), after_commit=True)
+    db.session.rollback()
+    db.session.commit()
+    assert _entity_ids(db) == [1]
+
+
+def test_degraded_writer_spools_and_replays_later(db, writer):
+    writer.degraded_until = time.monotonic() + 60
+    writer.enqueue(AuditLog.__table__, _row(1))
+    writer.enqueue(AuditLog.__table__, _row(2))
+
+    assert _entity_ids(db) == []
+    with open(writer.spool_file) as spool:
+        entries = [json.loads(line) for line in spool]
+    assert [entry['row']['action'] for entry in entries] == ['UPDATE', 'UPDATE']
+
+    # The first healthy flush replays the spool after its own rows
+    writer.degraded_until = 0.0
+    writer.enqueue(AuditLog.__table__, _row(3))
+
+    assert _entity_ids(db) == [1, 2, 3]
+    assert not os.path.exists(writer.spool_file)
+    log = db.session.query(AuditLog).filter_by(entity_id=1).one()
+    assert (log.action, log.created_at, log.new_values) == (AuditAction.UPDATE, datetime(2026, 3, 2, 9, 30),
+                                                            {'price': 1})
+
+
+def test_replay_moves_refused_rows_aside(db, writer):
+    writer.degraded_until = time.monotonic() + 60
+    writer.enqueue(AuditLog.__table__, _row(1))
+    writer.enqueue(AuditLog.__table__, _row(2, entity_type=None))
+    writer.degraded_until = 0.0
+
+    assert writer.replay_spool() == 1
+    assert _entity_ids(db) == [1]
+    with open(f'{writer.spool_file}.rejected') as rejected:
+        assert [json.loads(line)['row']['entity_id'] for line in rejected] == [2]
+
+
+def test_background_flusher_writes_queued_rows(db, writer):
+    writer.async_writes = True
+    for entity_id in range(5):
+        writer.enqueue(AuditLog.__table__, _row(entity_id))
+
+    writer.flush()
+
+    assert _entity_ids(db) == [0, 1, 2, 3, 4]
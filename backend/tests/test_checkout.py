@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.models.customer import Customer
+from app.models.inventory_transaction import InventoryTransaction
+from app.models.order import Order
+from app.models.outbox import OutboxEvent
+from app.models.product import Product
+from app.utils.checkout import CheckoutError, checkout, lock_products, take_stock
+
+
+@pytest.fixture
+def sale(app, db, business, admin):
+    """sale(data, pos=True): checkout in a request context as the admin."""
+    def sale(data, pos=True):
+        with app.test_request_context():
+            return checkout(business.id, None, admin.id, data, pos=pos)
+    return sale
+
+
+@pytest.fixture
+def customer(db, business):
+    customer = Customer(business_id=business.id, customer_id='CUST0001', first_name='Cara', last_name='Buyer',
+                        email='cara@example.com', balance=0)
+    db.session.add(customer)
+    db.session.commit()
+    return customer
+
+
+def _line(product, quantity):
+    return {'product_id': product.id, 'quantity': quantity, 'unit_price': float(product.unit_price)}
+
+
+def _stock(db, products):
+    return [db.session.get(Product, product.id).stock_quantity for product in products]
+
+
+def test_checkout_takes_stock_and_logs_the_sale(db, sale, products):
+    order = sale({'items': [_line(products[0], 2), _line(products[1], 1), _line(products[0], 3)]})
+
+    assert _stock(db, products) == [5, 9, 10]
+    assert order['status'] == 'delivered'
+    assert len(order['items']) == 3
+    movements = db.session.query(InventoryTransaction.product_id, InventoryTransaction.quantity).filter_by(
+        reference_id=order['order_id']
+    ).order_by(InventoryTransaction.product_id).all()
+    assert [tuple(movement) for movement in movements] == [(products[0].id, 5), (products[1].id, 1)]
+    assert db.session.query(OutboxEvent).filter_by(event_type='low_stock.check').one().payload == {
+        'product_ids': [products[0].id, products[1].id]
+    }
+
+
+def test_insufficient_stock_rejects_the_whole_sale(db, sale, products):
+    with pytest.raises(CheckoutError, match='Insufficient stock for product Product 1'):
+        sale({'items': [_line(products[0], 1), _line(products[1], 11)]})
+    db.session.rollback()
+
+    assert _stock(db, products) == [10, 10, 10]
+    assert db.session.query(Order).count() == 0
+
+
+def test_guarded_decrement_rejects_stock_taken_after_the_lock(db, business, products):
+    locked = lock_products(business.id, [products[1].id, products[0].id])
+    assert list(locked) == [products[0].id, products[1].id]
+
+    # Without row locks (SQLite) another till can sell between the lock and the update
+    db.session.execute(update(Product).where(Product.id == products[1].id).values(stock_quantity=1))
+    with pytest.raises(CheckoutError, match='Insufficient stock for product Product 1'):
+        take_stock(business.id, {products[0].id: 2, products[1].id: 2}, locked)
+    db.session.rollback()
+
+    assert _stock(db, products) == [10, 10, 10]
+
+
+def test_products_are_locked_in_id_order(db, sale, products):
+    statements = []
+
+    def capture(state):
+        if state.is_select and Product.__table__ in state.statement.get_final_froms():
+            statements.append(str(state.statement.compile(dialect=postgresql.dialect())))
+
+    event.listen(Session, 'do_orm_execute', capture)
+    try:
+        sale({'items': [_line(products[2], 1), _line(products[0], 1)]})
+    finally:
+        event.remove(Session, 'do_orm_execute', capture)
+
+    locks = [statement for statement in statements if 'FOR UPDATE' in statement]
+    assert len(locks) == 1
+    assert 'ORDER BY products.id FOR UPDATE' in locks[0]
+
+
+def test_unpaid_sales_are_charged_to_the_customer(db, sale, products, customer):
+    order = sale({'items': [_line(products[0], 2)], 'customer_id': customer.id, 'payment_status': 'UNPAID'},
+                 pos=False)
+
+    assert order['status'] == 'pending'
+    assert float(db.session.get(Customer, customer.id).balance) == pytest.approx(20)
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.order import OrderStatus
+from app.models.sales_rollup import SalesRollupState
+from app.utils.dashboard_metrics import DashboardMetricsAggregator
+from app.utils.outbox import OutboxWorker
+
+
+def _midnight(days_ago: int) -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+
+
+@pytest.fixture
+def orders(products, make_order):
+    """Current-period, previous-period and unsuccessful orders."""
+    return {
+        'current': make_order(products[:2], OrderStatus.DELIVERED, _midnight(5) + timedelta(hours=9), quantity=2),
+        'previous': make_order(products[:1], OrderStatus.COMPLETED, _midnight(40) + timedelta(hours=9)),
+        'pending': make_order(products, OrderStatus.PENDING, _midnight(3) + timedelta(hours=9)),
+    }
+
+
+def test_period_metrics_aggregate_both_periods(db, business, products, orders):
+    # Without a rollup state the aggregator reads the raw rows
+    SalesRollupState.query.filter_by(business_id=business.id).delete()
+    db.session.commit()
+
+    metrics = DashboardMetricsAggregator(business.id).get_period_metrics(
+        (_midnight(30), None), (_midnight(60), _midnight(30))
+    )
+
+    assert metrics['current']['revenue'] == pytest.approx(2 * (10 + 11))
+    assert metrics['current']['cogs'] == pytest.approx(2 * (4 + 5))
+    assert metrics['previous']['revenue'] == pytest.approx(10)
+    assert metrics['previous']['cogs'] == pytest.approx(4)
+    assert metrics['current']['profit'] == pytest.approx(42 - 18)
+    # Orders of every status are counted, revenue only from successful ones
+    assert metrics['total_orders'] == 2
+    assert metrics['total_products'] == len(products)
+
+
+def test_stats_endpoint_reports_changes(db, client, auth_headers, orders):
+    # Rollups are refreshed by the outbox worker
+    OutboxWorker().run_once()
+
+    response = client.get('/api/dashboard/stats?period=daily', headers=auth_headers)
+
+    assert response.status_code == 200
+    stats = response.get_json()['stats']
+    assert stats['total_revenue'] == pytest.approx(42)
+    assert stats['total_orders'] == 2
+    assert stats['changes']['revenue'] == pytest.approx(320.0)
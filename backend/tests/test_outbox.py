@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.outbox import OutboxEvent
+from app.utils import outbox
+from app.utils.outbox import OutboxWorker, enqueue_event
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Registers 'test.ok' (coalesced), 'test.each' (per event) and 'test.fail' handlers; records their calls."""
+    calls = []
+
+    def record(business_id, events):
+        calls.append((business_id, sorted(event.payload['n'] for event in events)))
+
+    def fail(business_id, events):
+        raise RuntimeError('endpoint down')
+
+    monkeypatch.setitem(outbox._HANDLERS, 'test.ok', (record, True))
+    monkeypatch.setitem(outbox._HANDLERS, 'test.each', (record, False))
+    monkeypatch.setitem(outbox._HANDLERS, 'test.fail', (fail, True))
+    return calls
+
+
+def _events(db, event_type=None):
+    query = db.session.query(OutboxEvent)
+    if event_type:
+        query = query.filter(OutboxEvent.event_type == event_type)
+    return query.order_by(OutboxEvent.id).all()
+
+
+def test_claim_batch_takes_due_and_stale_events(db, business):
+    now = datetime.utcnow()
+    due = enqueue_event(business.id, 'test.ok', {'n': 1})
+    enqueue_event(business.id, 'test.ok', {'n': 2}, available_at=now + timedelta(minutes=5))
+    stale = OutboxEvent(business_id=business.id, event_type='test.ok', payload={'n': 3}, status='processing',
+                        available_at=now, locked_at=now - timedelta(hours=1))
+    held = OutboxEvent(business_id=business.id, event_type='test.ok', payload={'n': 4}, status='processing',
+                       available_at=now, locked_at=now)
+    db.session.add_all([stale, held])
+    db.session.commit()
+
+    assert OutboxWorker(lock_timeout=600).claim_batch() == [due.id, stale.id]
+    assert OutboxWorker().claim_batch() == []
+
+
+def test_run_once_coalesces_per_type_and_business(db, business, calls):
+    business_id = business.id
+    for n in range(3):
+        enqueue_event(business_id, 'test.ok', {'n': n})
+    enqueue_event(business_id + 1, 'test.ok', {'n': 9})
+    enqueue_event(business_id, 'test.each', {'n': 5})
+    enqueue_event(business_id, 'test.each', {'n': 6})
+    db.session.commit()
+
+    stats = OutboxWorker().run_once()
+
+    assert stats == {'claimed': 6, 'done': 6, 'failed': 0}
+    assert calls == [(business_id, [0, 1, 2]), (business_id + 1, [9]), (business_id, [5]), (business_id, [6])]
+    assert {event.status for event in _events(db)} == {'done'}
+
+
+def test_failed_events_back_off_then_go_dead(db, business, calls):
+    enqueue_event(business.id, 'test.fail', {'n': 1})
+    db.session.commit()
+    worker = OutboxWorker(max_attempts=2, base_delay=30)
+
+    before = datetime.utcnow()
+    assert worker.run_once() == {'claimed': 1, 'done': 0, 'failed': 1}
+    event = _events(db)[0]
+    assert (event.status, event.attempts) == ('pending', 1)
+    assert event.last_error == 'RuntimeError: endpoint down'
+    assert before + timedelta(seconds=24) <= event.available_at <= datetime.utcnow() + timedelta(seconds=36)
+
+    # Not due yet
+    assert worker.run_once()['claimed'] == 0
+
+    event.available_at = datetime.utcnow()
+    db.session.commit()
+    worker.run_once()
+    event = _events(db)[0]
+    assert (event.status, event.attempts) == ('dead', 2)
+    assert worker.run_once()['claimed'] == 0
+
+
+def test_backoff_grows_exponentially_up_to_max_delay():
+    worker = OutboxWorker(base_delay=30, max_delay=3600)
+
+    assert 24 <= worker._backoff(1).total_seconds() <= 36
+    assert 96 <= worker._backoff(3).total_seconds() <= 144
+    assert 2880 <= worker._backoff(20).total_seconds() <= 4320
+
+
+def test_unknown_event_types_fail(db, business):
+    enqueue_event(business.id, 'test.unknown', {'n': 1})
+    db.session.commit()
+
+    assert OutboxWorker().run_once()['failed'] == 1
+    assert "No outbox handler for 'test.unknown'" in _events(db)[0].last_error
+
+
+def test_prune_deletes_old_done_events_only(db, business):
+    now = datetime.utcnow()
+    old, recent = now - timedelta(days=8), now - timedelta(days=1)
+    db.session.add_all([
+        OutboxEvent(business_id=business.id, event_type='test.ok', payload={'n': 1}, status='done',
+                    available_at=old, processed_at=old),
+        OutboxEvent(business_id=business.id, event_type='test.ok', payload={'n': 2}, status='done',
+                    available_at=recent, processed_at=recent),
+        OutboxEvent(business_id=business.id, event_type='test.ok', payload={'n': 3}, status='dead',
+                    available_at=old, processed_at=None),
+    ])
+    db.session.commit()
+
+    assert OutboxWorker(retention_days=7).prune() == 1
+    assert sorted(event.payload['n'] for event in _events(db, 'test.ok')) == [2, 3]
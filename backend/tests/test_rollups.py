@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.models.expense import Expense, ExpenseCategory, ExpenseStatus
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.outbox import OutboxEvent
+from app.models.returns import Return, ReturnItem, ReturnStatus
+from app.models.sales_rollup import DailySalesRollup
+from app.utils.outbox import OutboxWorker
+from app.utils.rollups import METRICS, rebuild
+
+DAY = datetime.utcnow().replace(hour=10, minute=0, second=0, microsecond=0) - timedelta(days=10)
+
+
+def _snapshot(db, business_id):
+    """Non-empty rollup rows as {(branch, day): metrics}."""
+    rows = db.session.query(DailySalesRollup).filter_by(business_id=business_id).all()
+    snapshot = {
+        (row.branch_id, row.day): tuple(round(float(getattr(row, metric) or 0), 2) for metric in METRICS)
+        for row in rows
+    }
+    return {key: values for key, values in snapshot.items() if any(values)}
+
+
+def _drain():
+    while OutboxWorker().run_once()['claimed']:
+        pass
+
+
+@pytest.fixture
+def activity(db, business, admin, products, make_order):
+    """Orders over three days, a return and an approved expense; returns the business id."""
+    first = make_order(products[:2], OrderStatus.DELIVERED, DAY)
+    make_order(products[1:], OrderStatus.COMPLETED, DAY + timedelta(days=1), quantity=2)
+    make_order(products[:1], OrderStatus.PENDING, DAY + timedelta(days=2))
+    item = first.order_items[0]
+    db.session.add(Return(business_id=business.id, return_id='RET1', order_id=first.id, return_date=DAY.date(),
+                          status=ReturnStatus.PENDING, reason='damaged', total_amount=item.unit_price,
+                          created_at=DAY, return_items=[ReturnItem(product_id=item.product_id, quantity=1,
+                                                                   unit_price=item.unit_price,
+                                                                   line_total=item.unit_price)]))
+    db.session.add(Expense(business_id=business.id, expense_id='EXP1', description='rent', amount=Decimal('30'),
+                           category=ExpenseCategory.RENT, expense_date=DAY.date(), status=ExpenseStatus.APPROVED,
+                           created_by=admin.id))
+    db.session.commit()
+    return business.id
+
+
+def test_commits_queue_a_refresh_for_the_worker(db, activity):
+    events = db.session.query(OutboxEvent).filter_by(event_type='rollup.refresh', status='pending').all()
+    assert {day for event in events for day in event.payload['days']} == {
+        (DAY + timedelta(days=offset)).date().isoformat() for offset in range(3)
+    }
+    # Nothing is aggregated on the committing request
+    assert _snapshot(db, activity) == {}
+
+    _drain()
+
+    snapshot = _snapshot(db, activity)
+    assert {day for _, day in snapshot} == {(DAY + timedelta(days=offset)).date() for offset in range(3)}
+    assert db.session.query(OutboxEvent).filter(OutboxEvent.status != 'done').count() == 0
+
+
+def test_rolled_back_writes_queue_nothing(db, business, admin):
+    db.session.add(Order(business_id=business.id, order_id='ORDX', user_id=admin.id, status=OrderStatus.DELIVERED,
+                         total_amount=5, tax_amount=0, shipping_cost=0, created_at=DAY - timedelta(days=1)))
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    assert db.session.query(OutboxEvent).filter_by(event_type='rollup.refresh').count() == 0
+
+
+def test_incremental_rollups_match_a_rebuild(db, activity):
+    business_id = activity
+    _drain()
+    incremental = _snapshot(db, business_id)
+    rebuild(business_id)
+    assert _snapshot(db, business_id) == incremental
+
+    # Moved, re-statused, edited and deleted rows, each in its own commit
+    orders = db.session.query(Order).filter_by(business_id=business_id).order_by(Order.id).all()
+    orders[0].created_at -= timedelta(days=3)
+    db.session.commit()
+    orders[2].status = OrderStatus.COMPLETED
+    db.session.commit()
+    db.session.query(OrderItem).filter_by(order_id=orders[1].id).first().quantity += 5
+    db.session.commit()
+    db.session.delete(orders[1])
+    db.session.commit()
+    expense = db.session.query(Expense).filter_by(business_id=business_id).one()
+    expense.expense_date -= timedelta(days=1)
+    expense.amount += 7
+    db.session.commit()
+    db.session.query(Return).filter_by(business_id=business_id).one().status = ReturnStatus.APPROVED
+    db.session.commit()
+
+    _drain()
+    incremental = _snapshot(db, business_id)
+    rebuild(business_id)
+    assert _snapshot(db, business_id) == incremental
+    assert (0, (DAY - timedelta(days=3)).date()) in incremental
@@ -0,0 +1,83 @@
+import pytest
+from flask_jwt_extended import create_access_token, verify_jwt_in_request
+
+from app.models.branch import Branch, UserBranchAccess
+from app.models.user import UserRole
+from app.utils import tenant_context
+from app.utils.tenant_context import get_tenant_context
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Counts the context loads that missed the cache."""
+    loads = []
+    load_context = tenant_context._load_context
+
+    def counting_load(user_id):
+        loads.append(user_id)
+        return load_context(user_id)
+
+    monkeypatch.setattr(tenant_context, '_load_context', counting_load)
+    return loads
+
+
+@pytest.fixture
+def context_for(app):
+    """context_for(user_id): the tenant context a fresh request with that JWT identity resolves."""
+    def context_for(user_id):
+        with app.app_context():
+            token = create_access_token(identity=str(user_id))
+        with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+            verify_jwt_in_request()
+            return get_tenant_context()
+    return context_for
+
+
+def test_context_is_cached_across_requests(db, business, admin, loads, context_for):
+    context = context_for(admin.id)
+
+    assert (context.user_id, context.role, context.business_id) == (admin.id, UserRole.admin, business.id)
+    assert context.is_active and context.business_active
+    assert context_for(admin.id) == context
+    assert loads == [admin.id]
+
+
+def test_unknown_users_have_no_context(db, loads, context_for):
+    assert context_for(999) is None
+    assert context_for(999) is None
+    assert loads == [999]
+
+
+def test_user_changes_reload_the_context(db, admin, loads, context_for):
+    context_for(admin.id)
+
+    admin.role = UserRole.manager
+    db.session.commit()
+
+    assert context_for(admin.id).role == UserRole.manager
+    assert len(loads) == 2
+
+
+def test_default_branch_changes_reload_the_context(db, business, admin, loads, context_for):
+    assert context_for(admin.id).default_branch_id is None
+
+    branch = Branch(business_id=business.id, name='Main', code='MAIN')
+    db.session.add(branch)
+    db.session.flush()
+    db.session.add(UserBranchAccess(user_id=admin.id, branch_id=branch.id, is_default=True))
+    db.session.commit()
+
+    assert context_for(admin.id).default_branch_id == branch.id
+
+
+def test_stale_entries_of_other_workers_are_not_served(db, business, admin, loads, context_for):
+    context_for(admin.id)
+    stale = tenant_context._context_cache.get(admin.id)
+
+    business.is_active = False
+    db.session.commit()
+    # Another worker never saw this commit's invalidation, only the bumped version
+    tenant_context._context_cache.set(admin.id, stale)
+
+    assert context_for(admin.id).business_active is False
+    assert len(loads) == 2
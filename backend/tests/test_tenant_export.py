@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+import tarfile
+
+import pytest
+from sqlalchemy import func
+
+from app.models.customer import Customer
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product
+from app.models.stock_level import StockLevel
+from app.models.user import User
+from app.utils.tenant_export import TenantArchiveError, create_export_job, create_restore_job, run_tenant_job
+
+
+def _counts(db):
+    return {model.__tablename__: db.session.query(model).count() for model in (User, Product, Order, OrderItem, Customer)}
+
+
+def test_export_then_restore_into_a_fresh_database(db, business, admin, products, make_order):
+    db.session.add(Customer(business_id=business.id, customer_id='CUST0001', first_name='Cara', last_name='Buyer',
+                            email='cara@example.com'))
+    for day in range(3):
+        make_order(products[:2], OrderStatus.DELIVERED, datetime.utcnow() - timedelta(days=day))
+    business_id, product_names = business.id, sorted(product.name for product in products)
+    before = _counts(db)
+
+    export = run_tenant_job(create_export_job(business_id, None).id)
+    assert export.status == 'done', export.error_message
+    archive = export.archive_path
+    with tarfile.open(archive) as tar:
+        assert 'manifest.json' in tar.getnames()
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    restore = run_tenant_job(create_restore_job(None, path=archive).id)
+
+    assert restore.status == 'done', restore.error_message
+    assert (restore.business_id, restore.rejected_rows) == (business_id, 0)
+    assert _counts(db) == before
+    assert sorted(name for (name,) in db.session.query(Product.name)) == product_names
+    assert db.session.query(Order).filter_by(business_id=business_id).first().order_items
+    # Derived tables are rebuilt, not restored
+    levels = dict(db.session.query(StockLevel.product_id, func.sum(StockLevel.quantity)).group_by(StockLevel.product_id))
+    assert levels == dict(db.session.query(Product.id, Product.stock_quantity))
+
+
+def test_restore_refuses_files_that_are_not_archives(db, tmp_path):
+    path = tmp_path / 'export.tar'
+    path.write_bytes(b'not a tar file')
+
+    with pytest.raises(TenantArchiveError):
+        create_restore_job(None, path=str(path))
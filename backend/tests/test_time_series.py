@@ -0,0 +1,57 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func
+
+from app.models.order import Order, OrderStatus
+from app.utils.time_series import TimeSeries, bucket_start
+
+ORDER_TIMES = [
+    datetime(2026, 1, 15, 10), datetime(2026, 1, 31, 23, 30), datetime(2026, 2, 2, 8),
+    datetime(2026, 3, 1, 0), datetime(2026, 4, 10, 12), datetime(2026, 4, 14, 18),
+]
+
+
+@pytest.fixture
+def orders(products, make_order):
+    return [make_order(products[:1], OrderStatus.DELIVERED, created_at) for created_at in ORDER_TIMES]
+
+
+def test_monthly_buckets_include_the_trailing_partial_month():
+    series = TimeSeries('month', datetime(2026, 1, 15), datetime(2026, 4, 14, 23, 59, 59))
+
+    assert series.buckets == [date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1), date(2026, 4, 1)]
+    assert series.labels() == ['Jan 2026', 'Feb 2026', 'Mar 2026', 'Apr 2026']
+    assert series.range_end == date(2026, 5, 1)
+
+
+def test_weekly_buckets_start_on_monday():
+    series = TimeSeries('week', date(2026, 1, 1), date(2026, 1, 14))
+
+    assert series.buckets == [date(2025, 12, 29), date(2026, 1, 5), date(2026, 1, 12)]
+    assert series.shifted(-1).buckets == [date(2025, 12, 22), date(2025, 12, 29), date(2026, 1, 5)]
+
+
+@pytest.mark.parametrize('granularity', ['day', 'week', 'month', 'year'])
+def test_sql_buckets_match_python_buckets(db, business, orders, granularity):
+    series = TimeSeries(granularity, ORDER_TIMES[0], ORDER_TIMES[-1])
+    rows = series.fetch(series.query(Order.created_at, func.count(Order.id).label('orders')).filter(
+        Order.business_id == business.id
+    ))
+
+    expected = {}
+    for created_at in ORDER_TIMES:
+        bucket = bucket_start(created_at, granularity)
+        expected[bucket] = expected.get(bucket, 0) + 1
+    assert {bucket: row.orders for bucket, row in rows.items()} == expected
+    assert sum(series.fill(rows, lambda row: row.orders, default=0)) == len(ORDER_TIMES)
+
+
+def test_sales_report_trend_has_one_point_per_month(client, auth_headers, orders):
+    response = client.get('/api/reports/sales?start_date=2026-01-15&end_date=2026-04-14', headers=auth_headers)
+
+    assert response.status_code == 200
+    report = response.get_json()['sales_report']
+    assert [point['period'] for point in report['sales_trend']] == ['Jan 2026', 'Feb 2026', 'Mar 2026', 'Apr 2026']
+    assert [point['orders'] for point in report['sales_trend']] == [2, 1, 1, 2]
+    assert len(report['previous_sales_trend']) == 4
@@ -78,6 +78,31 @@ export const getImageUrl = (path) => {
 
 export default api;
 
+// Bulk uploads of large files return 202 with an import job; poll it until it
+// finishes and resolve with the same { created_count, created, errors } shape
+// as a synchronous upload.
+const waitForImportJob = async (response, interval = 1000) => {
+  if (response.status !== 202 || !response.data || !response.data.job) return response;
+  let job = response.data.job;
+  while (job.status !== 'done' && job.status !== 'failed') {
+    await new Promise((res) => setTimeout(res, interval));
+    job = (await api.get(`/import-jobs/${job.id}`)).data.job;
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.error_message || 'Import failed');
+  }
+  return {
+    ...response,
+    status: 200,
+    data: { job, created: job.created, errors: job.errors, created_count: job.created_count, error_count: job.error_count },
+  };
+};
+
+export const importJobsAPI = {
+  getImportJobs: (params = {}) => api.get('/import-jobs/', { params }),
+  getImportJob: (jobId) => api.get(`/import-jobs/${jobId}`),
+};
+
 // API functions
 export const salesAPI = {
   getOrders: (params = {}) => api.get('/sales/orders', { params }),
@@ -186,7 +211,7 @@ export const inventoryAPI = {
   getCategories: () => api.get('/inventory/categories'),
   createCategory: (categoryData) => api.post('/inventory/categories', categoryData),
   adjustStock: (adjustmentData) => api.post('/inventory/stock-adjustment', adjustmentData),
-  bulkUploadProducts: (formData) => api.post('/inventory/products/bulk-upload', formData),
+  bulkUploadProducts: (formData) => api.post('/inventory/products/bulk-upload', formData).then((res) => waitForImportJob(res)),
   getInventoryTransactions: (params = {}) => api.get('/inventory/transactions', { params }),
   exportProducts: () => api.get('/reports/export/inventory?format=csv', { responseType: 'blob' }),
 };
@@ -209,7 +234,7 @@ export const customersAPI = {
   getCustomerOrders: (customerId) => api.get(`/customers/${customerId}/orders`),
   recalculateBalances: () => api.post('/customers/recalculate-balances'),
   bulkUploadCustomers: (formData) =>
-    api.post('/customers/bulk-upload', formData),
+    api.post('/customers/bulk-upload', formData).then((res) => waitForImportJob(res)),
 };
 
 export const hrAPI = {
@@ -282,7 +307,7 @@ export const hrAPI = {
   exportPayroll: () => api.get('/reports/export/payroll'),
   exportEmployees: () => api.get('/reports/export/employees'),
   bulkUploadEmployees: (formData) =>
-    api.post('/hr/employees/bulk-upload', formData),
+    api.post('/hr/employees/bulk-upload', formData).then((res) => waitForImportJob(res)),
 };
 
 export const customerAPI = {
@@ -558,7 +583,12 @@ export const superadminAPI = {
   },
 
   // Business Data Export
-  exportBusinessData: (businessId) => api.get(`/superadmin/business/${businessId}/export`),
+  exportBusinessData: (businessId) => api.post(`/superadmin/business/${businessId}/export`),
+  getLatestBusinessExport: (businessId) => api.get(`/superadmin/business/${businessId}/export`),
+  getExportJob: (jobId) => api.get(`/superadmin/exports/${jobId}`),
+  resumeExportJob: (jobId) => api.post(`/superadmin/exports/${jobId}/resume`),
+  downloadExport: (jobId) => api.get(`/superadmin/exports/${jobId}/download`, { responseType: 'blob' }),
+  restoreBusinessData: (exportId) => api.post('/superadmin/restores', { export_id: exportId }),
 
   // Plans Management
   getAllPlans: () => api.get('/superadmin/plans'),